@@ -2,7 +2,7 @@
 設定ファイル
 """
 import os
-from typing import Dict, Any
+from typing import Dict, List, Any, Tuple
 
 # 基本的な検索設定
 SEARCH_KEYWORD: str = "マダミス"  # 検索キーワード
@@ -15,6 +15,9 @@ OUTPUT_DIR: str = "data"          # データ保存ディレクトリ
 # アクセス制御設定
 WAIT_TIME_MIN: float = 1.0        # アクセス間の最小待機時間
 WAIT_TIME_MAX: float = 1.1        # アクセス間の最大待機時間
+ITEM_WAIT_TIME_MIN: float = 1.0   # 商品ページ間の最小待機時間
+ITEM_WAIT_TIME_MAX: float = 2.0   # 商品ページ間の最大待機時間
+PAGE_TIMEOUT: tuple = (10.0, 30.0)  # 検索・商品ページ取得の (接続, 読み込み) タイムアウト秒
 HEADERS: Dict[str, str] = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -23,5 +26,91 @@ HEADERS: Dict[str, str] = {
     'DNT': '1',
 }
 
+# サムネイル設定（--thumbnails指定時）
+THUMBNAIL_DIR: str = "data/thumbnails"  # 画像の保存先（内容のハッシュをファイル名にする）
+THUMBNAIL_WORKERS: int = 4        # 並列にダウンロードするワーカー数
+THUMBNAIL_INTERVAL: float = 0.2   # 画像サーバーへのリクエストの最小間隔（秒）
+THUMBNAIL_TIMEOUT: float = 30.0   # 1枚あたりのタイムアウト（秒）
+
 # URL設定
-BASE_URL: str = "https://booth.pm"
+BASE_URL: str = os.getenv("BOOTH_BASE_URL", "https://booth.pm")  # 負荷試験ではローカルのモックサーバーを指定する
+
+# 整形設定
+RULE_CONFIDENCE_THRESHOLD: float = 0.8  # ルールベース抽出の値を確定とみなす確信度の下限
+PARSE_ERROR_LOG: str = "json_parse_error.log"  # JSON解析に失敗した応答の追記先
+# 小さいモデルから順に試すモデルカスケード [(APIタイプ, モデル名), ...]。空の場合は--apiのモデルのみ使用
+FORMAT_CASCADE: List[Tuple[str, str]] = []
+REPAIR_SNIPPET_CHARS: int = 300   # 修正プロンプトに含める説明文の抜粋の最大文字数
+DESCRIPTION_TOKEN_BUDGET: int = 400  # プロンプトに含める説明文のトークン数の上限（概算、0で圧縮しない）
+
+# 近似重複クラスタリング設定（代表の1件だけを整形し、他のメンバーに結果を流用する）
+DEDUP_THRESHOLD: float = 0.85     # 同じクラスタとみなす推定Jaccard類似度の下限
+DEDUP_NUM_PERM: int = 64          # MinHashのハッシュ関数の数
+DEDUP_BANDS: int = 16             # LSHのバンド数（DEDUP_NUM_PERMを割り切れる数）
+DEDUP_SHINGLE_SIZE: int = 5       # シングルの文字数
+DEDUP_MIN_CHARS: int = 100        # クラスタリングの対象とする説明文の最小文字数
+
+# プロファイル設定（--profile指定時）
+PROFILE_DIR: str = "profiles"     # プロファイルの出力先（実行ごとにサブディレクトリを作成）
+PROFILE_SAMPLE_INTERVAL: float = 0.005  # スタックのサンプリング間隔（秒）
+PROFILE_TOP_N: int = 15           # レポートに表示するホットスポットの件数
+
+# データベース設定（--db指定時）
+STORAGE_BATCH_SIZE: int = 50      # 整形済みアイテムをまとめて書き込む件数
+
+# 全文検索設定（index・searchコマンド）
+SEARCH_DB_PATH: str = "data/booth.db"  # --db省略時のデータベース
+INDEX_BATCH_SIZE: int = 1000      # indexコマンドでまとめて登録する件数
+
+# 列指向形式の書き出し・集計設定（export・statsコマンド）
+COLUMNAR_BATCH_SIZE: int = 65536  # Parquet・Arrowに1回で書き込む行数
+STATS_PRICE_BANDS: List[int] = [0, 500, 1000, 2000, 3000, 5000]  # 価格帯の下限（円）
+
+# 評価設定（evalコマンド）
+EVAL_GOLD_FILE: str = "eval/gold_set.json"  # 正解付きのデータ（get_examples()と同じ{"input", "output"}の形式）
+EVAL_OUTPUT_DIR: str = "eval_results"     # 評価結果の出力先
+
+# 実行マニフェスト設定（scrape・formatの出力ファイルごとにコミット・設定・プロンプトのバージョンを記録する）
+RUN_MANIFEST_SUFFIX: str = ".manifest.json"  # 出力ファイル名に付けるマニフェストの接尾辞
+
+# クロールのメトリクス設定（scrapeの出力ファイルごとにステージ別の統計を保存する）
+CRAWL_METRICS_SUFFIX: str = ".crawl_metrics.json"  # 出力ファイル名に付けるメトリクスの接尾辞
+
+# テレメトリ設定
+TELEMETRY_DIR: str = "logs/telemetry"  # LLM呼び出しのログ（実行ごとのJSONLとサマリー）の出力先
+TELEMETRY_PERCENTILE_SAMPLES: int = 10000  # パーセンタイルの計算に使うモデルごとのサンプル数の上限（超えた分は無作為に間引く）
+# モデルごとの単価（USD / 100万トークン）: (入力, 出力)。ローカルのOllamaモデルは0とする
+MODEL_PRICING: Dict[str, Tuple[float, float]] = {
+    'gemini-2.0-flash-001': (0.10, 0.40),
+    'gemini-2.0-flash-lite-001': (0.075, 0.30),
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemma3:4b': (0.0, 0.0),
+    'gemma3:12b': (0.0, 0.0),
+}
+
+# ヘッジ設定（--hedge指定時、応答が遅いリクエストに予備のリクエストを重ねる）
+HEDGE_QUANTILE: float = 0.95      # 予備を送るまでの待ち時間に使うレイテンシの分位点
+HEDGE_MIN_SAMPLES: int = 20       # 予備を送り始めるまでに必要なレイテンシの記録数
+HEDGE_WINDOW: int = 200           # 分位点の計算に使う直近のレイテンシの件数
+HEDGE_MIN_DELAY: float = 1.0      # 予備を送るまでの最小の待ち時間（秒）
+HEDGE_MAX_EXTRA_RATIO: float = 0.1  # 全呼び出しに対する予備のリクエストの割合の上限
+# 予備のリクエストを別のバックエンドに送る場合の指定 {APIタイプ: (APIタイプ, モデル名)}。
+# 指定がない場合は同じバックエンド（Ollamaで複数エンドポイントがあれば別のノード）に送る
+HEDGE_BACKENDS: Dict[str, Tuple[str, str]] = {}
+
+# Ollama設定
+OLLAMA_API_URLS: List[str] = []   # 負荷分散するエンドポイント（例: ["http://gpu1:11434/api", "http://gpu2:11434/api"]）
+OLLAMA_EJECT_SECONDS: float = 60.0  # 失敗したエンドポイントを除外しておく秒数
+OLLAMA_HEALTH_CHECK_INTERVAL: float = 30.0  # すべてのエンドポイントをヘルスチェックする間隔（秒、振り分けの前に確認する）
+OLLAMA_KEEP_ALIVE: str = "30m"    # リクエスト後にモデルをメモリへ保持する時間
+OLLAMA_TIMEOUT: tuple = (5.0, 300.0)  # (接続, 読み込み) タイムアウト秒
+OLLAMA_OPTIONS: Dict[str, Any] = {
+    'num_ctx': 8192,              # コンテキスト長
+    'num_predict': 512,           # 最大生成トークン数
+    'temperature': 0.2,
+}
+
+# LLM呼び出しのサーキットブレーカー設定（バックエンドごとに全ワーカーで共有）
+BREAKER_FAILURE_THRESHOLD: int = 5    # 停止に切り替える連続失敗回数
+BREAKER_RESET_TIMEOUT: float = 5.0    # 待機時間の指示がない場合の停止秒数（連続するたびに倍増）
+BREAKER_MAX_BACKOFF: float = 300.0    # 停止秒数の上限
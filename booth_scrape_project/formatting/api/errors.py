@@ -0,0 +1,75 @@
+"""
+LLMプロバイダー共通の例外
+"""
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+
+class ProviderError(Exception):
+    """LLMプロバイダー呼び出しの失敗"""
+
+    def __init__(self, message: str, provider: Optional[str] = None, retry_after: Optional[float] = None, retryable: bool = True) -> None:
+        """
+        初期化
+
+        Args:
+            message: エラーメッセージ
+            provider: プロバイダー名（gemini / ollama）
+            retry_after: プロバイダーが示した再試行までの秒数
+            retryable: 再試行で回復する見込みがあるかどうか
+        """
+        super().__init__(message)
+        self.provider = provider
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
+class RateLimitError(ProviderError):
+    """レート制限・クォータ超過（HTTP 429、RESOURCE_EXHAUSTED）"""
+
+
+class ProviderUnavailableError(ProviderError):
+    """接続失敗・タイムアウト・サーバーエラー（HTTP 5xx）"""
+
+
+class ProviderConfigError(ProviderError):
+    """APIキーやパッケージの不足など、再試行しても回復しないエラー"""
+
+    def __init__(self, message: str, provider: Optional[str] = None) -> None:
+        super().__init__(message, provider=provider, retryable=False)
+
+
+class RequestCancelledError(ProviderError):
+    """ヘッジで別のリクエストが先に返ったため中断したリクエスト"""
+
+    def __init__(self, message: str, provider: Optional[str] = None) -> None:
+        super().__init__(message, provider=provider, retryable=False)
+
+
+def parse_retry_after(value: Any) -> Optional[float]:
+    """
+    再試行までの待機時間を秒に変換する
+
+    Args:
+        value: Retry-Afterヘッダーの値（秒数またはHTTP日付）、"34s"形式のgRPCの期間、数値のいずれか
+
+    Returns:
+        秒数。解釈できない場合はNone
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return max(0.0, float(value))
+
+    text = str(value).strip()
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*s?", text)
+    if match:
+        return float(match.group(1))
+
+    try:
+        retry_at = parsedate_to_datetime(text)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
@@ -2,14 +2,53 @@
 Google Gemini APIを利用したフォーマット機能
 """
 import os
-import sys
-from typing import Dict, Optional
+import re
+from typing import Dict, Any, Optional, TYPE_CHECKING
 from pathlib import Path
 from dotenv import load_dotenv
+from formatting.api.errors import (
+    ProviderError,
+    ProviderConfigError,
+    ProviderUnavailableError,
+    RateLimitError,
+    parse_retry_after,
+)
 
+if TYPE_CHECKING:
+    from formatting.hedging import CancelToken
 
-def format_with_gemini(prompt: str, model_name: str) -> Optional[Dict]:
-    """Gemini APIを使用してプロンプトを処理"""
+PROVIDER = "gemini"
+
+
+def to_gemini_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """JSONスキーマをGeminiのresponse_schema形式（型名が大文字）に変換する"""
+    converted: Dict[str, Any] = {}
+    for key, value in schema.items():
+        if key == "type":
+            converted[key] = value.upper()
+        elif key == "properties":
+            converted[key] = {name: to_gemini_schema(sub) for name, sub in value.items()}
+        elif key == "items":
+            converted[key] = to_gemini_schema(value)
+        else:
+            converted[key] = value
+    if "properties" in schema:
+        # 出力順をスキーマの定義順に固定する
+        converted["property_ordering"] = list(schema["properties"])
+    return converted
+
+
+def format_with_gemini(prompt: str, model_name: str, response_schema: Optional[Dict[str, Any]] = None, cancel_token: Optional["CancelToken"] = None, usage: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Gemini APIを使用してプロンプトを処理
+
+    同期呼び出しは途中で中断できないため、cancel_tokenは送信前と応答受信後に確認し、
+    中断済みの場合は応答を捨てる。
+    usageを指定した場合は、usage_metadataのトークン数を書き込む
+
+    Raises:
+        ProviderError: API呼び出しに失敗した場合（レート制限時はRateLimitError）
+    """
     try:
         from google import genai
         from google.genai import types
@@ -38,12 +77,20 @@ def format_with_gemini(prompt: str, model_name: str) -> Optional[Dict]:
         # 環境変数を取得
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
-            print(
-                "GEMINI_API_KEY が環境変数に設定されていません。.envファイルを確認してください。")
-            sys.exit(1)
+            raise ProviderConfigError(
+                "GEMINI_API_KEY が環境変数に設定されていません。.envファイルを確認してください。", PROVIDER)
 
         client = genai.Client(api_key=api_key)
 
+        schema_config: Dict[str, Any] = {}
+        if response_schema is not None:
+            schema_config = {
+                "response_mime_type": "application/json",
+                "response_schema": to_gemini_schema(response_schema),
+            }
+
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled(PROVIDER)
         response = client.models.generate_content(
             model=model_name,
             contents=prompt,
@@ -51,14 +98,69 @@ def format_with_gemini(prompt: str, model_name: str) -> Optional[Dict]:
                 temperature=0.2,
                 top_k=40,
                 top_p=0.95,
+                **schema_config,
             )
         )
 
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled(PROVIDER)
+        metadata = getattr(response, "usage_metadata", None)
+        if usage is not None and metadata is not None:
+            usage.update({
+                "prompt_tokens": metadata.prompt_token_count,
+                # 思考トークンも出力トークンとして課金される
+                "output_tokens": (metadata.candidates_token_count or 0) + (getattr(metadata, "thoughts_token_count", None) or 0),
+            })
         return response.text
 
     except ImportError:
-        print("google-generativeai package is not installed. Run: pip install google-generativeai")
-        sys.exit(1)
+        raise ProviderConfigError(
+            "google-genai package is not installed. Run: pip install google-genai", PROVIDER)
+    except ProviderError:
+        raise
     except Exception as e:
-        print(f"Error in Gemini API call: {e}")
-        sys.exit(1)
+        raise convert_gemini_error(e) from e
+
+
+def _gemini_retry_delay(error: Exception) -> Optional[float]:
+    """Geminiのエラーから再試行までの秒数（RetryInfoのretryDelay、Retry-Afterヘッダー）を取り出す"""
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        for detail in details.get("error", {}).get("details", []):
+            if isinstance(detail, dict) and "retryDelay" in detail:
+                delay = parse_retry_after(detail["retryDelay"])
+                if delay is not None:
+                    return delay
+
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None and headers.get("Retry-After"):
+        return parse_retry_after(headers.get("Retry-After"))
+
+    match = re.search(r"retry in (\d+(?:\.\d+)?)\s*s", str(error), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def convert_gemini_error(error: Exception) -> ProviderError:
+    """
+    Gemini SDKの例外を共通の例外に変換する
+
+    Args:
+        error: Gemini SDKが送出した例外
+
+    Returns:
+        対応するProviderError
+    """
+    code = getattr(error, "code", None)
+    status = str(getattr(error, "status", "") or "")
+    message = f"Error in Gemini API call: {error}"
+
+    if code == 429 or "RESOURCE_EXHAUSTED" in status or "RESOURCE_EXHAUSTED" in str(error):
+        return RateLimitError(message, PROVIDER, retry_after=_gemini_retry_delay(error))
+    if isinstance(code, int) and (code >= 500 or code == 408):
+        return ProviderUnavailableError(message, PROVIDER, retry_after=_gemini_retry_delay(error))
+    if code in (400, 401, 403, 404):
+        return ProviderError(message, PROVIDER, retryable=False)
+    return ProviderError(message, PROVIDER)
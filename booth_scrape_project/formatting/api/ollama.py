@@ -2,32 +2,300 @@
 Ollama APIを利用したフォーマット機能
 """
 import os
+import json
+import time
+import threading
 import requests
-from typing import Dict, Optional
-
-def format_with_ollama(prompt: str, model_name: str) -> Optional[str]:
-    """Ollama APIを使用してプロンプトを処理"""
-    api_url = os.getenv("OLLAMA_API_URL", "http://localhost:11434/api")
-    
-    payload = {
-        "model": model_name,
-        "prompt": prompt,
-        "stream": False
-    }
-    
-    try:
-        response = requests.post(
-            f"{api_url}/generate",
-            json=payload,
-            headers={"Content-Type": "application/json"}
-        )
-        
-        response.raise_for_status()
-        
-        response_json = response.json()
-        # APIからのレスポンステキストを返す
-        return response_json.get("response", "")
-        
-    except requests.RequestException as e:
-        print(f"Error in Ollama API call: {e}")
-        return None
\ No newline at end of file
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Optional, Tuple, Union, TYPE_CHECKING
+import config
+from formatting.response_parser import IncrementalJsonParser
+from formatting.compaction import estimate_tokens
+from formatting.api.errors import (
+    ProviderError,
+    ProviderUnavailableError,
+    RateLimitError,
+    RequestCancelledError,
+    parse_retry_after,
+)
+
+if TYPE_CHECKING:
+    from formatting.hedging import CancelToken
+
+PROVIDER = "ollama"
+DEFAULT_API_URL = "http://localhost:11434/api"
+
+# ストリームの途中で返るエラーのうち、一時的なもの（再試行や別のノードで成功しうる）のメッセージ
+TRANSIENT_STREAM_ERRORS = ("server busy", "timed out", "timeout", "unexpected eof", "connection reset", "runner process has terminated")
+
+
+def _convert_http_error(response: requests.Response) -> ProviderError:
+    """HTTPエラー応答を共通の例外に変換する"""
+    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    message = f"Error in Ollama API call: HTTP {response.status_code} {response.text[:200]}"
+    if response.status_code == 429:
+        return RateLimitError(message, PROVIDER, retry_after=retry_after)
+    if response.status_code >= 500:
+        return ProviderUnavailableError(message, PROVIDER, retry_after=retry_after)
+    return ProviderError(message, PROVIDER, retryable=False)
+
+
+def _convert_stream_error(message: str) -> ProviderError:
+    """
+    ストリームの途中で返ったエラーを共通の例外に変換する
+
+    存在しないモデルなどのリクエストの誤りは再試行しても失敗するため、一時的なエラー以外は再試行しない
+    """
+    text = f"Error in Ollama API call: {message}"
+    if any(marker in str(message).lower() for marker in TRANSIENT_STREAM_ERRORS):
+        return ProviderUnavailableError(text, PROVIDER)
+    return ProviderError(text, PROVIDER, retryable=False)
+
+
+def _convert_request_error(error: Exception) -> Optional[ProviderError]:
+    """
+    通信エラーを共通の例外に変換する
+
+    Returns:
+        変換した例外。通信エラーではない場合はNone（呼び出し元で元の例外をそのまま送出する）
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return ProviderUnavailableError(f"Error in Ollama API call: {error}", PROVIDER)
+    if isinstance(error, json.JSONDecodeError):
+        # ストリームの行が途中で切れた場合など
+        return ProviderUnavailableError(f"Error in Ollama API call: 不正な応答です: {error}", PROVIDER)
+    if isinstance(error, requests.RequestException):
+        return ProviderError(f"Error in Ollama API call: {error}", PROVIDER)
+    return None
+
+
+class OllamaClient:
+    """セッションを再利用し、ストリーミングで応答を受け取るOllama APIクライアント"""
+
+    def __init__(self, api_url: Optional[str] = None, keep_alive: Optional[str] = None, options: Optional[Dict[str, Any]] = None, timeout: Optional[Union[float, Tuple[float, float]]] = None, pool_size: int = 8) -> None:
+        """
+        初期化
+
+        Args:
+            api_url: Ollama APIのベースURL（例: http://localhost:11434/api）
+            keep_alive: リクエスト後にモデルをメモリへ保持する時間
+            options: num_ctx、num_predict、temperatureなどのモデルオプション
+            timeout: (接続, 読み込み) タイムアウト秒
+            pool_size: 保持するコネクション数
+        """
+        self.api_url = (api_url or os.getenv("OLLAMA_API_URL", DEFAULT_API_URL)).rstrip("/")
+        self.keep_alive = keep_alive if keep_alive is not None else config.OLLAMA_KEEP_ALIVE
+        self.options = dict(config.OLLAMA_OPTIONS if options is None else options)
+        self.timeout = timeout if timeout is not None else config.OLLAMA_TIMEOUT
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        self._lock = threading.Lock()
+        self._totals: Dict[str, float] = {
+            "requests": 0,
+            "stopped_early": 0,
+            "prompt_eval_count": 0,
+            "prompt_eval_duration": 0.0,
+            "eval_count": 0,
+            "eval_duration": 0.0,
+            "wall_time": 0.0,
+        }
+
+    def generate(self, prompt: str, model_name: str, options: Optional[Dict[str, Any]] = None, early_stop: bool = True, response_format: Optional[Dict[str, Any]] = None, cancel_token: Optional["CancelToken"] = None) -> Dict[str, Any]:
+        """
+        プロンプトを送信し、ストリーミングで応答を受け取る
+
+        early_stopがTrueの場合、JSONオブジェクトが閉じた時点で受信を打ち切る。
+        cancel_tokenが中断された場合はコネクションを閉じ、Ollama側の生成も止める
+
+        Args:
+            prompt: プロンプト
+            model_name: モデル名
+            options: このリクエストだけに適用するモデルオプション
+            early_stop: JSONオブジェクト完成時に生成を打ち切るかどうか
+            response_format: 出力を制約するJSONスキーマ
+            cancel_token: ヘッジで不要になったリクエストを中断するためのトークン
+
+        Returns:
+            応答テキスト（response）と所要時間などの統計を含む辞書。時間の単位は秒。
+            早期終了した場合の出力トークン数（eval_count）は応答テキストからの概算で、eval_count_estimatedがTrueになる
+
+        Raises:
+            ProviderError: API呼び出しに失敗した場合（HTTP 429はRateLimitError、中断した場合はRequestCancelledError）
+        """
+        payload: Dict[str, Any] = {
+            "model": model_name,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+            "options": {**self.options, **(options or {})},
+        }
+        if response_format is not None:
+            payload["format"] = response_format
+
+        started_at = time.perf_counter()
+        first_token_at: Optional[float] = None
+        chunks = []
+        final: Dict[str, Any] = {}
+        stopped_early = False
+        parser = IncrementalJsonParser()
+
+        try:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled(PROVIDER)
+            # withを抜けるとコネクションが閉じられ、Ollama側の生成も中断される
+            with self.session.post(f"{self.api_url}/generate", json=payload, stream=True, timeout=self.timeout) as response:
+                if cancel_token is not None:
+                    # 応答待ちで止まっていても中断できるよう、中断時にコネクションを閉じる
+                    cancel_token.on_cancel(response.close)
+                if response.status_code >= 400:
+                    raise _convert_http_error(response)
+                for line in response.iter_lines():
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled(PROVIDER)
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise _convert_stream_error(chunk["error"])
+
+                    token = chunk.get("response", "")
+                    if token and first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    chunks.append(token)
+
+                    if chunk.get("done"):
+                        final = chunk
+                        break
+                    if early_stop and parser.feed(token):
+                        stopped_early = True
+                        break
+        except ProviderError:
+            raise
+        except Exception as e:
+            if cancel_token is not None and cancel_token.cancelled:
+                raise RequestCancelledError("Ollama APIの呼び出しを中断しました", PROVIDER) from e
+            error = _convert_request_error(e)
+            if error is None:
+                raise
+            raise error from e
+
+        finished_at = time.perf_counter()
+        result = {
+            "response": "".join(chunks),
+            "stopped_early": stopped_early,
+            "wall_time": finished_at - started_at,
+        }
+        if final:
+            # Ollamaが返す所要時間はナノ秒単位
+            result.update({
+                "prompt_eval_count": final.get("prompt_eval_count", 0),
+                "prompt_eval_duration": final.get("prompt_eval_duration", 0) / 1e9,
+                "eval_count": final.get("eval_count", 0),
+                "eval_count_estimated": False,
+                "eval_duration": final.get("eval_duration", 0) / 1e9,
+                "load_duration": final.get("load_duration", 0) / 1e9,
+            })
+        else:
+            # 途中で打ち切った場合は最終チャンクが届かないため、受信時刻と応答テキストから推定する
+            # （チャンク数はトークン数と一致しないため使わない）
+            first = first_token_at or finished_at
+            result.update({
+                "prompt_eval_count": None,
+                "prompt_eval_duration": first - started_at,
+                "eval_count": estimate_tokens(result["response"]),
+                "eval_count_estimated": True,
+                "eval_duration": finished_at - first,
+                "load_duration": None,
+            })
+
+        self._record(result)
+        return result
+
+    def _record(self, result: Dict[str, Any]) -> None:
+        """累計の統計を更新する"""
+        with self._lock:
+            self._totals["requests"] += 1
+            self._totals["stopped_early"] += int(result["stopped_early"])
+            self._totals["prompt_eval_count"] += result["prompt_eval_count"] or 0
+            self._totals["prompt_eval_duration"] += result["prompt_eval_duration"]
+            self._totals["eval_count"] += result["eval_count"]
+            self._totals["eval_duration"] += result["eval_duration"]
+            self._totals["wall_time"] += result["wall_time"]
+
+    def get_stats(self) -> Dict[str, float]:
+        """累計の統計を取得する"""
+        with self._lock:
+            return dict(self._totals)
+
+    def close(self) -> None:
+        """セッションを閉じる"""
+        self.session.close()
+
+
+_default_client: Optional[OllamaClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> OllamaClient:
+    """プロセス内で共有するOllamaクライアントを取得する"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OllamaClient()
+        return _default_client
+
+
+def print_ollama_stats() -> None:
+    """共有クライアント（複数エンドポイントの場合はエンドポイントごと）の累計統計を表示する"""
+    from formatting.api.ollama_pool import get_default_pool
+
+    pool = get_default_pool()
+    if pool is not None:
+        print("Ollamaエンドポイント別統計:")
+        pool.print_stats()
+        return
+
+    if _default_client is None:
+        return
+    stats = _default_client.get_stats()
+    if not stats["requests"]:
+        return
+    print(
+        f"Ollama統計: {int(stats['requests'])}リクエスト "
+        f"(早期終了 {int(stats['stopped_early'])}件), "
+        f"prompt_eval {stats['prompt_eval_duration']:.1f}秒 / {int(stats['prompt_eval_count'])}トークン, "
+        f"eval {stats['eval_duration']:.1f}秒 / {int(stats['eval_count'])}トークン, "
+        f"合計 {stats['wall_time']:.1f}秒")
+
+
+def format_with_ollama(prompt: str, model_name: str, response_schema: Optional[Dict[str, Any]] = None, cancel_token: Optional["CancelToken"] = None, usage: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Ollama APIを使用してプロンプトを処理（複数のエンドポイントが設定されている場合は負荷分散する）
+
+    cancel_tokenを指定した場合は、中断時にストリーミングを打ち切る。
+    usageを指定した場合は、トークン数と所要時間（秒）を書き込む
+
+    Raises:
+        ProviderError: API呼び出しに失敗した場合（HTTP 429はRateLimitError）
+    """
+    from formatting.api.ollama_pool import get_default_pool
+
+    provider = get_default_pool() or get_default_client()
+    result = provider.generate(
+        prompt, model_name, response_format=response_schema, cancel_token=cancel_token)
+    if usage is not None:
+        usage.update({
+            "prompt_tokens": result["prompt_eval_count"],
+            "output_tokens": result["eval_count"],
+            "output_tokens_estimated": result["eval_count_estimated"],
+            "prompt_eval_duration": round(result["prompt_eval_duration"], 4),
+            "eval_duration": round(result["eval_duration"], 4),
+            "endpoint": result.get("endpoint", getattr(provider, "api_url", None)),
+        })
+    # APIからのレスポンステキストを返す
+    return result["response"]
@@ -0,0 +1,267 @@
+"""
+複数のOllamaエンドポイントに負荷分散するプロバイダー
+観測したレイテンシと処理中のリクエスト数から送信先を選び、失敗したエンドポイントは一時的に外す
+"""
+import os
+import time
+import threading
+import requests
+from typing import Dict, List, Any, Optional, Set
+import config
+from formatting.api.ollama import OllamaClient, DEFAULT_API_URL, PROVIDER
+from formatting.api.errors import ProviderError, ProviderUnavailableError, RequestCancelledError
+
+
+class OllamaEndpoint:
+    """1つのOllamaエンドポイントと、その観測値"""
+
+    # 初回の計測までに仮定するレイテンシ（秒）
+    INITIAL_LATENCY = 1.0
+    # レイテンシの指数移動平均の重み
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, client: OllamaClient) -> None:
+        """
+        初期化
+
+        Args:
+            client: このエンドポイント用のクライアント
+        """
+        self.client = client
+        self.api_url = client.api_url
+        self.in_flight = 0
+        self.latency = self.INITIAL_LATENCY
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        self.busy_time = 0.0
+        self.eval_count = 0
+        self.eval_duration = 0.0
+
+    def score(self) -> float:
+        """送信先選択用のスコア（小さいほど優先）"""
+        return (self.in_flight + 1) * self.latency
+
+    def record_success(self, result: Dict[str, Any]) -> None:
+        """成功したリクエストの観測値を反映する"""
+        wall_time = result["wall_time"]
+        self.requests += 1
+        self.busy_time += wall_time
+        self.eval_count += result.get("eval_count") or 0
+        self.eval_duration += result.get("eval_duration") or 0.0
+        self.latency = (1 - self.EWMA_ALPHA) * self.latency + self.EWMA_ALPHA * wall_time
+
+    def get_stats(self) -> Dict[str, Any]:
+        """エンドポイントごとの統計を取得する"""
+        return {
+            "api_url": self.api_url,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "latency_ewma": round(self.latency, 3),
+            "items_per_second": round(self.requests / self.busy_time, 3) if self.busy_time else 0.0,
+            "tokens_per_second": round(self.eval_count / self.eval_duration, 1) if self.eval_duration else 0.0,
+        }
+
+
+class OllamaEndpointPool:
+    """複数のOllamaエンドポイントへリクエストを振り分けるプロバイダー"""
+
+    def __init__(self, api_urls: List[str], eject_seconds: Optional[float] = None, health_timeout: float = 2.0, health_interval: Optional[float] = None, **client_kwargs: Any) -> None:
+        """
+        初期化
+
+        Args:
+            api_urls: Ollama APIのベースURLのリスト
+            eject_seconds: 失敗したエンドポイントを外しておく秒数
+            health_timeout: ヘルスチェックのタイムアウト秒
+            health_interval: すべてのエンドポイントをヘルスチェックする間隔（秒）
+            client_kwargs: 各OllamaClientに渡す引数
+        """
+        if not api_urls:
+            raise ValueError("api_urlsが空です")
+        self.endpoints = [OllamaEndpoint(OllamaClient(api_url=url, **client_kwargs)) for url in api_urls]
+        self.eject_seconds = eject_seconds if eject_seconds is not None else config.OLLAMA_EJECT_SECONDS
+        self.health_timeout = health_timeout
+        self.health_interval = health_interval if health_interval is not None else config.OLLAMA_HEALTH_CHECK_INTERVAL
+        self._lock = threading.Lock()
+        self._next_check_at = time.monotonic() + self.health_interval
+
+    def check_health(self, endpoint: OllamaEndpoint) -> bool:
+        """
+        エンドポイントが応答するか確認する
+
+        Args:
+            endpoint: 確認するエンドポイント
+
+        Returns:
+            応答した場合はTrue
+        """
+        try:
+            response = endpoint.client.session.get(f"{endpoint.api_url}/tags", timeout=self.health_timeout)
+            response.raise_for_status()
+            return True
+        except requests.RequestException:
+            return False
+
+    def check_all(self) -> None:
+        """すべてのエンドポイントのヘルスチェックを行い、応答しないものを外す"""
+        with self._lock:
+            self._next_check_at = time.monotonic() + self.health_interval
+        for endpoint in self.endpoints:
+            if self.check_health(endpoint):
+                with self._lock:
+                    endpoint.healthy = True
+                    endpoint.ejected_until = 0.0
+            else:
+                self._eject(endpoint)
+
+    def _eject(self, endpoint: OllamaEndpoint) -> None:
+        """エンドポイントを一定時間外す"""
+        with self._lock:
+            if endpoint.healthy:
+                endpoint.ejections += 1
+                print(f"Ollamaエンドポイントを一時的に除外します: {endpoint.api_url}")
+            endpoint.healthy = False
+            endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    def _check_if_due(self) -> None:
+        """前回のヘルスチェックから一定時間たっていれば、すべてのエンドポイントを確認する"""
+        with self._lock:
+            if time.monotonic() < self._next_check_at:
+                return
+            # 同時に複数スレッドが確認しないよう、先に次の確認時刻を進めておく
+            self._next_check_at = time.monotonic() + self.health_interval
+        self.check_all()
+
+    def _revive_expired(self) -> None:
+        """除外期間が過ぎたエンドポイントをヘルスチェックして復帰させる"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [ep for ep in self.endpoints if not ep.healthy and ep.ejected_until <= now]
+            for endpoint in candidates:
+                # 同時に複数スレッドが確認しないよう、確認中は期限を延ばしておく
+                endpoint.ejected_until = now + self.eject_seconds
+        for endpoint in candidates:
+            if self.check_health(endpoint):
+                with self._lock:
+                    endpoint.healthy = True
+                    endpoint.ejected_until = 0.0
+                print(f"Ollamaエンドポイントが復帰しました: {endpoint.api_url}")
+
+    def _acquire(self, exclude: Set[str]) -> Optional[OllamaEndpoint]:
+        """スコアが最小のエンドポイントを選び、処理中として登録する"""
+        # 応答しないノードには実際のアイテムを送る前に外す
+        self._check_if_due()
+        self._revive_expired()
+        with self._lock:
+            candidates = [ep for ep in self.endpoints if ep.api_url not in exclude]
+            healthy = [ep for ep in candidates if ep.healthy]
+            if not healthy:
+                # すべて除外中の場合は、最も早く除外が明けるものを試す
+                healthy = sorted(candidates, key=lambda ep: ep.ejected_until)[:1]
+            if not healthy:
+                return None
+            endpoint = min(healthy, key=lambda ep: ep.score())
+            endpoint.in_flight += 1
+            return endpoint
+
+    def generate(self, prompt: str, model_name: str, **kwargs: Any) -> Dict[str, Any]:
+        """
+        エンドポイントを選んでプロンプトを送信する。失敗した場合は別のエンドポイントで再試行する
+
+        Args:
+            prompt: プロンプト
+            model_name: モデル名
+            kwargs: OllamaClient.generateに渡す引数
+
+        Returns:
+            OllamaClient.generateの結果に、処理したエンドポイント（endpoint）を加えた辞書
+
+        Raises:
+            ProviderError: すべてのエンドポイントで失敗した場合は最後のエラー
+        """
+        tried: Set[str] = set()
+        last_error: Optional[Exception] = None
+
+        while len(tried) < len(self.endpoints):
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                break
+            tried.add(endpoint.api_url)
+            try:
+                result = endpoint.client.generate(prompt, model_name, **kwargs)
+            except ProviderError as e:
+                if isinstance(e, RequestCancelledError) or not e.retryable:
+                    # ヘッジで中断したリクエストや、存在しないモデルなどの不正なリクエストはエンドポイントの障害ではない
+                    raise
+                last_error = e
+                with self._lock:
+                    endpoint.failures += 1
+                self._eject(endpoint)
+                print(f"Ollamaエンドポイントでエラーが発生したため別のノードで再試行します: {endpoint.api_url} - {e}")
+                continue
+            finally:
+                # 想定外の例外でも処理中の数を戻す（戻さないとスコアが上がったままになる）
+                with self._lock:
+                    endpoint.in_flight -= 1
+
+            with self._lock:
+                endpoint.record_success(result)
+            result["endpoint"] = endpoint.api_url
+            return result
+
+        raise last_error or ProviderUnavailableError("利用可能なOllamaエンドポイントがありません", PROVIDER)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """エンドポイントごとの統計を取得する"""
+        with self._lock:
+            return [endpoint.get_stats() for endpoint in self.endpoints]
+
+    def print_stats(self) -> None:
+        """エンドポイントごとの統計を表示する"""
+        for stats in self.get_stats():
+            state = "正常" if stats["healthy"] else "除外中"
+            print(
+                f"  {stats['api_url']} [{state}]: {stats['requests']}件 "
+                f"(失敗 {stats['failures']}件, 除外 {stats['ejections']}回), "
+                f"平均レイテンシ {stats['latency_ewma']}秒, "
+                f"{stats['items_per_second']}件/秒, {stats['tokens_per_second']}トークン/秒")
+
+
+def get_configured_urls() -> List[str]:
+    """
+    設定されたOllamaエンドポイントのURLを取得する
+    環境変数OLLAMA_API_URLS（カンマ区切り）、config.OLLAMA_API_URLS、OLLAMA_API_URLの順に参照する
+    """
+    env_urls = os.getenv("OLLAMA_API_URLS")
+    if env_urls:
+        return [url.strip() for url in env_urls.split(",") if url.strip()]
+    if config.OLLAMA_API_URLS:
+        return list(config.OLLAMA_API_URLS)
+    return [os.getenv("OLLAMA_API_URL", DEFAULT_API_URL)]
+
+
+_default_pool: Optional[OllamaEndpointPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> Optional[OllamaEndpointPool]:
+    """
+    複数のエンドポイントが設定されている場合に、プロセス内で共有するプールを取得する
+
+    Returns:
+        エンドポイントが1つだけの場合はNone
+    """
+    global _default_pool
+    urls = get_configured_urls()
+    if len(urls) < 2:
+        return None
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = OllamaEndpointPool(urls)
+            _default_pool.check_all()
+        return _default_pool
@@ -0,0 +1,144 @@
+"""
+記録済みのLLM応答を再生するプロバイダー
+ベンチマーク・評価をLLMなしで再現できるよう、プロンプトに対応する応答をJSONLから返す。
+LLM_RECORD_FILEを設定すると、実際のプロバイダーの応答を同じ形式で記録する
+"""
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, List, Any, Optional, TYPE_CHECKING
+from formatting.api.errors import ProviderError, ProviderConfigError
+
+if TYPE_CHECKING:
+    from formatting.hedging import CancelToken
+
+PROVIDER = "replay"
+
+
+def prompt_key(prompt: str) -> str:
+    """プロンプトの照合に使うハッシュ"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class ReplayProvider:
+    """
+    記録済みの応答を返すプロバイダー
+
+    記録の形式（1行1件のJSON）:
+        {"prompt_sha256": "...", "model": "...", "response": "...", "match": "...",
+         "prompt_tokens": 123, "output_tokens": 45}
+
+    prompt_sha256が一致する記録を優先し、なければmatchの文字列をプロンプトに含む記録を使う
+    （プロンプトの文面を変えても、タイトルなどで照合した記録は再生できる）
+    """
+
+    def __init__(self, record_file: str) -> None:
+        """
+        初期化
+
+        Args:
+            record_file: 記録ファイル（JSONL）
+        """
+        self.record_file = record_file
+        self._by_key: Dict[str, Dict[str, Any]] = {}
+        self._by_match: List[Dict[str, Any]] = []
+        with open(record_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("prompt_sha256"):
+                    self._by_key[record["prompt_sha256"]] = record
+                if record.get("match"):
+                    self._by_match.append(record)
+
+    def lookup(self, prompt: str) -> Optional[Dict[str, Any]]:
+        """プロンプトに対応する記録を探す"""
+        record = self._by_key.get(prompt_key(prompt))
+        if record is not None:
+            return record
+        for record in self._by_match:
+            if record["match"] in prompt:
+                return record
+        return None
+
+    def generate(self, prompt: str, model_name: str) -> Dict[str, Any]:
+        """
+        記録済みの応答を返す
+
+        Raises:
+            ProviderError: 対応する記録がない場合（再試行しても結果は変わらないため再試行不可）
+        """
+        record = self.lookup(prompt)
+        if record is None:
+            raise ProviderError(
+                f"記録済みの応答がありません（{self.record_file}）: {prompt_key(prompt)[:12]}", PROVIDER, retryable=False)
+        return record
+
+
+_providers: Dict[str, ReplayProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_replay_provider(record_file: Optional[str] = None) -> ReplayProvider:
+    """
+    記録ファイルごとに共有するプロバイダーを取得する
+
+    Args:
+        record_file: 記録ファイル（省略時は環境変数LLM_REPLAY_FILE）
+    """
+    record_file = record_file or os.getenv("LLM_REPLAY_FILE")
+    if not record_file:
+        raise ProviderConfigError("LLM_REPLAY_FILE が設定されていません。再生する記録ファイルを指定してください。", PROVIDER)
+    with _providers_lock:
+        if record_file not in _providers:
+            _providers[record_file] = ReplayProvider(record_file)
+        return _providers[record_file]
+
+
+def format_with_replay(prompt: str, model_name: str, response_schema: Optional[Dict[str, Any]] = None, cancel_token: Optional["CancelToken"] = None, usage: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    記録済みの応答でプロンプトを処理（他のプロバイダーと同じ呼び出し形式）
+
+    Raises:
+        ProviderError: 対応する記録がない場合
+    """
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled(PROVIDER)
+    record = get_replay_provider().generate(prompt, model_name)
+    if usage is not None:
+        usage.update({
+            "prompt_tokens": record.get("prompt_tokens"),
+            "output_tokens": record.get("output_tokens"),
+        })
+    return record["response"]
+
+
+_record_lock = threading.Lock()
+
+
+def record_response(prompt: str, model_name: str, response: Optional[str], usage: Optional[Dict[str, Any]] = None, record_file: Optional[str] = None) -> None:
+    """
+    実際のプロバイダーの応答を再生用に記録する（LLM_RECORD_FILEが設定されていなければ何もしない）
+
+    Args:
+        prompt: プロンプト
+        model_name: モデル名
+        response: 応答テキスト
+        usage: トークン数など
+        record_file: 記録ファイル（省略時は環境変数LLM_RECORD_FILE）
+    """
+    record_file = record_file or os.getenv("LLM_RECORD_FILE")
+    if not record_file or response is None:
+        return
+    record = {
+        "prompt_sha256": prompt_key(prompt),
+        "model": model_name,
+        "response": response,
+        "prompt_tokens": (usage or {}).get("prompt_tokens"),
+        "output_tokens": (usage or {}).get("output_tokens"),
+    }
+    with _record_lock:
+        with open(record_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
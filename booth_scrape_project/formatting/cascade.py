@@ -0,0 +1,170 @@
+"""
+モデルカスケード
+小さく速いモデルから順に整形し、検証に通らなかったアイテムだけを次の（大きい・リモートの）モデルに回す
+"""
+import time
+import threading
+from typing import Dict, List, Any, Optional, Callable, Tuple
+from formatting.validation import validate_formatted_item
+
+# (APIタイプ, モデル名)
+Tier = Tuple[str, str]
+# (アイテム, APIタイプ, モデル名) -> 整形結果
+FormatFunc = Callable[[Dict[str, Any], str, str], Optional[Dict[str, Any]]]
+# (アイテム, 整形結果, 不正なフィールド名 -> 理由, APIタイプ, モデル名) -> 修正後の整形結果
+RepairFunc = Callable[[Dict[str, Any], Dict[str, Any], Dict[str, str], str, str], Dict[str, Any]]
+
+# 指定できるAPIタイプ（json_formatterのAPI_TYPE_*）
+SUPPORTED_API_TYPES: Tuple[str, ...] = ("gemini", "ollama", "replay")
+
+
+def parse_cascade(spec: str) -> List[Tier]:
+    """
+    カスケード指定の文字列を解析する
+
+    Args:
+        spec: "api:model" をカンマ区切りで並べた文字列（例: "ollama:gemma3:4b,gemini:gemini-2.0-flash-001"）
+
+    Returns:
+        (APIタイプ, モデル名) のリスト
+    """
+    tiers: List[Tier] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        # モデル名に「:」が含まれるため、最初の「:」だけで分割する
+        api_type, sep, model_name = part.partition(":")
+        if not sep or not model_name:
+            raise ValueError(f"カスケードの指定が不正です（api:model の形式で指定してください）: {part}")
+        tiers.append((api_type, model_name))
+    return validate_tiers(tiers)
+
+
+def validate_tiers(tiers: List[Tier]) -> List[Tier]:
+    """
+    カスケードの各段のAPIタイプを確認する（整形を始める前に指定の誤りで止めるため）
+
+    Args:
+        tiers: (APIタイプ, モデル名) のリスト
+
+    Returns:
+        そのままのtiers
+
+    Raises:
+        ValueError: 対応していないAPIタイプが含まれる場合
+    """
+    for api_type, model_name in tiers:
+        if api_type not in SUPPORTED_API_TYPES:
+            raise ValueError(
+                f"カスケードのAPIタイプが不正です（{', '.join(SUPPORTED_API_TYPES)} のいずれかを指定してください）: {api_type}:{model_name}")
+    return tiers
+
+
+class ModelCascade:
+    """モデルを段階的に切り替えて整形し、段ごとの採用率とレイテンシを集計するクラス"""
+
+    def __init__(self, tiers: List[Tier], format_func: FormatFunc, needs_llm: Optional[Callable[[Dict[str, Any]], bool]] = None, repair_func: Optional[RepairFunc] = None) -> None:
+        """
+        初期化
+
+        Args:
+            tiers: 試す順に並べた (APIタイプ, モデル名) のリスト
+            format_func: 1つのモデルでアイテムを整形する関数
+            needs_llm: アイテムにLLMの呼び出しが必要かどうかを判定する関数（不要なものは集計を分ける）
+            repair_func: 検証に通らなかったフィールドだけを同じモデルで修正する関数（次の段に回す前に1回だけ試す）
+        """
+        if not tiers:
+            raise ValueError("カスケードに1つ以上のモデルを指定してください")
+        self.tiers = tiers
+        self.format_func = format_func
+        self.needs_llm = needs_llm
+        self.repair_func = repair_func
+        self._lock = threading.Lock()
+        self.rules_only = 0
+        self.exhausted = 0
+        self.stats: List[Dict[str, Any]] = [
+            {"tier": f"{api_type}:{model_name}", "attempts": 0, "accepted": 0, "rejected": 0, "repaired": 0, "failed": 0, "latency": 0.0}
+            for api_type, model_name in tiers
+        ]
+
+    def format(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        アイテムを整形する
+
+        すべての段で検証に通らなかった場合は、最後に得られた結果をそのまま返す
+
+        Args:
+            item: 整形前のアイテム
+
+        Returns:
+            整形結果。どの段からも応答が得られなかった場合はNone
+        """
+        if self.needs_llm is not None and not self.needs_llm(item):
+            with self._lock:
+                self.rules_only += 1
+            api_type, model_name = self.tiers[0]
+            return self.format_func(item, api_type, model_name)
+
+        fallback: Optional[Dict[str, Any]] = None
+        for index, (api_type, model_name) in enumerate(self.tiers):
+            started_at = time.perf_counter()
+            result = self.format_func(item, api_type, model_name)
+            errors = validate_formatted_item(result) if result else None
+            repaired = False
+            if errors and self.repair_func is not None:
+                # 項目全体を再整形せず、不正なフィールドだけを同じモデルで問い合わせ直す
+                result = self.repair_func(item, result, errors, api_type, model_name)
+                errors = validate_formatted_item(result)
+                repaired = not errors
+            latency = time.perf_counter() - started_at
+
+            with self._lock:
+                stats = self.stats[index]
+                stats["attempts"] += 1
+                stats["latency"] += latency
+                if result is None:
+                    stats["failed"] += 1
+                elif errors:
+                    stats["rejected"] += 1
+                else:
+                    stats["accepted"] += 1
+                    if repaired:
+                        stats["repaired"] += 1
+
+            if result is not None and not errors:
+                return result
+            if result is not None:
+                fallback = result
+                if index < len(self.tiers) - 1:
+                    print(f"検証エラーのため次のモデルで再整形します（{api_type}:{model_name}）: {errors}")
+
+        with self._lock:
+            self.exhausted += 1
+        return fallback
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """段ごとの採用率と平均レイテンシを取得する"""
+        with self._lock:
+            summary = []
+            for stats in self.stats:
+                attempts = stats["attempts"]
+                summary.append({
+                    **stats,
+                    "acceptance_rate": round(stats["accepted"] / attempts, 3) if attempts else 0.0,
+                    "avg_latency": round(stats["latency"] / attempts, 3) if attempts else 0.0,
+                })
+            return summary
+
+    def print_stats(self) -> None:
+        """段ごとの採用率と平均レイテンシを表示する"""
+        print("モデルカスケード統計:")
+        if self.rules_only:
+            print(f"  ルールのみで確定: {self.rules_only}件")
+        for stats in self.get_stats():
+            print(
+                f"  {stats['tier']}: {stats['attempts']}件中 採用 {stats['accepted']}件 "
+                f"(採用率 {stats['acceptance_rate']:.1%}, うち修正 {stats['repaired']}件, 不合格 {stats['rejected']}件, 失敗 {stats['failed']}件), "
+                f"平均 {stats['avg_latency']}秒")
+        if self.exhausted:
+            print(f"  全モデルで検証に通らなかったアイテム: {self.exhausted}件")
@@ -0,0 +1,121 @@
+"""
+整形処理の再開用チェックポイント
+整形済みアイテムのIDを記録し、中断後の再実行で同じアイテムを再度APIに送らないようにする
+"""
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, Set
+from utils.data_utils import iter_json_items, get_item_id
+
+
+class FormatCheckpoint:
+    """
+    出力ファイルごとの整形済みID一覧と進捗マニフェストを管理するクラス
+
+    出力ファイルの横に以下のファイルを作成する
+      - <出力ファイル>.checkpoint: 整形済みIDを1行ずつ追記するファイル
+      - <出力ファイル>.progress.json: 処理状況のマニフェスト（置き換えで更新するため中断しても壊れない）
+    """
+
+    def __init__(self, output_file: str, input_file: Optional[str] = None) -> None:
+        """
+        初期化
+
+        Args:
+            output_file: 整形結果の出力ファイル
+            input_file: 入力ファイル（マニフェストへの記録用）
+        """
+        self.output_file = output_file
+        self.input_file = input_file
+        self.checkpoint_file = f"{output_file}.checkpoint"
+        self.manifest_file = f"{output_file}.progress.json"
+        self.done_ids: Set[str] = set()
+        self.counts: Dict[str, int] = {"processed": 0, "skipped": 0, "failed": 0}
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.last_item_id: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        """
+        出力ファイルとチェックポイントから整形済みIDを読み込む
+
+        Returns:
+            整形済みIDの件数
+        """
+        if os.path.exists(self.output_file):
+            try:
+                for item in iter_json_items(self.output_file):
+                    self.done_ids.add(get_item_id(item))
+            except ValueError as e:
+                # 書き込み途中で中断した場合は、読めたところまでとチェックポイントを使う
+                print(f"出力ファイルの読み込みを途中で終了しました: {self.output_file} - {e}")
+
+        if os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+                self.done_ids.update(line.strip() for line in f if line.strip())
+
+        return len(self.done_ids)
+
+    def reset(self) -> None:
+        """出力ファイル・チェックポイント・マニフェストを削除して最初からやり直す"""
+        for path in (self.output_file, self.checkpoint_file, self.manifest_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self.done_ids.clear()
+
+    def is_done(self, item: Dict[str, Any]) -> bool:
+        """アイテムが整形済みかどうか"""
+        return get_item_id(item) in self.done_ids
+
+    def mark_done(self, item: Dict[str, Any]) -> None:
+        """アイテムを整形済みとして記録する"""
+        item_id = get_item_id(item)
+        with self._lock:
+            self.counts["processed"] += 1
+            self.done_ids.add(item_id)
+            self.last_item_id = item_id
+            with open(self.checkpoint_file, "a", encoding="utf-8") as f:
+                f.write(item_id + "\n")
+                f.flush()
+        self.write_manifest("running")
+
+    def mark_skipped(self) -> None:
+        """整形済みのため読み飛ばしたことを記録する"""
+        with self._lock:
+            self.counts["skipped"] += 1
+
+    def mark_failed(self) -> None:
+        """整形に失敗したことを記録する（再実行時に再度処理される）"""
+        with self._lock:
+            self.counts["failed"] += 1
+        self.write_manifest("running")
+
+    def write_manifest(self, status: str, **extra: Any) -> None:
+        """
+        進捗マニフェストを書き出す
+
+        一時ファイルに書いてから置き換えるため、書き込み中に中断しても前回の内容が残る
+
+        Args:
+            status: 処理状況（running / completed / failed）
+            extra: 追加で記録する値
+        """
+        with self._lock:
+            manifest = {
+                "input_file": self.input_file,
+                "output_file": self.output_file,
+                "status": status,
+                "started_at": self.started_at,
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+                "done_ids": len(self.done_ids),
+                "last_item_id": self.last_item_id,
+                **self.counts,
+                **extra,
+            }
+            os.makedirs(os.path.dirname(self.manifest_file) or ".", exist_ok=True)
+            tmp_file = f"{self.manifest_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.manifest_file)
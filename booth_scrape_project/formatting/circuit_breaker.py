@@ -0,0 +1,159 @@
+"""
+LLMバックエンドごとのサーキットブレーカー
+全ワーカーで共有し、レート制限や連続した失敗を検出したらバックエンドへの呼び出しを一斉に止める
+"""
+import time
+import threading
+from typing import Dict, Optional
+import config
+from formatting.api.errors import ProviderError, RateLimitError
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    バックエンドへの呼び出しを制御するサーキットブレーカー
+
+    - closed: 通常どおり呼び出す
+    - open: 再開時刻まで全ワーカーが待機する
+    - half_open: 1件だけ試し、成功すればclosed、失敗すれば再びopenに戻す
+    """
+
+    def __init__(self, name: str, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None, max_backoff: Optional[float] = None) -> None:
+        """
+        初期化
+
+        Args:
+            name: バックエンド名
+            failure_threshold: openに切り替える連続失敗回数
+            reset_timeout: 失敗でopenにしたときの待機秒数（レート制限で待機時間の指示がない場合の初期値）
+            max_backoff: 連続でopenになった場合の待機秒数の上限
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold or config.BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or config.BREAKER_RESET_TIMEOUT
+        self.max_backoff = max_backoff or config.BREAKER_MAX_BACKOFF
+        self.state = STATE_CLOSED
+        self.open_until = 0.0
+        self.consecutive_failures = 0
+        self.consecutive_trips = 0
+        self.trips = 0
+        self._probe_in_flight = False
+        self._probe_owner: Optional[int] = None  # 試行中の呼び出しのスレッドID
+        self._condition = threading.Condition()
+
+    def before_call(self) -> float:
+        """
+        呼び出し可能になるまで待機する
+
+        Returns:
+            待機した秒数
+        """
+        started_at = time.monotonic()
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self.state == STATE_CLOSED:
+                    break
+                if self.state == STATE_OPEN:
+                    if now >= self.open_until:
+                        # 再開時刻を過ぎたら1件だけ試す
+                        self.state = STATE_HALF_OPEN
+                        self._take_probe()
+                        break
+                    self._condition.wait(self.open_until - now)
+                    continue
+                # half_open: 試行中の1件の結果を待つ
+                if not self._probe_in_flight:
+                    self._take_probe()
+                    break
+                self._condition.wait(self.reset_timeout)
+        return time.monotonic() - started_at
+
+    def _take_probe(self) -> None:
+        """試行枠を呼び出し元のスレッドに割り当てる（ロック取得済みで呼ぶこと）"""
+        self._probe_in_flight = True
+        self._probe_owner = threading.get_ident()
+
+    def _clear_probe(self) -> None:
+        """試行枠を空ける（ロック取得済みで呼ぶこと）"""
+        self._probe_in_flight = False
+        self._probe_owner = None
+
+    def record_success(self) -> None:
+        """呼び出しの成功を記録する"""
+        with self._condition:
+            if self.state == STATE_OPEN:
+                # 停止前に送信済みだった呼び出しの成功では再開しない
+                return
+            self.consecutive_failures = 0
+            self.consecutive_trips = 0
+            self._clear_probe()
+            if self.state != STATE_CLOSED:
+                print(f"{self.name}: 呼び出しを再開します")
+            self.state = STATE_CLOSED
+            self._condition.notify_all()
+
+    def release_probe(self) -> None:
+        """
+        バックエンドの状態を判断できない結果（設定不備・不正なリクエストなど）で終わった呼び出しの試行枠を返す
+
+        状態は変えず、half_openの場合は待機中の次の呼び出しが試行する。
+        試行枠を持っていない呼び出し（openになる前に送信済みだったものなど）からは何もしない
+        """
+        with self._condition:
+            if not self._probe_in_flight or self._probe_owner != threading.get_ident():
+                return
+            self._clear_probe()
+            self._condition.notify_all()
+
+    def record_failure(self, error: ProviderError) -> None:
+        """
+        呼び出しの失敗を記録する
+
+        レート制限の場合は直ちに、それ以外はfailure_threshold回連続で失敗した場合にopenにする
+        """
+        with self._condition:
+            self._clear_probe()
+            self.consecutive_failures += 1
+            rate_limited = isinstance(error, RateLimitError)
+            if rate_limited or self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self._trip(error.retry_after)
+            self._condition.notify_all()
+
+    def _trip(self, retry_after: Optional[float]) -> None:
+        """openに切り替える（ロック取得済みで呼ぶこと）"""
+        if retry_after is None:
+            retry_after = min(self.reset_timeout * (2 ** self.consecutive_trips), self.max_backoff)
+        open_until = time.monotonic() + retry_after
+        if self.state == STATE_OPEN and open_until <= self.open_until:
+            # 既にopenの場合は、より遅い再開時刻のみ反映する
+            return
+        self.state = STATE_OPEN
+        self.open_until = open_until
+        self.consecutive_trips += 1
+        self.trips += 1
+        print(f"{self.name}: 呼び出しを{retry_after:.1f}秒間停止します（全ワーカー共通）")
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """
+    バックエンドごとに共有するサーキットブレーカーを取得する
+
+    Args:
+        name: バックエンド名（APIタイプ）
+
+    Returns:
+        サーキットブレーカー
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
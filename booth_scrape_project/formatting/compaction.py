@@ -0,0 +1,165 @@
+"""
+説明文の圧縮
+プロンプトに埋め込む説明文から、プレイ人数・GM・プレイ時間・ジャンルに関係する文だけを
+トークン数の上限内で残し、プロンプト評価の時間を減らす
+"""
+import re
+import math
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+# フィールドごとに、説明文の関係する文を探すためのパターン
+FIELD_PATTERNS: Dict[str, "re.Pattern[str]"] = {
+    "game_type": re.compile(
+        r"マーダーミステリー|マダミス|murder\s*mystery|TRPG|ボードゲーム|シナリオ|協力型|対立型|推理|"
+        r"(?<![A-Za-z])SS(?![A-Za-z])|支援|ショートストーリー|サウンドトラック|グッズ",
+        re.IGNORECASE),
+    "gm_required": re.compile(r"GM|ゲームマスター|進行役|ノーGM"),
+    "min_players": re.compile(r"\d+\s*(?:人|名)|PL|プレイヤー|人数"),
+    "max_players": re.compile(r"\d+\s*(?:人|名)|PL|プレイヤー|人数"),
+    "play_time": re.compile(r"\d+\s*(?:分|時間|h)|プレイ時間|所要|時間"),
+}
+
+_SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[。！？!?])|\n")
+
+
+def split_sentences(text: str) -> List[str]:
+    """説明文を文・行に分割する"""
+    return [sentence.strip() for sentence in _SENTENCE_SPLIT_PATTERN.split(text or "") if sentence.strip()]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    テキストのトークン数を概算する
+
+    日本語などの非ASCII文字は1文字1トークン、ASCII文字は4文字1トークンとして数える
+    """
+    if not text:
+        return 0
+    non_ascii = sum(1 for char in text if ord(char) > 0x7F)
+    return non_ascii + math.ceil((len(text) - non_ascii) / 4)
+
+
+def relevant_sentences(description: str, fields: Optional[List[str]] = None) -> List[Tuple[int, str, int]]:
+    """
+    説明文の各文について、関係するフィールドの数を求める
+
+    Args:
+        description: 説明文
+        fields: 対象のフィールド（省略時はパターンのあるすべてのフィールド）
+
+    Returns:
+        (文の位置, 文, 関係するフィールドの数) のリスト（関係しない文は含まない）
+    """
+    patterns = [pattern for field, pattern in FIELD_PATTERNS.items() if fields is None or field in fields]
+    # min_players と max_players は同じパターンのため重複して数えない
+    patterns = list(dict.fromkeys(patterns))
+    scored = []
+    for index, sentence in enumerate(split_sentences(description)):
+        score = sum(1 for pattern in patterns if pattern.search(sentence))
+        if score:
+            scored.append((index, sentence, score))
+    return scored
+
+
+def compact_description(description: str, fields: Optional[List[str]], token_budget: int) -> str:
+    """
+    説明文を関係する文だけに絞ってトークン数の上限内に収める
+
+    関係するフィールドの多い文から順に、上限に収まる限り採用して元の順に並べ直す。
+    関係する文がない場合は先頭から上限まで残す
+
+    Args:
+        description: 説明文
+        fields: 問い合わせるフィールド（省略時はすべて）
+        token_budget: 圧縮後の説明文のトークン数の上限（0以下の場合は圧縮しない）
+
+    Returns:
+        圧縮後の説明文
+    """
+    if token_budget <= 0 or estimate_tokens(description) <= token_budget:
+        return description
+
+    selected = []
+    used = 0
+    candidates = sorted(relevant_sentences(description, fields), key=lambda entry: (-entry[2], entry[0]))
+    for index, sentence, _ in candidates:
+        tokens = estimate_tokens(sentence)
+        if used + tokens > token_budget:
+            continue
+        selected.append((index, sentence))
+        used += tokens
+    if selected:
+        return "\n".join(sentence for _, sentence in sorted(selected))
+
+    head = []
+    for sentence in split_sentences(description):
+        tokens = estimate_tokens(sentence)
+        if used + tokens > token_budget:
+            break
+        head.append(sentence)
+        used += tokens
+    return "\n".join(head) if head else description[:token_budget]
+
+
+class CompactionStats:
+    """説明文の圧縮でプロンプトがどれだけ縮んだかを集計するクラス"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.items = 0
+        self.compacted = 0
+        self.description_tokens_before = 0
+        self.description_tokens_after = 0
+        self.prompt_tokens = 0
+
+    def record(self, before: str, after: str, prompt: str) -> None:
+        """
+        1件分の圧縮結果を記録する
+
+        Args:
+            before: 圧縮前の説明文
+            after: 圧縮後の説明文
+            prompt: 圧縮後の説明文で構築したプロンプト
+        """
+        with self._lock:
+            self.items += 1
+            if after != before:
+                self.compacted += 1
+            self.description_tokens_before += estimate_tokens(before)
+            self.description_tokens_after += estimate_tokens(after)
+            self.prompt_tokens += estimate_tokens(prompt)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """圧縮の集計結果を取得する"""
+        with self._lock:
+            saved = self.description_tokens_before - self.description_tokens_after
+            prompt_before = self.prompt_tokens + saved
+            return {
+                "items": self.items,
+                "compacted": self.compacted,
+                "description_tokens_before": self.description_tokens_before,
+                "description_tokens_after": self.description_tokens_after,
+                "prompt_tokens_before": prompt_before,
+                "prompt_tokens_after": self.prompt_tokens,
+                "prompt_reduction": round(saved / prompt_before, 3) if prompt_before else 0.0,
+            }
+
+    def print_stats(self) -> None:
+        """圧縮の集計結果を表示する"""
+        stats = self.get_stats()
+        if not stats["items"]:
+            return
+        print(
+            f"説明文の圧縮: {stats['items']}件中 {stats['compacted']}件を圧縮 "
+            f"(説明文 {stats['description_tokens_before']} → {stats['description_tokens_after']}トークン, "
+            f"プロンプト {stats['prompt_tokens_before']} → {stats['prompt_tokens_after']}トークン, "
+            f"削減率 {stats['prompt_reduction']:.1%}、トークン数は概算)")
+
+
+_stats = CompactionStats()
+
+
+def get_compaction_stats() -> CompactionStats:
+    """実行全体で共有する圧縮の集計を取得する"""
+    return _stats
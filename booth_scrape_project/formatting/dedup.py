@@ -0,0 +1,256 @@
+"""
+整形前の近似重複クラスタリング
+説明文とタイトルがほぼ同じアイテム（支援SS・セット販売・再販・別ショップでの販売など）を
+MinHash + LSHでまとめ、代表の1件だけをLLMで整形して他のメンバーに結果を流用する
+"""
+import re
+import zlib
+import random
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Any, Optional, Callable, Set, Tuple, Union
+import config
+from formatting.rule_extractor import normalize_text
+
+# MinHashで使うハッシュの法（2^61 - 1 のメルセンヌ素数）
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# (アイテム) -> 整形結果
+FormatItemFunc = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+# (メンバーのアイテム, 代表の整形結果) -> メンバーの整形結果
+DeriveFunc = Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]
+# 代表の整形を待つメンバーと、その整形結果を返すFuture
+ParkedMember = Tuple[Dict[str, Any], Future]
+
+
+def shingles(text: str, size: int) -> Set[int]:
+    """
+    文字単位のシングル（size文字ずつずらした部分文字列）のハッシュ集合を求める
+
+    日本語は単語に区切られていないため、単語ではなく文字のn-gramを使う
+    """
+    text = _WHITESPACE_PATTERN.sub(" ", normalize_text(text)).strip().lower()
+    if len(text) < size:
+        return {zlib.crc32(text.encode("utf-8"))} if text else set()
+    return {zlib.crc32(text[i:i + size].encode("utf-8")) for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """シングル集合からMinHashシグネチャを計算するクラス"""
+
+    def __init__(self, num_perm: int, seed: int = 1) -> None:
+        """
+        初期化
+
+        Args:
+            num_perm: ハッシュ関数の数（シグネチャの長さ）
+            seed: ハッシュ関数の係数を決める乱数シード
+        """
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingle_set: Set[int]) -> Tuple[int, ...]:
+        """シングル集合のMinHashシグネチャを返す"""
+        return tuple(
+            min((a * value + b) % _MERSENNE_PRIME & _MAX_HASH for value in shingle_set)
+            for a, b in self._params
+        )
+
+
+def estimate_similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+    """2つのシグネチャからJaccard類似度を推定する"""
+    return sum(1 for a, b in zip(left, right) if a == b) / len(left)
+
+
+class Cluster:
+    """近似重複のクラスタ。代表の整形が終わるまで、メンバーはワーカーを止めずに預けておく"""
+
+    def __init__(self, signature: Tuple[int, ...]) -> None:
+        self.signature = signature
+        self.done = False
+        self.result: Optional[Dict[str, Any]] = None
+        self._parked: List[ParkedMember] = []
+        self._lock = threading.Lock()
+
+    def park(self, item: Dict[str, Any]) -> Optional[Future]:
+        """
+        代表の整形が終わるまでメンバーを預ける
+
+        Returns:
+            メンバーの整形結果を返すFuture。代表の整形が終わっている場合はNone
+        """
+        with self._lock:
+            if self.done:
+                return None
+            future: Future = Future()
+            self._parked.append((item, future))
+            return future
+
+    def finish(self, result: Optional[Dict[str, Any]]) -> Tuple[List[ParkedMember], Optional[ParkedMember]]:
+        """
+        代表の整形結果を登録する
+
+        代表の整形に失敗し、預けられたメンバーがいる場合は、先頭のメンバーを次の代表にする
+
+        Returns:
+            (代表の結果を流用するメンバー, 次の代表になるメンバー)
+        """
+        with self._lock:
+            if result is None and self._parked:
+                return [], self._parked.pop(0)
+            self.done = True
+            self.result = result
+            parked, self._parked = self._parked, []
+            return parked, None
+
+
+class NearDuplicateIndex:
+    """MinHashシグネチャをLSHのバンドで索引し、近似重複のクラスタを探すクラス"""
+
+    def __init__(self, threshold: float, num_perm: int, bands: int, shingle_size: int) -> None:
+        """
+        初期化
+
+        Args:
+            threshold: 同じクラスタとみなす推定Jaccard類似度の下限
+            num_perm: MinHashのハッシュ関数の数
+            bands: LSHのバンド数（num_permを割り切れる数）
+            shingle_size: シングルの文字数
+        """
+        if num_perm % bands:
+            raise ValueError("num_permはbandsで割り切れる必要があります")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+        self._buckets: List[Dict[Tuple[int, ...], List[Cluster]]] = [{} for _ in range(bands)]
+        self._lock = threading.Lock()
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, ...]]:
+        return [signature[i * self.rows:(i + 1) * self.rows] for i in range(self.bands)]
+
+    def find_or_add(self, item: Dict[str, Any]) -> Tuple[Cluster, bool]:
+        """
+        アイテムが属するクラスタを探し、なければ新しいクラスタの代表として登録する
+
+        Args:
+            item: 整形前のアイテム
+
+        Returns:
+            (クラスタ, アイテムが代表かどうか)
+        """
+        text = f"{item.get('title') or ''}\n{item.get('description') or ''}"
+        signature = self.hasher.signature(shingles(text, self.shingle_size))
+        band_keys = self._band_keys(signature)
+
+        with self._lock:
+            best: Optional[Cluster] = None
+            best_similarity = self.threshold
+            for band, key in enumerate(band_keys):
+                for candidate in self._buckets[band].get(key, []):
+                    similarity = estimate_similarity(signature, candidate.signature)
+                    if similarity >= best_similarity:
+                        best, best_similarity = candidate, similarity
+            if best is not None:
+                return best, False
+
+            cluster = Cluster(signature)
+            for band, key in enumerate(band_keys):
+                self._buckets[band].setdefault(key, []).append(cluster)
+            return cluster, True
+
+
+class DedupFormatter:
+    """近似重複のクラスタごとに代表だけを整形し、メンバーには代表の結果を流用するクラス"""
+
+    def __init__(self, format_item: FormatItemFunc, derive: DeriveFunc, threshold: Optional[float] = None, num_perm: Optional[int] = None, bands: Optional[int] = None, shingle_size: Optional[int] = None, min_chars: Optional[int] = None) -> None:
+        """
+        初期化
+
+        Args:
+            format_item: アイテムを整形する関数（代表・クラスタに属さないアイテムに使う）
+            derive: 代表の整形結果からメンバーの整形結果を作る関数
+            threshold: 同じクラスタとみなす推定Jaccard類似度の下限
+            num_perm: MinHashのハッシュ関数の数
+            bands: LSHのバンド数
+            shingle_size: シングルの文字数
+            min_chars: クラスタリングの対象とする説明文の最小文字数（短い説明文は偶然一致しやすいため除外）
+        """
+        self.format_item = format_item
+        self.derive = derive
+        self.min_chars = min_chars if min_chars is not None else config.DEDUP_MIN_CHARS
+        self.index = NearDuplicateIndex(
+            threshold if threshold is not None else config.DEDUP_THRESHOLD,
+            num_perm or config.DEDUP_NUM_PERM,
+            bands or config.DEDUP_BANDS,
+            shingle_size or config.DEDUP_SHINGLE_SIZE,
+        )
+        self._lock = threading.Lock()
+        self._reused_clusters: Set[int] = set()
+        self.reused = 0
+
+    def format(self, item: Dict[str, Any]) -> Union[Optional[Dict[str, Any]], Future]:
+        """
+        アイテムを整形する
+
+        代表の整形中に同じクラスタのメンバーが来た場合は、メンバーを預けてFutureを返す
+        （呼び出し元のワーカーは次のアイテムに進み、代表の整形が終わった時点で結果が決まる）。
+        代表の整形に失敗した場合は、預けられたメンバーを順に次の代表として整形する
+        """
+        if len(item.get("description") or "") < self.min_chars:
+            return self.format_item(item)
+
+        cluster, is_representative = self.index.find_or_add(item)
+        if is_representative:
+            result = None
+            try:
+                result = self.format_item(item)
+            finally:
+                self._resolve(cluster, result)
+            return result
+
+        parked = cluster.park(item)
+        if parked is not None:
+            return parked
+        if cluster.result is None:
+            return self.format_item(item)
+        return self._reuse(cluster, item, cluster.result)
+
+    def _reuse(self, cluster: Cluster, item: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        """代表の整形結果からメンバーの整形結果を作る"""
+        with self._lock:
+            self.reused += 1
+            self._reused_clusters.add(id(cluster))
+        return self.derive(item, result)
+
+    def _resolve(self, cluster: Cluster, result: Optional[Dict[str, Any]]) -> None:
+        """代表の整形結果で、預けられたメンバーのFutureを完了させる"""
+        while True:
+            members, successor = cluster.finish(result)
+            for member, future in members:
+                try:
+                    future.set_result(self._reuse(cluster, member, result))
+                except BaseException as e:
+                    future.set_exception(e)
+            if successor is None:
+                return
+            member, future = successor
+            result = None
+            try:
+                result = self.format_item(member)
+                future.set_result(result)
+            except BaseException as e:
+                future.set_exception(e)
+
+    def print_stats(self) -> None:
+        """近似重複の流用件数を表示する"""
+        if self.reused:
+            print(f"近似重複: {len(self._reused_clusters)}クラスタ、{self.reused}件に代表の整形結果を流用しました")
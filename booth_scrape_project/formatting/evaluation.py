@@ -0,0 +1,231 @@
+"""
+整形の品質とスループットの評価
+正解付きのデータ（get_examples()と同じ{"input", "output"}の形式）をモデル・プロンプトの種類ごとに
+format_json_with_apiで整形し、フィールドごとの正解率とレイテンシ・トークン数・処理速度を比較する
+"""
+import os
+import json
+import time
+import unicodedata
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+import config
+from formatting import telemetry
+from formatting.cascade import Tier
+from formatting.json_formatter import format_json_with_api, get_examples
+from utils.rate_limiter import RateLimiter
+from utils.stats import percentile
+
+# 正解率を求めるフィールド
+EVAL_FIELDS: List[str] = ["title", "game_type", "gm_required", "min_players", "max_players", "play_time"]
+
+# プロンプトの種類: 名前 -> 設定
+#   use_rules: ルールで確定したフィールドを問い合わせない縮小版のプロンプトを使うかどうか
+#   token_budget: 説明文の圧縮のトークン数の上限（Noneの場合はconfig.DESCRIPTION_TOKEN_BUDGET、0で圧縮しない）
+PROMPT_VARIANTS: Dict[str, Dict[str, Any]] = {
+    "rules": {"use_rules": True, "token_budget": None},
+    "rules_uncompacted": {"use_rules": True, "token_budget": 0},
+    "full": {"use_rules": False, "token_budget": None},
+}
+
+
+def load_gold_set(gold_file: str, include_examples: bool = False) -> List[Dict[str, Any]]:
+    """
+    正解付きのデータを読み込む
+
+    Args:
+        gold_file: 正解付きのデータ（{"input": ..., "output": ...}のリストのJSON）
+        include_examples: get_examples()の例も加えるかどうか（例はプロンプトに含まれるため既定では除く）
+
+    Returns:
+        正解付きのデータのリスト
+    """
+    with open(gold_file, "r", encoding="utf-8") as f:
+        gold = json.load(f)
+    if include_examples:
+        gold = gold + get_examples()
+    for i, entry in enumerate(gold):
+        if "input" not in entry or "output" not in entry:
+            raise ValueError(f"{gold_file}の{i}件目に input・output がありません")
+    return gold
+
+
+def _normalize(value: Any) -> Any:
+    """比較のために値をそろえる（文字列はNFKC正規化と前後の空白の除去、play_timeは平均値）"""
+    if isinstance(value, dict) and "avg" in value:
+        value = value["avg"]
+    if isinstance(value, str):
+        value = unicodedata.normalize("NFKC", value).strip()
+        if value.isdigit():
+            return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def field_matches(expected: Any, actual: Any) -> bool:
+    """整形結果のフィールドが正解と一致するかどうか"""
+    return _normalize(expected) == _normalize(actual)
+
+
+@contextmanager
+def _variant_settings(variant: Dict[str, Any]) -> Iterator[None]:
+    """プロンプトの種類に応じて説明文の圧縮の設定を一時的に切り替える"""
+    token_budget = variant.get("token_budget")
+    if token_budget is None:
+        yield
+        return
+    original = config.DESCRIPTION_TOKEN_BUDGET
+    config.DESCRIPTION_TOKEN_BUDGET = token_budget
+    try:
+        yield
+    finally:
+        config.DESCRIPTION_TOKEN_BUDGET = original
+
+
+def evaluate(gold: List[Dict[str, Any]], tier: Tier, variant_name: str, examples: Optional[List[Dict]] = None, max_workers: int = 1, delay: float = 0) -> Dict[str, Any]:
+    """
+    1つのモデル・プロンプトの種類で正解付きのデータを整形して評価する
+
+    Args:
+        gold: 正解付きのデータ
+        tier: (APIタイプ, モデル名)
+        variant_name: プロンプトの種類（PROMPT_VARIANTSのキー）
+        examples: プロンプトに含める例（省略時はget_examples()）
+        max_workers: 並列に整形するワーカー数
+        delay: APIリクエスト間の最小間隔（秒）
+
+    Returns:
+        フィールドごとの正解率・完全一致率・レイテンシ・トークン数・処理速度を含む辞書
+    """
+    api_type, model_name = tier
+    variant = PROMPT_VARIANTS[variant_name]
+    if examples is None:
+        examples = get_examples()
+    rate_limiter = RateLimiter(delay)
+
+    def run(entry: Dict[str, Any]) -> Tuple[Optional[Dict], float]:
+        started_at = time.perf_counter()
+        try:
+            result = format_json_with_api(
+                entry["input"], api_type, model_name, examples, use_rules=variant["use_rules"], rate_limiter=rate_limiter)
+        except Exception as e:
+            print(f"評価中のエラー（{entry['input'].get('id')}）: {e}")
+            result = None
+        return result, time.perf_counter() - started_at
+
+    run_id = f"eval-{api_type}-{model_name.replace(':', '_').replace('/', '_')}-{variant_name}-{time.strftime('%Y%m%d-%H%M%S')}"
+    telemetry.start_run(run_id=run_id)
+    started_at = time.perf_counter()
+    try:
+        with _variant_settings(variant):
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(run, gold))
+    finally:
+        elapsed = time.perf_counter() - started_at
+        summary = telemetry.finish_run() or {"models": {}, "calls": 0}
+
+    correct = {field: 0 for field in EVAL_FIELDS}
+    labelled = {field: 0 for field in EVAL_FIELDS}
+    exact = 0
+    failed = 0
+    mistakes: List[Dict[str, Any]] = []
+    for entry, (formatted, _) in zip(gold, results):
+        expected = entry["output"]
+        if formatted is None:
+            failed += 1
+        all_correct = True
+        for field in EVAL_FIELDS:
+            if field not in expected:
+                continue
+            labelled[field] += 1
+            actual = formatted.get(field) if formatted is not None else None
+            if field_matches(expected[field], actual):
+                correct[field] += 1
+            else:
+                all_correct = False
+                mistakes.append({"id": entry["input"].get("id"), "field": field, "expected": expected[field], "actual": actual})
+        exact += int(all_correct and formatted is not None)
+
+    latencies = [latency for _, latency in results]
+    prompt_tokens = sum(stats["prompt_tokens"] for stats in summary["models"].values())
+    output_tokens = sum(stats["output_tokens"] for stats in summary["models"].values())
+    return {
+        "api_type": api_type,
+        "model": model_name,
+        "variant": variant_name,
+        "items": len(gold),
+        "failed": failed,
+        "accuracy": {field: round(correct[field] / labelled[field], 3) if labelled[field] else None for field in EVAL_FIELDS},
+        "exact_match": round(exact / len(gold), 3) if gold else None,
+        "calls": summary["calls"],
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "tokens_per_item": round((prompt_tokens + output_tokens) / len(gold), 1) if gold else 0.0,
+        "cost_usd": summary.get("cost_usd"),
+        "seconds": round(elapsed, 3),
+        "items_per_second": round(len(gold) / elapsed, 2) if elapsed else None,
+        "mistakes": mistakes,
+    }
+
+
+def run_evaluation(gold_file: str, tiers: List[Tier], variants: List[str], include_examples: bool = False, max_workers: int = 1, delay: float = 0, output_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    モデルとプロンプトの種類のすべての組み合わせを評価し、結果を表示・保存する
+
+    Args:
+        gold_file: 正解付きのデータ
+        tiers: 評価する(APIタイプ, モデル名)のリスト
+        variants: 評価するプロンプトの種類のリスト
+        include_examples: get_examples()の例も正解付きのデータに加えるかどうか
+        max_workers: 並列に整形するワーカー数
+        delay: APIリクエスト間の最小間隔（秒）
+        output_dir: 結果の出力ディレクトリ（省略時はconfig.EVAL_OUTPUT_DIR）
+
+    Returns:
+        組み合わせごとの評価結果のリスト
+    """
+    unknown = [name for name in variants if name not in PROMPT_VARIANTS]
+    if unknown:
+        raise ValueError(f"不明なプロンプトの種類です: {', '.join(unknown)}（{', '.join(PROMPT_VARIANTS)} から選択してください）")
+
+    gold = load_gold_set(gold_file, include_examples)
+    print(f"正解付きのデータ: {gold_file}（{len(gold)}件）")
+
+    results = []
+    for tier in tiers:
+        for variant_name in variants:
+            print(f"\n評価中: {tier[0]}:{tier[1]} / {variant_name}")
+            results.append(evaluate(gold, tier, variant_name, max_workers=max_workers, delay=delay))
+
+    print_results(results)
+    output_dir = output_dir or config.EVAL_OUTPUT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, f"eval-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump({"gold_file": gold_file, "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"評価結果を保存しました: {output_file}")
+    return results
+
+
+def _format_rate(value: Optional[float]) -> str:
+    return f"{value:.1%}" if value is not None else "-"
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    """評価結果を表示する"""
+    print("\n評価結果:")
+    for result in results:
+        accuracy = ", ".join(f"{field} {_format_rate(rate)}" for field, rate in result["accuracy"].items())
+        latency_p50 = f"{result['latency_p50']:.2f}秒" if result["latency_p50"] is not None else "-"
+        latency_p95 = f"{result['latency_p95']:.2f}秒" if result["latency_p95"] is not None else "-"
+        cost = f"${result['cost_usd']:.4f}" if result["cost_usd"] is not None else "単価未設定"
+        print(
+            f"  {result['api_type']}:{result['model']} / {result['variant']}: "
+            f"完全一致 {_format_rate(result['exact_match'])} (失敗 {result['failed']}件)\n"
+            f"    正解率: {accuracy}\n"
+            f"    LLM呼び出し {result['calls']}回, レイテンシ p50 {latency_p50} / p95 {latency_p95}, "
+            f"トークン {result['tokens_per_item']}/件, {result['items_per_second']}件/秒, 推定コスト {cost}")
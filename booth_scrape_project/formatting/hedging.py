@@ -0,0 +1,214 @@
+"""
+LLM呼び出しのヘッジ
+応答がこれまでのレイテンシのpN（例: p95）を過ぎても返らない場合に、別のエンドポイント・バックエンドへ
+同じリクエストを送り、先に返った方を採用して遅い方は中断する
+"""
+import time
+import queue
+import threading
+from collections import deque
+from typing import Dict, List, Any, Optional, Callable, Deque, Tuple
+import config
+from utils.stats import percentile
+from formatting.api.errors import ProviderError, RequestCancelledError
+
+
+class CancelToken:
+    """リクエストの中断を伝えるトークン"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        """中断されたかどうか"""
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """中断し、登録されたコールバック（コネクションを閉じる処理など）を呼び出す"""
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """中断時に呼び出すコールバックを登録する（既に中断済みの場合は直ちに呼び出す）"""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def raise_if_cancelled(self, provider: Optional[str] = None) -> None:
+        """中断されていればRequestCancelledErrorを送出する"""
+        if self._cancelled:
+            raise RequestCancelledError("リクエストが中断されました", provider)
+
+
+# (中断トークン) -> 応答テキスト
+AttemptFunc = Callable[[CancelToken], Optional[str]]
+
+
+class HedgedCaller:
+    """
+    遅いリクエストに予備のリクエストを重ねて送り、先に返った応答を使うクラス
+
+    予備を送るまでの待ち時間は、直近のレイテンシの分位点（config.HEDGE_QUANTILE）とする。
+    予備のリクエストは全呼び出しのconfig.HEDGE_MAX_EXTRA_RATIOまでに制限する
+    """
+
+    def __init__(self, name: str, quantile: Optional[float] = None, min_samples: Optional[int] = None, max_extra_ratio: Optional[float] = None, window: Optional[int] = None, min_delay: Optional[float] = None) -> None:
+        """
+        初期化
+
+        Args:
+            name: バックエンド名（表示用）
+            quantile: 予備を送るまでの待ち時間に使うレイテンシの分位点（0〜1）
+            min_samples: 予備を送り始めるまでに必要なレイテンシの記録数
+            max_extra_ratio: 全呼び出しに対する予備のリクエストの割合の上限
+            window: 分位点の計算に使う直近のレイテンシの件数
+            min_delay: 予備を送るまでの最小の待ち時間（秒）
+        """
+        self.name = name
+        self.quantile = quantile if quantile is not None else config.HEDGE_QUANTILE
+        self.min_samples = min_samples if min_samples is not None else config.HEDGE_MIN_SAMPLES
+        self.max_extra_ratio = max_extra_ratio if max_extra_ratio is not None else config.HEDGE_MAX_EXTRA_RATIO
+        self.min_delay = min_delay if min_delay is not None else config.HEDGE_MIN_DELAY
+        self._latencies: Deque[float] = deque(maxlen=window or config.HEDGE_WINDOW)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.cancelled = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """予備を送るまでの待ち時間を求める（記録が足りない場合はNone）"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = list(self._latencies)
+        return max(self.min_delay, percentile(latencies, self.quantile * 100))
+
+    def _record_latency(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def _reserve_hedge(self) -> bool:
+        """予備のリクエストの上限に達していなければ枠を確保する"""
+        with self._lock:
+            if self.hedges + 1 > self.max_extra_ratio * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def call(self, primary: AttemptFunc, hedge: Optional[AttemptFunc] = None) -> Optional[str]:
+        """
+        リクエストを送り、必要に応じて予備のリクエストを重ねる
+
+        Args:
+            primary: 本来のリクエストを送る関数
+            hedge: 予備のリクエストを送る関数（省略時はprimaryをもう一度呼ぶ）
+
+        Returns:
+            先に成功したリクエストの応答テキスト
+
+        Raises:
+            ProviderError: すべてのリクエストが失敗した場合は最後のエラー
+        """
+        with self._lock:
+            self.calls += 1
+        delay = self.hedge_delay()
+        if delay is None:
+            # 記録が足りないうちは予備を送らずにそのまま呼び出す
+            started_at = time.perf_counter()
+            response = primary(CancelToken())
+            self._record_latency(time.perf_counter() - started_at)
+            return response
+
+        results: "queue.Queue[Tuple[int, Any, Optional[Exception], float]]" = queue.Queue()
+        tokens: List[CancelToken] = []
+
+        def start(attempt: AttemptFunc) -> None:
+            token = CancelToken()
+            index = len(tokens)
+            tokens.append(token)
+
+            def run() -> None:
+                try:
+                    response = attempt(token)
+                    results.put((index, response, None, time.perf_counter()))
+                except Exception as e:
+                    results.put((index, None, e, time.perf_counter()))
+
+            # 中断できないリクエスト（Geminiの同期呼び出しなど）が終了を妨げないようデーモンスレッドにする
+            threading.Thread(target=run, name=f"hedge-{self.name}-{index}", daemon=True).start()
+
+        # レイテンシは予備が先着した場合も、呼び出し元が待った時間（本来のリクエストの送信から）で記録する
+        started_at = time.perf_counter()
+        start(primary)
+        pending = 1
+        hedged = False
+        last_error: Optional[Exception] = None
+        while pending:
+            try:
+                index, response, error, finished_at = results.get(timeout=None if hedged else delay)
+            except queue.Empty:
+                hedged = True
+                if self._reserve_hedge():
+                    start(hedge or primary)
+                    pending += 1
+                continue
+
+            pending -= 1
+            if error is not None:
+                if not isinstance(error, RequestCancelledError):
+                    last_error = error
+                continue
+
+            self._record_latency(finished_at - started_at)
+            for other, token in enumerate(tokens):
+                if other != index and pending:
+                    token.cancel()
+                    with self._lock:
+                        self.cancelled += 1
+            if index > 0:
+                with self._lock:
+                    self.hedge_wins += 1
+            return response
+
+        if last_error is not None:
+            raise last_error
+        raise ProviderError("リクエストが中断されました", self.name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヘッジの統計を取得する"""
+        delay = self.hedge_delay()
+        with self._lock:
+            return {
+                "backend": self.name,
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "cancelled": self.cancelled,
+                "extra_load": round(self.hedges / self.calls, 3) if self.calls else 0.0,
+                "hedge_delay": round(delay, 3) if delay is not None else None,
+            }
+
+    def print_stats(self) -> None:
+        """ヘッジの統計を表示する"""
+        stats = self.get_stats()
+        if not stats["calls"]:
+            return
+        delay = f"{stats['hedge_delay']}秒" if stats["hedge_delay"] is not None else "未確定"
+        print(
+            f"ヘッジ（{stats['backend']}）: {stats['calls']}件中 予備送信 {stats['hedges']}件 "
+            f"(追加負荷 {stats['extra_load']:.1%}), 予備が先着 {stats['hedge_wins']}件, "
+            f"中断 {stats['cancelled']}件, 待ち時間 p{int(self.quantile * 100)}={delay}")
@@ -3,54 +3,157 @@ AI APIを使用してJSONデータを整形するモジュール
 """
 import os
 import json
-import re
 import time
+import threading
 import requests
-import sys
-from typing import Dict, List, Any, Optional
-from tqdm import tqdm
+from concurrent.futures import Future
+from typing import Dict, List, Any, Optional, Tuple, Callable, Union
 from pathlib import Path
-from utils.data_utils import append_to_json
+from formatting.rule_extractor import extract_fields, split_settled, TARGET_FIELDS
+from formatting.schema import build_response_schema
+from formatting.response_parser import parse_json_response, log_parse_failure
+from formatting.scheduler import FormatJob, run_format_jobs
+from utils.rate_limiter import RateLimiter
+from utils.profiling import mark_stage
+from utils.storage import ItemStore, BatchWriter, TABLE_FORMATTED
+from formatting.circuit_breaker import get_breaker
+from formatting.cascade import ModelCascade, Tier, SUPPORTED_API_TYPES
+from formatting.repair import build_repair_prompt
+from formatting.dedup import DedupFormatter
+from formatting.compaction import compact_description, estimate_tokens, get_compaction_stats
+from formatting.hedging import HedgedCaller, CancelToken
+from formatting import telemetry
+from formatting.api.errors import ProviderError, ProviderConfigError, ProviderUnavailableError, RateLimitError
+from utils.manifest import fingerprint, write_manifest
+from utils.data_utils import is_item_file, get_item_id
+import config
 # APIクライアントインポート
 from formatting.api.gemini import format_with_gemini
 from formatting.api.ollama import format_with_ollama
+from formatting.api.replay import format_with_replay, record_response
 
 # APIのタイプを定義
 API_TYPE_GEMINI = "gemini"
 API_TYPE_OLLAMA = "ollama"
+API_TYPE_REPLAY = "replay"  # 記録済みの応答を再生する（ベンチマーク・評価用）
 
 # モデル設定
 DEFAULT_GEMINI_MODEL = "gemini-2.0-flash-001"
 DEFAULT_OLLAMA_MODEL = "gemma3:12b"
 
 
-def build_prompt(examples: List[Dict], input_json: Dict) -> str:
-    """プロンプトを構築する"""
+# 整形指示（対象フィールド, 指示文）
+FIELD_INSTRUCTIONS: List[Tuple[List[str], str]] = [
+    (["game_type"], "game_type: タイトルや説明文から「マーダーミステリー」「その他」のいずれかを判断"),
+    (["gm_required"], "gm_required: 説明文からGM必要性（「必要」「不要」「どちらでも可」のいずれか）"),
+    (["min_players", "max_players"], "min_players, max_players: 最小・最大プレイ人数（GM必須の場合はどちらもGM込の人数を、どちらでも可の場合は最小人数はGMなし、最大人数はGM込の人数にすること）"),
+    (["play_time"], "play_time: プレイ時間（平均）を分単位で数値化"),
+    (["title"], "title: マーダーミステリーゲームのタイトルを整形する際は、引用符（「」や『』）内の文字列がある場合、それを真のタイトルとして抽出してください。例えば「マーダーミステリー「アリスインロストワンダーランド」 - サークル名」からは「アリスインロストワンダーランド」だけをタイトルとして取り出してください。引用符がない場合でも、「マーダーミステリー」などのプレフィックスと「- サークル名」などのサフィックスを削除し、本来のゲームタイトルのみを残すようにしてください。ただし、マーダーミステリーがタイトルに含まれると判断した場合はその限りではありません（例：マーダーミステリーゲームという名前のシナリオがあります）"),
+    (["likes"], 'likes:100未満なら"~100",100~500なら"100~500",500以上なら"500~"'),
+]
+
+# 整形後もそのまま引き継ぐフィールド
+PASSTHROUGH_FIELDS: List[str] = ["url", "id", "price", "author", "thumbnail_url"]
+
+# 整形後のフィールド順
+OUTPUT_FIELD_ORDER: List[str] = [
+    "url", "id", "title", "price", "likes", "author", "game_type", "gm_required",
+    "min_players", "max_players", "play_time", "thumbnail_url",
+]
+
+
+def build_prompt(examples: List[Dict], input_json: Dict, fields: Optional[List[str]] = None, known: Optional[Dict[str, Any]] = None) -> str:
+    """
+    プロンプトを構築する
+
+    fieldsを指定した場合は、そのフィールドだけを問い合わせる縮小版のプロンプトを構築する
+    """
+    instructions = [
+        text for targets, text in FIELD_INSTRUCTIONS
+        if fields is None or any(field in fields for field in targets)
+    ]
+
     prompt = """
 以下はゲームシナリオや関連コンテンツのJSONデータを特定の形式に整形する例です。
 以下の情報を抽出・整形してください：
 
-1. game_type: タイトルや説明文から「マーダーミステリー」「その他」のいずれかを判断
-2. gm_required: 説明文からGM必要性（「必要」「不要」「どちらでも可」のいずれか）
-3. min_players, max_players: 最小・最大プレイ人数（GM必須の場合はどちらもGM込の人数を、どちらでも可の場合は最小人数はGMなし、最大人数はGM込の人数にすること）
-4. play_time: プレイ時間（平均）を分単位で数値化
-5. title: マーダーミステリーゲームのタイトルを整形する際は、引用符（「」や『』）内の文字列がある場合、それを真のタイトルとして抽出してください。例えば「マーダーミステリー「アリスインロストワンダーランド」 - サークル名」からは「アリスインロストワンダーランド」だけをタイトルとして取り出してください。引用符がない場合でも、「マーダーミステリー」などのプレフィックスと「- サークル名」などのサフィックスを削除し、本来のゲームタイトルのみを残すようにしてください。ただし、マーダーミステリーがタイトルに含まれると判断した場合はその限りではありません（例：マーダーミステリーゲームという名前のシナリオがあります）
-6. likes:100未満なら"~100",100~500なら"100~500",500以上なら"500~"
-
-元のデータと整形後のデータの例を示します：
 """
+    for i, text in enumerate(instructions, 1):
+        prompt += f"{i}. {text}\n"
+    prompt += "\n元のデータと整形後のデータの例を示します：\n"
 
     for i, example in enumerate(examples, 1):
+        example_input = _select_prompt_input(example['input'], fields)
+        example_output = example['output'] if fields is None else {
+            key: value for key, value in example['output'].items() if key in fields}
         prompt += f"\n例 {i}:\n"
-        prompt += f"入力: {json.dumps(example['input'], ensure_ascii=False, indent=2)}\n"
-        prompt += f"出力: {json.dumps(example['output'], ensure_ascii=False, indent=2)}\n"
+        prompt += f"入力: {json.dumps(example_input, ensure_ascii=False, indent=2)}\n"
+        prompt += f"出力: {json.dumps(example_output, ensure_ascii=False, indent=2)}\n"
 
-    prompt += f"\n新しい入力:\n{json.dumps(input_json, ensure_ascii=False, indent=2)}\n\n"
-    prompt += "新しい出力（整形されたJSON）を作成してください。JSONフォーマットのみを返してください。"
+    prompt += f"\n新しい入力:\n{json.dumps(_select_prompt_input(input_json, fields), ensure_ascii=False, indent=2)}\n\n"
+    if fields is None:
+        prompt += "新しい出力（整形されたJSON）を作成してください。JSONフォーマットのみを返してください。"
+    else:
+        if known:
+            prompt += f"確定済みの値（参考）:\n{json.dumps(known, ensure_ascii=False)}\n\n"
+        prompt += f"新しい出力（整形されたJSON）を作成してください。キーは {', '.join(fields)} のみとし、JSONフォーマットのみを返してください。"
 
     return prompt
 
 
+def _select_prompt_input(input_json: Dict, fields: Optional[List[str]]) -> Dict:
+    """縮小版のプロンプトに必要な入力キーだけを残す"""
+    if fields is None:
+        return input_json
+    keys = ["title", "description"]
+    if "likes" in fields:
+        keys.append("likes")
+    return {key: input_json[key] for key in keys if key in input_json}
+
+
+def compact_item(input_json: Dict, fields: Optional[List[str]]) -> Dict:
+    """説明文を問い合わせるフィールドに関係する文だけに圧縮したアイテムを返す"""
+    description = input_json.get("description")
+    if not description:
+        return input_json
+    compacted = compact_description(description, fields, config.DESCRIPTION_TOKEN_BUDGET)
+    if compacted == description:
+        return input_json
+    return {**input_json, "description": compacted}
+
+
+def build_formatted_item(input_json: Dict, values: Dict[str, Any]) -> Dict:
+    """元データの引き継ぎフィールドと整形済みの値から出力用のアイテムを組み立てる"""
+    merged = {key: input_json[key] for key in PASSTHROUGH_FIELDS if key in input_json}
+    merged.update(values)
+    ordered = {key: merged[key] for key in OUTPUT_FIELD_ORDER if key in merged}
+    ordered.update({key: value for key, value in merged.items() if key not in ordered})
+    return ordered
+
+
+def derive_from_representative(input_json: Dict, representative: Dict) -> Dict:
+    """
+    近似重複の代表の整形結果からメンバーの整形結果を作る
+
+    url・id・価格などの引き継ぎフィールドと、メンバー自身の情報からルールで確定できる
+    フィールド（タイトル・スキ数など）はメンバーの値を使い、残りは代表の値を流用する
+    """
+    values = {key: representative[key] for key in TARGET_FIELDS if key in representative}
+    values.update(resolve_with_rules(input_json)[0])
+    return build_formatted_item(input_json, values)
+
+
+def get_prompt_version(examples: Optional[List[Dict]] = None) -> str:
+    """
+    プロンプトのバージョンを求める
+
+    指示・例・出力の指定を含むプロンプトのひな形とレスポンススキーマが変わると値が変わる
+    """
+    if examples is None:
+        examples = get_examples()
+    return fingerprint({"prompt": build_prompt(examples, {}), "schema": build_response_schema()})
+
+
 def get_examples() -> List[Dict]:
     """フォーマット例を取得する"""
     return [
@@ -141,136 +244,309 @@ def get_examples() -> List[Dict]:
     ]
 
 
-def extract_json_from_response(response_text: str) -> Optional[Dict]:
+def extract_json_from_response(response_text: Optional[str], item_id: Optional[str] = None) -> Optional[Dict]:
     """テキストレスポンスからJSONを抽出して解析"""
     if response_text is None:
         return None
 
-    json_str = response_text.strip()
+    parsed = parse_json_response(response_text)
+    if parsed is None:
+        print(
+            f"Failed to parse JSON from response. First 100 chars: {response_text.strip()[:100]}...")
+        # デバッグのためにログファイルへ追記
+        log_parse_failure(item_id, response_text)
+        print(f"Response appended to {config.PARSE_ERROR_LOG} for debugging")
+    return parsed
 
-    # コードブロック内のJSONを抽出
-    if '```' in json_str:
-        json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', json_str)
-        if json_match:
-            json_str = json_match.group(1)
 
-    try:
-        # JSONを解析
-        return json.loads(json_str)
-    except json.JSONDecodeError:
-        # 余分なテキストを除去して再試行
-        try:
-            clean_text = re.search(r'({[\s\S]*})', json_str)
-            if clean_text:
-                return json.loads(clean_text.group(1))
-
-            # 失敗した場合は下の正規表現を試す
-            clean_text = re.sub(r'^[^{]*({.*})[^}]*$',
-                                r'\1', json_str, flags=re.DOTALL)
-            return json.loads(clean_text)
-        except json.JSONDecodeError:
-            print(
-                f"Failed to parse JSON from response. First 100 chars: {json_str[:100]}...")
-            # デバッグのためにログファイルに保存
-            with open("json_parse_error.log", "w", encoding="utf-8") as f:
-                f.write(json_str)
-            print("Response saved to json_parse_error.log for debugging")
-            return None
+def resolve_with_rules(input_json: Dict) -> Tuple[Dict[str, Any], List[str]]:
+    """ルールベースで確定できるフィールドと、LLMに問い合わせるフィールドを求める"""
+    return split_settled(extract_fields(input_json), config.RULE_CONFIDENCE_THRESHOLD)
 
 
-def format_json_with_api(input_json: Dict, api_type: str, model_name: str, examples: Optional[List[Dict]] = None, retries: int = 3, backoff_factor: int = 2) -> Optional[Dict]:
-    """APIを使用してJSONを整形"""
-    if examples is None:
-        examples = get_examples()
+def call_provider(api_type: str, prompt: str, model_name: str, response_schema: Optional[Dict[str, Any]] = None, cancel_token: Optional[CancelToken] = None, usage: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    APIタイプに応じたプロバイダーにプロンプトを送信する（usageにはトークン数などが書き込まれる）
+
+    環境変数LLM_RECORD_FILEが設定されている場合は、応答を再生用に記録する
+    """
+    if api_type == API_TYPE_REPLAY:
+        return format_with_replay(prompt, model_name, response_schema, cancel_token, usage)
+    if api_type == API_TYPE_GEMINI:
+        response = format_with_gemini(prompt, model_name, response_schema, cancel_token, usage)
+    else:
+        response = format_with_ollama(prompt, model_name, response_schema, cancel_token, usage)
+    record_response(prompt, model_name, response, usage)
+    return response
+
+
+def get_hedge_backend(api_type: str, model_name: str) -> Tier:
+    """予備のリクエストを送る (APIタイプ, モデル名)（config.HEDGE_BACKENDSに指定がなければ同じバックエンド）"""
+    return config.HEDGE_BACKENDS.get(api_type, (api_type, model_name))
+
+
+def request_fields(prompt: str, fields: List[str], api_type: str, model_name: str, item_id: Optional[str] = None, retries: int = 3, backoff_factor: int = 2, rate_limiter: Optional[RateLimiter] = None, hedger: Optional[HedgedCaller] = None, kind: str = "format", hedge_rate_limiter: Optional[RateLimiter] = None) -> Optional[Dict]:
+    """
+    プロンプトを送信し、指定したフィールドのJSONを受け取る
+
+    レート制限時はバックエンド共通のサーキットブレーカーで待機し、失敗時は再試行する。
+    hedgerを指定した場合は、応答が遅いときに予備のリクエストを重ねて先に返った方を使う。
+    予備のリクエストはhedge_rate_limiterの実行枠を待ち、別のバックエンドに送る場合はそのバックエンドの
+    サーキットブレーカーも通す。
+    呼び出しごとの待ち時間・レイテンシ・トークン数・解析結果はテレメトリに記録する（kindは記録上の呼び出し種別）。
+    ヘッジで採用されなかったリクエストも、終了した時点でトークン数を記録する
 
-    prompt = build_prompt(examples, input_json)
+    Raises:
+        ProviderConfigError: 対応していないAPIタイプが指定された場合
+    """
+    if api_type not in SUPPORTED_API_TYPES:
+        # ワーカースレッド内で呼ばれるため、プロセスを終了せず例外で呼び出し元に伝える
+        raise ProviderConfigError(f"Unsupported API type: {api_type}", api_type)
+
+    response_schema = build_response_schema(fields)
+    # レート制限時は全ワーカーがこのブレーカーで一斉に待機する
+    breaker = get_breaker(api_type)
+    hedge_api, hedge_model = get_hedge_backend(api_type, model_name)
+    # 同じバックエンドへの予備のリクエストは、本来のリクエストが通ったブレーカーの判定に従う
+    hedge_breaker = get_breaker(hedge_api) if hedge_api != api_type else None
 
     for attempt in range(retries):
+        queued_at = time.perf_counter()
+        breaker.before_call()
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        started_at = time.perf_counter()
+        # 終了したリクエストの使用量（ヘッジした場合は終了した順に複数入る）
+        usages: List[Dict[str, Any]] = []
+        usage_lock = threading.Lock()
+        recorded = threading.Event()
+
+        def write_usage(usage: Dict[str, Any], outcome: str, error_name: Optional[str]) -> None:
+            prompt_tokens = usage.get("prompt_tokens")
+            estimated = bool(usage.get("succeeded")) and prompt_tokens is None
+            if estimated:
+                # 早期終了などでプロバイダーが入力トークン数を返さなかった場合は概算する
+                prompt_tokens = estimate_tokens(prompt)
+            telemetry.record_call(
+                item_id=item_id, kind=kind,
+                api_type=usage.get("api_type", api_type), model=usage.get("model", model_name),
+                attempt=attempt, queue_time=round(started_at - queued_at, 4),
+                latency=round(time.perf_counter() - started_at, 4),
+                prompt_tokens=prompt_tokens, prompt_tokens_estimated=estimated,
+                output_tokens=usage.get("output_tokens"), output_tokens_estimated=bool(usage.get("output_tokens_estimated")),
+                prompt_eval_duration=usage.get("prompt_eval_duration"), eval_duration=usage.get("eval_duration"),
+                endpoint=usage.get("endpoint"),
+                outcome=outcome, error=error_name)
+
+        def attempt_call(call_api: str, call_model: str) -> Callable[[Optional[CancelToken]], Optional[str]]:
+            def run(token: Optional[CancelToken] = None) -> Optional[str]:
+                usage: Dict[str, Any] = {"api_type": call_api, "model": call_model}
+                try:
+                    text = call_provider(call_api, prompt, call_model, response_schema, token, usage)
+                    usage["succeeded"] = True
+                    return text
+                except BaseException as e:
+                    usage["error"] = type(e).__name__
+                    raise
+                finally:
+                    with usage_lock:
+                        usages.append(usage)
+                        late = recorded.is_set()
+                    if late:
+                        # 採用された結果を記録した後に終わったリクエスト（中断できないGeminiの呼び出しなど）
+                        write_usage(usage, telemetry.OUTCOME_HEDGE_LOSER, usage.get("error"))
+            return run
+
+        def hedge_call(token: Optional[CancelToken] = None) -> Optional[str]:
+            if hedge_breaker is not None:
+                hedge_breaker.before_call()
+            try:
+                if token is not None:
+                    # ブレーカー・レートリミッターの待機中に本来のリクエストが返った場合は送らない
+                    token.raise_if_cancelled(hedge_api)
+                if hedge_rate_limiter is not None:
+                    hedge_rate_limiter.acquire()
+                text = attempt_call(hedge_api, hedge_model)(token)
+            except ProviderError as e:
+                if hedge_breaker is not None:
+                    if e.retryable:
+                        hedge_breaker.record_failure(e)
+                    else:
+                        hedge_breaker.release_probe()
+                raise
+            except BaseException:
+                if hedge_breaker is not None:
+                    hedge_breaker.release_probe()
+                raise
+            if hedge_breaker is not None:
+                hedge_breaker.record_success()
+            return text
+
+        def record(outcome: str, error: Optional[Exception] = None) -> None:
+            with usage_lock:
+                recorded.set()
+                finished = list(usages)
+            # 採用したリクエスト（成功したものがなければ最初に終わったもの）を結果として記録する
+            chosen = next((usage for usage in finished if usage.get("succeeded")), finished[0] if finished else {})
+            write_usage(chosen, outcome, type(error).__name__ if error is not None else chosen.get("error"))
+            for usage in finished:
+                if usage is not chosen:
+                    write_usage(usage, telemetry.OUTCOME_HEDGE_LOSER, usage.get("error"))
+
         try:
-            if api_type == API_TYPE_GEMINI:
-                response_text = format_with_gemini(prompt, model_name)
-                return extract_json_from_response(response_text)
-            elif api_type == API_TYPE_OLLAMA:
-                response_text = format_with_ollama(prompt, model_name)
-                return extract_json_from_response(response_text)
+            if hedger is None:
+                response_text = attempt_call(api_type, model_name)()
             else:
-                print(f"Unsupported API type: {api_type}")
-                sys.exit(1)
-
-        except Exception as e:
-            error_str = str(e)
-            if "RESOURCE_EXHAUSTED" in error_str or "429" in error_str:
-                wait_time = (backoff_factor ** attempt) * 5
-                print(
-                    f"Rate limit reached. Waiting for {wait_time} seconds before retry...")
-                time.sleep(wait_time)
+                response_text = hedger.call(attempt_call(api_type, model_name), hedge_call)
+
+        except (ProviderError, requests.RequestException, ConnectionError, TimeoutError) as e:
+            # プロバイダーで変換されなかった通信エラーは接続失敗として扱う
+            error = e if isinstance(e, ProviderError) else ProviderUnavailableError(str(e), api_type)
+            record(telemetry.OUTCOME_ERROR, error)
+            if not error.retryable:
+                # 設定不備や不正なリクエストはバックエンドの障害ではないため、成功・失敗のどちらにも数えない
+                breaker.release_probe()
+                print(f"API call failed: {error}")
+                return None
+            breaker.record_failure(error)
+            if attempt < retries - 1:
+                if isinstance(error, RateLimitError):
+                    # 待機はブレーカーが全ワーカー共通で行う
+                    print("Rate limit reached. Waiting for the shared circuit breaker before retry...")
+                else:
+                    wait_time = error.retry_after if error.retry_after is not None else backoff_factor ** attempt
+                    print(f"API call failed. Retrying in {wait_time} seconds...")
+                    time.sleep(wait_time)
                 continue
-            elif attempt < retries - 1:
-                wait_time = (backoff_factor ** attempt) * 1
-                print(f"API call failed. Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
+            print(f"API call failed after {retries} attempts: {error}")
+            return None
+        except Exception as e:
+            # プロバイダーの失敗ではない例外（プログラムの誤りなど）は再試行せずに呼び出し元へ伝える
+            breaker.release_probe()
+            record(telemetry.OUTCOME_ERROR, e)
+            raise
+
+        breaker.record_success()
+        parsed = extract_json_from_response(response_text, item_id)
+        record(telemetry.OUTCOME_OK if parsed is not None else telemetry.OUTCOME_PARSE_ERROR)
+        if parsed is None:
+            if attempt < retries - 1:
+                print("JSONの解析に失敗したため再試行します")
                 continue
-            else:
-                print(f"API call failed after {retries} attempts: {e}")
-                return None
+            return None
+        return parsed
 
+    return None
 
-def process_file(file_path: str, output_dir: str, api_type: str, model_name: str, examples: Optional[List[Dict]] = None, delay: float = 4) -> int:
-    """ファイルを処理"""
-    try:
-        # 入力ファイルを読み込み
-        with open(file_path, 'r', encoding='utf-8') as f:
-            input_data = json.load(f)
-
-        # 出力ディレクトリが存在しない場合は作成
-        os.makedirs(output_dir, exist_ok=True)
-
-        # 出力ファイルパスを決定
-        output_file = os.path.join(output_dir, os.path.basename(file_path))
-
-        # データタイプに基づいて処理
-        if isinstance(input_data, list):
-            # 配列の場合は各アイテムを処理し、すぐ保存する
-            os.makedirs(output_dir, exist_ok=True)
-            results = []
-            for item in tqdm(input_data, desc=f"Processing {file_path}", unit="item"):
-                formatted_item = format_json_with_api(
-                    item, api_type, model_name, examples)
-                if formatted_item:
-                    title = formatted_item.get("title", "タイトルなし")
-                    print(f"成功： \"{title}\"の整形が完了")
-                    results.append(formatted_item)
-                    append_to_json(formatted_item, output_file)
-                    print(
-                        f"アイテム処理完了： {formatted_item.get('title', '不明なタイトル')}")
-                time.sleep(delay)  # APIリクエスト間の遅延
-
-            return len(results)
-        else:
-            # 単一オブジェクトの場合
-            formatted_data = format_json_with_api(
-                input_data, api_type, model_name, examples)
-            if formatted_data:
-                # 結果を保存
-                title = formatted_data.get("title", "タイトルなし")
-                print(f"成功： \"{title}\"の整形が完了")
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(formatted_data, f, ensure_ascii=False, indent=2)
-                return 1
-            return 0
 
+def format_json_with_api(input_json: Dict, api_type: str, model_name: str, examples: Optional[List[Dict]] = None, retries: int = 3, backoff_factor: int = 2, use_rules: bool = True, rate_limiter: Optional[RateLimiter] = None, hedger: Optional[HedgedCaller] = None, hedge_rate_limiter: Optional[RateLimiter] = None) -> Optional[Dict]:
+    """
+    APIを使用してJSONを整形
+
+    use_rulesがTrueの場合はルールベースで確定できたフィールドをLLMに問い合わせず、
+    すべて確定した場合はAPIを呼び出さない。
+    rate_limiterを指定した場合は、API呼び出しの前に実行枠を待つ。
+    hedgerを指定した場合は、応答が遅いリクエストに予備のリクエストを重ねる（予備はhedge_rate_limiterの実行枠を待つ）
+    """
+    if examples is None:
+        examples = get_examples()
+
+    if use_rules:
+        settled, pending = resolve_with_rules(input_json)
+        if not pending:
+            return build_formatted_item(input_json, settled)
+        prompt_input = compact_item(input_json, pending)
+        prompt = build_prompt(examples, prompt_input, pending, settled)
+    else:
+        settled, pending = {}, list(TARGET_FIELDS)
+        prompt_input = compact_item(input_json, None)
+        prompt = build_prompt(examples, prompt_input)
+    get_compaction_stats().record(
+        input_json.get("description") or "", prompt_input.get("description") or "", prompt)
+
+    parsed = request_fields(
+        prompt, pending, api_type, model_name, get_item_id(input_json),
+        retries, backoff_factor, rate_limiter, hedger, hedge_rate_limiter=hedge_rate_limiter)
+    if parsed is None:
+        return None
+    values = {key: parsed[key] for key in pending if key in parsed}
+    values.update(settled)
+    return build_formatted_item(input_json, values)
+
+
+def repair_formatted_item(input_json: Dict, formatted_item: Dict, errors: Dict[str, str], api_type: str, model_name: str, rate_limiter: Optional[RateLimiter] = None, hedger: Optional[HedgedCaller] = None, hedge_rate_limiter: Optional[RateLimiter] = None) -> Dict:
+    """
+    検証に通らなかったフィールドだけを修正プロンプトで問い合わせ直し、結果をマージする
+
+    Args:
+        input_json: 整形前のアイテム
+        formatted_item: 検証に通らなかった整形結果
+        errors: 不正なフィールド名 -> 理由（validate_formatted_itemの結果）
+        api_type: 使用するAPIタイプ
+        model_name: 使用するモデル
+        rate_limiter: API呼び出しの間隔制御
+        hedger: 応答が遅いリクエストに予備のリクエストを重ねるヘッジ
+        hedge_rate_limiter: 予備のリクエストの間隔制御
+
+    Returns:
+        修正後の整形結果（修正できなかった場合は元の整形結果）
+    """
+    fields = [field for field in TARGET_FIELDS if field in errors]
+    if not fields:
+        return formatted_item
+
+    instructions = [
+        text for targets, text in FIELD_INSTRUCTIONS
+        if any(field in fields for field in targets)
+    ]
+    prompt = build_repair_prompt(
+        input_json, formatted_item, {field: errors[field] for field in fields},
+        instructions, config.REPAIR_SNIPPET_CHARS)
+    parsed = request_fields(
+        prompt, fields, api_type, model_name, get_item_id(input_json),
+        retries=1, rate_limiter=rate_limiter, hedger=hedger, kind="repair", hedge_rate_limiter=hedge_rate_limiter)
+    if parsed is None:
+        return formatted_item
+
+    repaired = dict(formatted_item)
+    repaired.update({field: parsed[field] for field in fields if field in parsed})
+    return build_formatted_item(input_json, repaired)
+
+
+def process_file(file_path: str, output_dir: str, api_type: str, model_name: str, examples: Optional[List[Dict]] = None, delay: float = 4, resume: bool = True, max_workers: int = 1, cascade: Optional[List[Tier]] = None, dedup: bool = True, hedge: bool = False, db_path: Optional[str] = None) -> int:
+    """
+    ファイルを処理
+
+    resumeがTrueの場合は出力ファイルとチェックポイントにある整形済みアイテムを読み飛ばし、
+    Falseの場合は既存の出力を削除して最初から整形し直す。
+    cascadeを指定した場合はapi_type・model_nameの代わりにそのモデルを順に試す。
+    dedupがTrueの場合は近似重複のアイテムをまとめ、代表だけを整形する。
+    hedgeがTrueの場合は応答が遅いリクエストに予備のリクエストを重ねる。
+    db_pathを指定した場合は整形済みのアイテムをそのデータベースにもupsertする
+    """
+    try:
+        job = FormatJob(file_path, output_dir)
+        job.prepare(resume)
     except Exception as e:
         print(f"ファイル処理エラー{file_path}: {e}")
         return 0
 
+    return _run_jobs([job], cascade or [(api_type, model_name)], examples, max_workers, delay, dedup, hedge, db_path)
+
+
+def process_directory(input_dir: str, output_dir: str, api_type: str, model_name: str, examples: Optional[List[Dict]] = None, max_workers: int = 1, delay: float = 4, resume: bool = True, cascade: Optional[List[Tier]] = None, dedup: bool = True, hedge: bool = False, db_path: Optional[str] = None) -> int:
+    """
+    ディレクトリ内のすべてのJSONファイルを処理
 
-def process_directory(input_dir: str, output_dir: str, api_type: str, model_name: str, examples: Optional[List[Dict]] = None, max_workers: int = 1, delay: float = 4) -> int:
-    """ディレクトリ内のすべてのJSONファイルを処理"""
+    すべてのファイルのアイテムを1つのキューに流し、共通のワーカーとレートリミッターで整形する
+    """
     # 出力ディレクトリが存在しない場合は作成
     os.makedirs(output_dir, exist_ok=True)
 
     # 入力ディレクトリ内のすべてのJSONファイルを検索
-    json_files = list(Path(input_dir).glob('**/*.json'))
+    json_files = sorted(Path(input_dir).glob('**/*.json')) + sorted(Path(input_dir).glob('**/*.jsonl'))
+    # 実行マニフェストやクロールのメトリクスは入力にしない
+    json_files = [file for file in json_files if is_item_file(file.name)]
 
     if not json_files:
         print(f"No JSON files found in {input_dir}")
@@ -278,40 +554,97 @@ def process_directory(input_dir: str, output_dir: str, api_type: str, model_name
 
     print(f"Found {len(json_files)} JSON files to process")
 
-    # 単一ワーカーの場合はシーケンシャルに処理
-    if max_workers <= 1:
-        processed_count = 0
-        for file in tqdm(json_files, desc="Processing files", unit="file"):
-            try:
-                result_count = process_file(
-                    str(file), output_dir, api_type, model_name, examples, delay)
-                processed_count += result_count
-                print(f"Processed {file}: {result_count} items")
-            except Exception as e:
-                print(f"Error processing {file}: {e}")
+    jobs = []
+    for file in json_files:
+        try:
+            job = FormatJob(str(file), output_dir, input_dir)
+            job.prepare(resume)
+            jobs.append(job)
+        except Exception as e:
+            print(f"Error processing {file}: {e}")
 
-        return processed_count
+    processed_count = _run_jobs(jobs, cascade or [(api_type, model_name)], examples, max_workers, delay, dedup, hedge, db_path)
+    for job in jobs:
+        print(f"完了：{job.file_path}から{job.processed_count}件の処理が終了しました。")
+    return processed_count
 
-    # 複数ワーカーの場合は並列処理
-    else:
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        processed_count = 0
-
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # すべての処理タスクを送信
-            future_to_file = {
-                executor.submit(process_file, str(file), output_dir, api_type, model_name, examples, delay): file
-                for file in json_files
-            }
-
-            # 完了したタスクの結果を処理
-            for future in tqdm(as_completed(future_to_file), total=len(json_files), desc="Processing files", unit="file"):
-                file = future_to_file[future]
-                try:
-                    result_count = future.result()
-                    processed_count += result_count
-                    print(f"完了：{file}から{result_count}件の処理が終了しました。")
-                except Exception as e:
-                    print(f"Error processing {file}: {e}")
 
-        return processed_count
+def _run_jobs(jobs: List[FormatJob], tiers: List[Tier], examples: Optional[List[Dict]], max_workers: int, delay: float, dedup: bool = True, hedge: bool = False, db_path: Optional[str] = None) -> int:
+    """ジョブのアイテムをモデルカスケードで整形する（API呼び出しの間隔はバックエンドごとに全ワーカーで共有）"""
+    if examples is None:
+        examples = get_examples()
+    rate_limiters = {api_type: RateLimiter(delay) for api_type, _ in tiers}
+    hedgers = {api_type: HedgedCaller(api_type) for api_type, _ in tiers} if hedge else {}
+    for api_type, model_name in tiers if hedge else []:
+        # 予備のリクエストを別のバックエンドに送る場合も、そのバックエンドの呼び出し間隔を全ワーカーで共有する
+        rate_limiters.setdefault(get_hedge_backend(api_type, model_name)[0], RateLimiter(delay))
+
+    def hedge_limiter(api_type: str, model_name: str) -> Optional[RateLimiter]:
+        return rate_limiters[get_hedge_backend(api_type, model_name)[0]] if hedge else None
+
+    def format_with_model(item: Dict, api_type: str, model_name: str) -> Optional[Dict]:
+        return format_json_with_api(
+            item, api_type, model_name, examples, rate_limiter=rate_limiters[api_type], hedger=hedgers.get(api_type),
+            hedge_rate_limiter=hedge_limiter(api_type, model_name))
+
+    def repair_with_model(item: Dict, formatted_item: Dict, errors: Dict[str, str], api_type: str, model_name: str) -> Dict:
+        return repair_formatted_item(
+            item, formatted_item, errors, api_type, model_name, rate_limiter=rate_limiters[api_type], hedger=hedgers.get(api_type),
+            hedge_rate_limiter=hedge_limiter(api_type, model_name))
+
+    cascade = ModelCascade(
+        tiers, format_with_model, needs_llm=lambda item: bool(resolve_with_rules(item)[1]),
+        repair_func=repair_with_model)
+    format_item = cascade.format
+    deduplicator = None
+    if dedup:
+        # ファイルをまたいだ近似重複もまとめる
+        deduplicator = DedupFormatter(cascade.format, derive_from_representative)
+        format_item = deduplicator.format
+    store = writer = None
+    if db_path:
+        store = ItemStore(db_path)
+        writer = BatchWriter(store, TABLE_FORMATTED)
+        format_without_store = format_item
+
+        def store_formatted(formatted_item: Optional[Dict]) -> None:
+            if formatted_item is not None:
+                writer.add(formatted_item)
+
+        def format_and_store(item: Dict) -> Union[Optional[Dict], Future]:
+            formatted_item = format_without_store(item)
+            if isinstance(formatted_item, Future):
+                # 近似重複の代表の整形を待つメンバーは、結果が決まった時点で保存する
+                formatted_item.add_done_callback(lambda done: store_formatted(done.result()) if done.exception() is None else None)
+            else:
+                store_formatted(formatted_item)
+            return formatted_item
+        format_item = format_and_store
+    mark_stage("prepare")
+    telemetry.start_run()
+    try:
+        processed_count = run_format_jobs(jobs, format_item, max_workers)
+    finally:
+        telemetry.finish_run()
+        if store is not None:
+            writer.flush()
+            store.close()
+            print(f"データベースに{writer.written}件を保存しました: {db_path}")
+        # 出力ファイルごとにコードの出所と設定・プロンプトのバージョンを記録する（gitの実行は最初の1回のみ）
+        prompt_version = get_prompt_version(examples)
+        parameters = {
+            "models": [f"{api_type}:{model_name}" for api_type, model_name in tiers],
+            "max_workers": max_workers, "delay": delay, "dedup": dedup, "hedge": hedge, "db_path": db_path,
+        }
+        for job in jobs:
+            write_manifest(
+                job.output_file, "format", {"input_file": job.file_path, **parameters}, prompt_version,
+                items=job.processed_count)
+    mark_stage("format")
+    cascade.print_stats()
+    get_compaction_stats().print_stats()
+    for hedger in hedgers.values():
+        hedger.print_stats()
+    if deduplicator is not None:
+        deduplicator.print_stats()
+    return processed_count
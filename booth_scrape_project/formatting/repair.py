@@ -0,0 +1,73 @@
+"""
+フィールド単位の修正プロンプト
+検証で不正と判定されたフィールドだけを、説明文の関連箇所とともにLLMへ問い合わせ直す
+"""
+import json
+from typing import Dict, List, Any
+from formatting.rule_extractor import TARGET_FIELDS
+from formatting.compaction import FIELD_PATTERNS, relevant_sentences
+
+
+def relevant_snippet(description: str, fields: List[str], max_chars: int) -> str:
+    """
+    説明文から指定フィールドに関係する文だけを抜き出す
+
+    Args:
+        description: 説明文
+        fields: 対象のフィールド
+        max_chars: 抜粋の最大文字数
+
+    Returns:
+        関係する文を元の順に連結した抜粋
+    """
+    if not any(field in FIELD_PATTERNS for field in fields):
+        return ""
+
+    snippet: List[str] = []
+    length = 0
+    for _, sentence, _ in relevant_sentences(description, fields):
+        if length + len(sentence) > max_chars:
+            break
+        snippet.append(sentence)
+        length += len(sentence) + 1
+    return "\n".join(snippet)
+
+
+def build_repair_prompt(input_json: Dict[str, Any], formatted_item: Dict[str, Any], errors: Dict[str, str], instructions: List[str], max_chars: int) -> str:
+    """
+    不正なフィールドだけを問い合わせる修正プロンプトを構築する
+
+    Args:
+        input_json: 整形前のアイテム
+        formatted_item: 検証に通らなかった整形結果
+        errors: 不正なフィールド名 -> 理由
+        instructions: 対象フィールドの整形指示
+        max_chars: 説明文の抜粋の最大文字数
+
+    Returns:
+        修正プロンプト
+    """
+    fields = list(errors)
+    prompt = "以下のJSONデータの整形結果のうち、一部のフィールドが不正です。指定したフィールドだけを修正してください。\n\n"
+    prompt += "整形ルール:\n"
+    for i, text in enumerate(instructions, 1):
+        prompt += f"{i}. {text}\n"
+
+    prompt += "\n不正なフィールド:\n"
+    for field, reason in errors.items():
+        prompt += f"- {field}: {json.dumps(formatted_item.get(field), ensure_ascii=False)}（{reason}）\n"
+
+    source = {"title": input_json.get("title")}
+    if "likes" in errors:
+        source["likes"] = input_json.get("likes")
+    snippet = relevant_snippet(input_json.get("description", ""), fields, max_chars)
+    if snippet:
+        source["description"] = snippet
+    prompt += f"\n元データ（抜粋）:\n{json.dumps(source, ensure_ascii=False, indent=2)}\n"
+
+    valid = {key: value for key, value in formatted_item.items() if key not in errors and key in TARGET_FIELDS}
+    if valid:
+        prompt += f"\n確定済みの値（参考）:\n{json.dumps(valid, ensure_ascii=False)}\n"
+
+    prompt += f"\nキーは {', '.join(fields)} のみとし、修正後の値をJSONフォーマットのみで返してください。"
+    return prompt
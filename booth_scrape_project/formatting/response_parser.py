@@ -0,0 +1,132 @@
+"""
+LLMの応答からJSONオブジェクトを取り出すパーサー
+テキストを先頭から1回走査するだけで、ストリーミング中の応答にも使える
+"""
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+import config
+
+_log_lock = threading.Lock()
+
+
+class IncrementalJsonParser:
+    """テキスト片を順に受け取り、最初のトップレベルのJSONオブジェクトを取り出すパーサー"""
+
+    def __init__(self) -> None:
+        self._chars: List[str] = []
+        self._stack: List[str] = []
+        self._started = False
+        self._in_string = False
+        self._escaped = False
+        self.complete = False
+
+    def feed(self, text: str) -> bool:
+        """
+        テキスト片を読み込む
+
+        Args:
+            text: 応答テキストの一部
+
+        Returns:
+            JSONオブジェクトが閉じた場合はTrue
+        """
+        if self.complete:
+            return True
+
+        for char in text:
+            if not self._started:
+                # 最初の「{」より前（コードブロックの開始や前置きの文）は読み飛ばす
+                if char == "{":
+                    self._started = True
+                    self._stack.append("}")
+                    self._chars.append(char)
+                continue
+
+            if self._in_string:
+                self._chars.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append("}" if char == "{" else "]")
+            elif char in "}]":
+                if self._chars and self._chars[-1] == ",":
+                    # 末尾のカンマは取り除く
+                    self._chars.pop()
+                self._stack.pop()
+                if not self._stack:
+                    self._chars.append(char)
+                    self.complete = True
+                    return True
+            elif char in " \t\r\n" and self._chars and self._chars[-1] == ",":
+                # 末尾のカンマを検出できるよう、カンマ直後の空白は捨てる
+                continue
+            self._chars.append(char)
+        return False
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """
+        解析結果を取得する
+
+        オブジェクトが閉じる前に応答が終わった場合は、開いている文字列と括弧を補って解析を試みる
+
+        Returns:
+            解析したJSONオブジェクト、解析できない場合はNone
+        """
+        if not self._started:
+            return None
+
+        text = "".join(self._chars)
+        if not self.complete:
+            if self._in_string:
+                text += '"'
+            text = text.rstrip().rstrip(",")
+            text += "".join(reversed(self._stack))
+
+        try:
+            parsed = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
+
+def parse_json_response(response_text: Optional[str]) -> Optional[Dict[str, Any]]:
+    """テキスト全体からJSONオブジェクトを取り出す"""
+    if response_text is None:
+        return None
+    parser = IncrementalJsonParser()
+    parser.feed(response_text)
+    return parser.result()
+
+
+def log_parse_failure(item_id: Optional[str], response_text: Optional[str], log_file: Optional[str] = None) -> None:
+    """
+    解析に失敗した応答をアイテムIDとともにログファイルへ追記する
+
+    Args:
+        item_id: アイテムID
+        response_text: 解析に失敗した応答テキスト
+        log_file: ログファイル（省略時は設定値）
+    """
+    log_file = log_file or config.PARSE_ERROR_LOG
+    record = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "item_id": item_id,
+        "response": response_text,
+    }
+    log_dir = os.path.dirname(log_file)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    with _log_lock:
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
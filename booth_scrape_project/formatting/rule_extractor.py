@@ -0,0 +1,260 @@
+"""
+ルールベースでフィールドを事前抽出するモジュール
+LLMに渡す前に、正規表現や閾値で機械的に決まるフィールドを確信度付きで埋める
+"""
+import re
+from typing import Dict, List, Any, Optional, Tuple
+
+# 抽出結果の型: フィールド名 -> (値, 確信度 0.0〜1.0)
+Extraction = Dict[str, Tuple[Any, float]]
+
+# LLMに整形させる対象のフィールド（この順で出力される）
+TARGET_FIELDS: List[str] = [
+    "title", "likes", "game_type", "gm_required",
+    "min_players", "max_players", "play_time",
+]
+
+GAME_TYPE_MURDER = "マーダーミステリー"
+GAME_TYPE_OTHER = "その他"
+
+GM_REQUIRED = "必要"
+GM_NOT_REQUIRED = "不要"
+GM_OPTIONAL = "どちらでも可"
+
+# 全角数字・記号を半角にそろえるための変換表
+_NORMALIZE_TABLE = str.maketrans(
+    "０１２３４５６７８９＋～〜－：（）　",
+    "0123456789+~~-:() ",
+)
+
+# ゲーム本編ではない商品を示す表現（タイトル）
+_NON_GAME_TITLE_PATTERN = re.compile(
+    r"支援用|(?<![A-Za-z])SS(?![A-Za-z])|ショートストーリー|サウンドトラック|サントラ|グッズ|アクリル|イラスト集|設定資料")
+# ゲーム本編ではない商品を示す表現（説明文）
+_NON_GAME_DESC_PATTERN = re.compile(r"ゲームではありません|ゲームではございません")
+_MURDER_PATTERN = re.compile(r"マーダーミステリー|マダミス|murder\s*mystery", re.IGNORECASE)
+
+# GM要否
+_GM_OPTIONAL_PATTERN = re.compile(
+    r"GMレス(?:可能|可|でも|対応)|GM(?:あり|有り)[/・,、]?(?:なし|無し)|GMなしでも|GM(?:の)?有無(?:を)?問わ")
+_GM_NOT_REQUIRED_PATTERN = re.compile(r"GMレス|GM(?:なし|無し|不要)|ノーGM")
+_GM_REQUIRED_PATTERN = re.compile(
+    r"GM必須|要GM|GM必要|GM\s*1\s*[名人]|PL\s*\d+\s*[名人]?\s*\+\s*GM|GM\s*\+\s*PL")
+
+# プレイ人数（GMを含まないPL人数）
+_PLAYER_RANGE_PATTERN = re.compile(r"(\d{1,2})\s*[~-]\s*(\d{1,2})\s*(?:人|名|PL)")
+_PLAYER_PATTERNS: List[Tuple[re.Pattern, float]] = [
+    (re.compile(r"PL\s*(\d{1,2})\s*[名人]?"), 0.9),
+    (re.compile(r"(\d{1,2})\s*PL"), 0.9),
+    (re.compile(r"(\d{1,2})\s*人(?:用|協力|向け|専用|プレイ)"), 0.85),
+    (re.compile(r"(?:プレイ人数|必要人数|人数)\s*[:は]?\s*(\d{1,2})\s*[名人]"), 0.9),
+    (re.compile(r"(\d{1,2})\s*人"), 0.6),
+]
+
+# プレイ時間
+_TIME_CONTEXT = r"(?:プレイ時間|所要時間|想定時間|目安|時間)"
+_PLAY_TIME_PATTERNS: List[Tuple[re.Pattern, float, str]] = [
+    (re.compile(r"平均\s*(\d+(?:\.\d+)?)\s*時間"), 0.95, "hours"),
+    (re.compile(r"平均\s*(\d{2,3})\s*分"), 0.95, "minutes"),
+    (re.compile(_TIME_CONTEXT + r"\s*[:は]?\s*約?\s*(\d{2,3})\s*[~-]\s*(\d{2,3})\s*分"), 0.85, "minutes_range"),
+    (re.compile(_TIME_CONTEXT + r"\s*[:は]?\s*約?\s*(\d+(?:\.\d+)?)\s*時間\s*(\d{1,2})\s*分"), 0.9, "hours_minutes"),
+    (re.compile(_TIME_CONTEXT + r"\s*[:は]?\s*約?\s*(\d+(?:\.\d+)?)\s*時間"), 0.9, "hours"),
+    (re.compile(_TIME_CONTEXT + r"\s*[:は]?\s*約?\s*(\d{2,3})\s*分"), 0.9, "minutes"),
+    (re.compile(r"約\s*(\d+(?:\.\d+)?)\s*時間"), 0.85, "hours"),
+    (re.compile(r"約\s*(\d{2,3})\s*分"), 0.8, "minutes"),
+]
+
+# タイトルの装飾
+_TITLE_QUOTE_PATTERN = re.compile(r"[「『]([^「」『』]+)[」』]")
+_TITLE_BRACKET_PATTERN = re.compile(r"【[^】]*】|\[[^\]]*\]")
+_TITLE_PREFIX_PATTERN = re.compile(r"^(?:マーダーミステリー|マダミス)\s*[:：\-]?\s*")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """全角数字・記号を半角にそろえる"""
+    if not text:
+        return ""
+    return text.translate(_NORMALIZE_TABLE)
+
+
+def bucket_likes(likes: Optional[int]) -> Optional[str]:
+    """
+    スキ数を区分に変換する
+
+    Args:
+        likes: スキ数
+
+    Returns:
+        "~100"、"100~500"、"500~" のいずれか。スキ数不明の場合はNone
+    """
+    if likes is None:
+        return None
+    if likes < 100:
+        return "~100"
+    if likes < 500:
+        return "100~500"
+    return "500~"
+
+
+def extract_game_type(title: str, description: str) -> Tuple[Optional[str], float]:
+    """ゲーム種別を判定する"""
+    if _NON_GAME_DESC_PATTERN.search(description) or _NON_GAME_TITLE_PATTERN.search(title):
+        return GAME_TYPE_OTHER, 0.9
+    if _MURDER_PATTERN.search(title):
+        return GAME_TYPE_MURDER, 0.9
+    if _MURDER_PATTERN.search(description):
+        return GAME_TYPE_MURDER, 0.8
+    return None, 0.0
+
+
+def extract_gm_required(text: str) -> Tuple[Optional[str], float]:
+    """GMの要否を判定する"""
+    if _GM_OPTIONAL_PATTERN.search(text):
+        return GM_OPTIONAL, 0.9
+    if _GM_NOT_REQUIRED_PATTERN.search(text):
+        return GM_NOT_REQUIRED, 0.85
+    if _GM_REQUIRED_PATTERN.search(text):
+        return GM_REQUIRED, 0.9
+    return None, 0.0
+
+
+def extract_player_count(text: str) -> Tuple[Optional[Tuple[int, int]], float]:
+    """
+    GMを含まないPL人数を抽出する
+
+    Returns:
+        ((最小PL人数, 最大PL人数), 確信度)
+    """
+    range_match = _PLAYER_RANGE_PATTERN.search(text)
+    if range_match:
+        low, high = int(range_match.group(1)), int(range_match.group(2))
+        if 0 < low <= high:
+            return (low, high), 0.85
+
+    for pattern, confidence in _PLAYER_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            count = int(match.group(1))
+            if count > 0:
+                return (count, count), confidence
+    return None, 0.0
+
+
+def extract_play_time(text: str) -> Tuple[Optional[int], float]:
+    """平均プレイ時間を分単位で抽出する"""
+    for pattern, confidence, unit in _PLAY_TIME_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        if unit == "hours":
+            minutes = float(match.group(1)) * 60
+        elif unit == "hours_minutes":
+            minutes = float(match.group(1)) * 60 + int(match.group(2))
+        elif unit == "minutes_range":
+            minutes = (int(match.group(1)) + int(match.group(2))) / 2
+        else:
+            minutes = float(match.group(1))
+        if minutes > 0:
+            return int(round(minutes)), confidence
+    return None, 0.0
+
+
+def clean_title(title: str, game_type: Optional[str]) -> Tuple[Optional[str], float]:
+    """タイトルから装飾を取り除き、本来のタイトルを取り出す"""
+    if not title:
+        return None, 0.0
+
+    stripped = _TITLE_BRACKET_PATTERN.sub("", title).strip()
+    if game_type == GAME_TYPE_OTHER:
+        # ゲーム以外の商品は【】の装飾のみ除去する
+        return (stripped or title), 0.85
+
+    quoted = _TITLE_QUOTE_PATTERN.search(stripped)
+    if quoted:
+        return quoted.group(1).strip(), 0.9
+
+    without_prefix = _TITLE_PREFIX_PATTERN.sub("", stripped).strip()
+    if not without_prefix:
+        return None, 0.0
+    if _MURDER_PATTERN.search(without_prefix):
+        # 「マーダーミステリー」がタイトルの一部かどうかは判断できない
+        return without_prefix, 0.5
+    return without_prefix, 0.85
+
+
+def extract_fields(item: Dict[str, Any]) -> Extraction:
+    """
+    アイテムから機械的に決まるフィールドを確信度付きで抽出する
+
+    Args:
+        item: スクレイピングしたアイテム情報
+
+    Returns:
+        フィールド名 -> (値, 確信度) の辞書。抽出できなかったフィールドは含まない
+    """
+    title = normalize_text(item.get("title"))
+    description = normalize_text(item.get("description"))
+    text = f"{title}\n{description}"
+    result: Extraction = {}
+
+    likes = item.get("likes")
+    if isinstance(likes, int):
+        result["likes"] = (bucket_likes(likes), 1.0)
+
+    game_type, game_conf = extract_game_type(title, description)
+    if game_type:
+        result["game_type"] = (game_type, game_conf)
+
+    cleaned_title, title_conf = clean_title(item.get("title") or "", game_type)
+    if cleaned_title:
+        result["title"] = (cleaned_title, title_conf)
+
+    if game_type == GAME_TYPE_OTHER:
+        # ゲーム以外の商品はプレイ関連の値をすべて0とする
+        result["gm_required"] = (GM_NOT_REQUIRED, game_conf)
+        result["min_players"] = (0, game_conf)
+        result["max_players"] = (0, game_conf)
+        result["play_time"] = ({"avg": 0}, game_conf)
+        return result
+
+    gm_required, gm_conf = extract_gm_required(text)
+    if gm_required:
+        result["gm_required"] = (gm_required, gm_conf)
+
+    players, players_conf = extract_player_count(text)
+    if players and gm_required:
+        # GM必須はGM込み、どちらでも可は最小がGMなし・最大がGM込み
+        low, high = players
+        if gm_required == GM_REQUIRED:
+            low, high = low + 1, high + 1
+        elif gm_required == GM_OPTIONAL:
+            high = high + 1
+        confidence = min(players_conf, gm_conf)
+        result["min_players"] = (low, confidence)
+        result["max_players"] = (high, confidence)
+
+    play_time, time_conf = extract_play_time(text)
+    if play_time is not None:
+        result["play_time"] = ({"avg": play_time}, time_conf)
+
+    return result
+
+
+def split_settled(extraction: Extraction, threshold: float) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    抽出結果を確定フィールドと未確定フィールドに分ける
+
+    Args:
+        extraction: extract_fieldsの結果
+        threshold: 確定とみなす確信度の下限
+
+    Returns:
+        (確定したフィールドの値, LLMに問い合わせるフィールド名のリスト)
+    """
+    settled = {
+        field: value
+        for field, (value, confidence) in extraction.items()
+        if confidence >= threshold
+    }
+    pending = [field for field in TARGET_FIELDS if field not in settled]
+    return settled, pending
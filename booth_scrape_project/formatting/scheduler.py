@@ -0,0 +1,225 @@
+"""
+複数ファイルのアイテムを1つのキューで整形するスケジューラ
+すべての入力ファイルのアイテムを共通のワーカープールで処理し、結果は各アイテムの出力ファイルへ書き戻す
+"""
+import os
+import json
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Any, Optional, Callable, Iterator, Tuple, Union
+from tqdm import tqdm
+from utils.data_utils import append_to_json, append_to_jsonl, detect_json_layout, iter_json_items
+from formatting.checkpoint import FormatCheckpoint
+
+# キューの終端を示す値
+_STOP = None
+
+# キューが空くのを待つ間にワーカーの生存を確認する間隔（秒）
+_PUT_POLL_INTERVAL = 1.0
+
+
+class FormatJob:
+    """1つの入力ファイルと、その出力ファイル・チェックポイントをまとめたもの"""
+
+    def __init__(self, file_path: str, output_dir: str, input_dir: Optional[str] = None) -> None:
+        """
+        初期化
+
+        Args:
+            file_path: 入力ファイル
+            output_dir: 出力ディレクトリ
+            input_dir: 入力ディレクトリ（指定した場合は出力ファイルをそこからの相対パスに置き、
+                別のサブディレクトリにある同じ名前のファイルの出力・チェックポイントが重ならないようにする）
+        """
+        self.file_path = file_path
+        relative_path = os.path.relpath(file_path, input_dir) if input_dir else os.path.basename(file_path)
+        self.output_file = os.path.join(output_dir, relative_path)
+        self.layout = detect_json_layout(file_path)
+        self.checkpoint = FormatCheckpoint(self.output_file, file_path)
+        self.processed_count = 0
+        self._pending = 0
+        self._input_done = False
+        self._error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def prepare(self, resume: bool) -> None:
+        """出力ディレクトリとチェックポイントを準備する"""
+        os.makedirs(os.path.dirname(self.output_file) or ".", exist_ok=True)
+        if resume:
+            done_count = self.checkpoint.load()
+            if done_count:
+                print(f"再開: {self.file_path} の整形済みアイテム{done_count}件を読み飛ばします")
+        else:
+            self.checkpoint.reset()
+        self.checkpoint.write_manifest("running")
+
+    def iter_pending_items(self) -> Iterator[Dict[str, Any]]:
+        """未整形のアイテムを1件ずつ返す"""
+        for item in iter_json_items(self.file_path):
+            if self.checkpoint.is_done(item):
+                self.checkpoint.mark_skipped()
+                continue
+            with self._lock:
+                self._pending += 1
+            yield item
+
+    def write(self, item: Dict[str, Any], formatted_item: Dict[str, Any]) -> None:
+        """整形結果を出力ファイルへ書き込み、チェックポイントを更新する"""
+        with self._lock:
+            if self.layout == "jsonl":
+                append_to_jsonl(formatted_item, self.output_file)
+            elif self.layout == "array":
+                append_to_json(formatted_item, self.output_file)
+            else:
+                with open(self.output_file, "w", encoding="utf-8") as f:
+                    json.dump(formatted_item, f, ensure_ascii=False, indent=2)
+            self.processed_count += 1
+        self.checkpoint.mark_done(item)
+
+    def fail(self, error: Optional[str] = None) -> None:
+        """整形に失敗したことを記録する"""
+        self.checkpoint.mark_failed()
+        if error:
+            print(f"整形エラー {self.file_path}: {error}")
+
+    def input_finished(self, error: Optional[str] = None) -> None:
+        """入力ファイルを最後まで読み終えたことを記録する"""
+        with self._lock:
+            self._input_done = True
+            self._error = error
+        self._finish_if_done()
+
+    def item_finished(self) -> None:
+        """1件の処理が終わったことを記録する"""
+        with self._lock:
+            self._pending -= 1
+        self._finish_if_done()
+
+    def _finish_if_done(self) -> None:
+        """すべてのアイテムを処理し終えたらマニフェストを完了にする"""
+        with self._lock:
+            finished = self._input_done and self._pending == 0
+        if not finished:
+            return
+        if self._error:
+            self.checkpoint.write_manifest("failed", error=self._error)
+        else:
+            self.checkpoint.write_manifest("completed")
+
+
+def run_format_jobs(jobs: List[FormatJob], format_item: Callable[[Dict[str, Any]], Union[Optional[Dict[str, Any]], Future]], max_workers: int = 1, queue_size: Optional[int] = None) -> int:
+    """
+    すべてのジョブのアイテムを1つのキューに流し、共通のワーカーで整形する
+
+    入力ファイルは先頭から順に読み込みながらキューへ投入するため、
+    大きなファイルが1つあっても空いたワーカーが次々にそのアイテムを処理する
+
+    Args:
+        jobs: 処理するジョブ
+        format_item: アイテムを整形する関数（失敗時はNoneを返す）。結果が後で決まるアイテム
+            （近似重複の代表の整形待ちなど）にはFutureを返し、ワーカーは完了を待たずに次のアイテムに進む
+        max_workers: ワーカースレッド数
+        queue_size: キューの最大長（省略時はワーカー数の4倍）
+
+    Returns:
+        整形に成功したアイテム数
+    """
+    max_workers = max(1, max_workers)
+    work_queue: "queue.Queue[Optional[Tuple[FormatJob, Dict[str, Any]]]]" = queue.Queue(
+        maxsize=queue_size or max_workers * 4)
+    progress = tqdm(desc="Processing items", unit="item")
+    progress_lock = threading.Lock()
+
+    def put(task: Optional[Tuple[FormatJob, Dict[str, Any]]]) -> bool:
+        """キューに投入する（ワーカーがすべて終了していて取り出されない場合はFalse）"""
+        while True:
+            try:
+                work_queue.put(task, timeout=_PUT_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                if not any(worker.is_alive() for worker in workers):
+                    return False
+
+    def produce() -> None:
+        """すべての入力ファイルからアイテムを読み込んでキューに投入する"""
+        try:
+            for job in jobs:
+                try:
+                    for item in job.iter_pending_items():
+                        if not put((job, item)):
+                            # 投入できなかったアイテムは処理されないため、未処理の件数から除く
+                            job.item_finished()
+                            raise RuntimeError("ワーカーがすべて終了したため整形を中断しました")
+                    job.input_finished()
+                except Exception as e:
+                    print(f"ファイル処理エラー{job.file_path}: {e}")
+                    job.input_finished(str(e))
+        finally:
+            for _ in range(max_workers):
+                if not put(_STOP):
+                    break
+
+    def finish(job: FormatJob, item: Dict[str, Any], formatted_item: Optional[Dict[str, Any]], error: Optional[BaseException] = None) -> None:
+        """整形結果を書き込む（失敗した場合は失敗として記録する）"""
+        try:
+            if formatted_item:
+                job.write(item, formatted_item)
+                title = formatted_item.get("title", "タイトルなし")
+                print(f"成功： \"{title}\"の整形が完了")
+            else:
+                job.fail(f"{type(error).__name__}: {error}" if error is not None else None)
+        except BaseException as e:
+            job.fail(f"{type(e).__name__}: {e}")
+        finally:
+            job.item_finished()
+            with progress_lock:
+                progress.update(1)
+
+    def finish_future(job: FormatJob, item: Dict[str, Any], done: Future) -> None:
+        """後で結果が決まったアイテムの整形結果を書き込む"""
+        error = done.exception()
+        finish(job, item, done.result() if error is None else None, error)
+
+    def work() -> None:
+        """キューからアイテムを取り出して整形する"""
+        while True:
+            task = work_queue.get()
+            if task is _STOP:
+                return
+            job, item = task
+            try:
+                formatted_item = format_item(item)
+            except BaseException as e:
+                # SystemExitなどでワーカーが終了すると残りのアイテムが処理されなくなるため、
+                # 失敗として記録して次のアイテムに進む
+                finish(job, item, None, e)
+                continue
+            if isinstance(formatted_item, Future):
+                # 結果が決まった時点で（近似重複の代表を整形したワーカーで）書き込む
+                formatted_item.add_done_callback(lambda done, job=job, item=item: finish_future(job, item, done))
+                continue
+            finish(job, item, formatted_item)
+
+    producer = threading.Thread(target=produce, name="format-producer", daemon=True)
+    workers = [
+        threading.Thread(target=work, name=f"format-worker-{i}", daemon=True)
+        for i in range(max_workers)
+    ]
+    producer.start()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    producer.join()
+    # ワーカーが途中で終了した場合にキューに残ったアイテムは未処理のまま終える（再開時に処理される）
+    while True:
+        try:
+            task = work_queue.get_nowait()
+        except queue.Empty:
+            break
+        if task is not _STOP:
+            task[0].item_finished()
+    progress.close()
+
+    return sum(job.processed_count for job in jobs)
@@ -0,0 +1,51 @@
+"""
+整形後アイテムのJSONスキーマ
+LLMの構造化出力（Geminiのresponse_schema、Ollamaのformat）に使用する
+"""
+import copy
+from typing import Dict, List, Any, Optional
+from formatting.rule_extractor import (
+    TARGET_FIELDS,
+    GAME_TYPE_MURDER,
+    GAME_TYPE_OTHER,
+    GM_REQUIRED,
+    GM_NOT_REQUIRED,
+    GM_OPTIONAL,
+)
+
+LIKES_BUCKETS: List[str] = ["~100", "100~500", "500~"]
+GAME_TYPES: List[str] = [GAME_TYPE_MURDER, GAME_TYPE_OTHER]
+GM_REQUIRED_VALUES: List[str] = [GM_REQUIRED, GM_NOT_REQUIRED, GM_OPTIONAL]
+
+# LLMが出力するフィールドのスキーマ
+FIELD_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "title": {"type": "string"},
+    "likes": {"type": "string", "enum": LIKES_BUCKETS},
+    "game_type": {"type": "string", "enum": GAME_TYPES},
+    "gm_required": {"type": "string", "enum": GM_REQUIRED_VALUES},
+    "min_players": {"type": "integer"},
+    "max_players": {"type": "integer"},
+    "play_time": {
+        "type": "object",
+        "properties": {"avg": {"type": "integer"}},
+        "required": ["avg"],
+    },
+}
+
+
+def build_response_schema(fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    整形後アイテムのJSONスキーマを構築する
+
+    Args:
+        fields: 含めるフィールド。Noneの場合はLLMが出力する全フィールド
+
+    Returns:
+        JSONスキーマ
+    """
+    targets = [field for field in TARGET_FIELDS if fields is None or field in fields]
+    return {
+        "type": "object",
+        "properties": {field: copy.deepcopy(FIELD_SCHEMAS[field]) for field in targets},
+        "required": targets,
+    }
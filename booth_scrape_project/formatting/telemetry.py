@@ -0,0 +1,240 @@
+"""
+LLM呼び出しのテレメトリ
+呼び出しごとのトークン数・待ち時間・レイテンシ・再試行・解析結果を実行ごとのJSONLに記録し、
+モデルごとのパーセンタイル・アイテムあたりのトークン数・推定コストを集計する
+"""
+import os
+import json
+import time
+import random
+import threading
+from collections import defaultdict
+from typing import Dict, List, Set, Any, Optional
+import config
+from utils.stats import percentile, format_seconds
+
+# 解析結果
+OUTCOME_OK = "ok"
+OUTCOME_PARSE_ERROR = "parse_error"
+OUTCOME_ERROR = "error"
+OUTCOME_HEDGE_LOSER = "hedge_loser"  # ヘッジで採用されなかったリクエスト（トークン・コストは集計に含める）
+
+
+def estimate_cost(model_name: str, prompt_tokens: int, output_tokens: int) -> Optional[float]:
+    """
+    トークン数からコスト（USD）を推定する
+
+    Returns:
+        推定コスト。config.MODEL_PRICINGに単価がないモデルはNone
+    """
+    pricing = config.MODEL_PRICING.get(model_name)
+    if pricing is None:
+        return None
+    input_price, output_price = pricing
+    return (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+class Reservoir:
+    """パーセンタイル計算用に、件数が多い場合は無作為に間引いて一定数のサンプルを保持するクラス"""
+
+    def __init__(self, size: int, seed: int = 0) -> None:
+        self.size = size
+        self.count = 0
+        self.samples: List[float] = []
+        self._random = random.Random(seed)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+            return
+        index = self._random.randrange(self.count)
+        if index < self.size:
+            self.samples[index] = value
+
+
+class ModelStats:
+    """1モデル分の呼び出しの集計（件数・トークン数は累計、レイテンシ・待ち時間はサンプルで保持する）"""
+
+    def __init__(self, model_name: str, samples: int) -> None:
+        self.model_name = model_name
+        self.calls = 0
+        self.items: Set[Any] = set()
+        self.outcomes: Dict[str, int] = defaultdict(int)
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.latencies = Reservoir(samples)
+        self.queue_times = Reservoir(samples)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.calls += 1
+        self.items.add(record.get("item_id"))
+        self.outcomes[record.get("outcome") or ""] += 1
+        if (record.get("attempt") or 0) > 0:
+            self.retries += 1
+        self.prompt_tokens += record.get("prompt_tokens") or 0
+        self.output_tokens += record.get("output_tokens") or 0
+        if record.get("latency") is not None:
+            self.latencies.add(record["latency"])
+        if record.get("queue_time") is not None:
+            self.queue_times.add(record["queue_time"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies, queue_times = self.latencies.samples, self.queue_times.samples
+        cost = estimate_cost(self.model_name, self.prompt_tokens, self.output_tokens)
+        tokens = self.prompt_tokens + self.output_tokens
+        return {
+            "calls": self.calls,
+            "items": len(self.items),
+            "ok": self.outcomes[OUTCOME_OK],
+            "parse_errors": self.outcomes[OUTCOME_PARSE_ERROR],
+            "errors": self.outcomes[OUTCOME_ERROR],
+            "hedge_losers": self.outcomes[OUTCOME_HEDGE_LOSER],
+            "retries": self.retries,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+            "queue_time_p50": percentile(queue_times, 50),
+            "queue_time_p95": percentile(queue_times, 95),
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "tokens_per_item": round(tokens / len(self.items), 1) if self.items else 0.0,
+            "cost_usd": round(cost, 6) if cost is not None else None,
+        }
+
+
+class TelemetryLog:
+    """1回の実行分のLLM呼び出しを記録するクラス"""
+
+    def __init__(self, log_dir: Optional[str] = None, run_id: Optional[str] = None) -> None:
+        """
+        初期化
+
+        Args:
+            log_dir: ログの出力ディレクトリ
+            run_id: 実行ID（省略時は開始時刻とプロセスIDから生成）
+        """
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.log_dir = log_dir or config.TELEMETRY_DIR
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.log_file = os.path.join(self.log_dir, f"{self.run_id}.jsonl")
+        self.summary_file = os.path.join(self.log_dir, f"{self.run_id}.summary.json")
+        self._lock = threading.Lock()
+        self._file = open(self.log_file, "a", encoding="utf-8")
+
+    def record(self, **fields: Any) -> None:
+        """
+        LLM呼び出し1回分を記録する
+
+        Args:
+            fields: item_id、kind、api_type、model、attempt、queue_time、latency、prompt_tokens、
+                output_tokens、outcome、errorなど
+        """
+        record = {"run_id": self.run_id, "timestamp": round(time.time(), 3), **fields}
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def summarize(self) -> Dict[str, Any]:
+        """
+        モデルごとの集計結果を求める
+        呼び出しの記録はメモリに保持せず、書き出したJSONLを1行ずつ読み直して集計する
+        """
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+            size = os.path.getsize(self.log_file)
+
+        by_model: Dict[str, ModelStats] = {}
+        items: Set[Any] = set()
+        calls = 0
+        read = 0
+        with open(self.log_file, "rb") as f:
+            for line in f:
+                # 読み込み中に追記された行は含めない
+                read += len(line)
+                if read > size:
+                    break
+                if not line.strip():
+                    continue
+                record = json.loads(line.decode("utf-8"))
+                key = f"{record.get('api_type')}:{record.get('model')}"
+                if key not in by_model:
+                    by_model[key] = ModelStats(record.get("model") or "", config.TELEMETRY_PERCENTILE_SAMPLES)
+                by_model[key].add(record)
+                items.add(record.get("item_id"))
+                calls += 1
+
+        models = {key: stats.to_dict() for key, stats in by_model.items()}
+        costs = [summary["cost_usd"] for summary in models.values() if summary["cost_usd"] is not None]
+        return {
+            "run_id": self.run_id,
+            "calls": calls,
+            "items": len(items),
+            "cost_usd": round(sum(costs), 6) if costs else None,
+            "models": models,
+        }
+
+    def close(self) -> Dict[str, Any]:
+        """ログを閉じ、集計結果をサマリーファイルに書き出す"""
+        with self._lock:
+            self._file.close()
+        summary = self.summarize()
+        with open(self.summary_file, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    """集計結果を表示する"""
+    if not summary["calls"]:
+        return
+    print(f"LLM呼び出しテレメトリ（実行ID: {summary['run_id']}）:")
+    for key, stats in summary["models"].items():
+        cost = f"${stats['cost_usd']:.4f}" if stats["cost_usd"] is not None else "単価未設定"
+        print(
+            f"  {key}: {stats['calls']}回 / {stats['items']}件 "
+            f"(成功 {stats['ok']}, 解析失敗 {stats['parse_errors']}, エラー {stats['errors']}, 再試行 {stats['retries']}, "
+            f"ヘッジ不採用 {stats['hedge_losers']}), "
+            f"レイテンシ p50 {format_seconds(stats['latency_p50'])} / p95 {format_seconds(stats['latency_p95'])} / "
+            f"p99 {format_seconds(stats['latency_p99'])}, 待ち時間 p95 {format_seconds(stats['queue_time_p95'])}, "
+            f"トークン 入力 {stats['prompt_tokens']} / 出力 {stats['output_tokens']} "
+            f"({stats['tokens_per_item']}/件), 推定コスト {cost}")
+    if summary["cost_usd"] is not None:
+        print(f"  推定コスト合計: ${summary['cost_usd']:.4f}")
+
+
+_current: Optional[TelemetryLog] = None
+_current_lock = threading.Lock()
+
+
+def start_run(log_dir: Optional[str] = None, run_id: Optional[str] = None) -> TelemetryLog:
+    """実行の記録を開始する（以降のrecord_callはこの実行のログに書き込まれる）"""
+    global _current
+    with _current_lock:
+        if _current is not None:
+            _current.close()
+        _current = TelemetryLog(log_dir, run_id)
+        return _current
+
+
+def finish_run() -> Optional[Dict[str, Any]]:
+    """実行の記録を終了し、集計結果を表示して返す"""
+    global _current
+    with _current_lock:
+        log, _current = _current, None
+    if log is None:
+        return None
+    summary = log.close()
+    print_summary(summary)
+    print(f"テレメトリを保存しました: {log.log_file}")
+    return summary
+
+
+def record_call(**fields: Any) -> None:
+    """記録中の実行にLLM呼び出しを記録する（記録中でなければ何もしない）"""
+    log = _current
+    if log is not None:
+        log.record(**fields)
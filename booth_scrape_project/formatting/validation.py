@@ -0,0 +1,80 @@
+"""
+整形後アイテムの検証
+スキーマ（型・列挙値）と整合性ルールを確認し、不正なフィールドとその理由を返す
+"""
+from typing import Dict, List, Any, Optional
+from formatting.rule_extractor import TARGET_FIELDS, GAME_TYPE_MURDER
+from formatting.schema import FIELD_SCHEMAS
+
+# プレイ人数・プレイ時間として妥当な上限
+MAX_PLAYERS_LIMIT = 30
+MAX_PLAY_TIME_LIMIT = 24 * 60
+
+
+def _check_type(value: Any, schema: Dict[str, Any]) -> Optional[str]:
+    """値がスキーマの型・列挙値に合うか確認する"""
+    expected = schema["type"]
+    if expected == "string":
+        if not isinstance(value, str) or not value.strip():
+            return "文字列ではありません"
+    elif expected == "integer":
+        if isinstance(value, bool) or not isinstance(value, int):
+            return "整数ではありません"
+    elif expected == "object":
+        if not isinstance(value, dict):
+            return "オブジェクトではありません"
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key not in value:
+                return f"{key}がありません"
+            reason = _check_type(value[key], sub_schema)
+            if reason:
+                return f"{key}: {reason}"
+        return None
+
+    if "enum" in schema and value not in schema["enum"]:
+        return f"想定外の値です（{'、'.join(schema['enum'])}のいずれか）"
+    return None
+
+
+def validate_formatted_item(item: Dict[str, Any], fields: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    整形後アイテムを検証する
+
+    Args:
+        item: 整形後のアイテム
+        fields: 検証するフィールド（省略時はLLMが出力する全フィールド）
+
+    Returns:
+        不正なフィールド名 -> 理由 の辞書。問題がなければ空の辞書
+    """
+    targets = fields or TARGET_FIELDS
+    errors: Dict[str, str] = {}
+
+    for field in targets:
+        if field not in item or item[field] is None:
+            errors[field] = "値がありません"
+            continue
+        reason = _check_type(item[field], FIELD_SCHEMAS[field])
+        if reason:
+            errors[field] = reason
+
+    # 整合性ルール（型が正しいフィールドのみ確認する）
+    min_players = item.get("min_players") if "min_players" not in errors else None
+    max_players = item.get("max_players") if "max_players" not in errors else None
+    for field, value in (("min_players", min_players), ("max_players", max_players)):
+        if value is not None and not 0 <= value <= MAX_PLAYERS_LIMIT:
+            errors[field] = f"人数が範囲外です（0〜{MAX_PLAYERS_LIMIT}）"
+    if min_players is not None and max_players is not None and "min_players" not in errors and min_players > max_players:
+        errors["min_players"] = "min_playersがmax_playersより大きくなっています"
+        errors.setdefault("max_players", "min_playersがmax_playersより大きくなっています")
+
+    if item.get("game_type") == GAME_TYPE_MURDER and "game_type" not in errors:
+        if max_players == 0 and "max_players" not in errors:
+            errors["max_players"] = "マーダーミステリーなのにプレイ人数が0です"
+
+    play_time = item.get("play_time")
+    if "play_time" not in errors and isinstance(play_time, dict):
+        if not 0 <= play_time["avg"] <= MAX_PLAY_TIME_LIMIT:
+            errors["play_time"] = f"プレイ時間が範囲外です（0〜{MAX_PLAY_TIME_LIMIT}分）"
+
+    return {field: reason for field, reason in errors.items() if field in targets}
@@ -1,73 +1,150 @@
+import os
+import threading
 import subprocess
 from typing import List, Dict, Any, Tuple, Optional
 
-def get_git_status() -> Dict[str, Any]:
+# リポジトリのディレクトリごとの取得結果（同じプロセスでは1回だけgitを実行する）
+_status_cache: Dict[str, Dict[str, Any]] = {}
+_cache_lock = threading.Lock()
+
+# 変更の種類（porcelain v2のXY）ごとの表示
+_CHANGE_LABELS: Dict[str, str] = {"A": "(新規) ", "D": "(削除) ", "T": "(種類変更) "}
+
+
+def _run_git(args: List[str], repo_dir: str) -> str:
+    return subprocess.check_output(["git", *args], cwd=repo_dir, stderr=subprocess.DEVNULL).decode('utf-8')
+
+
+def parse_porcelain_v2(output: str) -> Dict[str, Any]:
+    """
+    git status --porcelain=v2 --branch -z の出力を解析する
+
+    Args:
+        output: NUL区切りの出力
+
+    Returns:
+        Dict[str, Any]: ブランチ・コミット・上流との差と、ステージング済み・未ステージング・競合・未追跡のファイル
+    """
+    result: Dict[str, Any] = {
+        "current_branch": None,
+        "commit": None,
+        "upstream": None,
+        "ahead": 0,
+        "behind": 0,
+        "modified_files": [],
+        "staged_files": [],
+        "conflicted_files": [],
+        "untracked_files": [],
+    }
+    entries: List[str] = output.split("\0")
+    i = 0
+    while i < len(entries):
+        entry = entries[i]
+        i += 1
+        if not entry:
+            continue
+
+        if entry.startswith("# "):
+            key, _, value = entry[2:].partition(" ")
+            if key == "branch.oid":
+                result["commit"] = None if value == "(initial)" else value
+            elif key == "branch.head":
+                result["current_branch"] = "HEAD" if value == "(detached)" else value
+            elif key == "branch.upstream":
+                result["upstream"] = value
+            elif key == "branch.ab":
+                ahead, behind = value.split()
+                result["ahead"], result["behind"] = int(ahead), -int(behind)
+        elif entry.startswith("1 "):
+            # 1 XY sub mH mI mW hH hI path
+            parts = entry.split(" ", 8)
+            _add_change(result, parts[1], parts[8])
+        elif entry.startswith("2 "):
+            # 2 XY sub mH mI mW hH hI Xscore path（-zでは変更前のパスが次の項目になる）
+            parts = entry.split(" ", 9)
+            original = entries[i] if i < len(entries) else ""
+            i += 1
+            _add_change(result, parts[1], parts[9], original, parts[8][0])
+        elif entry.startswith("u "):
+            # u XY sub m1 m2 m3 mW h1 h2 h3 path
+            parts = entry.split(" ", 10)
+            result["conflicted_files"].append(parts[10])
+        elif entry.startswith("? "):
+            result["untracked_files"].append(entry[2:])
+    return result
+
+
+def _add_change(result: Dict[str, Any], xy: str, path: str, original: Optional[str] = None, kind: Optional[str] = None) -> None:
+    """XY（ステージング済み・作業ツリーの変更の種類）に応じてファイルを分類する（MMのように両方に入る場合もある）"""
+    staged, modified = xy[0], xy[1]
+    if staged != ".":
+        if original is not None and staged in ("R", "C"):
+            label = "(名前変更) " if kind == "R" else "(コピー) "
+            result["staged_files"].append(f"{label}{original} -> {path}")
+        else:
+            result["staged_files"].append(_CHANGE_LABELS.get(staged, "") + path)
+    if modified != ".":
+        result["modified_files"].append(_CHANGE_LABELS.get(modified, "") + path)
+
+
+def get_git_status(repo_dir: Optional[str] = None, refresh: bool = False) -> Dict[str, Any]:
     """
     Gitの状態を取得する関数
 
+    git status --porcelain=v2 --branch の1回とgit logの1回だけ実行し、結果はリポジトリのディレクトリごとに
+    プロセス内でキャッシュする（出力ファイルごとに呼び出してもgitは最初の1回だけ実行される）
+
+    Args:
+        repo_dir: リポジトリ内のディレクトリ（省略時はカレントディレクトリ）
+        refresh: キャッシュを使わずに取得し直すかどうか
+
     Returns:
-        Dict[str, Any]: Git状態の情報を含む辞書
+        Dict[str, Any]: Git状態の情報を含む辞書（エラー時は"error"のみ）
     """
-    result: Dict[str, Any] = {}
-    
+    repo_dir = os.path.abspath(repo_dir or os.getcwd())
+    with _cache_lock:
+        if not refresh and repo_dir in _status_cache:
+            return _status_cache[repo_dir]
+
     try:
-        # 現在のブランチを取得
-        branch_cmd: List[str] = ["git", "rev-parse", "--abbrev-ref", "HEAD"]
-        branch: str = subprocess.check_output(branch_cmd).decode('utf-8').strip()
-        result["current_branch"] = branch
-        
-        # 変更ファイルの状態を取得
-        status_cmd: List[str] = ["git", "status", "--porcelain"]
-        status_output: str = subprocess.check_output(status_cmd).decode('utf-8')
-        
-        modified_files: List[str] = []
-        staged_files: List[str] = []
-        untracked_files: List[str] = []
-        
-        for line in status_output.splitlines():
-            if line.startswith("M "):
-                staged_files.append(line[2:])
-            elif line.startswith(" M"):
-                modified_files.append(line[2:])
-            elif line.startswith("??"):
-                untracked_files.append(line[3:])
-            elif line.startswith("A "):
-                staged_files.append(f"(新規) {line[2:]}")
-        
-        result["modified_files"] = modified_files
-        result["staged_files"] = staged_files
-        result["untracked_files"] = untracked_files
-        
-        # 最近のコミット履歴を取得
-        log_cmd: List[str] = ["git", "log", "--oneline", "-n", "5"]
-        log_output: str = subprocess.check_output(log_cmd).decode('utf-8')
-        result["recent_commits"] = log_output.splitlines()
-        
-        return result
-    
+        status_output: str = _run_git(["status", "--porcelain=v2", "--branch", "-z"], repo_dir)
+        result: Dict[str, Any] = parse_porcelain_v2(status_output)
+        result["dirty"] = bool(result["staged_files"] or result["modified_files"] or result["conflicted_files"])
+
+        # 最近のコミット履歴を取得（コミットがまだない場合は空）
+        result["recent_commits"] = _run_git(["log", "--oneline", "-n", "5"], repo_dir).splitlines() if result["commit"] else []
     except subprocess.CalledProcessError as e:
-        return {"error": f"Gitコマンドの実行中にエラーが発生しました: {str(e)}"}
+        result = {"error": f"Gitコマンドの実行中にエラーが発生しました: {str(e)}"}
     except Exception as e:
-        return {"error": f"予期せぬエラーが発生しました: {str(e)}"}
+        result = {"error": f"予期せぬエラーが発生しました: {str(e)}"}
+
+    with _cache_lock:
+        _status_cache[repo_dir] = result
+    return result
+
 
 if __name__ == "__main__":
     status_info: Dict[str, Any] = get_git_status()
-    
+
     print("=== Git状態情報 ===")
+    if "error" in status_info:
+        print(status_info["error"])
     print(f"現在のブランチ: {status_info.get('current_branch', 'エラー')}")
-    
-    print("\n変更済み（未ステージング）:")
-    for file in status_info.get("modified_files", []):
-        print(f"  - {file}")
-    
-    print("\nステージング済み:")
-    for file in status_info.get("staged_files", []):
-        print(f"  - {file}")
-    
-    print("\n未追跡ファイル:")
-    for file in status_info.get("untracked_files", []):
-        print(f"  - {file}")
-    
+    print(f"コミット: {status_info.get('commit') or '-'}")
+    if status_info.get("upstream"):
+        print(f"上流: {status_info['upstream']}（先行 {status_info['ahead']}, 遅れ {status_info['behind']}）")
+
+    sections: List[Tuple[str, str]] = [
+        ("modified_files", "変更済み（未ステージング）"),
+        ("staged_files", "ステージング済み"),
+        ("conflicted_files", "競合"),
+        ("untracked_files", "未追跡ファイル"),
+    ]
+    for key, label in sections:
+        print(f"\n{label}:")
+        for file in status_info.get(key, []):
+            print(f"  - {file}")
+
     print("\n最近のコミット:")
     for commit in status_info.get("recent_commits", []):
-        print(f"  {commit}")
\ No newline at end of file
+        print(f"  {commit}")
@@ -1,33 +1,52 @@
 """
 BOOTHスクレイピングのエントリポイント
+
+起動（--helpを含む）を速くするため、スクレイピング（requests・bs4・Playwright）や整形（tqdm・APIクライアント）などの
+機能のモジュールは、それを使うサブコマンドの中で読み込む
 """
 import os
+import glob
+import time
+import json
 import argparse
-from typing import List, Dict, Any, Optional
-
-# スクレイピング機能
-from scraping.booth_scraper import BoothScraper
-# 整形機能
-from formatting.json_formatter import process_file
-# ユーティリティ
-from utils.data_utils import save_to_json, format_item_data, append_to_json
+from collections import deque
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Deque, TYPE_CHECKING
+
+# ユーティリティ（標準ライブラリのみに依存する軽いもの）
+from utils.storage import TABLE_ITEMS, TABLE_FORMATTED
 # 設定
 import config
 
+if TYPE_CHECKING:
+    from utils.storage import ItemStore
+
 
-def scrape_booth(keyword: str, start_page: int = 1, end_page: int = 1, output_dir: str = "data") -> List[Dict[str, Any]]:
+def scrape_booth(keyword: str, start_page: int = 1, end_page: int = 1, output_dir: str = "data", metrics_port: Optional[int] = None, db_path: Optional[str] = None, thumbnail_dir: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     BOOTHからデータをスクレイピングする
 
+    ステージ別のメトリクスは終了時に表示し、出力ファイル名にconfig.CRAWL_METRICS_SUFFIXを付けたJSONに保存する
+
     Args:
         keyword: 検索キーワード
         start_page: 開始ページ
         end_page: 終了ページ
         output_dir: 出力ディレクトリ
+        metrics_port: 指定した場合はこのポートでPrometheus形式の/metricsを公開する
+        db_path: 指定した場合は収集した商品をこのデータベースにもupsertする（ページごとにまとめて書き込む）
+        thumbnail_dir: 指定した場合はサムネイル画像をこのディレクトリにダウンロードし、
+            商品にthumbnail_path・thumbnail_sha256を加える（次の商品ページの取得と並行して実行する）
 
     Returns:
         収集したデータのリスト
     """
+    from scraping.booth_scraper import BoothScraper
+    from scraping.metrics import MetricsServer, get_metrics, STAGE_WRITE
+    from utils.data_utils import save_to_json, format_item_data, append_to_json
+    from utils.profiling import mark_stage
+    from utils.manifest import write_manifest
+
     # 保存先ディレクトリを作成
     os.makedirs(output_dir, exist_ok=True)
 
@@ -36,6 +55,30 @@ def scrape_booth(keyword: str, start_page: int = 1, end_page: int = 1, output_di
 
     # スクレイパーを初期化
     scraper = BoothScraper()
+    metrics = get_metrics()
+    metrics_server = None
+    if metrics_port is not None:
+        metrics_server = MetricsServer(metrics, metrics_port)
+        metrics_server.start()
+    store = writer = None
+    if db_path:
+        from utils.storage import ItemStore, BatchWriter
+        store = ItemStore(db_path)
+        # ページの商品をまとめて1つのトランザクションで書き込む
+        writer = BatchWriter(store, TABLE_ITEMS, batch_size=10**9, keyword=keyword)
+    downloader = None
+    if thumbnail_dir:
+        from scraping.thumbnails import ThumbnailStore, ThumbnailDownloader
+        downloader = ThumbnailDownloader(ThumbnailStore(thumbnail_dir), metrics=metrics)
+    # サムネイルの取得を待っている商品（収集した順に書き込む）
+    pending: Deque[Future] = deque()
+
+    def write_item(item: Dict[str, Any]) -> None:
+        with metrics.stage(STAGE_WRITE):
+            append_to_json(item, output_file)
+            # 取得に失敗した商品で保存済みの値を上書きしない
+            if writer is not None and item.get("title") != "取得エラー":
+                writer.add(item)
 
     # 収集データを保持するリスト
     all_items: List[Dict[str, Any]] = []
@@ -50,11 +93,12 @@ def scrape_booth(keyword: str, start_page: int = 1, end_page: int = 1, output_di
             item_links = scraper.get_item_links_from_search(search_url)
 
             print(f"ページ {page} から {len(item_links)} 件のアイテムリンクを取得しました")
+            mark_stage(f"page {page} search")
 
             # 各アイテムページをスクレイピング
             for item_link in item_links:
                 # ランダムな待機時間
-                scraper.wait_random_time()
+                scraper.wait_random_time(config.ITEM_WAIT_TIME_MIN, config.ITEM_WAIT_TIME_MAX)
 
                 # アイテムページのスクレイピング（全ての詳細情報を取得）
                 item_data = scraper.scrape_item_page(item_link)
@@ -62,7 +106,21 @@ def scrape_booth(keyword: str, start_page: int = 1, end_page: int = 1, output_di
                     # データを整形して追加
                     formatted_item = format_item_data(item_data)
                     all_items.append(formatted_item)
-                    append_to_json(formatted_item, output_file)
+                    if downloader is None:
+                        write_item(formatted_item)
+                    else:
+                        # サムネイルは次の商品ページを取得している間にダウンロードし、済んだ商品から書き込む
+                        pending.append(downloader.submit(formatted_item))
+                        while pending and pending[0].done():
+                            write_item(pending.popleft().result())
+
+            while pending:
+                write_item(pending.popleft().result())
+            if writer is not None:
+                with metrics.stage(STAGE_WRITE):
+                    writer.flush()
+
+            mark_stage(f"page {page} items")
 
             # ページ間の待機時間
             if page < end_page:
@@ -75,6 +133,8 @@ def scrape_booth(keyword: str, start_page: int = 1, end_page: int = 1, output_di
 
     except KeyboardInterrupt:
         print("\nユーザーによる中断が検出されました。ここまでのデータを保存します。")
+        if downloader is not None:
+            downloader.close(cancel_pending=True)
         save_to_json(all_items, f"{output_dir}/booth_data_interrupted.json")
         return all_items
 
@@ -86,24 +146,111 @@ def scrape_booth(keyword: str, start_page: int = 1, end_page: int = 1, output_di
             print("NO,Item. So dont save.")
         return all_items
 
-
-def format_booth_data(input_file: str, output_dir: str = "formatted", api_type: str = "gemini") -> None:
+    finally:
+        metrics.print_summary()
+        # 出力ディレクトリはformat・indexの入力になるため、商品のファイルと区別できる名前にする
+        metrics_file = output_file + config.CRAWL_METRICS_SUFFIX
+        metrics.write_summary(metrics_file)
+        print(f"クロールのメトリクスを保存しました: {metrics_file}")
+        if os.path.exists(output_file):
+            parameters = {
+                "keyword": keyword, "start_page": start_page, "end_page": end_page,
+                "db_path": db_path, "thumbnail_dir": thumbnail_dir,
+            }
+            print(f"実行マニフェストを保存しました: {write_manifest(output_file, 'scrape', parameters, items=len(all_items))}")
+        if downloader is not None:
+            downloader.close()
+            downloader.print_summary()
+        if store is not None:
+            writer.flush()
+            store.close()
+            print(f"データベースに{writer.written}件を保存しました: {db_path}")
+        if metrics_server is not None:
+            metrics_server.stop()
+
+
+def format_booth_data(input_file: str, output_dir: str = "formatted", api_type: str = "gemini", resume: bool = True, max_workers: int = 1, delay: float = 4, model_name: Optional[str] = None, cascade: Optional[str] = None, dedup: bool = True, hedge: bool = False, db_path: Optional[str] = None) -> None:
     """
     収集したBOOTHデータをAI APIを使用して整形する
 
     Args:
-        input_file: 入力ファイル
+        input_file: 入力ファイル（ディレクトリの場合は配下のすべてのJSONファイル）
         output_dir: 出力ディレクトリ
-        api_type: 使用するAPIタイプ ("gemini" or "ollama")
+        api_type: 使用するAPIタイプ ("gemini"、"ollama"、"replay")
+        resume: 整形済みのアイテムを読み飛ばして再開するかどうか（Falseの場合は最初から整形し直す）
+        max_workers: 並列に整形するワーカー数
+        delay: 実行全体でのAPIリクエスト間の最小間隔（秒）
+        model_name: 使用するモデル（省略時はAPIタイプごとのデフォルト）
+        cascade: 順に試すモデルの指定（"api:model" のカンマ区切り）。省略時はconfig.FORMAT_CASCADE
+        dedup: 近似重複のアイテムをまとめ、代表だけを整形するかどうか
+        hedge: 応答が遅いリクエストに予備のリクエストを重ね、先に返った方を使うかどうか
+        db_path: 指定した場合は整形済みのアイテムをこのデータベースにもupsertする
     """
+    from formatting.json_formatter import process_file, process_directory
+    from formatting.api.ollama import print_ollama_stats
+    from formatting.cascade import parse_cascade, validate_tiers
+
     # デフォルトモデル設定
-    model_name = "gemini-2.0-flash-001" if api_type == "gemini" else "gemma3:12b"
+    if model_name is None:
+        model_name = "gemini-2.0-flash-001" if api_type == "gemini" else "gemma3:12b"
+
+    # モデルカスケード設定（未指定の場合は単一モデル）
+    tiers = parse_cascade(cascade) if cascade else validate_tiers(list(config.FORMAT_CASCADE))
+    if tiers:
+        print("モデルカスケード: " + " → ".join(f"{api}:{model}" for api, model in tiers))
 
     # ファイル処理
-    processed_count = process_file(
-        input_file, output_dir, api_type, model_name)
+    if os.path.isdir(input_file):
+        processed_count = process_directory(
+            input_file, output_dir, api_type, model_name,
+            max_workers=max_workers, delay=delay, resume=resume, cascade=tiers, dedup=dedup, hedge=hedge, db_path=db_path)
+    else:
+        processed_count = process_file(
+            input_file, output_dir, api_type, model_name,
+            delay=delay, resume=resume, max_workers=max_workers, cascade=tiers, dedup=dedup, hedge=hedge, db_path=db_path)
     print(f"{processed_count}件のデータを整形しました")
 
+    if api_type == "ollama" or any(api == "ollama" for api, _ in tiers):
+        print_ollama_stats()
+
+
+def index_files(store: "ItemStore", paths: List[str], table: str = TABLE_ITEMS) -> int:
+    """
+    JSON・JSONLファイル（ディレクトリの場合は中の*.json・*.jsonl）の商品をデータベースに登録する
+
+    TABLE_ITEMSに登録した商品は全文検索インデックスにも追加される
+
+    Args:
+        store: 登録先のデータベース
+        paths: ファイルまたはディレクトリのリスト
+        table: TABLE_ITEMS（スクレイピングした商品）またはTABLE_FORMATTED（整形済みのアイテム）
+
+    Returns:
+        登録した件数
+    """
+    from utils.data_utils import iter_json_items, is_item_file
+    from utils.storage import BatchWriter
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                file for file in glob.glob(os.path.join(path, "*.json")) + glob.glob(os.path.join(path, "*.jsonl"))
+                if is_item_file(file)))
+        else:
+            files.append(path)
+
+    count = 0
+    for file_path in files:
+        writer = BatchWriter(store, table, batch_size=config.INDEX_BATCH_SIZE)
+        for item in iter_json_items(file_path):
+            if item.get("title") != "取得エラー":
+                writer.add(item)
+        writer.flush()
+        print(f"{file_path}: {writer.written}件を登録しました")
+        count += writer.written
+    return count
+
 
 def main() -> None:
     """メイン処理"""
@@ -122,25 +269,224 @@ def main() -> None:
         '--end', '-e', type=int, default=1, help='終了ページ')
     scrape_parser.add_argument(
         '--output', '-o', default='data', help='出力ディレクトリ')
+    scrape_parser.add_argument(
+        '--metrics-port', type=int, help='指定したポートでクロールのメトリクス（/metrics）を公開する')
+    scrape_parser.add_argument(
+        '--profile', action='store_true',
+        help='CPU・メモリ・asyncioタスクのプロファイルを収集する（出力先はconfig.PROFILE_DIR）')
+    scrape_parser.add_argument(
+        '--db', help='収集した商品をupsertするSQLiteデータベース')
+    scrape_parser.add_argument(
+        '--thumbnails', nargs='?', const=config.THUMBNAIL_DIR,
+        help=f'サムネイル画像をダウンロードするディレクトリ（値を省略した場合は{config.THUMBNAIL_DIR}）')
 
     # フォーマットコマンド
     format_parser = subparsers.add_parser('format', help='スクレイピングしたデータをフォーマット')
-    format_parser.add_argument('--input', '-i', required=True, help='入力ファイル')
+    format_parser.add_argument(
+        '--input', '-i', required=True, help='入力ファイル（ディレクトリ指定時は配下のすべてのJSONファイル）')
     format_parser.add_argument(
         '--output', '-o', default='formatted', help='出力ディレクトリ')
     format_parser.add_argument(
-        '--api', '-a', choices=['gemini', 'ollama'], default='gemini', help='使用するAPI')
+        '--api', '-a', choices=['gemini', 'ollama', 'replay'], default='gemini',
+        help='使用するAPI（replayは環境変数LLM_REPLAY_FILEの記録済み応答を再生する）')
+    format_parser.add_argument(
+        '--model', '-m', help='使用するモデル（省略時はAPIごとのデフォルト）')
+    format_parser.add_argument(
+        '--cascade', '-c',
+        help='小さいモデルから順に試すカスケード（例: ollama:gemma3:4b,ollama:gemma3:12b,gemini:gemini-2.0-flash-001）')
+    format_parser.add_argument(
+        '--workers', '-w', type=int, default=1, help='並列に整形するワーカー数')
+    format_parser.add_argument(
+        '--delay', '-d', type=float, default=4, help='APIリクエスト間の最小間隔（秒、全ワーカー共通）')
+    resume_group = format_parser.add_mutually_exclusive_group()
+    resume_group.add_argument(
+        '--resume', dest='resume', action='store_true', default=True,
+        help='整形済みのアイテムを読み飛ばして再開する（デフォルト）')
+    resume_group.add_argument(
+        '--force', dest='resume', action='store_false',
+        help='既存の出力を削除して最初から整形し直す')
+    format_parser.add_argument(
+        '--no-dedup', dest='dedup', action='store_false',
+        help='近似重複のアイテムをまとめず、すべてのアイテムを個別に整形する')
+    format_parser.add_argument(
+        '--profile', action='store_true',
+        help='CPU・メモリのプロファイルを収集する（出力先はconfig.PROFILE_DIR）')
+    format_parser.add_argument(
+        '--hedge', action='store_true',
+        help='応答がp95を過ぎても返らないリクエストに予備のリクエストを重ねる（追加負荷の上限はconfig.HEDGE_MAX_EXTRA_RATIO）')
+    format_parser.add_argument(
+        '--db', help='整形済みのアイテムをupsertするSQLiteデータベース')
+
+    # サムネイルのダウンロードコマンド（スクレイピング済みのファイル向け）
+    thumbnails_parser = subparsers.add_parser('thumbnails', help='スクレイピングしたファイルの商品のサムネイル画像をダウンロード')
+    thumbnails_parser.add_argument(
+        '--input', '-i', required=True, help='スクレイピングしたJSONファイル')
+    thumbnails_parser.add_argument(
+        '--output', '-o', help='thumbnail_path・thumbnail_sha256を加えたJSONの出力先（省略時は入力ファイルを上書き）')
+    thumbnails_parser.add_argument(
+        '--dir', '-d', default=config.THUMBNAIL_DIR, help='画像の保存先ディレクトリ')
+    thumbnails_parser.add_argument(
+        '--workers', '-w', type=int, default=config.THUMBNAIL_WORKERS, help='並列にダウンロードするワーカー数')
+
+    # 書き出しコマンド
+    export_parser = subparsers.add_parser('export', help='商品をJSON・JSONL・Parquet・Arrowに書き出す')
+    export_source = export_parser.add_mutually_exclusive_group(required=True)
+    export_source.add_argument(
+        '--db', help='SQLiteデータベース')
+    export_source.add_argument(
+        '--input', '-i', help='整形済みのJSON・JSONLファイル（Parquet・Arrowへの書き出しのみ）')
+    export_parser.add_argument(
+        '--output', '-o', required=True,
+        help='出力ファイル（拡張子で形式を決める: .jsonl、.parquet、.arrow・.feather、それ以外はJSON配列）')
+    export_parser.add_argument(
+        '--table', '-t', choices=[TABLE_ITEMS, TABLE_FORMATTED], default=TABLE_FORMATTED,
+        help='書き出すテーブル（itemsはスクレイピングした商品、formatted_itemsは整形済みのアイテム）')
+
+    # 集計コマンド
+    stats_parser = subparsers.add_parser('stats', help='Parquet・Arrowに書き出した整形済みアイテムの分布を集計')
+    stats_parser.add_argument(
+        '--input', '-i', required=True, help='exportで書き出した.parquet・.arrow・.featherファイル')
+    stats_parser.add_argument(
+        '--output', '-o', help='集計結果を保存するJSONファイル')
+
+    # 検索インデックスの作成コマンド
+    index_parser = subparsers.add_parser('index', help='商品をデータベースに登録して全文検索インデックスを作成・更新')
+    index_parser.add_argument(
+        '--db', default=config.SEARCH_DB_PATH, help='SQLiteデータベース（scrape・formatの--dbと共有できる）')
+    index_parser.add_argument(
+        '--input', '-i', nargs='*', default=[], help='スクレイピングしたJSON・JSONLファイルまたはディレクトリ')
+    index_parser.add_argument(
+        '--formatted', '-f', nargs='*', default=[], help='整形済みのJSON・JSONLファイルまたはディレクトリ（人数・プレイ時間などの条件に使う）')
+    index_parser.add_argument(
+        '--rebuild', action='store_true', help='データベースのすべての商品で検索インデックスを作り直す')
+
+    # 検索コマンド
+    search_parser = subparsers.add_parser('search', help='商品をタイトル・作者・説明文と価格・人数・スキ数などの条件で検索')
+    search_parser.add_argument(
+        'query', nargs='?', default='', help='検索語（空白区切りですべてを含む商品、省略時は条件のみで検索）')
+    search_parser.add_argument(
+        '--db', default=config.SEARCH_DB_PATH, help='SQLiteデータベース')
+    search_parser.add_argument('--min-price', type=int, help='最低価格（円）')
+    search_parser.add_argument('--max-price', type=int, help='最高価格（円）')
+    search_parser.add_argument('--players', type=int, help='遊べる人数（整形済みのアイテムの最小・最大人数で判定）')
+    search_parser.add_argument('--max-play-time', type=int, help='最大プレイ時間（分）')
+    search_parser.add_argument('--min-likes', type=int, help='最低スキ数')
+    search_parser.add_argument('--game-type', help='ゲーム種別（例: マーダーミステリー）')
+    search_parser.add_argument('--gm', dest='gm_required', help='GMの要否（例: 不要）')
+    search_parser.add_argument('--author', help='作者名（完全一致）')
+    search_parser.add_argument('--limit', '-n', type=int, default=20, help='最大件数')
+    search_parser.add_argument('--json', action='store_true', help='結果をJSONで出力する')
+
+    # 評価コマンド
+    eval_parser = subparsers.add_parser('eval', help='正解付きのデータでモデル・プロンプトごとの整形の品質と速度を評価')
+    eval_parser.add_argument(
+        '--gold', '-g', default=config.EVAL_GOLD_FILE, help='正解付きのデータ（{"input", "output"}のリストのJSON）')
+    eval_parser.add_argument(
+        '--models', '-m', default='ollama:gemma3:12b',
+        help='評価するモデル（例: ollama:gemma3:4b,ollama:gemma3:12b,gemini:gemini-2.0-flash-001、replay:<名前>で記録済み応答を再生）')
+    eval_parser.add_argument(
+        '--variants', '-v', default='rules', help='評価するプロンプトの種類（rules・rules_uncompacted・full のカンマ区切り）')
+    eval_parser.add_argument(
+        '--replay', help='記録済みの応答ファイル（指定時は環境変数LLM_REPLAY_FILEとして使う）')
+    eval_parser.add_argument(
+        '--include-examples', action='store_true', help='プロンプトの例（get_examples()）も評価に含める')
+    eval_parser.add_argument(
+        '--workers', '-w', type=int, default=1, help='並列に整形するワーカー数')
+    eval_parser.add_argument(
+        '--delay', '-d', type=float, default=0, help='APIリクエスト間の最小間隔（秒）')
+    eval_parser.add_argument(
+        '--output', '-o', default=config.EVAL_OUTPUT_DIR, help='評価結果の出力ディレクトリ')
 
     args = parser.parse_args()
 
     if args.command == 'scrape':
-        scrape_booth(args.keyword, args.start, args.end, args.output)
+        from utils.profiling import profile_run
+        with profile_run('scrape', args.profile):
+            scrape_booth(args.keyword, args.start, args.end, args.output, args.metrics_port, args.db, args.thumbnails)
         print("\nスクレイピング完了")
 
     elif args.command == 'format':
-        format_booth_data(args.input, args.output, args.api)
+        from utils.profiling import profile_run
+        with profile_run('format', args.profile):
+            format_booth_data(args.input, args.output, args.api,
+                              args.resume, args.workers, args.delay,
+                              args.model, args.cascade, args.dedup, args.hedge, args.db)
         print("\nフォーマット完了")
 
+    elif args.command == 'thumbnails':
+        from scraping.thumbnails import ThumbnailStore, ThumbnailDownloader
+        from utils.data_utils import save_to_json, load_from_json
+        items = load_from_json(args.input)
+        with ThumbnailDownloader(ThumbnailStore(args.dir), args.workers) as downloader:
+            downloader.download_all(items)
+        downloader.print_summary()
+        save_to_json(items, args.output or args.input)
+
+    elif args.command == 'export':
+        from utils.columnar import export_columnar
+        from utils.data_utils import iter_json_items
+        from utils.storage import ItemStore
+        columnar = os.path.splitext(args.output)[1].lower() in ('.parquet', '.arrow', '.feather')
+        if args.input:
+            if not columnar:
+                parser.error('--inputは.parquet・.arrow・.featherへの書き出しにのみ指定できます')
+            count = export_columnar(iter_json_items(args.input), args.output)
+        else:
+            with ItemStore(args.db) as store:
+                if columnar:
+                    if args.table != TABLE_FORMATTED:
+                        parser.error(f'Parquet・Arrowに書き出せるのは{TABLE_FORMATTED}のみです')
+                    count = export_columnar(store.iter_items(TABLE_FORMATTED), args.output, store.get_likes_counts())
+                else:
+                    count = store.export(args.output, args.table)
+        print(f"{count}件を書き出しました: {args.output}")
+
+    elif args.command == 'stats':
+        from utils.columnar import compute_stats, print_stats, write_stats
+        stats = compute_stats(args.input)
+        print_stats(stats)
+        if args.output:
+            write_stats(stats, args.output)
+            print(f"集計結果を保存しました: {args.output}")
+
+    elif args.command == 'index':
+        from utils.storage import ItemStore
+        with ItemStore(args.db) as store:
+            index_files(store, args.input, TABLE_ITEMS)
+            index_files(store, args.formatted, TABLE_FORMATTED)
+            if args.rebuild:
+                print(f"検索インデックスを作り直しました: {store.rebuild_search_index()}件")
+            print(f"登録済み: 商品 {store.count(TABLE_ITEMS)}件, 整形済み {store.count(TABLE_FORMATTED)}件 ({args.db})")
+
+    elif args.command == 'search':
+        from utils.search_index import format_result
+        from utils.storage import ItemStore
+        if not os.path.exists(args.db):
+            parser.error(f'データベースがありません: {args.db}（indexまたはscrape --dbで作成してください）')
+        with ItemStore(args.db) as store:
+            started_at = time.perf_counter()
+            results = store.search(
+                args.query, args.limit, min_price=args.min_price, max_price=args.max_price,
+                players=args.players, max_play_time=args.max_play_time, min_likes=args.min_likes,
+                game_type=args.game_type, gm_required=args.gm_required, author=args.author)
+            elapsed = time.perf_counter() - started_at
+        if args.json:
+            print(json.dumps(results, ensure_ascii=False, indent=2))
+        else:
+            for i, result in enumerate(results, 1):
+                heading, details = format_result(result)
+                print(f"{i}. {heading}\n   {details}")
+            print(f"{len(results)}件 ({elapsed * 1000:.1f}ミリ秒)")
+
+    elif args.command == 'eval':
+        from formatting.cascade import parse_cascade
+        from formatting.evaluation import run_evaluation
+        if args.replay:
+            os.environ['LLM_REPLAY_FILE'] = args.replay
+        variants = [name.strip() for name in args.variants.split(',') if name.strip()]
+        run_evaluation(args.gold, parse_cascade(args.models), variants,
+                       args.include_examples, args.workers, args.delay, args.output)
+
     else:
         parser.print_help()
 
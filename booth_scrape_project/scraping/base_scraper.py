@@ -5,34 +5,45 @@ import requests
 from bs4 import BeautifulSoup
 import time
 import random
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union
+import config
+from scraping.metrics import CrawlMetrics, get_metrics, classify_error, STAGE_WAIT
 
 class BaseScraper:
     """汎用Webスクレイパーの基底クラス"""
     
-    def __init__(self, headers: Optional[Dict[str, str]] = None) -> None:
+    def __init__(self, headers: Optional[Dict[str, str]] = None, metrics: Optional[CrawlMetrics] = None, timeout: Optional[Union[float, Tuple[float, float]]] = None) -> None:
         """初期化"""
+        self.metrics = metrics or get_metrics()
+        # 応答が止まった接続でクロール全体が止まらないようにする（タイムアウトはメトリクスに"timeout"として記録される）
+        self.timeout = timeout if timeout is not None else config.PAGE_TIMEOUT
         self.headers = headers or {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
         }
     
-    def get_page(self, url: str) -> Optional[BeautifulSoup]:
+    def get_page(self, url: str, stage: str = "page_fetch") -> Optional[BeautifulSoup]:
         """
         指定されたURLからページのHTMLを取得し、BeautifulSoupオブジェクトとして返す
         
         Args:
             url: 取得するページのURL
+            stage: メトリクスに記録するステージ名
             
         Returns:
             BeautifulSoupオブジェクト、エラー時はNone
         """
+        started_at = time.perf_counter()
+        nbytes = 0
         try:
-            response = requests.get(url, headers=self.headers)
+            response = requests.get(url, headers=self.headers, timeout=self.timeout)
+            nbytes = len(response.content)
             response.raise_for_status()
+            self.metrics.observe(stage, time.perf_counter() - started_at, nbytes=nbytes)
             return BeautifulSoup(response.text, "html.parser")
         except Exception as e:
+            self.metrics.observe(stage, time.perf_counter() - started_at, classify_error(e), nbytes)
             print(f"ページの取得エラー: {url} - {str(e)}")
             return None
 
@@ -46,4 +57,5 @@ class BaseScraper:
         """
         wait_time = random.uniform(min_time, max_time)
         print(f"{wait_time:.1f}秒待機中...")
-        time.sleep(wait_time)
\ No newline at end of file
+        with self.metrics.stage(STAGE_WAIT):
+            time.sleep(wait_time)
\ No newline at end of file
@@ -7,6 +7,7 @@ from bs4 import BeautifulSoup
 import re
 from scraping.base_scraper import BaseScraper
 from scraping.interaction.likes import get_booth_likes
+from scraping.metrics import STAGE_SEARCH_FETCH, STAGE_ITEM_FETCH, STAGE_PARSE, STAGE_LIKES
 import config
 
 class BoothScraper(BaseScraper):
@@ -45,10 +46,15 @@ class BoothScraper(BaseScraper):
             商品リンクのリスト（URLのみを含む）
         """
         print(f"検索ページにアクセス中: {search_url}")
-        soup = self.get_page(search_url)
+        soup = self.get_page(search_url, STAGE_SEARCH_FETCH)
         if not soup:
             return []
-            
+        
+        with self.metrics.stage(STAGE_PARSE):
+            return self._parse_item_links(soup)
+    
+    def _parse_item_links(self, soup: BeautifulSoup) -> List[Dict[str, str]]:
+        """検索結果ページのHTMLから商品リンクを抽出する"""
         # ページタイトルを表示
         page_title = soup.title.text if soup.title else "タイトルなし"
         print(f"ページタイトル: {page_title}")
@@ -94,7 +100,7 @@ class BoothScraper(BaseScraper):
         url = item_info["url"]
         print(f"商品ページにアクセス中: {url}")
         
-        soup = self.get_page(url)
+        soup = self.get_page(url, STAGE_ITEM_FETCH)
         if not soup:
             # エラー時も最低限の情報は返す
             item_info.update({
@@ -107,6 +113,38 @@ class BoothScraper(BaseScraper):
             })
             return item_info
         
+        with self.metrics.stage(STAGE_PARSE):
+            details = self._parse_item_details(soup)
+        
+        # スキの数取得（ブラウザで動的に読み込むため解析とは別に計測する）
+        with self.metrics.stage(STAGE_LIKES):
+            likes = get_booth_likes(url)
+        if likes is None:
+            self.metrics.record_error(STAGE_LIKES, "not_found")
+        
+        # 詳細データを更新
+        item_info.update({
+            "title": details["title"],
+            "price": details["price"],
+            "likes": likes,
+            "author": details["author"],
+            "description": details["description"],
+            "thumbnail_url": details["thumbnail_url"]
+        })
+        
+        print(f"収集完了: {details['title']} (スキ数: {likes})")
+        return item_info
+    
+    def _parse_item_details(self, soup: BeautifulSoup) -> Dict[str, Any]:
+        """
+        商品ページのHTMLからスキ数以外の詳細情報を抽出する
+        
+        Args:
+            soup: 商品ページのBeautifulSoupオブジェクト
+            
+        Returns:
+            タイトル、価格、作者、説明、サムネイルURLを含む辞書
+        """
         # タイトル取得
         title = "不明"
         # まずはページのtitleタグから取得を試みる
@@ -140,9 +178,6 @@ class BoothScraper(BaseScraper):
             if price_digits:
                 price = int(price_digits)
         
-        # スキの数取得
-        likes = get_booth_likes(url)
-        
         # 作者情報取得
         author = "不明"
         author_elem = soup.select_one(".shop-name") or soup.select_one(".u-text-ellipsis")
@@ -204,15 +239,10 @@ class BoothScraper(BaseScraper):
                     if thumbnail_url:
                         break
         
-        # 詳細データを更新
-        item_info.update({
+        return {
             "title": title,
             "price": price,
-            "likes": likes,
             "author": author,
             "description": description,
             "thumbnail_url": thumbnail_url
-        })
-        
-        print(f"収集完了: {title} (スキ数: {likes})")
-        return item_info
\ No newline at end of file
+        }
\ No newline at end of file
@@ -3,9 +3,12 @@ BOOTHページのスキ数を取得するモジュール
 Playwrightを使用してページから動的に読み込まれる「スキ」数を取得します
 """
 import asyncio
-from typing import Optional
-from playwright.async_api import async_playwright, Page, Browser, BrowserContext, Playwright
+from typing import Optional, TYPE_CHECKING
 import re
+from utils.profiling import run_with_task_timing
+
+if TYPE_CHECKING:
+    from playwright.async_api import Page, Browser, BrowserContext, Playwright
 
 async def get_booth_likes_async(url: str) -> Optional[int]:
     """
@@ -17,6 +20,9 @@ async def get_booth_likes_async(url: str) -> Optional[int]:
     Returns:
         int or None: スキ数、取得できない場合はNone
     """
+    # Playwrightの読み込みは重いため、スキ数を取得するときに読み込む
+    from playwright.async_api import async_playwright
+
     async with async_playwright() as p:
         browser: Browser = await p.chromium.launch(headless=True)
         context: BrowserContext = await browser.new_context(
@@ -78,4 +84,5 @@ def get_booth_likes(url: str) -> Optional[int]:
     Returns:
         int or None: スキ数、取得できない場合はNone
     """
-    return asyncio.run(get_booth_likes_async(url))
\ No newline at end of file
+    # プロファイル中はブラウザ起動などのasyncioタスクの所要時間も記録する
+    return asyncio.run(run_with_task_timing(get_booth_likes_async(url)))
\ No newline at end of file
@@ -0,0 +1,247 @@
+"""
+クロールのステージ別メトリクス
+検索ページ取得・商品ページ取得・解析・スキ数取得・書き込み・待機・サムネイル取得の各ステージについて、
+件数・レイテンシのヒストグラム・転送バイト数・エラー種別を集計し、
+Prometheus形式の/metricsエンドポイントと実行終了時のJSONサマリーで出力する
+"""
+import json
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional, Iterator, Deque
+
+import requests
+
+from utils.stats import percentile, format_seconds
+
+STAGE_SEARCH_FETCH = "search_fetch"
+STAGE_ITEM_FETCH = "item_fetch"
+STAGE_PARSE = "parse"
+STAGE_LIKES = "likes"
+STAGE_WRITE = "write"
+STAGE_WAIT = "wait"
+STAGE_THUMBNAIL = "thumbnail"
+
+# レイテンシのヒストグラムのバケット（秒）
+LATENCY_BUCKETS: List[float] = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+# パーセンタイルの計算に使う直近の観測値の件数
+_RECENT_SAMPLES = 10000
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    例外をエラー種別に分類する
+
+    Returns:
+        "http_4xx"、"http_5xx"、"timeout"、"connection"、またはその他の例外のクラス名
+    """
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return f"http_{error.response.status_code // 100}xx"
+    if isinstance(error, requests.Timeout):
+        return "timeout"
+    if isinstance(error, requests.ConnectionError):
+        return "connection"
+    return type(error).__name__
+
+
+class StageStats:
+    """1つのステージの集計値"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_seconds = 0.0
+        self.bytes = 0
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recent: Deque[float] = deque(maxlen=_RECENT_SAMPLES)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+
+
+class CrawlMetrics:
+    """クロールのステージ別メトリクスを集計するクラス"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stages: Dict[str, StageStats] = defaultdict(StageStats)
+        self.started_at = time.time()
+
+    def observe(self, stage: str, seconds: float, error: Optional[str] = None, nbytes: int = 0) -> None:
+        """
+        ステージの1回分の処理を記録する
+
+        Args:
+            stage: ステージ名
+            seconds: 所要時間
+            error: エラー種別（成功した場合はNone）
+            nbytes: 転送したバイト数
+        """
+        with self._lock:
+            stats = self._stages[stage]
+            stats.observe(seconds)
+            stats.bytes += nbytes
+            if error is not None:
+                stats.errors[error] += 1
+
+    def record_error(self, stage: str, error: str) -> None:
+        """処理時間とは別にステージのエラーだけを記録する（値が取得できなかった場合など）"""
+        with self._lock:
+            self._stages[stage].errors[error] += 1
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        """ブロックの所要時間をステージに記録する（例外はエラー種別として記録して再送出する）"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.observe(stage, time.perf_counter() - started_at, classify_error(e))
+            raise
+        self.observe(stage, time.perf_counter() - started_at)
+
+    def summary(self) -> Dict[str, Any]:
+        """ステージごとの集計結果を求める"""
+        with self._lock:
+            stages = {name: stats for name, stats in self._stages.items()}
+            total = sum(stats.total_seconds for stats in stages.values())
+            result: Dict[str, Any] = {
+                "started_at": self.started_at,
+                "elapsed_seconds": round(time.time() - self.started_at, 3),
+                "stage_seconds_total": round(total, 3),
+                "stages": {},
+            }
+            for name, stats in stages.items():
+                recent = list(stats.recent)
+                result["stages"][name] = {
+                    "count": stats.count,
+                    "errors": dict(stats.errors),
+                    "total_seconds": round(stats.total_seconds, 3),
+                    "time_share": round(stats.total_seconds / total, 3) if total else 0.0,
+                    "avg_seconds": round(stats.total_seconds / stats.count, 4) if stats.count else None,
+                    "p50_seconds": percentile(recent, 50),
+                    "p95_seconds": percentile(recent, 95),
+                    "max_seconds": round(max(recent), 4) if recent else None,
+                    "bytes": stats.bytes,
+                }
+            return result
+
+    def to_prometheus(self) -> str:
+        """Prometheusのテキスト形式で出力する"""
+        lines = [
+            "# HELP booth_crawl_stage_duration_seconds Time spent per crawl stage.",
+            "# TYPE booth_crawl_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            for name, stats in stages:
+                for bound, count in zip(LATENCY_BUCKETS, stats.bucket_counts):
+                    lines.append(f'booth_crawl_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'booth_crawl_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {stats.count}')
+                lines.append(f'booth_crawl_stage_duration_seconds_sum{{stage="{name}"}} {stats.total_seconds:.6f}')
+                lines.append(f'booth_crawl_stage_duration_seconds_count{{stage="{name}"}} {stats.count}')
+
+            lines += [
+                "# HELP booth_crawl_stage_errors_total Errors per crawl stage and error class.",
+                "# TYPE booth_crawl_stage_errors_total counter",
+            ]
+            for name, stats in stages:
+                for error, count in sorted(stats.errors.items()):
+                    lines.append(f'booth_crawl_stage_errors_total{{stage="{name}",error="{error}"}} {count}')
+
+            lines += [
+                "# HELP booth_crawl_bytes_total Bytes transferred per crawl stage.",
+                "# TYPE booth_crawl_bytes_total counter",
+            ]
+            for name, stats in stages:
+                lines.append(f'booth_crawl_bytes_total{{stage="{name}"}} {stats.bytes}')
+        return "\n".join(lines) + "\n"
+
+    def write_summary(self, output_file: str) -> Dict[str, Any]:
+        """集計結果をJSONファイルに書き出す"""
+        summary = self.summary()
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
+
+    def print_summary(self) -> None:
+        """ステージごとの集計結果を表示する"""
+        summary = self.summary()
+        if not summary["stages"]:
+            return
+        print("クロールのステージ別統計:")
+        for name, stats in sorted(summary["stages"].items(), key=lambda entry: -entry[1]["total_seconds"]):
+            errors = ", ".join(f"{error} {count}件" for error, count in stats["errors"].items()) or "なし"
+            print(
+                f"  {name}: {stats['count']}回, 合計 {stats['total_seconds']}秒 ({stats['time_share']:.1%}), "
+                f"p50 {format_seconds(stats['p50_seconds'])} / p95 {format_seconds(stats['p95_seconds'])}, "
+                f"{stats['bytes']}バイト, エラー {errors}")
+
+
+class MetricsServer:
+    """メトリクスをHTTPで公開するローカルサーバー（/metricsはPrometheus形式、/metrics.jsonはJSON）"""
+
+    def __init__(self, metrics: CrawlMetrics, port: int, host: str = "127.0.0.1") -> None:
+        """
+        初期化
+
+        Args:
+            metrics: 公開するメトリクス
+            port: 待ち受けるポート
+            host: 待ち受けるアドレス（デフォルトはローカルのみ）
+        """
+        handler = self._make_handler(metrics)
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True)
+
+    @staticmethod
+    def _make_handler(metrics: CrawlMetrics) -> type:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path == "/metrics":
+                    body = metrics.to_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(metrics.summary(), ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                # アクセスログでクロールの進捗表示が埋もれないようにする
+                pass
+
+        return Handler
+
+    def start(self) -> None:
+        """バックグラウンドで待ち受けを開始する"""
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        print(f"メトリクスを公開しています: http://{host}:{port}/metrics")
+
+    def stop(self) -> None:
+        """待ち受けを終了する"""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+_metrics = CrawlMetrics()
+
+
+def get_metrics() -> CrawlMetrics:
+    """プロセス内で共有するクロールのメトリクスを取得する"""
+    return _metrics
@@ -0,0 +1,255 @@
+"""
+サムネイル画像のダウンロード
+商品のthumbnail_urlの画像を複数スレッドで並行してダウンロードし、内容のSHA-256をファイル名にして保存する
+（同じ画像は1つのファイルにまとまる）。URLごとのETag・Last-Modifiedを記録し、再実行時は条件付きリクエストで
+変更がなければ再ダウンロードしない。保存先のパスとハッシュは商品のthumbnail_path・thumbnail_sha256に書き戻す
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, List, Any, Optional
+
+import requests
+
+import config
+from scraping.metrics import CrawlMetrics, get_metrics, classify_error, STAGE_THUMBNAIL
+from utils.rate_limiter import RateLimiter
+
+# Content-Typeごとの拡張子
+_EXTENSIONS: Dict[str, str] = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+# ダウンロード結果の種類
+RESULT_DOWNLOADED = "downloaded"      # 新しい画像を保存した
+RESULT_DUPLICATE = "duplicate"        # 別のURLで保存済みの画像と同じ内容だった
+RESULT_NOT_MODIFIED = "not_modified"  # 条件付きリクエストで変更がなかった（304）
+RESULT_FAILED = "failed"
+
+
+class ThumbnailStore:
+    """
+    内容のハッシュをファイル名にして画像を保存するディレクトリ
+
+    画像は objects/<ハッシュの先頭2文字>/<ハッシュ><拡張子> に保存し、
+    URLごとのハッシュ・ETag・Last-Modifiedは index.json に記録する
+    """
+
+    def __init__(self, root: str) -> None:
+        """
+        初期化（index.jsonがあれば読み込む）
+
+        Args:
+            root: 保存先のディレクトリ
+        """
+        self.root = root
+        self.index_file = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """URLの記録を取得する（画像のファイルがない場合はNone）"""
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is None or not os.path.exists(entry["path"]):
+            return None
+        return dict(entry)
+
+    def put(self, url: str, content: bytes, content_type: Optional[str], etag: Optional[str], last_modified: Optional[str]) -> Dict[str, Any]:
+        """
+        画像を保存してURLの記録を更新する
+
+        Returns:
+            URLの記録（sha256、path、etag、last_modified）と、同じ内容の画像が保存済みだったかどうかのduplicate
+        """
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = os.path.join(self.root, "objects", sha256[:2], sha256 + _guess_extension(url, content_type))
+        duplicate = os.path.exists(path)
+        if not duplicate:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 書きかけのファイルが残らないよう一時ファイルに書いてから置き換える
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        entry = {
+            "sha256": sha256,
+            "path": path,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with self._lock:
+            self._entries[url] = entry
+        return {**entry, "duplicate": duplicate}
+
+    def touch(self, url: str) -> None:
+        """条件付きリクエストで変更がなかったURLの確認日時を更新する"""
+        with self._lock:
+            if url in self._entries:
+                self._entries[url]["fetched_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def save(self) -> None:
+        """URLの記録をindex.jsonに保存する"""
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:
+            entries = dict(self._entries)
+        temp_file = self.index_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.index_file)
+
+
+def _guess_extension(url: str, content_type: Optional[str]) -> str:
+    """Content-TypeまたはURLから画像の拡張子を決める"""
+    if content_type:
+        extension = _EXTENSIONS.get(content_type.split(";")[0].strip().lower())
+        if extension:
+            return extension
+    extension = os.path.splitext(urllib.parse.urlparse(url).path)[1].lower()
+    return extension if extension in _EXTENSIONS.values() or extension == ".jpeg" else ""
+
+
+class ThumbnailDownloader:
+    """
+    サムネイル画像を並行してダウンロードするクラス
+
+    ワーカー間で1つのRateLimiterを共有して画像サーバーへのリクエスト間隔を保ち、
+    同じURL（ショップのアイコンなど）は実行中に1回だけ取得する
+    """
+
+    def __init__(self, store: ThumbnailStore, max_workers: Optional[int] = None, rate_limiter: Optional[RateLimiter] = None, metrics: Optional[CrawlMetrics] = None) -> None:
+        """
+        初期化
+
+        Args:
+            store: 画像の保存先
+            max_workers: 並列にダウンロードするワーカー数（省略時はconfig.THUMBNAIL_WORKERS）
+            rate_limiter: リクエスト間隔を保つレートリミッター（省略時はconfig.THUMBNAIL_INTERVAL秒間隔）
+            metrics: 取得時間・転送バイト数・エラーを記録するメトリクス
+        """
+        self.store = store
+        self.rate_limiter = rate_limiter or RateLimiter(config.THUMBNAIL_INTERVAL)
+        self.metrics = metrics or get_metrics()
+        self.headers = {**config.HEADERS, "Accept": "image/avif,image/webp,image/*,*/*;q=0.8"}
+        self.results: Dict[str, int] = {
+            RESULT_DOWNLOADED: 0, RESULT_DUPLICATE: 0, RESULT_NOT_MODIFIED: 0, RESULT_FAILED: 0}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __enter__(self) -> "ThumbnailDownloader":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self, cancel_pending: bool = False) -> None:
+        """
+        実行中のダウンロードを待ってURLの記録を保存する
+
+        Args:
+            cancel_pending: 開始していないダウンロードを取り消すかどうか（中断時）
+        """
+        self._executor.shutdown(wait=True, cancel_futures=cancel_pending)
+        self.store.save()
+
+    def submit(self, item: Dict[str, Any]) -> Future:
+        """
+        商品のサムネイルのダウンロードを開始する
+
+        完了すると商品のthumbnail_path・thumbnail_sha256を設定する（取得できなかった場合はNone）
+
+        Returns:
+            完了すると商品を返すFuture
+        """
+        url = item.get("thumbnail_url")
+        done: Future = Future()
+        if not url:
+            item["thumbnail_path"] = item["thumbnail_sha256"] = None
+            done.set_result(item)
+            return done
+
+        with self._lock:
+            future = self._futures.get(url)
+            if future is None:
+                future = self._futures[url] = self._executor.submit(self._download, url)
+
+        def write_back(download: Future) -> None:
+            entry = None if download.cancelled() else download.result()
+            item["thumbnail_path"] = entry["path"] if entry else None
+            item["thumbnail_sha256"] = entry["sha256"] if entry else None
+            done.set_result(item)
+
+        future.add_done_callback(write_back)
+        return done
+
+    def download_all(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """商品のサムネイルをまとめてダウンロードし、すべて完了するまで待つ"""
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    def _session(self) -> requests.Session:
+        # 接続を再利用するため、スレッドごとにセッションを持つ
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers.update(self.headers)
+        return session
+
+    def _download(self, url: str) -> Optional[Dict[str, Any]]:
+        """画像を取得して保存する（保存済みの場合は条件付きリクエストで変更を確認する）"""
+        cached = self.store.get(url)
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        self.rate_limiter.acquire()
+        started_at = time.perf_counter()
+        nbytes = 0
+        try:
+            response = self._session().get(url, headers=headers, timeout=config.THUMBNAIL_TIMEOUT)
+            nbytes = len(response.content)
+            if response.status_code == 304 and cached is not None:
+                self.store.touch(url)
+                result, entry = RESULT_NOT_MODIFIED, cached
+            else:
+                response.raise_for_status()
+                entry = self.store.put(
+                    url, response.content, response.headers.get("Content-Type"),
+                    response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                result = RESULT_DUPLICATE if entry.pop("duplicate") else RESULT_DOWNLOADED
+            self.metrics.observe(STAGE_THUMBNAIL, time.perf_counter() - started_at, nbytes=nbytes)
+        except Exception as e:
+            self.metrics.observe(STAGE_THUMBNAIL, time.perf_counter() - started_at, classify_error(e), nbytes)
+            print(f"サムネイルの取得エラー: {url} - {str(e)}")
+            # 取得に失敗しても保存済みの画像があればそれを使う
+            result, entry = RESULT_FAILED, cached
+
+        with self._lock:
+            self.results[result] += 1
+        return entry
+
+    def print_summary(self) -> None:
+        """ダウンロード結果の件数を表示する"""
+        with self._lock:
+            results = dict(self.results)
+            urls = len(self._futures)
+        print(
+            f"サムネイル: {urls}URL（新規 {results[RESULT_DOWNLOADED]}件, 保存済みと同じ内容 {results[RESULT_DUPLICATE]}件, "
+            f"変更なし {results[RESULT_NOT_MODIFIED]}件, 失敗 {results[RESULT_FAILED]}件） 保存先: {self.store.root}")
@@ -0,0 +1,105 @@
+"""
+オフラインベンチマークの共通設定
+記録済みのBOOTHのページ（tests/fixtures/booth）とLLMの応答（tests/fixtures/llm）を使い、
+ネットワークなしでスクレイピング・整形の処理時間を計測してbaselines.jsonの基準値と比較する
+
+    python -m pytest tests/benchmarks -q
+    BENCHMARK_UPDATE_BASELINES=1 python -m pytest tests/benchmarks -q   # 基準値を更新
+    BENCHMARK_TOLERANCE=3.0 python -m pytest tests/benchmarks -q        # 基準値の何倍まで許容するか
+"""
+import os
+import json
+import threading
+from typing import Dict, Any, Callable
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "fixtures")
+BOOTH_FIXTURES_DIR = os.path.join(FIXTURES_DIR, "booth")
+LLM_FIXTURES_DIR = os.path.join(FIXTURES_DIR, "llm")
+BASELINES_FILE = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+_baselines_lock = threading.Lock()
+
+
+def read_fixture(name: str) -> str:
+    """記録済みのページを読み込む"""
+    with open(os.path.join(BOOTH_FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _load_baselines() -> Dict[str, float]:
+    if not os.path.exists(BASELINES_FILE):
+        return {}
+    with open(BASELINES_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def check_baseline(benchmark: Any) -> Callable[[], None]:
+    """
+    計測した平均時間をbaselines.jsonの基準値と比較する関数を返す
+
+    基準値のBENCHMARK_TOLERANCE倍（デフォルト2倍）を超えた場合に失敗とする。
+    BENCHMARK_UPDATE_BASELINES=1の場合は比較せずに基準値を書き換える
+    """
+    def check() -> None:
+        stats = getattr(benchmark, "stats", None)
+        if stats is None:
+            # --benchmark-disableなどで計測していない場合
+            return
+        mean = stats.stats.mean
+        name = benchmark.name
+        with _baselines_lock:
+            baselines = _load_baselines()
+            if os.getenv("BENCHMARK_UPDATE_BASELINES") == "1":
+                baselines[name] = round(mean, 6)
+                with open(BASELINES_FILE, "w", encoding="utf-8") as f:
+                    json.dump(dict(sorted(baselines.items())), f, ensure_ascii=False, indent=2)
+                    f.write("\n")
+                return
+        baseline = baselines.get(name)
+        if baseline is None:
+            pytest.fail(f"{name} の基準値がありません。BENCHMARK_UPDATE_BASELINES=1 で記録してください。")
+        tolerance = float(os.getenv("BENCHMARK_TOLERANCE", "2.0"))
+        assert mean <= baseline * tolerance, (
+            f"{name}: 平均 {mean * 1000:.2f}ms が基準値 {baseline * 1000:.2f}ms の{tolerance}倍を超えました")
+
+    return check
+
+
+class FixtureResponse:
+    """記録済みのページを返すrequests.Responseの代わり"""
+
+    def __init__(self, text: str, status_code: int = 200) -> None:
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.status_code = status_code
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code}", response=self)  # type: ignore[arg-type]
+
+
+@pytest.fixture
+def offline_booth(monkeypatch: pytest.MonkeyPatch) -> None:
+    """BOOTHへのリクエストとスキ数の取得を記録済みのページに差し替える"""
+    import scraping.base_scraper
+    import scraping.booth_scraper
+
+    pages = {"search": read_fixture("search.html")}
+    for name in os.listdir(BOOTH_FIXTURES_DIR):
+        if name.startswith("item_") and name.endswith(".html"):
+            pages[str(1000 + int(name[5:-5]))] = read_fixture(name)
+
+    def fake_get(url: str, headers: Any = None, **kwargs: Any) -> FixtureResponse:
+        key = "search" if "/search/" in url else url.rstrip("/").rsplit("/", 1)[-1]
+        if key not in pages:
+            return FixtureResponse("", 404)
+        return FixtureResponse(pages[key])
+
+    monkeypatch.setattr(scraping.base_scraper.requests, "get", fake_get)
+    monkeypatch.setattr(scraping.booth_scraper, "get_booth_likes", lambda url: 42)
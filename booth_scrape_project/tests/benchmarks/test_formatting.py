@@ -0,0 +1,87 @@
+"""
+整形のベンチマーク（プロンプトの構築・応答の解析と、記録済みの応答を使った整形全体）
+"""
+import os
+import json
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+import config
+from formatting import json_formatter
+from formatting.json_formatter import (
+    API_TYPE_REPLAY, build_prompt, extract_json_from_response, get_examples, process_file, resolve_with_rules)
+from tests.benchmarks.conftest import BOOTH_FIXTURES_DIR, LLM_FIXTURES_DIR
+
+ITEMS_FILE = os.path.join(BOOTH_FIXTURES_DIR, "items.json")
+RESPONSES_FILE = os.path.join(LLM_FIXTURES_DIR, "responses.jsonl")
+
+
+def _load_items() -> List[Dict[str, Any]]:
+    with open(ITEMS_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_build_prompt(benchmark: Any, check_baseline: Callable[[], None]) -> None:
+    items = _load_items()
+    examples = get_examples()
+
+    def build_all() -> List[str]:
+        prompts = []
+        for item in items:
+            known, pending = resolve_with_rules(item)
+            prompts.append(build_prompt(examples, item, pending or None, known))
+        return prompts
+
+    prompts = benchmark(build_all)
+
+    assert len(prompts) == len(items)
+    assert all(json.dumps(item["title"], ensure_ascii=False) in prompt for item, prompt in zip(items, prompts))
+    check_baseline()
+
+
+def test_extract_json_from_response(benchmark: Any, check_baseline: Callable[[], None]) -> None:
+    with open(RESPONSES_FILE, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    # コードブロックで囲まれた応答・前後に説明のある応答も含める
+    responses = [record["response"] for record in records]
+    responses += [f"```json\n{response}\n```" for response in responses]
+    responses += [f"整形結果は以下のとおりです。\n{response}\n以上です。" for response in responses[:len(records)]]
+
+    parsed = benchmark(lambda: [extract_json_from_response(response) for response in responses])
+
+    assert all(result is not None for result in parsed)
+    assert parsed[0]["title"] == parsed[len(records)]["title"] == "霧雨の洋館"
+    check_baseline()
+
+
+@pytest.fixture
+def replay_env(tmp_path: Any, monkeypatch: pytest.MonkeyPatch) -> Any:
+    """記録済みの応答で整形し、テレメトリなどの出力を一時ディレクトリに書く"""
+    monkeypatch.setenv("LLM_REPLAY_FILE", RESPONSES_FILE)
+    monkeypatch.delenv("LLM_RECORD_FILE", raising=False)
+    monkeypatch.setattr(config, "TELEMETRY_DIR", str(tmp_path / "telemetry"))
+    monkeypatch.setattr(config, "PARSE_ERROR_LOG", str(tmp_path / "parse_errors.log"))
+    return tmp_path
+
+
+def test_process_file_replay(benchmark: Any, replay_env: Any, check_baseline: Callable[[], None]) -> None:
+    examples = get_examples()
+    runs = iter(range(1000))
+
+    def run() -> str:
+        output_dir = str(replay_env / f"out{next(runs)}")
+        processed = process_file(ITEMS_FILE, output_dir, API_TYPE_REPLAY, "replay", examples, delay=0, resume=False)
+        assert processed == 8
+        return os.path.join(output_dir, "items.json")
+
+    output_file = benchmark.pedantic(run, rounds=5, iterations=1)
+
+    with open(output_file, "r", encoding="utf-8") as f:
+        formatted = {item["id"]: item for item in json.load(f)}
+    assert formatted["1000"]["title"] == "霧雨の洋館"
+    assert formatted["1000"]["min_players"] == 5 and formatted["1000"]["play_time"] == {"avg": 180}
+    assert formatted["1003"]["game_type"] == "その他"
+    # ルールで確定できないアイテムは記録済みの応答で整形される
+    assert formatted["1006"]["max_players"] == 6 and formatted["1006"]["play_time"] == {"avg": 150}
+    check_baseline()
@@ -0,0 +1,52 @@
+"""
+スクレイピングのベンチマーク（記録済みの検索ページ・商品ページを解析する）
+"""
+from typing import Any, Callable
+
+from bs4 import BeautifulSoup
+
+from scraping.booth_scraper import BoothScraper
+from scraping.metrics import CrawlMetrics
+from tests.benchmarks.conftest import read_fixture
+
+
+def test_get_item_links_from_search(benchmark: Any, offline_booth: None, check_baseline: Callable[[], None]) -> None:
+    scraper = BoothScraper()
+    scraper.metrics = CrawlMetrics()
+    search_url = scraper.get_search_url("マーダーミステリー")
+
+    links = benchmark(scraper.get_item_links_from_search, search_url)
+
+    assert len(links) == 24
+    assert links[0] == {"url": f"{scraper.base_url}/ja/items/1000", "id": "1000"}
+    check_baseline()
+
+
+def test_scrape_item_page(benchmark: Any, offline_booth: None, check_baseline: Callable[[], None]) -> None:
+    scraper = BoothScraper()
+    scraper.metrics = CrawlMetrics()
+
+    def scrape_all() -> list:
+        return [scraper.scrape_item_page({"url": f"{scraper.base_url}/ja/items/{1000 + i}", "id": str(1000 + i)}) for i in range(8)]
+
+    items = benchmark(scrape_all)
+
+    assert [item["price"] for item in items] == [500 * (i + 1) for i in range(8)]
+    assert items[0]["title"] == "マーダーミステリー「霧雨の洋館」"
+    assert items[0]["likes"] == 42
+    # セクション構造の説明文は見出し付きで連結される
+    assert "**あらすじ**" in items[1]["description"]
+    # 説明文の要素がないページは商品詳細全体から取得し、ナビゲーションは除く
+    assert "ホーム" not in items[2]["description"] and "HO1" in items[2]["description"]
+    check_baseline()
+
+
+def test_parse_item_details(benchmark: Any, check_baseline: Callable[[], None]) -> None:
+    scraper = BoothScraper()
+    html = read_fixture("item_1.html")
+
+    details = benchmark(lambda: scraper._parse_item_details(BeautifulSoup(html, "html.parser")))
+
+    assert details["author"] == "サークル1"
+    assert details["thumbnail_url"] == "https://booth.pximg.net/c/300x300/1/main.jpg"
+    check_baseline()
@@ -0,0 +1,31 @@
+"""
+保存処理のベンチマーク（出力ファイルが大きくなっても追記の時間が変わらないことを確かめる）
+"""
+import os
+import json
+import shutil
+from typing import Any, Callable
+
+import pytest
+
+from utils.data_utils import append_to_json, save_to_json
+from tests.benchmarks.conftest import BOOTH_FIXTURES_DIR
+
+
+@pytest.mark.parametrize("existing_items", [10, 1000, 10000])
+def test_append_to_json(benchmark: Any, tmp_path: Any, existing_items: int, check_baseline: Callable[[], None]) -> None:
+    with open(os.path.join(BOOTH_FIXTURES_DIR, "items.json"), "r", encoding="utf-8") as f:
+        items = json.load(f)
+    seed_file = str(tmp_path / "seed.json")
+    save_to_json([items[i % len(items)] for i in range(existing_items)], seed_file)
+    output_file = str(tmp_path / "output" / "items.json")
+    os.makedirs(os.path.dirname(output_file))
+
+    def setup() -> None:
+        shutil.copyfile(seed_file, output_file)
+
+    benchmark.pedantic(append_to_json, args=(items[0], output_file), setup=setup, rounds=20, iterations=1)
+
+    with open(output_file, "r", encoding="utf-8") as f:
+        assert len(json.load(f)) == existing_items + 1
+    check_baseline()
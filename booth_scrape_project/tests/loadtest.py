@@ -0,0 +1,184 @@
+"""
+ローカルのモックサーバーに対する負荷試験
+モックのBOOTH・Ollamaを起動してscrape_boothとprocess_fileを実行し、
+スループット（件/秒）とレイテンシのパーセンタイルを報告する
+
+    python -m tests.loadtest --pages 2 --items-per-page 24 --rate-429 0.05 --workers 4
+"""
+import os
+import re
+import glob
+import json
+import time
+import argparse
+import tempfile
+from typing import Dict, List, Any, Optional
+
+import requests
+from bs4 import BeautifulSoup
+
+import config
+from tests.mock_servers import MockBoothServer, MockOllamaServer
+from utils.stats import format_seconds
+
+
+def get_likes_over_http(url: str) -> Optional[int]:
+    """
+    スキ数のボタンをHTTPで取得したHTMLから読み取る（--browser-likesを指定しない場合に使う）
+
+    ブラウザの起動時間で負荷試験の結果が埋もれないようにするためのもので、
+    モックサーバーのページにはスキ数が静的に埋め込まれている
+    """
+    response = requests.get(url, headers=config.HEADERS)
+    if response.status_code >= 400:
+        return None
+    button = BeautifulSoup(response.text, "html.parser").select_one("#js-item-wishlist-button")
+    match = re.search(r"\d+", button.text) if button else None
+    return int(match.group()) if match else None
+
+
+def run_scrape(args: argparse.Namespace, output_dir: str) -> Dict[str, Any]:
+    """モックのBOOTHに対してscrape_boothを実行する"""
+    import scraping.booth_scraper
+    from main import scrape_booth
+    from scraping.metrics import get_metrics
+
+    if not args.browser_likes:
+        scraping.booth_scraper.get_booth_likes = get_likes_over_http
+
+    started_at = time.perf_counter()
+    items = scrape_booth(args.keyword, 1, args.pages, output_dir)
+    elapsed = time.perf_counter() - started_at
+    return {
+        "items": len(items),
+        "seconds": round(elapsed, 3),
+        "items_per_second": round(len(items) / elapsed, 2) if elapsed else None,
+        "stages": get_metrics().summary()["stages"],
+    }
+
+
+def run_format(args: argparse.Namespace, input_file: str, output_dir: str) -> Dict[str, Any]:
+    """モックのOllamaに対してprocess_fileを実行する"""
+    from formatting.json_formatter import process_file, API_TYPE_OLLAMA
+
+    if args.force_llm:
+        # ルールで確定できるフィールドもLLMに問い合わせ、全件をモデルサーバーに流す
+        config.RULE_CONFIDENCE_THRESHOLD = 1.01
+
+    started_at = time.perf_counter()
+    processed = process_file(
+        input_file, output_dir, API_TYPE_OLLAMA, args.model, delay=args.delay, resume=False,
+        max_workers=args.workers, dedup=args.dedup, hedge=args.hedge)
+    elapsed = time.perf_counter() - started_at
+
+    summaries = sorted(glob.glob(os.path.join(config.TELEMETRY_DIR, "*.summary.json")), key=os.path.getmtime)
+    telemetry: Dict[str, Any] = {}
+    if summaries:
+        with open(summaries[-1], "r", encoding="utf-8") as f:
+            telemetry = json.load(f)
+    return {
+        "items": processed,
+        "seconds": round(elapsed, 3),
+        "items_per_second": round(processed / elapsed, 2) if elapsed else None,
+        "llm": telemetry.get("models", {}),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """負荷試験の結果を表示する"""
+    print("\n負荷試験の結果:")
+    scrape = report.get("scrape")
+    if scrape:
+        print(f"  スクレイピング: {scrape['items']}件 / {scrape['seconds']}秒 ({scrape['items_per_second']}件/秒)")
+        for name, stats in scrape["stages"].items():
+            errors = ", ".join(f"{error} {count}件" for error, count in stats["errors"].items()) or "なし"
+            print(
+                f"    {name}: {stats['count']}回, p50 {format_seconds(stats['p50_seconds'], 3)} / "
+                f"p95 {format_seconds(stats['p95_seconds'], 3)} / 最大 {format_seconds(stats['max_seconds'], 3)}, エラー {errors}")
+    formatting = report.get("format")
+    if formatting:
+        print(f"  整形: {formatting['items']}件 / {formatting['seconds']}秒 ({formatting['items_per_second']}件/秒)")
+        for key, stats in formatting["llm"].items():
+            print(
+                f"    {key}: {stats['calls']}回 (エラー {stats['errors']}, 再試行 {stats['retries']}), "
+                f"p50 {format_seconds(stats['latency_p50'], 3)} / p95 {format_seconds(stats['latency_p95'], 3)} / "
+                f"p99 {format_seconds(stats['latency_p99'], 3)}, 待ち時間 p95 {format_seconds(stats['queue_time_p95'], 3)}")
+    for name, stats in report["servers"].items():
+        status = ", ".join(f"{code}: {count}件" for code, count in stats["status"].items())
+        print(f"  {name}: {stats['requests']}リクエスト ({status})")
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    """負荷試験のエントリポイント"""
+    parser = argparse.ArgumentParser(description="モックサーバーに対するスクレイピング・整形の負荷試験")
+    parser.add_argument('--output', '-o', help='出力ディレクトリ（省略時は一時ディレクトリ）')
+    parser.add_argument('--keyword', default='マーダーミステリー', help='検索キーワード')
+    parser.add_argument('--pages', type=int, default=1, help='スクレイピングするページ数')
+    parser.add_argument('--items-per-page', type=int, default=24, help='検索ページ1ページあたりの商品数')
+    parser.add_argument('--latency', type=float, default=0.05, help='BOOTHのモックの応答までの待ち時間（秒）')
+    parser.add_argument('--jitter', type=float, default=0.05, help='待ち時間に加える乱数の幅（秒）')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='BOOTHのモックがHTTP 429を返す割合')
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help='BOOTHのモックがHTTP 503を返す割合')
+    parser.add_argument('--browser-likes', action='store_true', help='スキ数をPlaywrightで取得する（既定はHTTPで取得）')
+    parser.add_argument('--tokens-per-second', type=float, default=100.0, help='Ollamaのモックのトークン生成速度')
+    parser.add_argument('--prompt-latency', type=float, default=0.2, help='Ollamaのモックの最初のトークンまでの待ち時間（秒）')
+    parser.add_argument('--num-parallel', type=int, default=2, help='Ollamaのモックが同時に生成するリクエスト数（0で無制限）')
+    parser.add_argument('--ollama-rate-429', type=float, default=0.0, help='Ollamaのモックが HTTP 429 を返す割合')
+    parser.add_argument('--ollama-rate-5xx', type=float, default=0.0, help='Ollamaのモックが HTTP 503 を返す割合')
+    parser.add_argument('--model', default='gemma3:12b', help='リクエストに指定するモデル名')
+    parser.add_argument('--workers', '-w', type=int, default=4, help='整形の並列ワーカー数')
+    parser.add_argument('--delay', type=float, default=0.0, help='APIリクエスト間の最小間隔（秒）')
+    parser.add_argument('--force-llm', action='store_true', help='ルールで確定できるアイテムもLLMで整形する')
+    parser.add_argument('--dedup', action='store_true', help='近似重複のアイテムをまとめる（既定は全件を整形）')
+    parser.add_argument('--hedge', action='store_true', help='応答が遅いリクエストに予備のリクエストを重ねる')
+    parser.add_argument('--skip-scrape', action='store_true', help='スクレイピングを実行しない（--inputが必要）')
+    parser.add_argument('--input', '-i', help='整形する入力ファイル（省略時はスクレイピングの出力）')
+    parser.add_argument('--skip-format', action='store_true', help='整形を実行しない')
+    parser.add_argument('--seed', type=int, help='エラー注入の乱数のシード')
+    args = parser.parse_args(argv)
+
+    output_dir = args.output or tempfile.mkdtemp(prefix="booth-loadtest-")
+    os.makedirs(output_dir, exist_ok=True)
+
+    booth = MockBoothServer(
+        items_per_page=args.items_per_page, pages=args.pages, latency=args.latency, jitter=args.jitter,
+        rate_429=args.rate_429, rate_5xx=args.rate_5xx, seed=args.seed).start()
+    ollama = MockOllamaServer(
+        tokens_per_second=args.tokens_per_second, prompt_latency=args.prompt_latency, num_parallel=args.num_parallel,
+        rate_429=args.ollama_rate_429, rate_5xx=args.ollama_rate_5xx, seed=args.seed).start()
+    print(f"BOOTHのモック: {booth.url}, Ollamaのモック: {ollama.url}/api, 出力先: {output_dir}")
+
+    # 実行中の設定をモックサーバー向けに切り替える
+    config.BASE_URL = booth.url
+    config.WAIT_TIME_MIN = config.WAIT_TIME_MAX = 0.0
+    config.ITEM_WAIT_TIME_MIN = config.ITEM_WAIT_TIME_MAX = 0.0
+    config.TELEMETRY_DIR = os.path.join(output_dir, "telemetry")
+    config.PARSE_ERROR_LOG = os.path.join(output_dir, "json_parse_error.log")
+    os.environ["OLLAMA_API_URL"] = f"{ollama.url}/api"
+    os.environ.pop("OLLAMA_API_URLS", None)
+    config.OLLAMA_API_URLS = []
+
+    report: Dict[str, Any] = {"output_dir": output_dir, "settings": vars(args)}
+    try:
+        input_file = args.input
+        if not args.skip_scrape:
+            report["scrape"] = run_scrape(args, os.path.join(output_dir, "data"))
+            input_file = input_file or os.path.join(
+                output_dir, "data", f"booth_data_{args.keyword}_page_1-{args.pages}.json")
+        if not args.skip_format and input_file:
+            report["format"] = run_format(args, input_file, os.path.join(output_dir, "formatted"))
+    finally:
+        report["servers"] = {"booth": booth.get_stats(), "ollama": ollama.get_stats()}
+        booth.stop()
+        ollama.stop()
+
+    print_report(report)
+    report_file = os.path.join(output_dir, "loadtest_report.json")
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました: {report_file}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
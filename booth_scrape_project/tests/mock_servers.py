@@ -0,0 +1,318 @@
+"""
+負荷試験用のローカルモックサーバー
+BOOTH（検索ページ・商品ページ）とOllamaの/api/generateを模倣し、
+レイテンシ・HTTP 429・5xxの注入と、トークンの生成速度を設定できる
+"""
+import os
+import re
+import json
+import time
+import random
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from formatting.api.replay import ReplayProvider
+from formatting.rule_extractor import bucket_likes
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# 商品IDの開始番号（検索ページの商品カードと商品ページで共通）
+FIRST_ITEM_ID = 1000
+
+
+class _QuietServer(ThreadingHTTPServer):
+    """クライアントが接続を切った場合のトレースバックを表示しないサーバー"""
+
+    daemon_threads = True
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        import sys
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockServer:
+    """エラーの注入と応答の集計を共通化したモックサーバーの基底クラス"""
+
+    name = "mock"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0, rate_5xx: float = 0.0, seed: Optional[int] = None) -> None:
+        """
+        初期化
+
+        Args:
+            host: 待ち受けるアドレス
+            port: 待ち受けるポート（0の場合は空いているポート）
+            latency: 応答までの待ち時間（秒）
+            jitter: 待ち時間に加える一様乱数の幅（秒）
+            rate_429: HTTP 429を返す割合
+            rate_5xx: HTTP 503を返す割合
+            seed: エラー注入・待ち時間の乱数のシード
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.status_counts: Dict[int, int] = defaultdict(int)
+        self.server = _QuietServer((host, port), self._make_handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f"{self.name}-server", daemon=True)
+
+    @property
+    def url(self) -> str:
+        """サーバーのベースURL"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockServer":
+        """バックグラウンドで待ち受けを開始する"""
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """待ち受けを終了する"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """受け付けたリクエスト数と応答ステータスごとの件数を取得する"""
+        with self._lock:
+            return {"requests": self.requests, "status": dict(sorted(self.status_counts.items()))}
+
+    def _count(self, status: int) -> None:
+        with self._lock:
+            self.status_counts[status] += 1
+
+    def _draw(self) -> Tuple[float, Optional[int]]:
+        """リクエスト1件分の待ち時間と注入するエラーのステータスを決める"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            roll = self._random.random()
+        if roll < self.rate_429:
+            return delay, 429
+        if roll < self.rate_429 + self.rate_5xx:
+            return delay, 503
+        return delay, None
+
+    def _make_handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                server._dispatch(self, "GET")
+
+            def do_POST(self) -> None:
+                server._dispatch(self, "POST")
+
+            def log_message(self, format: str, *args: Any) -> None:
+                # アクセスログで負荷試験の出力が埋もれないようにする
+                pass
+
+        return Handler
+
+    def _dispatch(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        body = b""
+        length = int(handler.headers.get("Content-Length") or 0)
+        if length:
+            body = handler.rfile.read(length)
+        delay, error = self._draw()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            if error is not None:
+                self.send(handler, error, json.dumps({"error": "injected"}).encode("utf-8"), "application/json",
+                          {"Retry-After": "1"} if error == 429 else None)
+                return
+            self.handle(handler, method, body)
+        except (BrokenPipeError, ConnectionResetError):
+            # クライアントが受信を打ち切った場合（Ollamaの早期終了・ヘッジの中断など）
+            pass
+
+    def send(self, handler: BaseHTTPRequestHandler, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        """応答を送信して件数を記録する"""
+        self._count(status)
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str, body: bytes) -> None:
+        raise NotImplementedError
+
+
+class MockBoothServer(MockServer):
+    """
+    BOOTHのモックサーバー
+
+    /ja/search/<キーワード>?page=N は商品カードの並んだ検索ページ、
+    /ja/items/<ID> はtests/fixtures/boothの商品ページ（スキ数のボタンを含む）を順に割り当てて返す
+    """
+
+    name = "mock-booth"
+
+    def __init__(self, items_per_page: int = 24, pages: int = 3, **kwargs: Any) -> None:
+        """
+        初期化
+
+        Args:
+            items_per_page: 検索ページ1ページあたりの商品数
+            pages: 商品が存在するページ数（それ以降のページは商品なし）
+            kwargs: MockServerの引数
+        """
+        super().__init__(**kwargs)
+        self.items_per_page = items_per_page
+        self.pages = pages
+        booth_dir = os.path.join(FIXTURES_DIR, "booth")
+        names = sorted(
+            (name for name in os.listdir(booth_dir) if re.fullmatch(r"item_\d+\.html", name)),
+            key=lambda name: int(name[5:-5]))
+        self.item_pages: List[str] = []
+        for name in names:
+            with open(os.path.join(booth_dir, name), "r", encoding="utf-8") as f:
+                self.item_pages.append(f.read())
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str, body: bytes) -> None:
+        parts = urlsplit(handler.path)
+        if parts.path.startswith("/ja/search/"):
+            page = int(parse_qs(parts.query).get("page", ["1"])[0])
+            self.send(handler, 200, self.search_page(page).encode("utf-8"), "text/html; charset=utf-8")
+            return
+        match = re.fullmatch(r"/ja/items/(\d+)", parts.path)
+        if match:
+            self.send(handler, 200, self.item_page(int(match.group(1))).encode("utf-8"), "text/html; charset=utf-8")
+            return
+        self.send(handler, 404, b"not found", "text/plain; charset=utf-8")
+
+    def search_page(self, page: int) -> str:
+        """検索ページのHTMLを組み立てる"""
+        cards = []
+        if 1 <= page <= self.pages:
+            first = FIRST_ITEM_ID + (page - 1) * self.items_per_page
+            for item_id in range(first, first + self.items_per_page):
+                cards.append(
+                    f'<li class="item-card" data-product-id="{item_id}"><div class="item-card__wrap">'
+                    f'<a class="item-card__title-anchor--multiline" href="/ja/items/{item_id}">商品 {item_id}</a></div></li>')
+        return f'<html><head><title>検索結果 {page}ページ - BOOTH</title></head><body><ul class="l-cards">{"".join(cards)}</ul></body></html>'
+
+    def item_page(self, item_id: int) -> str:
+        """商品ページのHTMLを返す（スキ数は商品IDごとに変える）"""
+        html = self.item_pages[(item_id - FIRST_ITEM_ID) % len(self.item_pages)]
+        return re.sub(r'(id="js-item-wishlist-button">スキ )\d+', rf"\g<1>{item_id % 997}", html)
+
+
+class MockOllamaServer(MockServer):
+    """
+    Ollamaのモックサーバー
+
+    /api/generateは応答を1トークンずつ設定した速度でストリーミングし、最終チャンクに
+    Ollamaと同じ形式のトークン数・所要時間（ナノ秒）を含める。応答はresponses_fileの記録から選び、
+    該当するものがなければ固定の整形結果を返す
+    """
+
+    name = "mock-ollama"
+
+    # 記録に該当する応答がない場合の整形結果
+    DEFAULT_RESPONSE: Dict[str, Any] = {
+        "title": "モック商品", "game_type": "マーダーミステリー", "gm_required": "不要",
+        "min_players": 4, "max_players": 4, "play_time": {"avg": 120},
+    }
+
+    def __init__(self, tokens_per_second: float = 100.0, prompt_latency: float = 0.0, num_parallel: int = 0, responses_file: Optional[str] = None, **kwargs: Any) -> None:
+        """
+        初期化
+
+        Args:
+            tokens_per_second: 出力トークンの生成速度
+            prompt_latency: 最初のトークンまでの待ち時間（プロンプトの評価時間、秒）
+            num_parallel: 同時に生成するリクエスト数の上限（0で無制限、OllamaのOLLAMA_NUM_PARALLEL相当）
+            responses_file: 返す応答の記録ファイル（formatting.api.replayと同じ形式）
+            kwargs: MockServerの引数
+        """
+        super().__init__(**kwargs)
+        self.tokens_per_second = tokens_per_second
+        self.prompt_latency = prompt_latency
+        self._slots = threading.BoundedSemaphore(num_parallel) if num_parallel > 0 else None
+        responses_file = responses_file or os.path.join(FIXTURES_DIR, "llm", "responses.jsonl")
+        self.replay = ReplayProvider(responses_file) if os.path.exists(responses_file) else None
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str, body: bytes) -> None:
+        path = urlsplit(handler.path).path
+        if method == "GET" and path == "/api/tags":
+            self.send(handler, 200, json.dumps({"models": [{"name": "gemma3:12b"}]}).encode("utf-8"), "application/json")
+            return
+        if method == "GET" and path == "/":
+            self.send(handler, 200, b"Ollama is running", "text/plain; charset=utf-8")
+            return
+        if method != "POST" or path != "/api/generate":
+            self.send(handler, 404, b"not found", "text/plain; charset=utf-8")
+            return
+
+        payload = json.loads(body or b"{}")
+        if self._slots is None:
+            self.generate(handler, payload)
+            return
+        with self._slots:
+            self.generate(handler, payload)
+
+    def response_for(self, prompt: str) -> str:
+        """プロンプトに対応する応答テキストを選ぶ"""
+        record = self.replay.lookup(prompt) if self.replay is not None else None
+        values = json.loads(record["response"]) if record is not None else dict(self.DEFAULT_RESPONSE)
+        # スキ数の区分は記録に含まれないため、新しい入力のスキ数から求める
+        match = re.search(r'"likes": (\d+)', prompt.rsplit("新しい入力", 1)[-1])
+        if match and "likes" not in values:
+            values["likes"] = bucket_likes(int(match.group(1)))
+        return json.dumps(values, ensure_ascii=False)
+
+    def generate(self, handler: BaseHTTPRequestHandler, payload: Dict[str, Any]) -> None:
+        """応答をNDJSONでストリーミングする"""
+        prompt = payload.get("prompt", "")
+        text = self.response_for(prompt)
+        # おおよそ3文字を1トークンとして区切る
+        tokens = [text[i:i + 3] for i in range(0, len(text), 3)]
+        started_at = time.perf_counter()
+        if self.prompt_latency > 0:
+            time.sleep(self.prompt_latency)
+        prompt_done_at = time.perf_counter()
+
+        self._count(200)
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def write_chunk(chunk: Dict[str, Any]) -> None:
+            data = (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
+            handler.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            handler.wfile.flush()
+
+        interval = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for token in tokens:
+            if interval:
+                time.sleep(interval)
+            write_chunk({"model": payload.get("model"), "response": token, "done": False})
+        finished_at = time.perf_counter()
+        write_chunk({
+            "model": payload.get("model"),
+            "response": "",
+            "done": True,
+            "prompt_eval_count": max(1, len(prompt) // 2),
+            "prompt_eval_duration": int((prompt_done_at - started_at) * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int((finished_at - prompt_done_at) * 1e9),
+            "load_duration": 0,
+        })
+        handler.wfile.write(b"0\r\n\r\n")
+        handler.wfile.flush()
@@ -0,0 +1,43 @@
+"""
+ページ取得のテスト
+応答が止まったページの取得がタイムアウトで打ち切られ、メトリクスに"timeout"として記録されることを確認する
+
+    python -m pytest tests/test_base_scraper.py -q
+"""
+from typing import Iterator
+
+import pytest
+
+from scraping.base_scraper import BaseScraper
+from scraping.metrics import CrawlMetrics, STAGE_ITEM_FETCH
+from tests.mock_servers import MockBoothServer, FIRST_ITEM_ID
+
+
+@pytest.fixture
+def slow_server() -> Iterator[MockBoothServer]:
+    server = MockBoothServer(latency=1.0).start()
+    yield server
+    server.stop()
+
+
+def test_stalled_page_times_out(slow_server: MockBoothServer) -> None:
+    metrics = CrawlMetrics()
+    scraper = BaseScraper(metrics=metrics, timeout=0.2)
+
+    assert scraper.get_page(f"{slow_server.url}/ja/items/{FIRST_ITEM_ID}", STAGE_ITEM_FETCH) is None
+
+    stats = metrics.summary()["stages"][STAGE_ITEM_FETCH]
+    assert stats["errors"] == {"timeout": 1}
+    assert stats["p50_seconds"] < 1.0
+
+
+def test_page_within_timeout() -> None:
+    server = MockBoothServer().start()
+    try:
+        metrics = CrawlMetrics()
+        soup = BaseScraper(metrics=metrics, timeout=5.0).get_page(f"{server.url}/ja/items/{FIRST_ITEM_ID}", STAGE_ITEM_FETCH)
+    finally:
+        server.stop()
+
+    assert soup is not None
+    assert metrics.summary()["stages"][STAGE_ITEM_FETCH]["errors"] == {}
@@ -0,0 +1,110 @@
+"""
+整形の再開用チェックポイントのテスト
+IDのないアイテムの記録と、書き込み途中で中断した出力ファイルからの再開（ijsonで読み込む場合を含む）を確認する
+
+    python -m pytest tests/test_checkpoint.py -q
+"""
+import os
+import json
+import types
+from typing import Dict, List, Any, BinaryIO, Iterator
+
+import pytest
+
+from formatting.checkpoint import FormatCheckpoint, get_item_id
+from formatting.scheduler import FormatJob, run_format_jobs
+from utils import data_utils
+
+
+class _IjsonError(Exception):
+    """ijson.JSONErrorの代わり（ValueErrorを継承しない）"""
+
+
+def _fake_ijson_items(f: BinaryIO, prefix: str, use_float: bool = False) -> Iterator[Dict[str, Any]]:
+    """ijson.itemsと同じく完全な要素を1件ずつ返し、途中で終わっている場合はIncompleteJSONErrorを送出する"""
+    text = f.read().decode("utf-8")
+    decoder = json.JSONDecoder()
+    pos = text.index("[") + 1
+    while True:
+        while pos < len(text) and (text[pos].isspace() or text[pos] == ","):
+            pos += 1
+        if text[pos:pos + 1] == "]":
+            return
+        try:
+            item, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            raise _IjsonError("parse error: premature EOF") from None
+        yield item
+
+
+@pytest.fixture(params=["json", "ijson"])
+def reader(request: Any, monkeypatch: pytest.MonkeyPatch) -> str:
+    """出力ファイルを標準のjsonで読む場合と、ijsonがインストールされている場合の両方で試す"""
+    if request.param == "ijson":
+        fake = types.SimpleNamespace(items=_fake_ijson_items, JSONError=_IjsonError, IncompleteJSONError=_IjsonError)
+        monkeypatch.setattr(data_utils, "ijson", fake)
+    else:
+        monkeypatch.setattr(data_utils, "ijson", None)
+    return request.param
+
+
+def _write_input(tmp_path: Any, items: List[Dict[str, Any]]) -> str:
+    input_file = str(tmp_path / "input" / "items.json")
+    os.makedirs(os.path.dirname(input_file), exist_ok=True)
+    with open(input_file, "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False)
+    return input_file
+
+
+def _run(input_file: str, output_dir: str, resume: bool, formatted: List[str]) -> FormatJob:
+    """アイテムのタイトルをformattedに記録しながら整形する"""
+    def format_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        formatted.append(item["title"])
+        return dict(item)
+
+    job = FormatJob(input_file, output_dir)
+    job.prepare(resume)
+    run_format_jobs([job], format_item, max_workers=2)
+    return job
+
+
+def test_item_id_falls_back_to_content_hash() -> None:
+    assert get_item_id({"id": 123, "url": "https://booth.pm/ja/items/123"}) == "123"
+    assert get_item_id({"url": "https://booth.pm/ja/items/123"}) == "https://booth.pm/ja/items/123"
+    # 同じ内容なら同じID、内容が違えば別のID
+    assert get_item_id({"title": "a", "price": 100}) == get_item_id({"price": 100, "title": "a"})
+    assert get_item_id({"title": "a"}) != get_item_id({"title": "b"})
+
+
+def test_items_without_id_are_not_formatted_again_on_resume(tmp_path: Any) -> None:
+    input_file = _write_input(tmp_path, [{"title": f"no id {i}"} for i in range(4)])
+    output_dir = str(tmp_path / "output")
+    first: List[str] = []
+    _run(input_file, output_dir, resume=False, formatted=first)
+
+    second: List[str] = []
+    job = _run(input_file, output_dir, resume=True, formatted=second)
+
+    assert sorted(first) == [f"no id {i}" for i in range(4)]
+    assert second == []
+    assert job.checkpoint.counts["skipped"] == 4
+
+
+def test_resume_after_truncated_output(tmp_path: Any, reader: str) -> None:
+    items = [{"id": str(i), "title": f"item {i}"} for i in range(5)]
+    input_file = _write_input(tmp_path, items)
+    output_dir = str(tmp_path / "output")
+    output_file = os.path.join(output_dir, "items.json")
+    os.makedirs(output_dir)
+    # 2件目の書き込み中に中断した（チェックポイントには1件目だけが記録されている）
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write('[\n  {\n    "id": "0",\n    "title": "item 0"\n  },\n  {\n    "id": "1",\n    "ti')
+    with open(FormatCheckpoint(output_file).checkpoint_file, "w", encoding="utf-8") as f:
+        f.write("0\n")
+
+    formatted: List[str] = []
+    _run(input_file, output_dir, resume=True, formatted=formatted)
+
+    assert sorted(formatted) == [f"item {i}" for i in range(1, 5)]
+    with open(output_file, "r", encoding="utf-8") as f:
+        assert sorted(item["id"] for item in json.load(f)) == ["0", "1", "2", "3", "4"]
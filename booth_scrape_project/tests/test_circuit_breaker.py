@@ -0,0 +1,124 @@
+"""
+サーキットブレーカーのテスト
+closed / open / half_open の切り替えと、half_openの試行が再試行しても回復しないエラーで終わった場合の扱い、
+試行枠を持たない呼び出しが試行枠を返せないことを確認する
+
+    python -m pytest tests/test_circuit_breaker.py -q
+"""
+import time
+import threading
+from typing import Any
+
+import pytest
+
+from formatting import json_formatter
+from formatting.circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN
+from formatting.api.errors import ProviderError, ProviderUnavailableError, RateLimitError
+
+
+def _breaker(failure_threshold: int = 2) -> CircuitBreaker:
+    return CircuitBreaker("test", failure_threshold=failure_threshold, reset_timeout=0.05, max_backoff=1.0)
+
+
+def _half_open(breaker: CircuitBreaker) -> None:
+    """openにしてから再開時刻を過ぎるまで待ち、half_openの試行を1件始める"""
+    breaker.record_failure(RateLimitError("429", "test", retry_after=0.01))
+    assert breaker.state == STATE_OPEN
+    breaker.before_call()
+    assert breaker.state == STATE_HALF_OPEN
+
+
+def test_opens_after_consecutive_failures() -> None:
+    breaker = _breaker()
+    breaker.record_failure(ProviderUnavailableError("503", "test"))
+    assert breaker.state == STATE_CLOSED
+    breaker.record_failure(ProviderUnavailableError("503", "test"))
+    assert breaker.state == STATE_OPEN
+    assert breaker.trips == 1
+
+
+def test_rate_limit_opens_immediately_for_retry_after() -> None:
+    breaker = _breaker(failure_threshold=10)
+    breaker.record_failure(RateLimitError("429", "test", retry_after=0.2))
+    assert breaker.state == STATE_OPEN
+    waited = breaker.before_call()
+    assert waited >= 0.15
+    assert breaker.state == STATE_HALF_OPEN
+
+
+@pytest.mark.parametrize("succeeded, state", [
+    # 試行が成功すればclosedに戻る
+    (True, STATE_CLOSED),
+    # 試行が失敗すれば再びopenになる
+    (False, STATE_OPEN),
+])
+def test_half_open_probe_result(succeeded: bool, state: str) -> None:
+    breaker = _breaker()
+    _half_open(breaker)
+    if succeeded:
+        breaker.record_success()
+    else:
+        breaker.record_failure(ProviderUnavailableError("503", "test"))
+    assert breaker.state == state
+
+
+def test_half_open_allows_only_one_probe() -> None:
+    breaker = _breaker()
+    _half_open(breaker)
+    entered = threading.Event()
+    thread = threading.Thread(target=lambda: (breaker.before_call(), entered.set()), daemon=True)
+    thread.start()
+    assert not entered.wait(0.1)
+    breaker.release_probe()
+    assert entered.wait(1.0)
+    # 結果を判断できない呼び出しでは状態を変えない
+    assert breaker.state == STATE_HALF_OPEN
+
+
+def test_release_probe_only_by_probe_owner() -> None:
+    breaker = _breaker()
+    _half_open(breaker)
+
+    # openになる前に送信済みだった別のスレッドの呼び出しが、回復しないエラーで終わった
+    other = threading.Thread(target=breaker.release_probe)
+    other.start()
+    other.join()
+    assert breaker._probe_in_flight
+
+    entered = threading.Event()
+    waiting = threading.Thread(target=lambda: (breaker.before_call(), entered.set()), daemon=True)
+    waiting.start()
+    assert not entered.wait(0.1)
+    breaker.release_probe()
+    assert entered.wait(1.0)
+
+
+@pytest.mark.parametrize("error", [
+    # 再試行しても回復しないエラー（存在しないモデルなど）は試行枠を返すだけにする
+    ProviderError("404 model not found", "replay", retryable=False),
+    # プロバイダーの失敗ではない例外は呼び出し元に伝える
+    KeyError("bug"),
+])
+def test_request_fields_does_not_close_breaker_on_non_retryable_probe(monkeypatch: Any, error: Exception) -> None:
+    breaker = _breaker()
+    _half_open(breaker)
+    breaker.release_probe()
+    calls = []
+
+    def call_provider(*args: Any, **kwargs: Any) -> str:
+        calls.append(args)
+        raise error
+
+    monkeypatch.setattr(json_formatter, "get_breaker", lambda name: breaker)
+    monkeypatch.setattr(json_formatter, "call_provider", call_provider)
+    started_at = time.monotonic()
+    if isinstance(error, ProviderError):
+        assert json_formatter.request_fields("prompt", ["title"], "replay", "model") is None
+    else:
+        with pytest.raises(KeyError):
+            json_formatter.request_fields("prompt", ["title"], "replay", "model")
+
+    assert len(calls) == 1
+    assert time.monotonic() - started_at < 1.0
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker._probe_in_flight
@@ -0,0 +1,99 @@
+"""
+列指向形式への書き出しと集計のテスト
+Parquet・Arrowに書き出したアイテムが同じ値で読み戻せること、価格帯などの集計が設定の区間どおりに数えられることを確認する
+（書き出し・集計のテストはpyarrowがインストールされている場合のみ実行する）
+
+    python -m pytest tests/test_columnar.py -q
+"""
+from typing import Dict, List, Any, Optional
+
+import pytest
+
+import config
+from utils.columnar import to_record
+
+FORMATTED_ITEM: Dict[str, Any] = {
+    "url": "https://booth.pm/ja/items/1000", "id": "1000", "title": "霧雨の洋館", "price": 500, "likes": "~100",
+    "author": "サークル0", "game_type": "マーダーミステリー", "gm_required": "必要",
+    "min_players": 4, "max_players": 5, "play_time": {"avg": 180}, "thumbnail_url": "https://booth.pximg.net/c/300x300/0/main.jpg",
+}
+
+
+def _items(prices: List[Optional[int]]) -> List[Dict[str, Any]]:
+    return [
+        {**FORMATTED_ITEM, "id": str(1000 + i), "price": price, "play_time": {"avg": 60 * (i + 1)}}
+        for i, price in enumerate(prices)
+    ]
+
+
+def test_record_keeps_likes_count_and_bucket() -> None:
+    record = to_record(FORMATTED_ITEM, likes_count=42)
+
+    assert (record["likes"], record["likes_bucket"]) == (42, "~100")
+    assert record["play_time"] == {"avg": 180}
+    # スキ数が数値のまま残っている場合は区分に変換する
+    record = to_record({**FORMATTED_ITEM, "likes": 700})
+    assert (record["likes"], record["likes_bucket"]) == (700, "500~")
+    # 数値にならない値はnullにする
+    assert to_record({**FORMATTED_ITEM, "price": "不明", "play_time": None})["price"] is None
+    assert to_record({**FORMATTED_ITEM, "play_time": None})["play_time"] is None
+
+
+@pytest.mark.parametrize("name", ["items.parquet", "items.arrow"])
+def test_export_round_trip(tmp_path: Any, name: str) -> None:
+    pytest.importorskip("pyarrow")
+    from utils.columnar import export_columnar, read_columnar
+
+    items = _items([500, 1200, None])
+    output_file = str(tmp_path / "out" / name)
+
+    # 書き込みの単位より多い件数でも1つのファイルにまとまる
+    assert export_columnar(iter(items), output_file, likes_counts={"1001": 250}, batch_size=2) == 3
+
+    table = read_columnar(output_file)
+    assert table.num_rows == 3
+    assert table.to_pylist() == [
+        to_record(item, 250 if item["id"] == "1001" else None) for item in items
+    ]
+    assert read_columnar(output_file, ["id", "price"]).column_names == ["id", "price"]
+
+
+def test_export_rejects_unknown_extension(tmp_path: Any) -> None:
+    pytest.importorskip("pyarrow")
+    from utils.columnar import export_columnar
+
+    with pytest.raises(ValueError):
+        export_columnar([FORMATTED_ITEM], str(tmp_path / "items.csv"))
+
+
+def test_stats_count_price_bands(tmp_path: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    pytest.importorskip("pyarrow")
+    from utils.columnar import export_columnar, compute_stats
+
+    # 区間の下限ちょうどの価格はその区間に入る
+    prices = [0, 499, 500, 999, 1000, 2500, 3000, 4999, 5000, 12000, None]
+    output_file = str(tmp_path / "items.arrow")
+    export_columnar(_items(prices), output_file)
+    monkeypatch.setattr(config, "STATS_PRICE_BANDS", [0, 500, 1000, 2000, 3000, 5000])
+
+    stats = compute_stats(output_file)
+
+    assert stats["rows"] == len(prices)
+    assert stats["price_bands"] == {
+        "0~499": 2, "500~999": 2, "1000~1999": 1, "2000~2999": 1, "3000~4999": 2, "5000~": 2, "不明": 1,
+    }
+    assert stats["likes_buckets"] == {"~100": len(prices)}
+    assert stats["player_ranges"] == {"4-5": len(prices)}
+    assert stats["play_time"]["p50"] == 360
+    assert stats["play_time"]["unknown"] == 0
+
+
+def test_stats_follow_price_band_setting(tmp_path: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    pytest.importorskip("pyarrow")
+    from utils.columnar import export_columnar, compute_stats
+
+    output_file = str(tmp_path / "items.parquet")
+    export_columnar(_items([100, 800, 1500]), output_file)
+    monkeypatch.setattr(config, "STATS_PRICE_BANDS", [0, 1000])
+
+    assert compute_stats(output_file)["price_bands"] == {"0~999": 2, "1000~": 1, "不明": 0}
@@ -0,0 +1,102 @@
+"""
+説明文の圧縮のテスト
+圧縮後の説明文がトークン数の上限（config.DESCRIPTION_TOKEN_BUDGET）に収まり、問い合わせるフィールドに関係する文を優先して残すことを確認する
+
+    python -m pytest tests/test_compaction.py -q
+"""
+from typing import List
+
+import pytest
+
+import config
+from formatting.compaction import CompactionStats, compact_description, estimate_tokens, split_sentences
+from formatting.json_formatter import compact_item
+
+STORY = "物語の舞台は古い港町。長い雨の夜、ひとりの資産家が書斎で倒れているのが見つかった。"
+RELEVANT = ["GMは不要です。", "推奨人数は4〜5人。", "所要時間は約120分。"]
+# 関係する文のあいだに、どのフィールドにも関係しない長い文を挟む
+LONG_DESCRIPTION = "\n".join([STORY * 20, RELEVANT[0], STORY * 20, RELEVANT[1], STORY * 20, RELEVANT[2]])
+
+
+@pytest.mark.parametrize("estimate, text", [
+    (0, ""),
+    (2, "GMは"),
+    # ASCII文字は4文字で1トークン
+    (2, "abcde"),
+    (5, "マダミス abc"),
+])
+def test_estimate_tokens(estimate: int, text: str) -> None:
+    assert estimate_tokens(text) == estimate
+
+
+@pytest.mark.parametrize("budget", [config.DESCRIPTION_TOKEN_BUDGET, 40, 20, 5])
+def test_compacted_description_fits_budget(budget: int) -> None:
+    compacted = compact_description(LONG_DESCRIPTION, None, budget)
+
+    assert estimate_tokens(LONG_DESCRIPTION) > budget
+    assert estimate_tokens(compacted) <= budget
+
+
+def test_relevant_sentences_are_kept_in_order() -> None:
+    compacted = compact_description(LONG_DESCRIPTION, None, config.DESCRIPTION_TOKEN_BUDGET)
+
+    assert compacted == "\n".join(RELEVANT)
+
+
+@pytest.mark.parametrize("fields, expected", [
+    (["gm_required"], [RELEVANT[0]]),
+    (["play_time", "min_players"], [RELEVANT[1], RELEVANT[2]]),
+])
+def test_only_requested_fields_are_kept(fields: List[str], expected: List[str]) -> None:
+    assert split_sentences(compact_description(LONG_DESCRIPTION, fields, config.DESCRIPTION_TOKEN_BUDGET)) == expected
+
+
+def test_sentences_matching_more_fields_win_when_budget_is_tight() -> None:
+    description = "\n".join([STORY * 20, "GMは不要、4人で約90分です。", RELEVANT[0]])
+    budget = estimate_tokens("GMは不要、4人で約90分です。")
+
+    assert compact_description(description, None, budget) == "GMは不要、4人で約90分です。"
+
+
+@pytest.mark.parametrize("budget", [0, -1, 10_000])
+def test_description_within_budget_is_unchanged(budget: int) -> None:
+    # 上限が0以下、または上限内に収まる説明文は圧縮しない
+    assert compact_description(LONG_DESCRIPTION, None, budget) == LONG_DESCRIPTION
+
+
+def test_head_is_kept_when_no_sentence_is_relevant() -> None:
+    description = STORY * 30
+
+    compacted = compact_description(description, ["gm_required"], 30)
+
+    assert description.startswith(compacted)
+    assert 0 < estimate_tokens(compacted) <= 30
+
+
+def test_compact_item_uses_configured_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    item = {"id": "1", "title": "霧雨の洋館", "description": LONG_DESCRIPTION}
+
+    monkeypatch.setattr(config, "DESCRIPTION_TOKEN_BUDGET", 20)
+    compacted = compact_item(item, ["gm_required", "play_time"])
+    assert compacted["description"] == "\n".join([RELEVANT[0], RELEVANT[2]])
+    assert estimate_tokens(compacted["description"]) <= 20
+    assert item["description"] == LONG_DESCRIPTION
+
+    # 上限を0にすると元のアイテムをそのまま使う
+    monkeypatch.setattr(config, "DESCRIPTION_TOKEN_BUDGET", 0)
+    assert compact_item(item, None) is item
+
+
+def test_stats_record_reduction() -> None:
+    stats = CompactionStats()
+    compacted = compact_description(LONG_DESCRIPTION, None, config.DESCRIPTION_TOKEN_BUDGET)
+
+    stats.record(LONG_DESCRIPTION, compacted, "プロンプト" + compacted)
+    stats.record(RELEVANT[0], RELEVANT[0], "プロンプト" + RELEVANT[0])
+
+    summary = stats.get_stats()
+    assert (summary["items"], summary["compacted"]) == (2, 1)
+    assert summary["description_tokens_after"] < summary["description_tokens_before"]
+    assert summary["prompt_tokens_before"] - summary["prompt_tokens_after"] == (
+        summary["description_tokens_before"] - summary["description_tokens_after"])
+    assert 0 < summary["prompt_reduction"] < 1
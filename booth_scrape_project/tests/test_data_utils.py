@@ -0,0 +1,113 @@
+"""
+データ保存ユーティリティのテスト
+書き込み途中で中断したJSON配列への追記と、JSON・JSONLの形式の判定を確認する
+
+    python -m pytest tests/test_data_utils.py -q
+"""
+import json
+from typing import Any, List, Optional
+
+import pytest
+
+from utils.data_utils import append_to_json, detect_json_layout, iter_json_items, _repair_array_tail
+
+
+@pytest.mark.parametrize("content", [
+    # 要素の途中で中断した
+    '[\n  {"id": "1"},\n  {"id": "2"',
+    # 区切りのカンマの後で中断した
+    '[\n  {"id": "1"},\n',
+    # 閉じの「]」だけが書き込めなかった
+    '[\n  {"id": "1"},\n  {"id": "2"}\n',
+    # 最初の要素の途中で中断した
+    '[\n  {"id": "1", "title": "霧雨の',
+])
+def test_append_repairs_truncated_array(tmp_path: Any, content: str) -> None:
+    filename = str(tmp_path / "items.json")
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(content)
+
+    append_to_json({"id": "3"}, filename)
+    append_to_json({"id": "4"}, filename)
+
+    with open(filename, "r", encoding="utf-8") as f:
+        ids = [item["id"] for item in json.load(f)]
+    complete = [item_id for item_id in ("1", "2") if f'"id": "{item_id}"}}' in content]
+    assert ids == complete + ["3", "4"]
+
+
+class ReadRecorder:
+    """readで読み込んだサイズを記録するファイルのラッパー"""
+
+    def __init__(self, f: Any) -> None:
+        self.f = f
+        self.reads: List[Optional[int]] = []
+
+    def read(self, size: Optional[int] = None) -> bytes:
+        self.reads.append(size)
+        return self.f.read(size)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.f, name)
+
+
+def test_repair_reads_in_bounded_chunks(tmp_path: Any) -> None:
+    filename = str(tmp_path / "items.json")
+    items = [{"id": str(i), "title": f"霧雨の洋館 {i}"} for i in range(200)]
+    text = json.dumps(items, ensure_ascii=False, indent=2)
+    # 最後の要素の途中で中断した
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(text[:text.rindex('"title"') + 12])
+
+    # 小さい単位で読み、マルチバイト文字が読み込みの境界にかかっても位置がずれないことを確認する
+    with open(filename, "r+b") as f:
+        recorder = ReadRecorder(f)
+        _repair_array_tail(recorder, filename, chunk_size=7)
+
+    assert recorder.reads and all(size == 7 for size in recorder.reads)
+    with open(filename, "r", encoding="utf-8") as f:
+        assert json.load(f) == items[:-1]
+
+
+@pytest.mark.parametrize("content, ids", [
+    # 末尾の空白が長く、「[」や最後の要素が末尾から離れている
+    ("[" + " " * 10000 + "]", []),
+    ('[{"id": "1"}' + "\n" * 10000 + "]", ["1"]),
+    ('[{"id": "1"}' + " " * 10000, ["1"]),
+])
+def test_append_after_long_whitespace(tmp_path: Any, content: str, ids: List[str]) -> None:
+    filename = str(tmp_path / "items.json")
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(content)
+
+    append_to_json({"id": "2"}, filename)
+
+    with open(filename, "r", encoding="utf-8") as f:
+        assert [item["id"] for item in json.load(f)] == ids + ["2"]
+
+
+def test_append_rejects_non_array_file(tmp_path: Any) -> None:
+    filename = str(tmp_path / "item.json")
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write('{"id": "1"')
+
+    with pytest.raises(ValueError, match="item.json"):
+        append_to_json({"id": "2"}, filename)
+
+
+@pytest.mark.parametrize("name, content, layout", [
+    ("items.json", '[{"id": "1"}]', "array"),
+    # 1行で書かれた単一オブジェクトはJSONLではない
+    ("item.json", '{"id": "1"}\n', "object"),
+    ("item.json", '{\n  "id": "1"\n}\n', "object"),
+    ("items.json", '{"id": "1"}\n\n{"id": "2"}\n', "jsonl"),
+    # 拡張子が.jsonlなら1行でもJSONL
+    ("items.jsonl", '{"id": "1"}\n', "jsonl"),
+])
+def test_detect_json_layout(tmp_path: Any, name: str, content: str, layout: str) -> None:
+    filename = str(tmp_path / name)
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(content)
+
+    assert detect_json_layout(filename) == layout
+    assert [item["id"] for item in iter_json_items(filename)][0] == "1"
@@ -0,0 +1,136 @@
+"""
+近似重複クラスタリングのテスト
+MinHashによる類似度の推定、LSHでのクラスタの検出、代表の整形を待つメンバーがワーカーを止めないことを確認する
+
+    python -m pytest tests/test_dedup.py -q
+"""
+import json
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Any, Optional
+
+from formatting.dedup import DedupFormatter, MinHasher, NearDuplicateIndex, estimate_similarity, shingles
+from formatting.scheduler import FormatJob, run_format_jobs
+
+DESCRIPTION = (
+    "霧雨の降る夜、山奥の洋館に招かれた探索者たちは、主人の不可解な失踪の謎を追うことになる。"
+    "古い日記と地下室の鍵を手がかりに、館に隠された真実へと迫るクトゥルフ神話TRPGのシナリオです。"
+)
+OTHER_DESCRIPTION = (
+    "港町で開かれる骨董市を舞台に、呪われた懐中時計をめぐる事件を描く現代日本のシナリオです。"
+    "探索者は時計の持ち主たちを訪ね歩き、三十年前の火事の真相を明らかにしなければなりません。"
+)
+
+
+def _item(item_id: str, description: str, title: str = "霧雨の洋館") -> Dict[str, Any]:
+    return {"id": item_id, "title": title, "description": description}
+
+
+def _derive(item: Dict[str, Any], representative: Dict[str, Any]) -> Dict[str, Any]:
+    return {**representative, "id": item["id"], "derived": True}
+
+
+def _index() -> NearDuplicateIndex:
+    return NearDuplicateIndex(threshold=0.85, num_perm=64, bands=16, shingle_size=5)
+
+
+def test_minhash_estimates_jaccard_similarity() -> None:
+    hasher = MinHasher(256)
+    left, right = shingles(DESCRIPTION, 5), shingles(DESCRIPTION + "【支援者向け】", 5)
+    jaccard = len(left & right) / len(left | right)
+
+    estimated = estimate_similarity(hasher.signature(left), hasher.signature(right))
+
+    assert abs(estimated - jaccard) < 0.1
+    assert estimate_similarity(hasher.signature(left), hasher.signature(shingles(OTHER_DESCRIPTION, 5))) < 0.2
+
+
+def test_index_clusters_near_duplicates_only() -> None:
+    index = _index()
+    cluster, is_representative = index.find_or_add(_item("1", DESCRIPTION))
+    assert is_representative
+
+    # 末尾の短い追記（再販・セット販売など）や前後の空白の違いは同じクラスタになる
+    duplicate, is_representative = index.find_or_add(_item("2", DESCRIPTION + "（再販）\n\n"))
+    assert duplicate is cluster and not is_representative
+
+    other, is_representative = index.find_or_add(_item("3", OTHER_DESCRIPTION))
+    assert other is not cluster and is_representative
+
+
+def test_member_is_parked_until_representative_finishes() -> None:
+    started, release = threading.Event(), threading.Event()
+
+    def format_item(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        started.set()
+        release.wait(5)
+        return {"id": item["id"], "title": "整形済み"}
+
+    formatter = DedupFormatter(format_item, _derive, min_chars=10)
+    representative = threading.Thread(target=formatter.format, args=(_item("1", DESCRIPTION),), daemon=True)
+    representative.start()
+    assert started.wait(5)
+
+    member = formatter.format(_item("2", DESCRIPTION))
+    assert isinstance(member, Future) and not member.done()
+
+    release.set()
+    assert member.result(5) == {"id": "2", "title": "整形済み", "derived": True}
+    representative.join(5)
+    # 代表の整形が終わった後のメンバーはその場で流用する
+    assert formatter.format(_item("3", DESCRIPTION))["derived"]
+    assert formatter.reused == 2
+
+
+def test_parked_member_becomes_representative_when_representative_fails() -> None:
+    calls: List[str] = []
+    started, release = threading.Event(), threading.Event()
+
+    def format_item(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        calls.append(item["id"])
+        if item["id"] == "1":
+            started.set()
+            release.wait(5)
+            return None
+        return {"id": item["id"], "title": "整形済み"}
+
+    formatter = DedupFormatter(format_item, _derive, min_chars=10)
+    representative = threading.Thread(target=formatter.format, args=(_item("1", DESCRIPTION),), daemon=True)
+    representative.start()
+    assert started.wait(5)
+    members = [formatter.format(_item(item_id, DESCRIPTION)) for item_id in ("2", "3")]
+
+    release.set()
+    assert members[0].result(5) == {"id": "2", "title": "整形済み"}
+    assert members[1].result(5) == {"id": "3", "title": "整形済み", "derived": True}
+    assert calls == ["1", "2"]
+
+
+def test_members_do_not_block_scheduler_workers(tmp_path: Any) -> None:
+    # 代表の整形中に、もう1つのワーカーがメンバーを預けて残りのアイテムを処理できることを確認する
+    items = [_item("rep", DESCRIPTION), _item("member", DESCRIPTION)] + [
+        _item(f"other-{i}", OTHER_DESCRIPTION.replace("三十", str(i) * 10), title=f"other {i}") for i in range(3)]
+    input_file = str(tmp_path / "items.json")
+    with open(input_file, "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False)
+    others_done = threading.Event()
+    formatted: List[str] = []
+
+    def format_item(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if item["id"] == "rep":
+            # 他のアイテムがすべて整形されるまで代表の整形を終えない
+            assert others_done.wait(10), "メンバーがワーカーを止めている"
+        formatted.append(item["id"])
+        if sum(1 for item_id in formatted if item_id.startswith("other")) == 3:
+            others_done.set()
+        return {"id": item["id"], "title": item["title"]}
+
+    job = FormatJob(input_file, str(tmp_path / "output"))
+    job.prepare(resume=False)
+    formatter = DedupFormatter(format_item, _derive, min_chars=10)
+
+    assert run_format_jobs([job], formatter.format, max_workers=2) == 5
+    assert "member" not in formatted
+    with open(job.output_file, "r", encoding="utf-8") as f:
+        output = {item["id"]: item for item in json.load(f)}
+    assert output["member"]["derived"]
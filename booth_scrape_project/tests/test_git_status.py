@@ -0,0 +1,119 @@
+"""
+Gitの状態の取得のテスト
+git status --porcelain=v2 -z の出力から、名前変更・ステージング済みと作業ツリーの両方の変更・未追跡ファイルを
+正しく分類することを確認する
+
+    python -m pytest tests/test_git_status.py -q
+"""
+import shutil
+import subprocess
+from typing import Any, List
+
+import pytest
+
+from gitStatus.writeGitStatus import parse_porcelain_v2, get_git_status
+
+OID = "0123456789abcdef0123456789abcdef01234567"
+HASHES = "100644 100644 100644 " + " ".join([OID] * 2)
+
+
+def _porcelain(*entries: str) -> str:
+    return "\0".join(entries) + "\0"
+
+
+def test_branch_headers() -> None:
+    result = parse_porcelain_v2(_porcelain(
+        f"# branch.oid {OID}", "# branch.head main", "# branch.upstream origin/main", "# branch.ab +2 -3"))
+
+    assert (result["commit"], result["current_branch"], result["upstream"]) == (OID, "main", "origin/main")
+    assert (result["ahead"], result["behind"]) == (2, 3)
+
+
+def test_initial_and_detached_head() -> None:
+    result = parse_porcelain_v2(_porcelain("# branch.oid (initial)", "# branch.head (detached)"))
+
+    assert result["commit"] is None
+    assert result["current_branch"] == "HEAD"
+
+
+def test_rename_entry_consumes_original_path() -> None:
+    # -zでは変更前のパスが次の項目になる（パスの空白も区切りにしない）
+    result = parse_porcelain_v2(_porcelain(
+        f"2 R. N... {HASHES} R100 docs/new name.md", "docs/old name.md",
+        f"2 C. N... {HASHES} C75 copy.py", "main.py",
+        f"2 RM N... {HASHES} R90 utils/b.py", "utils/a.py",
+        "? notes.txt",
+    ))
+
+    assert result["staged_files"] == [
+        "(名前変更) docs/old name.md -> docs/new name.md",
+        "(コピー) main.py -> copy.py",
+        "(名前変更) utils/a.py -> utils/b.py",
+    ]
+    # 名前変更の後に作業ツリーでも変更したファイル
+    assert result["modified_files"] == ["utils/b.py"]
+    # 変更前のパスを未追跡ファイルなどと取り違えない
+    assert result["untracked_files"] == ["notes.txt"]
+
+
+@pytest.mark.parametrize("xy, staged, modified", [
+    # ステージング済みと作業ツリーの両方に入る
+    ("MM", ["main.py"], ["main.py"]),
+    ("M.", ["main.py"], []),
+    (".M", [], ["main.py"]),
+    ("A.", ["(新規) main.py"], []),
+    ("AM", ["(新規) main.py"], ["main.py"]),
+    (".D", [], ["(削除) main.py"]),
+    ("D.", ["(削除) main.py"], []),
+    (".T", [], ["(種類変更) main.py"]),
+])
+def test_changed_entry(xy: str, staged: List[str], modified: List[str]) -> None:
+    result = parse_porcelain_v2(_porcelain(f"1 {xy} N... 100644 100644 100644 {OID} {OID} main.py"))
+
+    assert (result["staged_files"], result["modified_files"]) == (staged, modified)
+
+
+def test_untracked_and_conflicted_files() -> None:
+    result = parse_porcelain_v2(_porcelain(
+        "? data/new file.json", "? logs/",
+        f"u UU N... 100644 100644 100644 100644 {OID} {OID} {OID} config.py",
+    ))
+
+    assert result["untracked_files"] == ["data/new file.json", "logs/"]
+    assert result["conflicted_files"] == ["config.py"]
+    assert result["staged_files"] == result["modified_files"] == []
+
+
+def _git(repo: Any, *args: str) -> None:
+    subprocess.run(["git", *args], cwd=str(repo), check=True, capture_output=True)
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="gitがインストールされていません")
+def test_git_status_of_repository(tmp_path: Any) -> None:
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "-q", "-b", "main")
+    _git(repo, "config", "user.email", "test@example.com")
+    _git(repo, "config", "user.name", "test")
+    for name, text in (("old name.txt", "a\n" * 20), ("main.py", "print(1)\n")):
+        (repo / name).write_text(text, encoding="utf-8")
+    _git(repo, "add", ".")
+    _git(repo, "commit", "-q", "-m", "initial")
+
+    _git(repo, "mv", "old name.txt", "new name.txt")
+    (repo / "main.py").write_text("print(2)\n", encoding="utf-8")
+    _git(repo, "add", "main.py")
+    (repo / "main.py").write_text("print(3)\n", encoding="utf-8")
+    (repo / "untracked.txt").write_text("x\n", encoding="utf-8")
+
+    status = get_git_status(str(repo), refresh=True)
+
+    assert status["current_branch"] == "main"
+    assert status["commit"] is not None
+    assert sorted(status["staged_files"]) == ["(名前変更) old name.txt -> new name.txt", "main.py"]
+    assert status["modified_files"] == ["main.py"]
+    assert status["untracked_files"] == ["untracked.txt"]
+    assert status["dirty"] is True
+    assert status["recent_commits"][0].endswith("initial")
+    # 同じディレクトリの2回目はキャッシュを返す
+    assert get_git_status(str(repo)) is status
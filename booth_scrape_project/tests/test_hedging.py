@@ -0,0 +1,172 @@
+"""
+ヘッジのテスト
+遅いリクエストへの予備の送信と中断、予備の割合の上限、別のバックエンドへの予備がそのバックエンドの
+サーキットブレーカー・レートリミッターを通ること、採用されなかったリクエストの使用量の記録を確認する
+
+    python -m pytest tests/test_hedging.py -q
+"""
+import json
+import time
+import threading
+from typing import Dict, List, Any, Iterator, Optional
+
+import pytest
+
+import config
+from formatting import json_formatter, telemetry
+from formatting.hedging import HedgedCaller, CancelToken
+from formatting.circuit_breaker import CircuitBreaker, STATE_CLOSED
+from formatting.api.errors import RateLimitError, RequestCancelledError
+
+RESPONSE = json.dumps({"title": "霧雨の洋館"}, ensure_ascii=False)
+
+
+def _hedger(max_extra_ratio: float = 1.0) -> HedgedCaller:
+    hedger = HedgedCaller("test", quantile=0.5, min_samples=1, max_extra_ratio=max_extra_ratio, window=10, min_delay=0.05)
+    hedger._record_latency(0.05)
+    return hedger
+
+
+def _slow(tokens: List[CancelToken], seconds: float = 2.0) -> Any:
+    """中断されるまで（最大seconds秒）応答しないリクエスト"""
+    def attempt(token: CancelToken) -> Optional[str]:
+        tokens.append(token)
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            token.raise_if_cancelled("test")
+            time.sleep(0.01)
+        return "slow"
+    return attempt
+
+
+def test_hedge_wins_and_cancels_primary() -> None:
+    hedger = _hedger()
+    tokens: List[CancelToken] = []
+    started_at = time.monotonic()
+
+    assert hedger.call(_slow(tokens), lambda token: "fast") == "fast"
+
+    assert time.monotonic() - started_at < 1.0
+    assert tokens[0].cancelled
+    stats = hedger.get_stats()
+    assert (stats["hedges"], stats["hedge_wins"], stats["cancelled"]) == (1, 1, 1)
+
+
+def test_hedge_win_records_latency_from_original_start() -> None:
+    hedger = _hedger()
+
+    def hedge(token: CancelToken) -> str:
+        time.sleep(0.1)
+        return "fast"
+
+    assert hedger.call(_slow([]), hedge) == "fast"
+
+    # 予備は0.05秒待ってから送られるため、呼び出し元が待った時間は予備の所要時間（0.1秒）より長い
+    assert hedger._latencies[-1] >= 0.15
+
+
+def test_hedges_are_capped_by_extra_ratio() -> None:
+    hedger = _hedger(max_extra_ratio=0.0)
+    hedged = []
+
+    assert hedger.call(_slow([], 0.2), lambda token: hedged.append(token) or "fast") == "slow"
+
+    assert hedged == []
+    assert hedger.get_stats()["hedges"] == 0
+
+
+class CountingLimiter:
+    """acquireの回数を数えるレートリミッター"""
+
+    def __init__(self) -> None:
+        self.acquired = 0
+
+    def acquire(self) -> float:
+        self.acquired += 1
+        return 0.0
+
+
+def _wait_for_records(log: telemetry.TelemetryLog, item_id: str, count: int, timeout: float = 2.0) -> List[Dict[str, Any]]:
+    """テレメトリにitem_idの呼び出しがcount件記録されるまで待って読み込む（採用されなかったリクエストは後から記録される）"""
+    deadline = time.monotonic() + timeout
+    while True:
+        with open(log.log_file, "r", encoding="utf-8") as f:
+            records = [record for record in map(json.loads, f) if record["item_id"] == item_id]
+        if len(records) >= count or time.monotonic() > deadline:
+            return records
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def hedge_backend(monkeypatch: Any, tmp_path: Any) -> Iterator[Dict[str, Any]]:
+    """replayの予備をgeminiに送る設定にし、ブレーカーとテレメトリをテスト用に差し替える"""
+    breakers = {name: CircuitBreaker(name, reset_timeout=0.05) for name in ("replay", "gemini")}
+    monkeypatch.setattr(config, "HEDGE_BACKENDS", {"replay": ("gemini", "gemini-test")})
+    monkeypatch.setattr(json_formatter, "get_breaker", lambda name: breakers[name])
+    log = telemetry.start_run(str(tmp_path))
+    yield {"breakers": breakers, "log": log}
+    telemetry.finish_run()
+
+
+def test_hedge_goes_through_alternate_breaker_and_limiter(monkeypatch: Any, hedge_backend: Dict[str, Any]) -> None:
+    def call_provider(api_type: str, prompt: str, model_name: str, schema: Any, token: CancelToken, usage: Dict[str, Any]) -> str:
+        if api_type == "replay":
+            _slow([])(token)
+        usage.update(prompt_tokens=100, output_tokens=20)
+        return RESPONSE
+
+    monkeypatch.setattr(json_formatter, "call_provider", call_provider)
+    gemini = hedge_backend["breakers"]["gemini"]
+    # 予備を送る先のバックエンドが停止中の場合は再開を待ってから送る
+    gemini.record_failure(RateLimitError("429", "gemini", retry_after=0.2))
+    limiter, hedge_limiter = CountingLimiter(), CountingLimiter()
+
+    started_at = time.monotonic()
+    parsed = json_formatter.request_fields(
+        "prompt", ["title"], "replay", "replay-test", "breaker",
+        rate_limiter=limiter, hedger=_hedger(), hedge_rate_limiter=hedge_limiter)
+
+    assert parsed == {"title": "霧雨の洋館"}
+    assert 0.15 <= time.monotonic() - started_at < 1.5
+    assert (limiter.acquired, hedge_limiter.acquired) == (1, 1)
+    assert gemini.state == STATE_CLOSED
+
+
+def test_late_loser_usage_is_recorded(monkeypatch: Any, hedge_backend: Dict[str, Any]) -> None:
+    loser_done = threading.Event()
+
+    def call_provider(api_type: str, prompt: str, model_name: str, schema: Any, token: CancelToken, usage: Dict[str, Any]) -> str:
+        if api_type == "replay":
+            # 中断できない呼び出しは予備が返った後も最後まで実行され、トークンを消費する
+            time.sleep(0.3)
+            usage.update(prompt_tokens=100, output_tokens=30)
+            loser_done.set()
+            return RESPONSE
+        usage.update(prompt_tokens=100, output_tokens=20)
+        return RESPONSE
+
+    monkeypatch.setattr(json_formatter, "call_provider", call_provider)
+    json_formatter.request_fields("prompt", ["title"], "replay", "replay-test", "late", hedger=_hedger())
+    assert loser_done.wait(2.0)
+
+    records = sorted(_wait_for_records(hedge_backend["log"], "late", 2), key=lambda record: record["api_type"])
+    assert [(r["api_type"], r["outcome"], r["output_tokens"]) for r in records] == [
+        ("gemini", telemetry.OUTCOME_OK, 20),
+        ("replay", telemetry.OUTCOME_HEDGE_LOSER, 30),
+    ]
+
+
+def test_cancelled_loser_is_recorded_without_tokens(monkeypatch: Any, hedge_backend: Dict[str, Any]) -> None:
+    def call_provider(api_type: str, prompt: str, model_name: str, schema: Any, token: CancelToken, usage: Dict[str, Any]) -> str:
+        if api_type == "replay":
+            _slow([])(token)
+        usage.update(prompt_tokens=100, output_tokens=20)
+        return RESPONSE
+
+    monkeypatch.setattr(json_formatter, "call_provider", call_provider)
+    json_formatter.request_fields("prompt", ["title"], "replay", "replay-test", "cancelled", hedger=_hedger())
+
+    loser = next(r for r in _wait_for_records(hedge_backend["log"], "cancelled", 2) if r["api_type"] == "replay")
+    assert loser["outcome"] == telemetry.OUTCOME_HEDGE_LOSER
+    assert loser["error"] == RequestCancelledError.__name__
+    assert loser["output_tokens"] is None
@@ -0,0 +1,60 @@
+"""
+スクレイピングの出力ディレクトリを入力にするコマンドのテスト
+出力ファイルに付随するクロールのメトリクスや実行マニフェストを、formatとindexが商品として扱わないことを確認する
+
+    python -m pytest tests/test_item_files.py -q
+"""
+import os
+import json
+from typing import Any
+
+import pytest
+
+import config
+from main import index_files
+from formatting.json_formatter import API_TYPE_REPLAY, process_directory
+from scraping.metrics import CrawlMetrics
+from utils.manifest import write_manifest
+from utils.storage import ItemStore
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@pytest.fixture
+def scrape_output(tmp_path: Any, monkeypatch: pytest.MonkeyPatch) -> str:
+    """スクレイピングと同じく、商品のファイルの隣にメトリクスとマニフェストを置いたディレクトリを作る"""
+    monkeypatch.setenv("LLM_REPLAY_FILE", os.path.join(FIXTURES_DIR, "llm", "responses.jsonl"))
+    monkeypatch.delenv("LLM_RECORD_FILE", raising=False)
+    monkeypatch.setattr(config, "TELEMETRY_DIR", str(tmp_path / "telemetry"))
+    monkeypatch.setattr(config, "PARSE_ERROR_LOG", str(tmp_path / "parse_errors.log"))
+
+    with open(os.path.join(FIXTURES_DIR, "booth", "items.json"), "r", encoding="utf-8") as f:
+        items = json.load(f)[:3]
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    output_file = str(data_dir / "booth_data_マダミス_page_1-1.json")
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False)
+
+    metrics = CrawlMetrics()
+    metrics.observe("item_fetch", 0.5)
+    metrics.write_summary(output_file + config.CRAWL_METRICS_SUFFIX)
+    write_manifest(output_file, "scrape", {"keyword": "マダミス"}, items=len(items))
+    return str(data_dir)
+
+
+def test_format_skips_metrics_and_manifest(scrape_output: str, tmp_path: Any) -> None:
+    output_dir = str(tmp_path / "formatted")
+
+    processed = process_directory(scrape_output, output_dir, API_TYPE_REPLAY, "gemma3:12b", delay=0, resume=False)
+
+    assert processed == 3
+    item_outputs = [name for name in os.listdir(output_dir) if name.endswith(".json") and "." not in name[:-5]]
+    assert item_outputs == ["booth_data_マダミス_page_1-1.json"]
+
+
+def test_index_skips_metrics_and_manifest(scrape_output: str, tmp_path: Any) -> None:
+    with ItemStore(str(tmp_path / "booth.db")) as store:
+        assert index_files(store, [scrape_output]) == 3
+        assert store.count() == 3
+        assert all(item["title"] for item in store.iter_items())
@@ -0,0 +1,96 @@
+"""
+Ollamaクライアントのテスト
+モックサーバーに対して、早期終了した場合の出力トークン数が概算として報告されること、
+ストリームの途中のエラーと通信以外の例外の扱いを確認する
+
+    python -m pytest tests/test_ollama_client.py -q
+"""
+import json
+from typing import Dict, List, Any, Iterator
+
+import pytest
+
+from formatting.api.ollama import OllamaClient
+from formatting.api.errors import ProviderError, ProviderUnavailableError
+from formatting.compaction import estimate_tokens
+from tests.mock_servers import MockOllamaServer
+
+
+@pytest.fixture
+def server() -> Iterator[MockOllamaServer]:
+    mock = MockOllamaServer(tokens_per_second=0).start()
+    yield mock
+    mock.stop()
+
+
+@pytest.mark.parametrize("early_stop", [True, False])
+def test_output_tokens_are_estimated_only_on_early_stop(server: MockOllamaServer, early_stop: bool) -> None:
+    client = OllamaClient(api_url=f"{server.url}/api", options={})
+    try:
+        result = client.generate("新しい入力", "gemma3:12b", early_stop=early_stop)
+    finally:
+        client.close()
+
+    # モックサーバーはおおよそ3文字を1チャンクとして送り、最終チャンクでチャンク数をeval_countとして返す
+    chunks = -(-len(result["response"]) // 3)
+    assert result["stopped_early"] is early_stop
+    assert result["eval_count_estimated"] is early_stop
+    if early_stop:
+        assert result["eval_count"] == estimate_tokens(result["response"])
+        assert result["prompt_eval_count"] is None
+    else:
+        assert result["eval_count"] == chunks
+
+
+class FakeStreamResponse:
+    """指定したチャンクを1行ずつ返すストリーミング応答"""
+
+    status_code = 200
+
+    def __init__(self, chunks: List[Dict[str, Any]]) -> None:
+        self.chunks = chunks
+
+    def __enter__(self) -> "FakeStreamResponse":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+    def iter_lines(self) -> Iterator[bytes]:
+        for chunk in self.chunks:
+            yield json.dumps(chunk).encode("utf-8")
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.mark.parametrize("message, retryable", [
+    # 存在しないモデルなどは再試行しても失敗する
+    ('model "gemma3:99b" not found, try pulling it first', False),
+    ("invalid format: expected object", False),
+    # 一時的なエラーは再試行する
+    ("server busy, please try again. maximum pending requests exceeded", True),
+    ("llama runner process has terminated: signal: killed", True),
+])
+def test_stream_error_is_retryable_only_when_transient(monkeypatch: Any, message: str, retryable: bool) -> None:
+    client = OllamaClient(api_url="http://127.0.0.1:1/api", options={})
+    chunks = [{"response": "{", "done": False}, {"error": message}]
+    monkeypatch.setattr(client.session, "post", lambda *args, **kwargs: FakeStreamResponse(chunks))
+
+    with pytest.raises(ProviderError) as raised:
+        client.generate("新しい入力", "gemma3:12b")
+
+    assert raised.value.retryable is retryable
+    assert isinstance(raised.value, ProviderUnavailableError) is retryable
+
+
+def test_unexpected_error_is_raised_as_is(monkeypatch: Any) -> None:
+    client = OllamaClient(api_url="http://127.0.0.1:1/api", options={})
+
+    def post(*args: Any, **kwargs: Any) -> Any:
+        raise RuntimeError("bug")
+
+    monkeypatch.setattr(client.session, "post", post)
+
+    with pytest.raises(RuntimeError, match="bug"):
+        client.generate("新しい入力", "gemma3:12b")
@@ -0,0 +1,143 @@
+"""
+Ollamaエンドポイントプールのテスト
+スコアによる送信先の選択、失敗したエンドポイントの除外と別ノードでの再試行、失敗後の処理中の数、
+ヘルスチェックに応答しないエンドポイントがアイテムを送る前に外されることを確認する
+
+    python -m pytest tests/test_ollama_pool.py -q
+"""
+from typing import Dict, List, Any, Optional, Iterator
+
+import pytest
+
+from formatting.api import ollama_pool
+from formatting.api.ollama_pool import OllamaEndpointPool
+from formatting.api.errors import ProviderError, ProviderUnavailableError, RequestCancelledError
+from tests.mock_servers import MockOllamaServer
+
+# 接続を拒否されるエンドポイント
+DEAD_URL = "http://127.0.0.1:1/api"
+
+
+class FakeClient:
+    """指定した例外を送出するか、固定の応答を返すクライアント"""
+
+    def __init__(self, api_url: str, error: Optional[BaseException] = None) -> None:
+        self.api_url = api_url
+        self.error = error
+        self.calls = 0
+
+    def generate(self, prompt: str, model_name: str, **kwargs: Any) -> Dict[str, Any]:
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return {"response": "{}", "wall_time": 0.5, "eval_count": 10, "eval_duration": 0.4}
+
+
+def _pool(*errors: Optional[BaseException]) -> OllamaEndpointPool:
+    pool = OllamaEndpointPool([f"http://node{i}/api" for i in range(len(errors))], eject_seconds=60)
+    for endpoint, error in zip(pool.endpoints, errors):
+        endpoint.client = FakeClient(endpoint.api_url, error)
+    return pool
+
+
+def _calls(pool: OllamaEndpointPool) -> List[int]:
+    return [endpoint.client.calls for endpoint in pool.endpoints]
+
+
+def test_prefers_lower_score() -> None:
+    pool = _pool(None, None)
+    pool.endpoints[0].latency = 2.0
+    pool.endpoints[1].latency = 1.0
+    assert pool.generate("prompt", "model")["endpoint"] == "http://node1/api"
+
+    # 処理中のリクエストが多いエンドポイントはレイテンシが小さくても後回しにする
+    pool.endpoints[1].in_flight = 2
+    assert pool.generate("prompt", "model")["endpoint"] == "http://node0/api"
+
+
+def test_retryable_error_ejects_and_fails_over() -> None:
+    pool = _pool(ProviderUnavailableError("503", "ollama"), None)
+    pool.endpoints[1].latency = 2.0
+
+    result = pool.generate("prompt", "model")
+
+    assert result["endpoint"] == "http://node1/api"
+    assert not pool.endpoints[0].healthy
+    assert pool.endpoints[0].failures == 1
+    assert pool.endpoints[0].ejections == 1
+    assert [endpoint.in_flight for endpoint in pool.endpoints] == [0, 0]
+
+
+@pytest.mark.parametrize("error", [
+    # 存在しないモデルなどの不正なリクエストはどのノードでも失敗する
+    ProviderError("HTTP 404 model not found", "ollama", retryable=False),
+    # ヘッジで中断したリクエスト
+    RequestCancelledError("cancelled", "ollama"),
+])
+def test_non_retryable_error_is_raised_without_ejecting(error: ProviderError) -> None:
+    pool = _pool(error, None)
+    pool.endpoints[1].latency = 2.0
+
+    with pytest.raises(type(error)):
+        pool.generate("prompt", "model")
+
+    assert _calls(pool) == [1, 0]
+    assert pool.endpoints[0].healthy
+    assert pool.endpoints[0].in_flight == 0
+
+
+def test_unexpected_error_releases_in_flight() -> None:
+    pool = _pool(RuntimeError("bug"), None)
+    pool.endpoints[1].latency = 2.0
+
+    with pytest.raises(RuntimeError):
+        pool.generate("prompt", "model")
+
+    assert [endpoint.in_flight for endpoint in pool.endpoints] == [0, 0]
+
+
+def test_all_endpoints_failing_raises_last_error() -> None:
+    pool = _pool(ProviderUnavailableError("503 a", "ollama"), ProviderUnavailableError("503 b", "ollama"))
+
+    with pytest.raises(ProviderUnavailableError):
+        pool.generate("prompt", "model")
+
+    assert _calls(pool) == [1, 1]
+    assert not any(endpoint.healthy for endpoint in pool.endpoints)
+    assert [endpoint.in_flight for endpoint in pool.endpoints] == [0, 0]
+
+
+@pytest.fixture
+def live_server() -> Iterator[MockOllamaServer]:
+    server = MockOllamaServer(tokens_per_second=0).start()
+    yield server
+    server.stop()
+
+
+def test_default_pool_ejects_dead_node_before_dispatch(monkeypatch: Any, live_server: MockOllamaServer) -> None:
+    live_url = f"{live_server.url}/api"
+    monkeypatch.setenv("OLLAMA_API_URLS", f"{DEAD_URL},{live_url}")
+    monkeypatch.setattr(ollama_pool, "_default_pool", None)
+
+    pool = ollama_pool.get_default_pool()
+    dead, live = pool.endpoints
+    # 除外されていなければスコアが小さい停止中のノードが選ばれる
+    live.latency = 5.0
+
+    assert not dead.healthy
+    assert pool.generate("新しい入力", "gemma3:12b")["endpoint"] == live_url
+    assert dead.failures == 0
+
+
+def test_periodic_health_check_ejects_node_that_went_down(live_server: MockOllamaServer) -> None:
+    other = MockOllamaServer(tokens_per_second=0).start()
+    pool = OllamaEndpointPool([f"{other.url}/api", f"{live_server.url}/api"], health_interval=0.0)
+    down, live = pool.endpoints
+    live.latency = 5.0
+    assert pool.generate("新しい入力", "gemma3:12b")["endpoint"] == down.api_url
+
+    other.stop()
+
+    assert pool.generate("新しい入力", "gemma3:12b")["endpoint"] == live.api_url
+    assert not down.healthy
+    assert down.failures == 0
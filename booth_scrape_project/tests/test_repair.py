@@ -0,0 +1,90 @@
+"""
+フィールド単位の修正のテスト
+修正プロンプトが不正なフィールドだけを問い合わせ、結果が検証済みのフィールドを変えずにマージされることを確認する
+
+    python -m pytest tests/test_repair.py -q
+"""
+import json
+from typing import Dict, List, Any, Optional
+
+import pytest
+
+from formatting import json_formatter
+from formatting.repair import build_repair_prompt, relevant_snippet
+
+INPUT_ITEM: Dict[str, Any] = {
+    "url": "https://booth.pm/ja/items/1000", "id": "1000", "title": "マーダーミステリー「霧雨の洋館」",
+    "price": 500, "likes": 120, "author": "サークル0",
+    "description": "長い雨の夜の物語です。推奨人数は4人。GMは不要です。所要時間は約90分。舞台は古い港町。",
+}
+
+FORMATTED_ITEM: Dict[str, Any] = {
+    "title": "霧雨の洋館", "likes": "100~500", "game_type": "マーダーミステリー", "gm_required": "不要",
+    "min_players": 4, "max_players": 4, "play_time": {"avg": 9000},
+}
+
+ERRORS = {"play_time": "プレイ時間が範囲外です（0〜1440分）"}
+
+
+def _section(prompt: str, heading: str) -> str:
+    """プロンプトの見出しの次の段落を取り出す"""
+    return prompt.split(f"\n{heading}:\n", 1)[1].split("\n\n", 1)[0]
+
+
+def test_prompt_requests_only_failed_fields() -> None:
+    prompt = build_repair_prompt(INPUT_ITEM, FORMATTED_ITEM, ERRORS, ["play_time: プレイ時間（平均）を分単位で数値化"], 300)
+
+    assert _section(prompt, "不正なフィールド") == '- play_time: {"avg": 9000}（プレイ時間が範囲外です（0〜1440分））'
+    assert prompt.endswith("キーは play_time のみとし、修正後の値をJSONフォーマットのみで返してください。")
+    # 説明文はプレイ時間に関係する文だけを含め、スキ数は不正でない限り含めない
+    source = json.loads(_section(prompt, "元データ（抜粋）"))
+    assert source == {"title": INPUT_ITEM["title"], "description": "所要時間は約90分。"}
+    # 検証に通ったフィールドは参考として渡す
+    valid = json.loads(_section(prompt, "確定済みの値（参考）"))
+    assert valid == {key: value for key, value in FORMATTED_ITEM.items() if key != "play_time"}
+
+
+def test_prompt_includes_likes_only_when_invalid() -> None:
+    errors = {"likes": "想定外の値です", "min_players": "人数が範囲外です"}
+
+    prompt = build_repair_prompt(INPUT_ITEM, FORMATTED_ITEM, errors, [], 300)
+
+    source = json.loads(_section(prompt, "元データ（抜粋）"))
+    assert source == {"title": INPUT_ITEM["title"], "likes": 120, "description": "推奨人数は4人。"}
+    assert "キーは likes, min_players のみ" in prompt
+
+
+@pytest.mark.parametrize("fields, max_chars, expected", [
+    (["gm_required"], 300, "GMは不要です。"),
+    (["min_players", "play_time"], 300, "推奨人数は4人。\n所要時間は約90分。"),
+    # 上限を超える文は含めない
+    (["min_players", "play_time"], 10, "推奨人数は4人。"),
+    # パターンのないフィールドは抜粋しない
+    (["title", "likes"], 300, ""),
+])
+def test_relevant_snippet(fields: List[str], max_chars: int, expected: str) -> None:
+    assert relevant_snippet(INPUT_ITEM["description"], fields, max_chars) == expected
+
+
+def test_repair_merges_only_failed_fields(monkeypatch: pytest.MonkeyPatch) -> None:
+    requests: List[List[str]] = []
+
+    def fake_request_fields(prompt: str, fields: List[str], *args: Any, **kwargs: Any) -> Optional[Dict[str, Any]]:
+        requests.append(fields)
+        # 問い合わせていないフィールドを返しても採用しない
+        return {"play_time": {"avg": 90}, "title": "別のタイトル"}
+
+    monkeypatch.setattr(json_formatter, "request_fields", fake_request_fields)
+
+    repaired = json_formatter.repair_formatted_item(INPUT_ITEM, FORMATTED_ITEM, ERRORS, "ollama", "gemma3:4b")
+
+    assert requests == [["play_time"]]
+    assert repaired["play_time"] == {"avg": 90}
+    assert repaired["title"] == "霧雨の洋館"
+    assert repaired["id"] == "1000"
+
+
+def test_repair_keeps_result_when_request_fails(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(json_formatter, "request_fields", lambda *args, **kwargs: None)
+
+    assert json_formatter.repair_formatted_item(INPUT_ITEM, FORMATTED_ITEM, ERRORS, "ollama", "gemma3:4b") is FORMATTED_ITEM
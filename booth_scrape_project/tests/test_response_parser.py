@@ -0,0 +1,45 @@
+"""
+応答パーサーのテスト
+前置きやコードブロック・末尾のカンマの除去と、途中で切れた応答の補完を確認する
+
+    python -m pytest tests/test_response_parser.py -q
+"""
+from typing import Dict, Any, Optional
+
+import pytest
+
+from formatting.response_parser import IncrementalJsonParser, parse_json_response
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"title": "霧雨の洋館"}', {"title": "霧雨の洋館"}),
+    # 前置きの文とコードブロックは読み飛ばす
+    ('整形結果です。\n```json\n{"title": "霧雨の洋館"}\n```\n以上です。', {"title": "霧雨の洋館"}),
+    # 末尾のカンマは取り除く
+    ('{"tags": ["CoC", "現代日本",\n], \n}', {"tags": ["CoC", "現代日本"]}),
+    # 文字列中の括弧とエスケープされた引用符は構造として扱わない
+    ('{"title": "「\\"館\\"」{上}[下]"}', {"title": '「"館"」{上}[下]'}),
+    # 文字列の途中で切れた
+    ('{"title": "霧雨の', {"title": "霧雨の"}),
+    # 区切りのカンマの後で切れた
+    ('{"title": "霧雨の洋館", ', {"title": "霧雨の洋館"}),
+    # 入れ子の配列の途中で切れた
+    ('{"title": "霧雨の洋館", "tags": ["CoC", "現代', {"title": "霧雨の洋館", "tags": ["CoC", "現代"]}),
+    # キーだけで値がない場合は補完できない
+    ('{"title": "霧雨の洋館", "price"', None),
+    ("JSONを出力できませんでした", None),
+    (None, None),
+])
+def test_parse_json_response(text: Optional[str], expected: Optional[Dict[str, Any]]) -> None:
+    assert parse_json_response(text) == expected
+
+
+def test_feed_stops_when_object_closes() -> None:
+    text = '```json\n{"title": "霧雨の洋館", "tags": ["CoC"]}\n```\n{"title": "別の"}'
+    parser = IncrementalJsonParser()
+    # ストリーミングと同じく、数文字ずつ読み込む
+    closed_at = next(i for i in range(0, len(text), 3) if parser.feed(text[i:i + 3]))
+
+    assert parser.complete
+    assert closed_at < text.index("```\n{")
+    assert parser.result() == {"title": "霧雨の洋館", "tags": ["CoC"]}
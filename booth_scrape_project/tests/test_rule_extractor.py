@@ -0,0 +1,58 @@
+"""
+ルールベースの事前抽出のテスト
+フォーマット例の入力から抽出した確定フィールドが例の出力と一致すること、確信度による確定・未確定の振り分けを確認する
+
+    python -m pytest tests/test_rule_extractor.py -q
+"""
+from typing import Dict, Any
+
+import pytest
+
+import config
+from formatting.json_formatter import get_examples
+from formatting.rule_extractor import TARGET_FIELDS, bucket_likes, extract_fields, split_settled
+
+EXAMPLES = get_examples()
+
+
+@pytest.mark.parametrize("example", EXAMPLES, ids=[example["input"]["id"] for example in EXAMPLES])
+def test_settled_fields_match_examples(example: Dict[str, Any]) -> None:
+    settled, pending = split_settled(extract_fields(example["input"]), config.RULE_CONFIDENCE_THRESHOLD)
+
+    # スキ数の区分は入力のスキ数から決まる（例の出力の区分は入力のスキ数と対応していないため比較しない）
+    assert settled.pop("likes") == bucket_likes(example["input"]["likes"])
+    assert settled == {field: example["output"][field] for field in settled}
+    assert set(settled) | {"likes"} | set(pending) == set(TARGET_FIELDS)
+    # 人数とGMの要否はすべての例でルールだけで確定する
+    assert {"game_type", "gm_required", "min_players", "max_players"} <= set(settled)
+
+
+def test_play_time_without_context_is_left_to_llm() -> None:
+    # 「プレイ時間」などの表記がない例は、プレイ時間をLLMに問い合わせる
+    example = next(example for example in EXAMPLES if example["input"]["id"] == "4347791")
+
+    _, pending = split_settled(extract_fields(example["input"]), config.RULE_CONFIDENCE_THRESHOLD)
+
+    assert pending == ["play_time"]
+
+
+def test_split_settled_uses_threshold() -> None:
+    extraction = extract_fields(EXAMPLES[0]["input"])
+
+    settled, pending = split_settled(extraction, threshold=1.0)
+
+    # 確信度1.0はスキ数のしきい値による区分だけ
+    assert settled == {"likes": "500~"}
+    assert pending == [field for field in TARGET_FIELDS if field != "likes"]
+    # 出力の順はTARGET_FIELDSの順
+    assert split_settled({}, 0.0) == ({}, TARGET_FIELDS)
+
+
+def test_non_game_item_fills_play_fields_with_zero() -> None:
+    extraction = extract_fields({
+        "title": "【マダミス】霧雨の洋館 サウンドトラック", "description": "BGM集です。ゲームではありません。", "likes": 3})
+
+    assert {field: value for field, (value, _) in extraction.items() if field != "title"} == {
+        "likes": "~100", "game_type": "その他", "gm_required": "不要",
+        "min_players": 0, "max_players": 0, "play_time": {"avg": 0},
+    }
@@ -0,0 +1,92 @@
+"""
+整形スケジューラのテスト
+ワーカーで例外が起きてもアイテムを取りこぼさず・停止しないこと、サブディレクトリの同名ファイルの出力が重ならないことを確認する
+
+    python -m pytest tests/test_scheduler.py -q
+"""
+import os
+import json
+import threading
+from typing import Dict, List, Any, Optional
+
+import pytest
+
+from formatting.scheduler import FormatJob, run_format_jobs
+
+
+def _write_items(path: str, count: int, prefix: str = "") -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{"id": f"{prefix}{i}", "title": f"item {i}"} for i in range(count)], f)
+
+
+def _read_manifest(job: FormatJob) -> Dict[str, Any]:
+    with open(job.checkpoint.manifest_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _run_with_timeout(jobs: List[FormatJob], format_item: Any, max_workers: int, timeout: float = 30) -> Optional[int]:
+    """run_format_jobsを別スレッドで実行する（timeout秒以内に終わらなければNone）"""
+    result: List[int] = []
+    thread = threading.Thread(
+        target=lambda: result.append(run_format_jobs(jobs, format_item, max_workers, queue_size=2)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return result[0] if result else None
+
+
+def test_system_exit_in_worker_is_recorded_as_failure(tmp_path: Any) -> None:
+    input_file = str(tmp_path / "input" / "items.json")
+    _write_items(input_file, 50)
+    job = FormatJob(input_file, str(tmp_path / "output"))
+    job.prepare(resume=False)
+
+    def format_item(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if item["id"] == "3":
+            raise SystemExit(1)
+        return dict(item)
+
+    assert _run_with_timeout([job], format_item, max_workers=1) == 49
+    manifest = _read_manifest(job)
+    assert manifest["status"] == "completed"
+    assert manifest["processed"] == 49
+    assert manifest["failed"] == 1
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_producer_stops_when_all_workers_die(tmp_path: Any) -> None:
+    input_file = str(tmp_path / "input" / "items.json")
+    _write_items(input_file, 50)
+
+    class DyingJob(FormatJob):
+        died = False
+
+        def item_finished(self) -> None:
+            super().item_finished()
+            if threading.current_thread().name.startswith("format-worker") and not self.died:
+                self.died = True
+                # finallyの中の例外はワーカーの外に出てワーカーが終了する
+                raise RuntimeError("worker died")
+
+    job = DyingJob(input_file, str(tmp_path / "output"))
+    job.prepare(resume=False)
+
+    assert _run_with_timeout([job], dict, max_workers=1) == 1
+    assert _read_manifest(job)["status"] == "failed"
+
+
+def test_same_file_names_in_subdirectories_do_not_collide(tmp_path: Any) -> None:
+    input_dir = str(tmp_path / "input")
+    output_dir = str(tmp_path / "output")
+    paths = [os.path.join(input_dir, "a", "items.json"), os.path.join(input_dir, "b", "items.json")]
+    for prefix, path in zip(("a", "b"), paths):
+        _write_items(path, 3, prefix)
+    jobs = [FormatJob(path, output_dir, input_dir) for path in paths]
+    for job in jobs:
+        job.prepare(resume=False)
+
+    assert jobs[0].output_file != jobs[1].output_file
+    assert run_format_jobs(jobs, dict, max_workers=2) == 6
+    for prefix, job in zip(("a", "b"), jobs):
+        with open(job.output_file, "r", encoding="utf-8") as f:
+            assert sorted(item["id"] for item in json.load(f)) == [f"{prefix}{i}" for i in range(3)]
@@ -0,0 +1,123 @@
+"""
+全文検索のテスト
+日本語のbigram分割とMATCH式の組み立て、全文検索と人数などの条件を組み合わせた検索を確認する
+
+    python -m pytest tests/test_search_index.py -q
+"""
+import os
+import json
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+import pytest
+
+from utils.search_index import build_match_query, ngram_tokens
+from utils.storage import ItemStore
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# 商品ID -> (最小人数, 最大人数)
+PLAYERS: Dict[str, Tuple[int, int]] = {
+    "1000": (4, 5), "1001": (4, 4), "1002": (2, 2), "1004": (6, 6), "1005": (0, 0), "1006": (3, 5), "1007": (5, 5),
+}
+
+
+@pytest.mark.parametrize("text, for_index, expected", [
+    ("霧雨の洋館", False, ["霧雨", "雨の", "の洋", "洋館"]),
+    # インデックスには1文字の検索語のため末尾の1文字も登録する
+    ("霧雨の洋館", True, ["霧雨", "雨の", "の洋", "洋館", "館"]),
+    # 英字は単語ごと、数字はかな・漢字と続けて分割する
+    ("Murder Mystery 4人用", False, ["murder", "mystery", "4人", "人用"]),
+    # 全角・半角と大文字・小文字をそろえる
+    ("ＢＧＭ集", False, ["bgm", "集"]),
+    ("「館」", False, ["館"]),
+    ("", False, []),
+    (None, False, []),
+])
+def test_ngram_tokens(text: Optional[str], for_index: bool, expected: List[str]) -> None:
+    assert ngram_tokens(text, for_index) == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("洋館", '"洋館"'),
+    ("霧雨の洋館", '"霧雨 雨の の洋 洋館"'),
+    ("霧雨 洋館", '"霧雨" AND "洋館"'),
+    ("館", '"館"*'),
+    ("BGM", '"bgm"*'),
+    # FTS5の演算子になる記号は検索語に含めない
+    ('"洋館" OR', '"洋館" AND "or"*'),
+    ("！？ ・", None),
+])
+def test_build_match_query(query: str, expected: Optional[str]) -> None:
+    assert build_match_query(query) == expected
+
+
+@pytest.fixture
+def store(tmp_path: Any) -> Iterator[ItemStore]:
+    with open(os.path.join(FIXTURES_DIR, "booth", "items.json"), "r", encoding="utf-8") as f:
+        items = json.load(f)
+    with ItemStore(str(tmp_path / "booth.db")) as item_store:
+        item_store.upsert_items(items)
+        item_store.upsert_formatted([
+            {"id": item["id"], "title": item["title"], "min_players": PLAYERS[item["id"]][0], "max_players": PLAYERS[item["id"]][1]}
+            for item in items if item["id"] in PLAYERS
+        ])
+        yield item_store
+
+
+def _ids(results: List[Dict[str, Any]]) -> List[str]:
+    return sorted(result["id"] for result in results)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("霧雨", ["1000", "1005"]),
+    ("霧雨 bgm", ["1005"]),
+    # 1文字の語は語の途中・末尾の文字にも一致する
+    ("鴉", ["1002"]),
+    ("サークル3", ["1003"]),
+    ("存在しない作品", []),
+])
+def test_search_matches_title_author_description(store: ItemStore, query: str, expected: List[str]) -> None:
+    assert _ids(store.search(query)) == expected
+
+
+def test_search_combines_match_with_players_filter(store: ItemStore) -> None:
+    # 「霧雨」を含む商品のうち、4人で遊べるもの（サウンドトラックは0人）
+    results = store.search("霧雨", players=4)
+
+    assert _ids(results) == ["1000"]
+    assert (results[0]["min_players"], results[0]["max_players"]) == (4, 5)
+    assert results[0]["score"] > 0
+    # 条件のない検索語と組み合わせても人数で絞り込む
+    assert _ids(store.search("マーダーミステリー", players=5)) == ["1000", "1006", "1007"]
+    assert _ids(store.search("マーダーミステリー", players=5, max_price=3000)) == ["1000"]
+
+
+def test_filters_without_query_are_ordered_by_likes(store: ItemStore) -> None:
+    results = store.search(players=4)
+
+    assert [result["id"] for result in results] == ["1006", "1001", "1000"]
+    assert all(result["score"] is None for result in results)
+
+
+def test_title_matches_rank_first(store: ItemStore) -> None:
+    # タイトルに含む商品を、説明文だけに含む商品より上位にする
+    results = store.search("マーダーミステリー")
+
+    assert _ids(results[:4]) == ["1000", "1002", "1004", "1007"]
+    assert _ids(results[4:]) == ["1001", "1006"]
+    assert all("マーダーミステリー" in result["title"] for result in results[:4])
+
+
+def test_index_follows_updates(store: ItemStore) -> None:
+    store.upsert_items([{"id": "1003", "url": "https://booth.pm/ja/items/1003", "title": "雪山荘の殺人 完全版"}])
+
+    assert _ids(store.search("完全版")) == ["1003"]
+    # 作り直しても同じ結果になる
+    assert store.rebuild_search_index() == 8
+    assert _ids(store.search("完全版")) == ["1003"]
+    assert _ids(store.search("支援用")) == []
+
+
+def test_unknown_filter_is_rejected(store: ItemStore) -> None:
+    with pytest.raises(ValueError):
+        store.search("霧雨", min_players=4)
@@ -0,0 +1,75 @@
+"""
+起動時間のテスト
+python -X importtime でモジュールの読み込みを計測し、サブコマンドに必要のない重いモジュール
+（Playwright・requests・bs4・tqdmなど）を読み込んでいないこと、main.pyの読み込み時間が予算内であることを確認する
+
+    python -m pytest tests/test_startup_time.py -q
+    STARTUP_IMPORT_BUDGET_MS=150 python -m pytest tests/test_startup_time.py -q   # 予算（ミリ秒）を変える
+"""
+import os
+import sys
+import subprocess
+from typing import Dict, List
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# import mainの読み込み時間の予算（ミリ秒）
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "100"))
+
+# --helpでは読み込まないモジュール
+FEATURE_MODULES: List[str] = [
+    "playwright", "requests", "bs4", "tqdm", "pyarrow", "google.genai",
+    "scraping.booth_scraper", "formatting.json_formatter", "formatting.evaluation",
+]
+
+
+def import_times(*args: str) -> Dict[str, int]:
+    """
+    python -X importtime で実行し、読み込んだモジュールごとの累計の読み込み時間（マイクロ秒）を返す
+
+    Args:
+        args: pythonに渡す引数（-X importtimeの後に続ける）
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=PROJECT_DIR, capture_output=True, text=True, encoding="utf-8", timeout=60)
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def _loaded(times: Dict[str, int], modules: List[str]) -> List[str]:
+    """modules（パッケージの場合は配下も含む）のうち読み込まれたもの"""
+    return sorted(name for name in times if any(name == module or name.startswith(module + ".") for module in modules))
+
+
+def test_help_does_not_import_feature_modules() -> None:
+    times = import_times("main.py", "--help")
+    assert _loaded(times, FEATURE_MODULES) == []
+
+
+@pytest.mark.parametrize("module, unused", [
+    # scrapeコマンドでは整形のモジュールを読み込まない
+    ("scraping.booth_scraper", ["playwright", "tqdm", "formatting.json_formatter"]),
+    # formatコマンドではスクレイピング・ブラウザのモジュールを読み込まない
+    ("formatting.json_formatter", ["playwright", "bs4", "scraping", "asyncio"]),
+])
+def test_subcommand_imports_only_what_it_uses(module: str, unused: List[str]) -> None:
+    times = import_times("-c", f"import {module}")
+    assert _loaded(times, unused) == []
+
+
+def test_main_import_budget() -> None:
+    # 1回目は.pycの作成を含むため、2回目を計測する
+    import_times("-c", "import main")
+    times = import_times("-c", "import main")
+    elapsed_ms = times["main"] / 1000
+    slowest = sorted(times.items(), key=lambda entry: -entry[1])[:5]
+    assert elapsed_ms <= IMPORT_BUDGET_MS, f"import mainに{elapsed_ms:.1f}ミリ秒（予算 {IMPORT_BUDGET_MS}ミリ秒）: {slowest}"
@@ -0,0 +1,45 @@
+"""
+パーセンタイルのテスト
+テレメトリ・クロールのメトリクス・ヘッジの待ち時間が、同じ値から同じパーセンタイルを求めることを確認する
+
+    python -m pytest tests/test_stats.py -q
+"""
+from typing import List, Optional
+
+import pytest
+
+from formatting.hedging import HedgedCaller
+from scraping.metrics import CrawlMetrics
+from utils.stats import percentile, format_seconds
+
+LATENCIES = [float(i) for i in range(1, 21)]
+
+
+@pytest.mark.parametrize("values, q, expected", [
+    (LATENCIES, 50, 10.0),
+    (LATENCIES, 95, 19.0),
+    (LATENCIES, 100, 20.0),
+    (LATENCIES, 0, 1.0),
+    ([3.0], 95, 3.0),
+    ([], 50, None),
+])
+def test_percentile_is_nearest_rank(values: List[float], q: float, expected: Optional[float]) -> None:
+    assert percentile(values, q) == expected
+
+
+def test_metrics_and_hedge_delay_use_same_percentile() -> None:
+    metrics = CrawlMetrics()
+    hedger = HedgedCaller("test", quantile=0.95, min_samples=1, window=100, min_delay=0.0)
+    for latency in LATENCIES:
+        metrics.observe("item_fetch", latency)
+        hedger._record_latency(latency)
+
+    expected = percentile(LATENCIES, 95)
+    assert metrics.summary()["stages"]["item_fetch"]["p95_seconds"] == expected
+    assert hedger.hedge_delay() == expected
+
+
+def test_format_seconds() -> None:
+    assert format_seconds(1.23456) == "1.23秒"
+    assert format_seconds(1.23456, 3) == "1.235秒"
+    assert format_seconds(None) == "-"
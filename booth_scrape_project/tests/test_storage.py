@@ -0,0 +1,138 @@
+"""
+SQLiteによる保存のテスト
+同じ商品IDの再保存が1行に上書きされ、変わったフィールドが履歴に残ること、書き出しがJSONの出力と同じ形になることを確認する
+
+    python -m pytest tests/test_storage.py -q
+"""
+import os
+import json
+from typing import Dict, List, Any, Iterator
+
+import pytest
+
+from utils.data_utils import save_to_json
+from utils.storage import ItemStore, BatchWriter, TABLE_ITEMS, TABLE_FORMATTED
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@pytest.fixture
+def items() -> List[Dict[str, Any]]:
+    with open(os.path.join(FIXTURES_DIR, "booth", "items.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def store(tmp_path: Any) -> Iterator[ItemStore]:
+    with ItemStore(str(tmp_path / "db" / "booth.db")) as item_store:
+        yield item_store
+
+
+def _formatted(item: Dict[str, Any], likes: str = "~100") -> Dict[str, Any]:
+    return {
+        "url": item["url"], "id": item["id"], "title": item["title"], "price": item["price"], "likes": likes,
+        "author": item["author"], "game_type": "マーダーミステリー", "gm_required": "必要",
+        "min_players": 4, "max_players": 5, "play_time": {"avg": 180}, "thumbnail_url": item["thumbnail_url"],
+    }
+
+
+def test_upsert_keeps_one_row_per_item(store: ItemStore, items: List[Dict[str, Any]]) -> None:
+    assert store.upsert_items(items, keyword="マダミス") == len(items)
+    # 同じ商品を再保存しても行は増えず、履歴も残らない
+    assert store.upsert_items(items, keyword="マダミス") == len(items)
+
+    assert store.count() == len(items)
+    assert list(store.iter_items()) == sorted(items, key=lambda item: item["id"])
+    assert store.get_history(items[0]["id"]) == []
+
+
+def test_changed_fields_are_recorded_in_history(store: ItemStore, items: List[Dict[str, Any]]) -> None:
+    item = items[0]
+    store.upsert_items([item])
+
+    store.upsert_items([{**item, "price": item["price"] + 500, "likes": item["likes"] + 10}])
+    store.upsert_items([{**item, "price": item["price"] + 500, "likes": item["likes"] + 20, "author": "別のサークル"}])
+
+    history = [(entry["field"], entry["old_value"], entry["new_value"]) for entry in store.get_history(item["id"])]
+    # 変わりやすいフィールド（タイトル・価格・スキ数）だけを古い順に記録する
+    assert history == [
+        ("price", str(item["price"]), str(item["price"] + 500)),
+        ("likes", str(item["likes"]), str(item["likes"] + 10)),
+        ("likes", str(item["likes"] + 10), str(item["likes"] + 20)),
+    ]
+    assert all(entry["changed_at"] for entry in store.get_history(item["id"]))
+    # 作者は上書きするが履歴は残さない
+    assert next(store.iter_items())["author"] == "別のサークル"
+    # 整形済みのテーブルの履歴とは分けて記録する
+    assert store.get_history(item["id"], TABLE_FORMATTED) == []
+
+
+def test_missing_values_do_not_overwrite(store: ItemStore, items: List[Dict[str, Any]]) -> None:
+    item = items[0]
+    store.upsert_items([item])
+
+    # スキ数の取得に失敗した再取得では、保存済みのスキ数を残す
+    store.upsert_items([{**item, "likes": None}])
+
+    assert next(store.iter_items())["likes"] == item["likes"]
+    assert store.get_history(item["id"]) == []
+
+
+def test_formatted_items_round_trip(store: ItemStore, items: List[Dict[str, Any]]) -> None:
+    formatted = [_formatted(item) for item in items]
+    store.upsert_formatted(formatted)
+    store.upsert_formatted([_formatted(items[0], likes="100~500")])
+
+    assert store.count(TABLE_FORMATTED) == len(items)
+    assert store.count(TABLE_ITEMS) == 0
+    stored = list(store.iter_items(TABLE_FORMATTED, batch_size=3))
+    assert stored[0] == _formatted(items[0], likes="100~500")
+    assert stored[1:] == sorted(formatted, key=lambda item: item["id"])[1:]
+    assert [entry["new_value"] for entry in store.get_history(items[0]["id"], TABLE_FORMATTED)] == ["100~500"]
+
+
+@pytest.mark.parametrize("name", ["export.json", "export.jsonl"])
+def test_export_matches_json_output(store: ItemStore, items: List[Dict[str, Any]], tmp_path: Any, name: str) -> None:
+    store.upsert_items(items)
+    output_file = str(tmp_path / "out" / name)
+
+    assert store.export(output_file) == len(items)
+
+    expected = sorted(items, key=lambda item: item["id"])
+    with open(output_file, "r", encoding="utf-8") as f:
+        if name.endswith(".jsonl"):
+            assert [json.loads(line) for line in f] == expected
+        else:
+            text = f.read()
+            # save_to_jsonで書いたファイルと同じ内容になる
+            json_file = str(tmp_path / "expected.json")
+            save_to_json(expected, json_file)
+            with open(json_file, "r", encoding="utf-8") as expected_file:
+                assert text == expected_file.read()
+
+
+def test_export_empty_table(store: ItemStore, tmp_path: Any) -> None:
+    output_file = str(tmp_path / "empty.json")
+
+    assert store.export(output_file, TABLE_FORMATTED) == 0
+    with open(output_file, "r", encoding="utf-8") as f:
+        assert json.load(f) == []
+
+
+def test_unknown_table_is_rejected(store: ItemStore) -> None:
+    with pytest.raises(ValueError):
+        store.count("item_history")
+    with pytest.raises(ValueError):
+        BatchWriter(store, "item_history")
+
+
+def test_batch_writer_writes_in_batches(store: ItemStore, items: List[Dict[str, Any]]) -> None:
+    writer = BatchWriter(store, TABLE_ITEMS, batch_size=3, keyword="マダミス")
+
+    for item in items[:4]:
+        writer.add(item)
+    assert store.count() == 3
+    writer.flush()
+
+    assert store.count() == 4
+    assert writer.written == 4
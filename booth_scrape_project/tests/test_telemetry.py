@@ -0,0 +1,45 @@
+"""
+テレメトリのテスト
+呼び出しの記録をメモリに保持せず、書き出したJSONLから集計できること、パーセンタイル用のサンプル数に上限があることを確認する
+
+    python -m pytest tests/test_telemetry.py -q
+"""
+import json
+from typing import Any
+
+from formatting import telemetry
+
+
+def test_summary_is_computed_from_log_file(tmp_path: Any) -> None:
+    log = telemetry.TelemetryLog(str(tmp_path), run_id="test")
+    for i in range(10):
+        log.record(item_id=str(i // 2), api_type="gemini", model="gemini-2.0-flash-001", attempt=i % 2,
+                   latency=float(i + 1), queue_time=0.5, prompt_tokens=1000, output_tokens=100,
+                   outcome=telemetry.OUTCOME_OK if i % 2 else telemetry.OUTCOME_ERROR)
+    log.record(item_id="0", api_type="ollama", model="gemma3:12b", attempt=0, latency=None, queue_time=None,
+               prompt_tokens=None, output_tokens=None, outcome=telemetry.OUTCOME_HEDGE_LOSER)
+    assert not hasattr(log, "_records")
+
+    summary = log.close()
+
+    gemini = summary["models"]["gemini:gemini-2.0-flash-001"]
+    assert (summary["calls"], summary["items"]) == (11, 5)
+    assert (gemini["calls"], gemini["items"], gemini["ok"], gemini["errors"], gemini["retries"]) == (10, 5, 5, 5, 5)
+    assert (gemini["latency_p50"], gemini["latency_p95"], gemini["queue_time_p95"]) == (5.0, 10.0, 0.5)
+    assert (gemini["prompt_tokens"], gemini["output_tokens"], gemini["tokens_per_item"]) == (10000, 1000, 2200.0)
+    assert gemini["cost_usd"] == 0.0014
+    assert summary["models"]["ollama:gemma3:12b"]["hedge_losers"] == 1
+    with open(log.summary_file, "r", encoding="utf-8") as f:
+        assert json.load(f) == summary
+
+
+def test_percentile_samples_are_bounded() -> None:
+    stats = telemetry.ModelStats("gemma3:12b", samples=100)
+    for i in range(10000):
+        stats.add({"item_id": str(i), "latency": float(i), "outcome": telemetry.OUTCOME_OK})
+
+    assert len(stats.latencies.samples) == 100
+    summary = stats.to_dict()
+    assert summary["calls"] == 10000
+    # 間引いたサンプルからでも中央値はおおよそ求まる
+    assert 3000 <= summary["latency_p50"] <= 7000
@@ -0,0 +1,177 @@
+"""
+サムネイル画像のダウンロードのテスト
+同じURLは実行中に1回だけ取得し、同じ内容の画像は1つのファイルにまとめること、
+再実行時はETag・Last-Modifiedの条件付きリクエストで変更がなければ再ダウンロードしないことを確認する
+
+    python -m pytest tests/test_thumbnails.py -q
+"""
+import os
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler
+from typing import Dict, List, Any, Iterator, Tuple
+
+import pytest
+
+from scraping.metrics import CrawlMetrics, STAGE_THUMBNAIL
+from scraping.thumbnails import (
+    ThumbnailDownloader, ThumbnailStore,
+    RESULT_DOWNLOADED, RESULT_DUPLICATE, RESULT_NOT_MODIFIED, RESULT_FAILED,
+)
+from tests.mock_servers import MockServer
+from utils.rate_limiter import RateLimiter
+
+LAST_MODIFIED = "Mon, 19 Oct 2026 00:00:00 GMT"
+
+
+class MockImageServer(MockServer):
+    """
+    画像サーバーのモック
+
+    /images/<名前> で登録した画像を返し、ETagが一致する条件付きリクエストには304を返す。
+    受け付けたリクエストのパスと条件付きリクエストのヘッダーを記録する
+    """
+
+    name = "images"
+
+    def __init__(self, images: Dict[str, bytes], **kwargs: Any) -> None:
+        # 同じURLへの並行したリクエストが重なるよう、応答を少し遅らせる
+        kwargs.setdefault("latency", 0.05)
+        super().__init__(**kwargs)
+        self.images = dict(images)
+        self.received: List[Tuple[str, Dict[str, str]]] = []
+        self._received_lock = threading.Lock()
+
+    def etag(self, name: str) -> str:
+        return '"' + hashlib.md5(self.images[name]).hexdigest() + '"'
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str, body: bytes) -> None:
+        conditions = {key: handler.headers[key] for key in ("If-None-Match", "If-Modified-Since") if handler.headers.get(key)}
+        with self._received_lock:
+            self.received.append((handler.path, conditions))
+        name = handler.path.rsplit("/", 1)[-1]
+        if name not in self.images:
+            self.send(handler, 404, b"not found", "text/plain")
+            return
+        headers = {"ETag": self.etag(name), "Last-Modified": LAST_MODIFIED}
+        if conditions.get("If-None-Match") == headers["ETag"]:
+            self.send(handler, 304, b"", "image/jpeg", headers)
+            return
+        self.send(handler, 200, self.images[name], "image/jpeg", headers)
+
+    def paths(self) -> List[str]:
+        with self._received_lock:
+            return sorted(path for path, _ in self.received)
+
+
+@pytest.fixture
+def server() -> Iterator[MockImageServer]:
+    image_server = MockImageServer({
+        "icon.jpg": b"icon-image",
+        "main.jpg": b"main-image",
+        # 別のURLで同じ内容の画像
+        "copy.jpg": b"main-image",
+    }).start()
+    yield image_server
+    image_server.stop()
+
+
+def _downloader(root: str, metrics: CrawlMetrics) -> ThumbnailDownloader:
+    return ThumbnailDownloader(ThumbnailStore(root), max_workers=4, rate_limiter=RateLimiter(0), metrics=metrics)
+
+
+def _items(server: MockImageServer, names: List[str]) -> List[Dict[str, Any]]:
+    return [{"id": str(1000 + i), "thumbnail_url": f"{server.url}/images/{name}"} for i, name in enumerate(names)]
+
+
+def test_each_url_is_fetched_once(server: MockImageServer, tmp_path: Any) -> None:
+    root = str(tmp_path / "thumbnails")
+    metrics = CrawlMetrics()
+    items = _items(server, ["icon.jpg", "icon.jpg", "main.jpg", "icon.jpg", "copy.jpg"])
+
+    with _downloader(root, metrics) as downloader:
+        results = downloader.download_all(items)
+
+    # ショップのアイコンなど同じURLは並行して要求されても1回だけ取得する
+    assert server.paths() == ["/images/copy.jpg", "/images/icon.jpg", "/images/main.jpg"]
+    assert downloader.results == {RESULT_DOWNLOADED: 2, RESULT_DUPLICATE: 1, RESULT_NOT_MODIFIED: 0, RESULT_FAILED: 0}
+    assert metrics.summary()["stages"][STAGE_THUMBNAIL]["count"] == 3
+
+    assert results == items
+    assert {item["thumbnail_path"] for item in items[:2] + items[3:4]} == {items[0]["thumbnail_path"]}
+    # 同じ内容の画像は1つのファイルにまとまる
+    assert items[2]["thumbnail_path"] == items[4]["thumbnail_path"]
+    assert items[2]["thumbnail_sha256"] == hashlib.sha256(b"main-image").hexdigest()
+    with open(items[2]["thumbnail_path"], "rb") as f:
+        assert f.read() == b"main-image"
+    assert items[2]["thumbnail_path"].endswith(".jpg")
+    assert os.path.exists(os.path.join(root, "index.json"))
+
+
+def test_unchanged_images_are_not_downloaded_again(server: MockImageServer, tmp_path: Any) -> None:
+    root = str(tmp_path / "thumbnails")
+    with _downloader(root, CrawlMetrics()) as downloader:
+        first = [dict(item) for item in downloader.download_all(_items(server, ["icon.jpg", "main.jpg"]))]
+    server.received.clear()
+
+    # 再実行（index.jsonから記録を読み込む）
+    with _downloader(root, CrawlMetrics()) as downloader:
+        second = downloader.download_all(_items(server, ["icon.jpg", "main.jpg"]))
+
+    assert downloader.results[RESULT_NOT_MODIFIED] == 2
+    assert downloader.results[RESULT_DOWNLOADED] == 0
+    # 前回のETag・Last-Modifiedで条件付きリクエストを送る
+    assert sorted(server.received) == [
+        ("/images/icon.jpg", {"If-None-Match": server.etag("icon.jpg"), "If-Modified-Since": LAST_MODIFIED}),
+        ("/images/main.jpg", {"If-None-Match": server.etag("main.jpg"), "If-Modified-Since": LAST_MODIFIED}),
+    ]
+    assert [item["thumbnail_path"] for item in second] == [item["thumbnail_path"] for item in first]
+
+
+def test_changed_image_is_downloaded_again(server: MockImageServer, tmp_path: Any) -> None:
+    root = str(tmp_path / "thumbnails")
+    with _downloader(root, CrawlMetrics()) as downloader:
+        old_path = downloader.download_all(_items(server, ["icon.jpg"]))[0]["thumbnail_path"]
+
+    server.images["icon.jpg"] = b"new-icon-image"
+    with _downloader(root, CrawlMetrics()) as downloader:
+        item = downloader.download_all(_items(server, ["icon.jpg"]))[0]
+
+    assert downloader.results[RESULT_DOWNLOADED] == 1
+    assert item["thumbnail_sha256"] == hashlib.sha256(b"new-icon-image").hexdigest()
+    assert item["thumbnail_path"] != old_path
+
+
+def test_missing_image_file_is_fetched_without_conditions(server: MockImageServer, tmp_path: Any) -> None:
+    root = str(tmp_path / "thumbnails")
+    with _downloader(root, CrawlMetrics()) as downloader:
+        path = downloader.download_all(_items(server, ["icon.jpg"]))[0]["thumbnail_path"]
+    os.remove(path)
+    server.received.clear()
+
+    # 記録があっても画像のファイルがなければ条件を付けずに取得し直す
+    with _downloader(root, CrawlMetrics()) as downloader:
+        item = downloader.download_all(_items(server, ["icon.jpg"]))[0]
+
+    assert server.received == [("/images/icon.jpg", {})]
+    assert item["thumbnail_path"] == path
+    assert os.path.exists(path)
+
+
+def test_failed_download_keeps_saved_image(server: MockImageServer, tmp_path: Any) -> None:
+    root = str(tmp_path / "thumbnails")
+    with _downloader(root, CrawlMetrics()) as downloader:
+        path = downloader.download_all(_items(server, ["icon.jpg"]))[0]["thumbnail_path"]
+
+    del server.images["icon.jpg"]
+    metrics = CrawlMetrics()
+    with _downloader(root, metrics) as downloader:
+        cached, missing, no_url = downloader.download_all(
+            _items(server, ["icon.jpg", "unknown.jpg"]) + [{"id": "2000", "thumbnail_url": None}])
+
+    assert downloader.results[RESULT_FAILED] == 2
+    # 取得に失敗しても保存済みの画像があればそれを使う
+    assert cached["thumbnail_path"] == path
+    assert missing["thumbnail_path"] is None and missing["thumbnail_sha256"] is None
+    assert no_url["thumbnail_path"] is None
+    assert sum(metrics.summary()["stages"][STAGE_THUMBNAIL]["errors"].values()) == 2
@@ -0,0 +1,129 @@
+"""
+整形結果の検証とモデルカスケードのテスト
+スキーマ・整合性ルールに反するフィールドが理由とともに返ること、検証に通らなかったアイテムだけが次のモデルに回ることを確認する
+
+    python -m pytest tests/test_validation.py -q
+"""
+from typing import Dict, List, Any, Optional, Tuple
+
+import pytest
+
+from formatting.cascade import ModelCascade, parse_cascade
+from formatting.validation import validate_formatted_item, MAX_PLAYERS_LIMIT, MAX_PLAY_TIME_LIMIT
+
+VALID_ITEM: Dict[str, Any] = {
+    "title": "霧雨の洋館", "likes": "100~500", "game_type": "マーダーミステリー", "gm_required": "不要",
+    "min_players": 4, "max_players": 5, "play_time": {"avg": 120},
+}
+
+
+def test_valid_item_has_no_errors() -> None:
+    assert validate_formatted_item(VALID_ITEM) == {}
+    # 対象外のフィールドは検証しない
+    assert validate_formatted_item({**VALID_ITEM, "extra": None}) == {}
+
+
+@pytest.mark.parametrize("changes, fields", [
+    # 型・列挙値の誤り
+    ({"title": ""}, ["title"]),
+    ({"likes": "100以上"}, ["likes"]),
+    ({"gm_required": "GM必須"}, ["gm_required"]),
+    ({"min_players": "4"}, ["min_players"]),
+    ({"max_players": True}, ["max_players"]),
+    ({"play_time": 120}, ["play_time"]),
+    ({"play_time": {"min": 120}}, ["play_time"]),
+    ({"game_type": None}, ["game_type"]),
+    # 範囲外
+    ({"max_players": MAX_PLAYERS_LIMIT + 1}, ["max_players"]),
+    ({"min_players": -1}, ["min_players"]),
+    ({"play_time": {"avg": MAX_PLAY_TIME_LIMIT + 1}}, ["play_time"]),
+    # 整合性ルール
+    ({"min_players": 6}, ["min_players", "max_players"]),
+    ({"min_players": 0, "max_players": 0}, ["max_players"]),
+])
+def test_invalid_fields_are_reported(changes: Dict[str, Any], fields: List[str]) -> None:
+    errors = validate_formatted_item({**VALID_ITEM, **changes})
+
+    assert sorted(errors) == sorted(fields)
+    assert all(errors.values())
+
+
+def test_missing_field_and_field_filter() -> None:
+    item = {key: value for key, value in VALID_ITEM.items() if key != "play_time"}
+
+    assert validate_formatted_item(item) == {"play_time": "値がありません"}
+    # 対象を指定した場合はそのフィールドだけを返す
+    assert validate_formatted_item(item, fields=["title", "likes"]) == {}
+
+
+def test_other_game_type_allows_zero_players() -> None:
+    item = {**VALID_ITEM, "game_type": "その他", "min_players": 0, "max_players": 0, "play_time": {"avg": 0}}
+
+    assert validate_formatted_item(item) == {}
+
+
+class FakeModels:
+    """モデルごとに決まった整形結果を返す整形関数"""
+
+    def __init__(self, results: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        self.results = results
+        self.calls: List[Tuple[str, str]] = []
+
+    def __call__(self, item: Dict[str, Any], api_type: str, model_name: str) -> Optional[Dict[str, Any]]:
+        self.calls.append((api_type, model_name))
+        return self.results[model_name]
+
+
+TIERS = parse_cascade("ollama:gemma3:4b,gemini:gemini-2.0-flash-001")
+
+
+def test_cascade_escalates_invalid_output() -> None:
+    models = FakeModels({"gemma3:4b": {**VALID_ITEM, "gm_required": "GM必須"}, "gemini-2.0-flash-001": VALID_ITEM})
+    cascade = ModelCascade(TIERS, models)
+
+    assert cascade.format({"id": "1"}) == VALID_ITEM
+
+    assert models.calls == TIERS
+    first, second = cascade.get_stats()
+    assert (first["attempts"], first["rejected"], first["accepted"]) == (1, 1, 0)
+    assert (second["attempts"], second["accepted"], second["acceptance_rate"]) == (1, 1, 1.0)
+    assert cascade.exhausted == 0
+
+
+def test_cascade_stops_at_first_valid_output() -> None:
+    models = FakeModels({"gemma3:4b": VALID_ITEM, "gemini-2.0-flash-001": VALID_ITEM})
+    cascade = ModelCascade(TIERS, models)
+
+    assert cascade.format({"id": "1"}) == VALID_ITEM
+    assert models.calls == TIERS[:1]
+
+
+def test_cascade_escalates_failed_call_and_returns_last_result() -> None:
+    invalid = {**VALID_ITEM, "max_players": MAX_PLAYERS_LIMIT + 1}
+    models = FakeModels({"gemma3:4b": None, "gemini-2.0-flash-001": invalid})
+    cascade = ModelCascade(TIERS, models)
+
+    # すべての段で検証に通らなかった場合は最後の結果を返す
+    assert cascade.format({"id": "1"}) == invalid
+
+    first, second = cascade.get_stats()
+    assert first["failed"] == 1
+    assert second["rejected"] == 1
+    assert cascade.exhausted == 1
+
+
+def test_cascade_repairs_before_escalating() -> None:
+    models = FakeModels({"gemma3:4b": {**VALID_ITEM, "likes": "100以上"}, "gemini-2.0-flash-001": VALID_ITEM})
+    repairs: List[Dict[str, str]] = []
+
+    def repair(item: Dict[str, Any], result: Dict[str, Any], errors: Dict[str, str], api_type: str, model_name: str) -> Dict[str, Any]:
+        repairs.append(errors)
+        return {**result, "likes": "100~500"}
+
+    cascade = ModelCascade(TIERS, models, repair_func=repair)
+
+    assert cascade.format({"id": "1"}) == VALID_ITEM
+    # 不正なフィールドだけが修正関数に渡され、次の段には回らない
+    assert [list(errors) for errors in repairs] == [["likes"]]
+    assert models.calls == TIERS[:1]
+    assert cascade.get_stats()[0]["repaired"] == 1
@@ -0,0 +1,253 @@
+"""
+整形済みアイテムの列指向形式（Parquet・Arrow）への書き出しと集計
+価格・スキ数・人数は整数、ゲーム種別・GMの要否はカテゴリ（辞書型）、プレイ時間は構造体として書き出し、
+Arrowファイルはメモリマップで読み込んでベクトル演算で分布を集計する（pyarrowが必要）
+"""
+import os
+import json
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Tuple
+import config
+from formatting.rule_extractor import bucket_likes
+
+
+def _import_pyarrow() -> Any:
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError as e:
+        raise ImportError("pyarrow がインストールされていません。pip install pyarrow を実行してください。") from e
+
+
+def build_schema() -> Any:
+    """整形済みアイテムのArrowスキーマを作る"""
+    pa = _import_pyarrow()
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("id", pa.string()),
+        ("url", pa.string()),
+        ("title", pa.string()),
+        ("price", pa.int64()),
+        ("likes", pa.int64()),
+        ("likes_bucket", category),
+        ("author", pa.string()),
+        ("game_type", category),
+        ("gm_required", category),
+        ("min_players", pa.int64()),
+        ("max_players", pa.int64()),
+        ("play_time", pa.struct([("avg", pa.int64())])),
+        ("thumbnail_url", pa.string()),
+    ])
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (ValueError, TypeError):
+        return None
+
+
+def to_record(item: Dict[str, Any], likes_count: Optional[int] = None) -> Dict[str, Any]:
+    """
+    整形済みのアイテムを列指向形式の1行にする
+
+    整形済みのlikesは区分（"~100"など）のため、スキ数そのものはlikes_countから取る（不明の場合はnull）
+
+    Args:
+        item: 整形済みのアイテム
+        likes_count: スクレイピング時のスキ数
+    """
+    likes = item.get("likes")
+    if isinstance(likes, int) and not isinstance(likes, bool):
+        likes_count = likes if likes_count is None else likes_count
+        likes = bucket_likes(likes)
+    play_time = item.get("play_time")
+    if isinstance(play_time, dict):
+        play_time = play_time.get("avg")
+    play_time = _to_int(play_time)
+    return {
+        "id": str(item["id"]) if item.get("id") is not None else None,
+        "url": item.get("url"),
+        "title": item.get("title"),
+        "price": _to_int(item.get("price")),
+        "likes": _to_int(likes_count),
+        "likes_bucket": likes,
+        "author": item.get("author"),
+        "game_type": item.get("game_type"),
+        "gm_required": item.get("gm_required"),
+        "min_players": _to_int(item.get("min_players")),
+        "max_players": _to_int(item.get("max_players")),
+        "play_time": {"avg": play_time} if play_time is not None else None,
+        "thumbnail_url": item.get("thumbnail_url"),
+    }
+
+
+def _batches(records: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch: List[Dict[str, Any]] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_columnar(items: Iterable[Dict[str, Any]], output_file: str, likes_counts: Optional[Dict[str, int]] = None, batch_size: Optional[int] = None) -> int:
+    """
+    整形済みのアイテムをParquetまたはArrow（IPCファイル形式）に書き出す
+
+    拡張子が.parquetの場合はParquet、.arrow・.featherの場合はArrowとする。
+    アイテムはbatch_size件ずつ書き込むため、全件をメモリに読み込まない
+
+    Args:
+        items: 整形済みのアイテム
+        output_file: 出力ファイル
+        likes_counts: 商品IDごとのスキ数（データベースのitemsテーブルなどから）
+        batch_size: 1回に書き込む行数（省略時はconfig.COLUMNAR_BATCH_SIZE）
+
+    Returns:
+        書き出した行数
+    """
+    pa = _import_pyarrow()
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension not in (".parquet", ".arrow", ".feather"):
+        raise ValueError(f"出力ファイルの拡張子は .parquet・.arrow・.feather のいずれかにしてください: {output_file}")
+
+    schema = build_schema()
+    likes_counts = likes_counts or {}
+    records = (to_record(item, likes_counts.get(str(item.get("id")))) for item in items)
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+
+    count = 0
+    if extension == ".parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(output_file, schema, compression="zstd")
+    else:
+        import pyarrow.ipc
+        # メモリマップで読み込めるよう圧縮しない
+        writer = pyarrow.ipc.new_file(output_file, schema)
+    try:
+        for batch in _batches(records, batch_size or config.COLUMNAR_BATCH_SIZE):
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    finally:
+        writer.close()
+    return count
+
+
+def read_columnar(input_file: str, columns: Optional[List[str]] = None) -> Any:
+    """
+    列指向形式のファイルを読み込む
+
+    Arrowファイルはメモリマップで読み込むため、データをコピーせずページキャッシュ上で集計できる。
+    Parquetは必要な列だけを展開する
+
+    Args:
+        input_file: .parquet・.arrow・.featherのファイル
+        columns: 読み込む列（省略時はすべて）
+
+    Returns:
+        pyarrow.Table
+    """
+    pa = _import_pyarrow()
+    if input_file.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.read_table(input_file, columns=columns, memory_map=True)
+    import pyarrow.ipc
+    table = pyarrow.ipc.open_file(pa.memory_map(input_file, "r")).read_all()
+    return table.select(columns) if columns else table
+
+
+def _value_counts(column: Any) -> Dict[str, int]:
+    """列の値ごとの件数を求める（nullは「不明」として数える）"""
+    import pyarrow.compute as pc
+    pa = _import_pyarrow()
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    counts = {}
+    for entry in pc.value_counts(column).to_pylist():
+        key = entry["values"]
+        counts["不明" if key is None else str(key)] = entry["counts"]
+    return dict(sorted(counts.items(), key=lambda entry: -entry[1]))
+
+
+def _band_counts(column: Any, bounds: List[int]) -> Dict[str, int]:
+    """区間ごとの件数を求める（boundsは区間の下限の昇順、最後の区間は上限なし）"""
+    import pyarrow.compute as pc
+    counts = {}
+    for lower, upper in zip(bounds, bounds[1:] + [None]):
+        mask = pc.greater_equal(column, lower)
+        label = f"{lower}~"
+        if upper is not None:
+            mask = pc.and_(mask, pc.less(column, upper))
+            label = f"{lower}~{upper - 1}"
+        counts[label] = pc.sum(mask).as_py() or 0
+    counts["不明"] = column.null_count
+    return counts
+
+
+def _histogram(column: Any) -> Dict[str, int]:
+    """整数の列の値ごとの件数を値の順に求める"""
+    counts = _value_counts(column)
+    return dict(sorted(counts.items(), key=lambda entry: (entry[0] == "不明", int(entry[0]) if entry[0] != "不明" else 0)))
+
+
+def compute_stats(input_file: str) -> Dict[str, Any]:
+    """
+    列指向形式のファイルから分布を集計する
+
+    Returns:
+        件数、スキ数の区分・価格帯・人数・ゲーム種別・GMの要否ごとの件数、プレイ時間の分位点を含む辞書
+    """
+    import pyarrow.compute as pc
+    columns = ["price", "likes_bucket", "game_type", "gm_required", "min_players", "max_players", "play_time"]
+    table = read_columnar(input_file, columns)
+    play_time = pc.struct_field(table.column("play_time"), [0])
+    quantiles = pc.quantile(play_time, q=[0.5, 0.9], interpolation="nearest").to_pylist() if len(play_time) - play_time.null_count else [None, None]
+
+    # 人数は(最小, 最大)の組み合わせごとにも数える
+    players = pc.binary_join_element_wise(
+        pc.cast(table.column("min_players"), "string"), pc.cast(table.column("max_players"), "string"), "-")
+    return {
+        "rows": table.num_rows,
+        "likes_buckets": _value_counts(table.column("likes_bucket")),
+        "price_bands": _band_counts(table.column("price"), config.STATS_PRICE_BANDS),
+        "min_players": _histogram(table.column("min_players")),
+        "max_players": _histogram(table.column("max_players")),
+        "player_ranges": _value_counts(players),
+        "game_type": _value_counts(table.column("game_type")),
+        "gm_required": _value_counts(table.column("gm_required")),
+        "play_time": {
+            "mean": pc.mean(play_time).as_py(),
+            "p50": quantiles[0],
+            "p90": quantiles[1],
+            "unknown": play_time.null_count,
+        },
+    }
+
+
+def print_stats(stats: Dict[str, Any]) -> None:
+    """集計結果を表示する"""
+    print(f"件数: {stats['rows']}")
+    sections: List[Tuple[str, str]] = [
+        ("likes_buckets", "スキ数の区分"), ("price_bands", "価格帯（円）"), ("game_type", "ゲーム種別"),
+        ("gm_required", "GMの要否"), ("min_players", "最小人数"), ("max_players", "最大人数"),
+        ("player_ranges", "人数（最小-最大、上位10件）"),
+    ]
+    for key, label in sections:
+        counts = stats[key]
+        if key == "player_ranges":
+            counts = dict(list(counts.items())[:10])
+        print(f"{label}:")
+        for value, count in counts.items():
+            share = count / stats["rows"] if stats["rows"] else 0.0
+            print(f"  {value}: {count}件 ({share:.1%})")
+    play_time = stats["play_time"]
+    mean = f"{play_time['mean']:.1f}分" if play_time["mean"] is not None else "-"
+    print(f"プレイ時間: 平均 {mean}, 中央値 {play_time['p50']}分, p90 {play_time['p90']}分, 不明 {play_time['unknown']}件")
+
+
+def write_stats(stats: Dict[str, Any], output_file: str) -> None:
+    """集計結果をJSONで保存する"""
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
@@ -3,7 +3,15 @@
 """
 import os
 import json
-from typing import List, Dict, Any, Union, Optional
+import codecs
+import hashlib
+from typing import List, Dict, Any, Union, Optional, Iterator, Tuple, BinaryIO
+import config
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 
 def save_to_json(data: List[Dict[str, Any]], filename: str) -> None:
@@ -14,7 +22,7 @@ def save_to_json(data: List[Dict[str, Any]], filename: str) -> None:
         data: 保存するデータ
         filename: 保存先ファイル名
     """
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
     with open(filename, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
     print(f"{len(data)}件のデータを {filename} に保存しました")
@@ -64,21 +72,270 @@ def format_item_data(item_info: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def append_to_json(item: Dict[str, Any], filename: str) -> None:
-    """_summary_
-    単一のアイテムをJson二追加する
-    ファイルが存在しない場合新規作成、存在する場合は追加
+    """
+    単一のアイテムをJSON配列のファイルに追加する
+    ファイルが存在しない場合新規作成、存在する場合は末尾の「]」の位置に追記する
+    （既存の内容は読み込まないため、ファイルサイズによらず一定のメモリで動作する）
+
+    Args:
+        item: 追加するアイテム
+        filename: 保存先ファイル名
+    """
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump([item], f, ensure_ascii=False, indent=2)
+        return
+
+    # json.dumpでindent=2の配列を書いた場合と同じ形になるよう字下げする
+    item_lines = json.dumps(item, ensure_ascii=False, indent=2).splitlines()
+    item_text = os.linesep.join("  " + line for line in item_lines)
+
+    with open(filename, "r+b") as f:
+        f.seek(0, os.SEEK_END)
+        close_pos, last = _find_last_non_space(f, f.tell())
+        if last != b"]":
+            # 書き込み途中で中断して末尾の「]」がない場合は、最後の完全な要素の直後で閉じ直してから追記する
+            close_pos = _repair_array_tail(f, filename)
+        body_end, last = _find_last_non_space(f, close_pos)
+        if not last:
+            raise ValueError(f"JSON配列のファイルではないため追記できません: {filename}")
+
+        separator = os.linesep if last == b"[" else "," + os.linesep
+        f.seek(body_end + 1)
+        f.write((separator + item_text + os.linesep + "]").encode("utf-8"))
+        f.truncate()
+
+
+def _find_last_non_space(f: BinaryIO, end: int, size: int = 4096) -> Tuple[int, bytes]:
+    """
+    endより前で最後の空白でないバイトを、末尾からsizeバイトずつ読んで探す
+
+    Returns:
+        そのバイトの位置とバイト。ない場合は(-1, b"")
+    """
+    while end > 0:
+        start = max(0, end - size)
+        f.seek(start)
+        chunk = f.read(end - start).rstrip()
+        if chunk:
+            return start + len(chunk) - 1, chunk[-1:]
+        end = start
+    return -1, b""
+
+
+def _repair_array_tail(f: BinaryIO, filename: str, chunk_size: int = 65536) -> int:
+    """
+    末尾の「]」がないJSON配列のファイルを、最後まで書き込めた要素の直後で閉じ直す
+
+    書きかけの要素は捨てる（再開時はチェックポイントにない要素として再度処理される）。
+    ファイルは先頭からchunk_sizeバイトずつ読み、保持するのは読みかけの要素1件分だけにする
+
+    Returns:
+        閉じ直した「]」の位置
+
+    Raises:
+        ValueError: JSON配列のファイルではない場合
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    f.seek(0)
+    buffer = ""
+    offset = 0  # bufferの先頭のバイト位置
+    end: Optional[int] = None  # 最後の完全な要素（要素がない場合は「[」）の直後のバイト位置
+    eof = False
+    while True:
+        # 空白と区切りのカンマを読み飛ばす
+        pos = 0
+        while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+            pos += 1
+        if end is None and buffer[:pos].strip():
+            raise ValueError(f"JSON配列のファイルではないため追記できません: {filename}")
+        offset += len(buffer[:pos].encode("utf-8"))
+        buffer = buffer[pos:]
+
+        if buffer and end is None:
+            # 最初の空白でない文字は配列の開始の「[」
+            if buffer[0] != "[":
+                raise ValueError(f"JSON配列のファイルではないため追記できません: {filename}")
+            offset = end = offset + 1
+            buffer = buffer[1:]
+            continue
+        if buffer and buffer[0] != "]":
+            try:
+                _, pos = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                pos = 0
+            # 読み込んだ範囲の末尾で終わる値（数値など）は続きがありうるため、続きを読んでから確定する
+            if pos and (pos < len(buffer) or eof):
+                offset = end = offset + len(buffer[:pos].encode("utf-8"))
+                buffer = buffer[pos:]
+                continue
+        elif buffer:
+            # 配列は閉じている（「]」の後ろに余分な内容がある）
+            break
+
+        if eof:
+            break
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer += utf8.decode(chunk, final=eof)
+
+    if end is None:
+        raise ValueError(f"JSON配列のファイルではないため追記できません: {filename}")
+    f.seek(0, os.SEEK_END)
+    removed = f.tell() - end
+    f.seek(end)
+    f.write((os.linesep + "]").encode("utf-8"))
+    f.truncate()
+    print(f"書き込み途中で終わっていた {filename} の末尾を修復しました（{removed}バイトを削除）")
+    return end + len(os.linesep)
+
+
+def append_to_jsonl(item: Dict[str, Any], filename: str) -> None:
+    """
+    単一のアイテムをJSONLファイルに1行として追記する
+
     Args:
-        item (Dict[str,Any]): _description_
-        filename (str): _description_
+        item: 追加するアイテム
+        filename: 保存先ファイル名
     """
     os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "a", encoding="utf-8") as f:
+        f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+def fingerprint(value: Any) -> str:
+    """JSONにした値のSHA-256の先頭12文字（設定・プロンプトのバージョンや、IDのないアイテムの識別に使う）"""
+    text = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
 
-    existing_data = []
-    if os.path.exists(filename):
+def get_item_id(item: Dict[str, Any]) -> str:
+    """
+    アイテムを識別するID（商品ID、なければURL）を取得する
+
+    どちらもない場合は内容のハッシュを使う（IDがないアイテムもチェックポイントに記録し、再開時に重複させないため）
+    """
+    item_id = item.get("id") or item.get("url")
+    return str(item_id) if item_id else f"sha256:{fingerprint(item)}"
+
+
+def is_item_file(filename: str) -> bool:
+    """
+    商品・アイテムのファイルかどうかを判定する（出力ファイルに付随する実行マニフェストやメトリクスは除く）
+
+    Args:
+        filename: 判定するファイル名
+
+    Returns:
+        商品・アイテムのファイルならTrue
+    """
+    return not filename.endswith((config.RUN_MANIFEST_SUFFIX, config.CRAWL_METRICS_SUFFIX))
+
+
+def detect_json_layout(filename: str) -> str:
+    """
+    JSONファイルの形式を判定する
+
+    Args:
+        filename: 判定するファイル名
+
+    Returns:
+        "array"（JSON配列）、"jsonl"（1行1オブジェクト）、"object"（単一オブジェクト）のいずれか
+    """
+    if filename.endswith(".jsonl"):
+        return "jsonl"
+
+    with open(filename, "r", encoding="utf-8") as f:
+        first_char = ""
+        while True:
+            char = f.read(1)
+            if not char or not char.isspace():
+                first_char = char
+                break
+        if first_char == "[":
+            return "array"
+
+        # 先頭から2行がそれぞれ完結したオブジェクトならJSONLとみなす
+        # （1行に書かれた単一オブジェクトの.jsonファイルをJSONLと誤判定しないため）
+        f.seek(0)
+        objects = 0
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                value = json.loads(line)
+            except json.JSONDecodeError:
+                return "object"
+            if not isinstance(value, dict):
+                return "object"
+            objects += 1
+            if objects == 2:
+                return "jsonl"
+    return "object"
+
+
+def iter_json_items(filename: str, chunk_size: int = 65536) -> Iterator[Dict[str, Any]]:
+    """
+    JSON配列・JSONLファイルからアイテムを1件ずつ読み込む
+    ファイル全体を読み込まないため、ファイルサイズによらず一定のメモリで動作する
+
+    Args:
+        filename: 読み込むファイル名
+        chunk_size: 一度に読み込む文字数
+
+    Yields:
+        アイテム
+
+    Raises:
+        ValueError: 書き込み途中で終わっているなど、JSONとして読み込めない場合（json.JSONDecodeErrorを含む）
+    """
+    layout = detect_json_layout(filename)
+
+    if layout == "jsonl":
         with open(filename, "r", encoding="utf-8") as f:
-            existing_data = json.load(f)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
 
-    # append data and save it
-    existing_data.append(item)
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(existing_data, f, ensure_ascii=False, indent=2)
+    if layout == "object":
+        with open(filename, "r", encoding="utf-8") as f:
+            yield json.load(f)
+        return
+
+    if ijson is not None:
+        with open(filename, "rb") as f:
+            try:
+                yield from ijson.items(f, "item", use_float=True)
+            except ijson.JSONError as e:
+                # ijsonの例外はValueErrorではないため、標準のjsonで読み込んだ場合と同じValueErrorにする
+                raise ValueError(f"JSONとして読み込めません: {filename} - {e}") from e
+        return
+
+    decoder = json.JSONDecoder()
+    with open(filename, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size).lstrip()[1:]  # 先頭の「[」を読み飛ばす
+        pos = 0
+        eof = False
+        while True:
+            # 区切りのカンマと空白を読み飛ばす
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                if pos >= len(buffer):
+                    raise json.JSONDecodeError("need more data", buffer, pos)
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield item
@@ -0,0 +1,93 @@
+"""
+実行マニフェスト
+スクレイピング・整形の出力ファイルの隣に、どのコード（コミット・未コミットの変更の有無）・設定・プロンプトで
+作られたかを <出力ファイル>.manifest.json として記録する。Gitの状態はプロセス内でキャッシュするため、
+出力ファイルがいくつあってもgitの実行は1回の実行につき最初の1回だけになる
+"""
+import os
+import sys
+import json
+import types
+from datetime import datetime
+from typing import Dict, Any, Optional
+import config
+from utils.data_utils import fingerprint
+from gitStatus.writeGitStatus import get_git_status
+
+# このプロジェクトのディレクトリ（カレントディレクトリによらずコードのリポジトリを調べる）
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_config_version() -> str:
+    """config.pyの設定値（大文字の名前のもの）から設定のバージョンを求める"""
+    settings = {
+        name: value for name, value in vars(config).items()
+        if name.isupper() and not isinstance(value, types.ModuleType)
+    }
+    return fingerprint(settings)
+
+
+def get_code_provenance() -> Dict[str, Any]:
+    """
+    コードの出所（コミット・ブランチ・未コミットの変更の有無）を取得する
+
+    Returns:
+        commit、branch、dirty、変更・未追跡のファイル数を含む辞書（Gitの情報が取れない場合はerror）
+    """
+    status = get_git_status(PROJECT_DIR)
+    if "error" in status:
+        return {"commit": None, "branch": None, "dirty": None, "error": status["error"]}
+    return {
+        "commit": status["commit"],
+        "branch": status["current_branch"],
+        "dirty": status["dirty"],
+        "changed_files": len(status["staged_files"]) + len(status["modified_files"]) + len(status["conflicted_files"]),
+        "untracked_files": len(status["untracked_files"]),
+    }
+
+
+def build_manifest(command: str, parameters: Dict[str, Any], prompt_version: Optional[str] = None, **stats: Any) -> Dict[str, Any]:
+    """
+    実行マニフェストを作る
+
+    Args:
+        command: サブコマンド（"scrape"、"format"など）
+        parameters: 実行時の引数
+        prompt_version: プロンプトのバージョン（整形の場合）
+        stats: 件数などの実行結果
+
+    Returns:
+        実行マニフェスト
+    """
+    return {
+        "command": command,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "code": get_code_provenance(),
+        "config_version": get_config_version(),
+        "prompt_version": prompt_version,
+        "python": sys.version.split()[0],
+        "parameters": parameters,
+        **stats,
+    }
+
+
+def write_manifest(output_file: str, command: str, parameters: Dict[str, Any], prompt_version: Optional[str] = None, **stats: Any) -> str:
+    """
+    出力ファイルの実行マニフェストを書き出す
+
+    Args:
+        output_file: 出力ファイル（マニフェストは出力ファイル名にconfig.RUN_MANIFEST_SUFFIXを付けたファイル）
+        command: サブコマンド
+        parameters: 実行時の引数
+        prompt_version: プロンプトのバージョン（整形の場合）
+        stats: 件数などの実行結果
+
+    Returns:
+        マニフェストのファイル名
+    """
+    manifest = build_manifest(command, parameters, prompt_version, output_file=output_file, **stats)
+    manifest_file = output_file + config.RUN_MANIFEST_SUFFIX
+    os.makedirs(os.path.dirname(manifest_file) or ".", exist_ok=True)
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest_file
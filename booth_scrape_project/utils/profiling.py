@@ -0,0 +1,248 @@
+"""
+プロファイリング
+--profile指定時に、CPUプロファイル（cProfileとスタックのサンプリング）、ステージ境界ごとの
+tracemallocのスナップショット、asyncioタスクの所要時間を収集し、
+flamegraph形式のファイルと上位N件のホットスポットのレポートを出力する
+"""
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Iterator, Tuple, Coroutine
+import config
+
+
+def _frame_label(frame: Any) -> str:
+    """サンプリングしたフレームの表示名（flamegraphの区切り文字「;」は含めない）"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class StackSampler:
+    """全スレッドのスタックを一定間隔で記録するサンプリングプロファイラ"""
+
+    def __init__(self, interval: float) -> None:
+        """
+        初期化
+
+        Args:
+            interval: サンプリング間隔（秒）
+        """
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write_folded(self, output_file: str) -> None:
+        """flamegraph.pl・speedscopeで読み込めるfolded stacks形式で書き出す"""
+        with open(output_file, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top_self(self, top_n: int) -> List[Tuple[str, int]]:
+        """スタックの先端（自身で時間を使っている関数）のサンプル数の上位"""
+        leaves: Counter = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(top_n)
+
+
+class Profiler:
+    """1回の実行分のプロファイルを収集するクラス"""
+
+    def __init__(self, name: str, output_dir: Optional[str] = None, sample_interval: Optional[float] = None, top_n: Optional[int] = None) -> None:
+        """
+        初期化
+
+        Args:
+            name: 実行名（サブコマンド名など）
+            output_dir: 出力ディレクトリ（省略時はconfig.PROFILE_DIR/<実行名>-<時刻>）
+            sample_interval: スタックのサンプリング間隔（秒）
+            top_n: レポートに表示する件数
+        """
+        self.name = name
+        self.output_dir = output_dir or os.path.join(config.PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+        self.top_n = top_n or config.PROFILE_TOP_N
+        self.cpu = cProfile.Profile()
+        self.sampler = StackSampler(sample_interval or config.PROFILE_SAMPLE_INTERVAL)
+        self._lock = threading.Lock()
+        self._snapshots: List[Tuple[str, float, tracemalloc.Snapshot]] = []
+        self._memory_report: List[str] = []
+        self.task_times: Dict[str, List[float]] = defaultdict(list)
+
+    def start(self) -> None:
+        """収集を開始する"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        tracemalloc.start()
+        self.mark("start")
+        self.sampler.start()
+        self.cpu.enable()
+
+    def mark(self, stage: str) -> None:
+        """
+        ステージの境界でtracemallocのスナップショットを取り、前の境界からのメモリ増加を記録する
+
+        Args:
+            stage: 境界の名前
+        """
+        if not tracemalloc.is_tracing():
+            return
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            if self._snapshots:
+                previous_stage, _, previous = self._snapshots[-1]
+                lines = [f"[{previous_stage} → {stage}] 使用中 {current / 1024:.1f} KiB / ピーク {peak / 1024:.1f} KiB"]
+                for stat in snapshot.compare_to(previous, "lineno")[:self.top_n // 3 or 1]:
+                    lines.append(f"  {stat}")
+                self._memory_report.append("\n".join(lines))
+            # 比較に使う直前のスナップショットだけを保持する
+            self._snapshots = [(stage, time.perf_counter(), snapshot)]
+
+    def record_task(self, name: str, seconds: float) -> None:
+        """asyncioタスクの所要時間を記録する"""
+        with self._lock:
+            self.task_times[name].append(seconds)
+
+    def stop(self) -> str:
+        """
+        収集を終了してファイルを書き出し、ホットスポットのレポートを返す
+
+        Returns:
+            レポートの文字列
+        """
+        self.cpu.disable()
+        self.sampler.stop()
+        self.mark("end")
+        tracemalloc.stop()
+
+        self.cpu.dump_stats(os.path.join(self.output_dir, f"{self.name}.prof"))
+        self.sampler.write_folded(os.path.join(self.output_dir, f"{self.name}.folded"))
+        report = self.build_report()
+        with open(os.path.join(self.output_dir, "report.txt"), "w", encoding="utf-8") as f:
+            f.write(report)
+        return report
+
+    def build_report(self) -> str:
+        """上位N件のホットスポットのレポートを組み立てる"""
+        lines = [f"プロファイル: {self.name}（出力先: {self.output_dir}）", ""]
+
+        lines.append(f"CPU（メインスレッド、累積時間の上位{self.top_n}件）:")
+        stats = pstats.Stats(self.cpu)
+        entries = sorted(stats.stats.items(), key=lambda entry: -entry[1][3])[:self.top_n]
+        for (filename, lineno, func), (_, calls, own, cumulative, _) in entries:
+            lines.append(f"  {cumulative:8.3f}秒 (自身 {own:7.3f}秒, {calls}回) {func} ({os.path.basename(filename)}:{lineno})")
+
+        total = sum(self.sampler.samples.values())
+        lines += ["", f"サンプリング（全スレッド、自身で時間を使っている関数の上位{self.top_n}件、{total}サンプル）:"]
+        for label, count in self.sampler.top_self(self.top_n):
+            lines.append(f"  {count / total:6.1%} {label}" if total else f"  {label}")
+
+        if self.task_times:
+            lines += ["", f"asyncioタスク（合計時間の上位{self.top_n}件）:"]
+            tasks = sorted(self.task_times.items(), key=lambda entry: -sum(entry[1]))[:self.top_n]
+            for name, times in tasks:
+                lines.append(f"  {sum(times):8.3f}秒 ({len(times)}回, 最大 {max(times):.3f}秒) {name}")
+
+        if self._memory_report:
+            lines += ["", "メモリ（ステージ境界ごとの増加の上位）:"]
+            lines += self._memory_report
+        return "\n".join(lines) + "\n"
+
+
+_active: Optional[Profiler] = None
+
+
+def get_active_profiler() -> Optional[Profiler]:
+    """実行中のプロファイラを取得する（プロファイル中でなければNone）"""
+    return _active
+
+
+def mark_stage(stage: str) -> None:
+    """プロファイル中であればステージの境界を記録する"""
+    if _active is not None:
+        _active.mark(stage)
+
+
+@contextmanager
+def profile_run(name: str, enabled: bool = True) -> Iterator[Optional[Profiler]]:
+    """
+    ブロックの実行中にプロファイルを収集する
+
+    Args:
+        name: 実行名（サブコマンド名など）
+        enabled: Falseの場合は何もしない
+    """
+    global _active
+    if not enabled:
+        yield None
+        return
+    profiler = Profiler(name)
+    _active = profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        _active = None
+        report = profiler.stop()
+        print("\n" + report)
+
+
+async def run_with_task_timing(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    実行中のイベントループで作られるタスクの所要時間を記録しながらコルーチンを実行する
+
+    プロファイル中でなければそのまま実行する
+    """
+    profiler = _active
+    if profiler is None:
+        return await coro
+
+    # イベントループの中で呼ばれるため、asyncioはこの時点で読み込み済み
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+
+    def task_factory(loop: asyncio.AbstractEventLoop, task_coro: Coroutine[Any, Any, Any], **kwargs: Any) -> asyncio.Task:
+        task = asyncio.Task(task_coro, loop=loop, **kwargs)
+        started_at = time.perf_counter()
+        name = getattr(task_coro, "__qualname__", type(task_coro).__name__)
+        task.add_done_callback(lambda _: profiler.record_task(name, time.perf_counter() - started_at))
+        return task
+
+    loop.set_task_factory(task_factory)
+    started_at = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        loop.set_task_factory(None)
+        profiler.record_task(getattr(coro, "__qualname__", "main"), time.perf_counter() - started_at)
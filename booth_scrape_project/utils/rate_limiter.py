@@ -0,0 +1,45 @@
+"""
+複数スレッドで共有するレートリミッター
+"""
+import time
+import threading
+
+
+class RateLimiter:
+    """
+    呼び出しの間隔を一定以上に保つレートリミッター
+
+    各呼び出しが次の実行枠を予約してから待機するため、複数スレッドから同時に呼ばれても
+    全体としての間隔がmin_interval秒以上に保たれる
+    """
+
+    def __init__(self, min_interval: float) -> None:
+        """
+        初期化
+
+        Args:
+            min_interval: 呼び出し間の最小間隔（秒）。0以下の場合は待機しない
+        """
+        self.min_interval = max(0.0, min_interval)
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        実行枠が来るまで待機する
+
+        Returns:
+            実際に待機した秒数
+        """
+        if self.min_interval <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+
+        wait_time = slot - now
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
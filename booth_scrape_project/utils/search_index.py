@@ -0,0 +1,230 @@
+"""
+商品の全文検索インデックス
+タイトル・作者・説明文を日本語向けのbigram（2文字ずつ重ねた区切り）に分割してSQLiteのFTS5に登録し、
+価格・人数・スキ数などの条件と組み合わせて検索する
+"""
+import re
+import sqlite3
+import unicodedata
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    title, author, description,
+    tokenize = 'unicode61 remove_diacritics 0'
+);
+"""
+
+# 英字の単語と、それ以外の文字（かな・漢字・数字など）の連なり
+# 数字は「4人用」のように前後の文字と続けて書かれるため、かな・漢字と同じ連なりにする
+_TOKEN_PATTERN = re.compile(r"[a-z]+|[^\Wa-z_]+")
+
+# bm25の列ごとの重み（title, author, description）
+_BM25_WEIGHTS = (5.0, 2.0, 1.0)
+
+# 検索条件: 引数名 -> SQLの条件（iはitems、fはformatted_itemsテーブル）
+FILTERS: Dict[str, str] = {
+    "min_price": "i.price >= ?",
+    "max_price": "i.price <= ?",
+    "min_likes": "i.likes >= ?",
+    "max_likes": "i.likes <= ?",
+    # 指定した人数で遊べる（最小人数以上・最大人数以下）
+    "players": "f.min_players <= ? AND f.max_players >= ?",
+    "max_play_time": "f.play_time <= ?",
+    "game_type": "f.game_type = ?",
+    "gm_required": "f.gm_required = ?",
+    "author": "i.author = ?",
+}
+
+# 検索結果に表示する説明文の抜粋の前後の文字数
+_SNIPPET_CONTEXT = 30
+
+
+def normalize(text: Optional[str]) -> str:
+    """全角・半角と大文字・小文字をそろえる"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def ngram_tokens(text: Optional[str], for_index: bool = False) -> List[str]:
+    """
+    テキストを検索用のトークンに分割する
+
+    英字は単語ごと、かな・漢字・数字は単語の区切りがないため2文字ずつ重ねたbigramにする
+    （例:「霧雨の洋館」→「霧雨」「雨の」「の洋」「洋館」）
+
+    Args:
+        text: テキスト
+        for_index: インデックスに登録する場合はTrue（1文字の検索語が連なりの末尾の文字にも
+            一致するよう、末尾の1文字もトークンに加える）
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(normalize(text)):
+        if run.isalpha() and run.isascii() or len(run) == 1:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if for_index:
+            tokens.append(run[-1])
+    return tokens
+
+
+def _index_text(text: Optional[str]) -> str:
+    return " ".join(ngram_tokens(text, for_index=True))
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    検索語をFTS5のMATCH式にする
+
+    空白で区切った語はすべてを含む（AND）。語のbigramは連続して現れるフレーズとして照合し、
+    1文字の語・英字の語は前方一致とする
+
+    Returns:
+        MATCH式。検索できる語がない場合はNone
+    """
+    terms = []
+    for word in query.split():
+        tokens = ngram_tokens(word)
+        if not tokens:
+            continue
+        if len(tokens) == 1 and (len(tokens[0]) == 1 or tokens[0].isalpha() and tokens[0].isascii()):
+            terms.append(f'"{tokens[0]}"*')
+        else:
+            terms.append('"' + " ".join(tokens) + '"')
+    return " AND ".join(terms) if terms else None
+
+
+def update_index(conn: sqlite3.Connection, item_ids: Sequence[str]) -> None:
+    """
+    itemsテーブルの商品の検索インデックスを更新する（呼び出し側のトランザクション内で実行する）
+
+    インデックスの行はitemsテーブルの行とrowidで対応させる
+
+    Args:
+        conn: データベースの接続
+        item_ids: 更新する商品ID
+    """
+    rows = []
+    for start in range(0, len(item_ids), 500):
+        chunk = list(item_ids[start:start + 500])
+        cursor = conn.execute(
+            f"SELECT rowid, title, author, description FROM items WHERE id IN ({', '.join('?' for _ in chunk)})", chunk)
+        rows.extend(cursor.fetchall())
+    conn.executemany("DELETE FROM search_index WHERE rowid = ?", [(row[0],) for row in rows])
+    conn.executemany(
+        "INSERT INTO search_index (rowid, title, author, description) VALUES (?, ?, ?, ?)",
+        [(rowid, *(_index_text(text) for text in texts)) for rowid, *texts in rows])
+
+
+def rebuild_index(conn: sqlite3.Connection, batch_size: int = 1000) -> int:
+    """
+    itemsテーブルのすべての商品で検索インデックスを作り直す（呼び出し側のトランザクション内で実行する）
+
+    Returns:
+        登録した件数
+    """
+    conn.execute("DELETE FROM search_index")
+    count = 0
+    last_rowid = 0
+    while True:
+        rows = conn.execute(
+            "SELECT rowid, title, author, description FROM items WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (last_rowid, batch_size)).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            "INSERT INTO search_index (rowid, title, author, description) VALUES (?, ?, ?, ?)",
+            [(rowid, *(_index_text(text) for text in texts)) for rowid, *texts in rows])
+        count += len(rows)
+        last_rowid = rows[-1][0]
+    # 削除・再登録で断片化したインデックスをまとめる
+    conn.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    return count
+
+
+def make_snippet(text: Optional[str], query: str) -> str:
+    """説明文のうち検索語が最初に現れる箇所の前後を抜き出す"""
+    text = (text or "").replace("\n", " ")
+    normalized = normalize(text)
+    for word in query.split():
+        position = normalized.find(normalize(word))
+        if position >= 0:
+            start = max(0, position - _SNIPPET_CONTEXT)
+            end = position + len(word) + _SNIPPET_CONTEXT
+            return ("…" if start else "") + text[start:end] + ("…" if end < len(text) else "")
+    return text[:_SNIPPET_CONTEXT * 2] + ("…" if len(text) > _SNIPPET_CONTEXT * 2 else "")
+
+
+def search(conn: sqlite3.Connection, query: str = "", limit: int = 20, **filters: Any) -> List[Dict[str, Any]]:
+    """
+    商品を検索する
+
+    Args:
+        conn: データベースの接続
+        query: 検索語（空の場合は条件だけで絞り込み、スキ数の多い順に並べる）
+        limit: 最大件数
+        filters: FILTERSの条件（Noneの条件は使わない）
+
+    Returns:
+        一致した商品（関連度の高い順）
+    """
+    unknown = [name for name in filters if name not in FILTERS]
+    if unknown:
+        raise ValueError(f"不明な検索条件です: {', '.join(unknown)}")
+
+    conditions: List[str] = []
+    params: List[Any] = []
+    match = build_match_query(query) if query else None
+    if query and match is None:
+        return []
+    if match is not None:
+        conditions.append("search_index MATCH ?")
+        params.append(match)
+    for name, value in filters.items():
+        if value is None:
+            continue
+        conditions.append(FILTERS[name])
+        params.extend([value] * FILTERS[name].count("?"))
+
+    columns = (
+        "i.id, i.url, i.title, i.price, i.likes, i.author, i.description, "
+        "f.title, f.game_type, f.gm_required, f.min_players, f.max_players, f.play_time")
+    if match is not None:
+        sql = (
+            f"SELECT {columns}, bm25(search_index, {', '.join(map(str, _BM25_WEIGHTS))}) AS rank "
+            "FROM search_index JOIN items i ON i.rowid = search_index.rowid "
+            "LEFT JOIN formatted_items f ON f.id = i.id "
+            f"WHERE {' AND '.join(conditions)} ORDER BY rank LIMIT ?")
+    else:
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        sql = (
+            f"SELECT {columns}, NULL AS rank FROM items i LEFT JOIN formatted_items f ON f.id = i.id "
+            f"{where}ORDER BY i.likes DESC LIMIT ?")
+    params.append(limit)
+
+    results = []
+    for row in conn.execute(sql, params):
+        (item_id, url, title, price, likes, author, description,
+         formatted_title, game_type, gm_required, min_players, max_players, play_time, rank) = row
+        results.append({
+            "id": item_id, "url": url, "title": title, "price": price, "likes": likes, "author": author,
+            "formatted_title": formatted_title, "game_type": game_type, "gm_required": gm_required,
+            "min_players": min_players, "max_players": max_players, "play_time": play_time,
+            "score": round(-rank, 3) if rank is not None else None,
+            "snippet": make_snippet(description, query),
+        })
+    return results
+
+
+def format_result(result: Dict[str, Any]) -> Tuple[str, str]:
+    """検索結果の1件を表示用の見出しと詳細の2行にする"""
+    details = [f"¥{result['price']:,}" if result["price"] is not None else "価格不明",
+               f"スキ {result['likes']}" if result["likes"] is not None else "スキ不明"]
+    if result["min_players"] is not None:
+        details.append(f"{result['min_players']}〜{result['max_players']}人")
+    if result["play_time"] is not None:
+        details.append(f"{result['play_time']}分")
+    if result["gm_required"]:
+        details.append(f"GM{result['gm_required']}")
+    heading = f"{result['title']} / {result['author']} ({', '.join(details)})"
+    return heading, f"{result['url']}  {result['snippet']}"
@@ -0,0 +1,29 @@
+"""
+集計用のユーティリティ
+テレメトリ・クロールのメトリクス・ヘッジの待ち時間で同じ順位の求め方を使うため、パーセンタイルの計算をまとめる
+"""
+import math
+from typing import Iterable, Optional
+
+
+def percentile(values: Iterable[float], q: float) -> Optional[float]:
+    """
+    パーセンタイルを求める（最近傍法: 小さい方から数えてceil(q/100 × 件数)番目の値）
+
+    Args:
+        values: 値
+        q: 分位点（0〜100）
+
+    Returns:
+        パーセンタイル。値がない場合はNone
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def format_seconds(value: Optional[float], digits: int = 2) -> str:
+    """秒数を表示用の文字列にする（値がない場合は「-」）"""
+    return f"{value:.{digits}f}秒" if value is not None else "-"
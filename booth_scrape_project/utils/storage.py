@@ -0,0 +1,386 @@
+"""
+SQLiteによるデータの保存
+スクレイピングした商品と整形済みのアイテムを商品IDをキーにupsertし、
+価格・スキ数などの変わりやすいフィールドの変化を履歴として残す。JSON・JSONLへの書き出しもできる
+"""
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Iterator, Iterable
+import config
+from utils.data_utils import get_item_id
+from utils import search_index
+
+TABLE_ITEMS = "items"
+TABLE_FORMATTED = "formatted_items"
+
+# 履歴を残すフィールド（商品ページの再取得で値が変わりうるもの）
+VOLATILE_FIELDS: Dict[str, List[str]] = {
+    TABLE_ITEMS: ["title", "price", "likes"],
+    TABLE_FORMATTED: ["title", "price", "likes"],
+}
+
+# テーブルの列（idと記録用の列を除く）
+ITEM_COLUMNS: List[str] = ["url", "title", "price", "likes", "author", "description", "thumbnail_url", "keyword"]
+FORMATTED_COLUMNS: List[str] = [
+    "url", "title", "price", "likes", "author", "game_type", "gm_required",
+    "min_players", "max_players", "play_time", "thumbnail_url", "data",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY,
+    url TEXT,
+    title TEXT,
+    price INTEGER,
+    likes INTEGER,
+    author TEXT,
+    description TEXT,
+    thumbnail_url TEXT,
+    keyword TEXT,
+    first_seen_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_items_author ON items(author);
+CREATE INDEX IF NOT EXISTS idx_items_price ON items(price);
+CREATE INDEX IF NOT EXISTS idx_items_likes ON items(likes);
+
+CREATE TABLE IF NOT EXISTS formatted_items (
+    id TEXT PRIMARY KEY,
+    url TEXT,
+    title TEXT,
+    price INTEGER,
+    likes TEXT,
+    author TEXT,
+    game_type TEXT,
+    gm_required TEXT,
+    min_players INTEGER,
+    max_players INTEGER,
+    play_time INTEGER,
+    thumbnail_url TEXT,
+    data TEXT NOT NULL,
+    first_seen_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_formatted_author ON formatted_items(author);
+CREATE INDEX IF NOT EXISTS idx_formatted_price ON formatted_items(price);
+CREATE INDEX IF NOT EXISTS idx_formatted_likes ON formatted_items(likes);
+CREATE INDEX IF NOT EXISTS idx_formatted_players ON formatted_items(min_players, max_players);
+CREATE INDEX IF NOT EXISTS idx_formatted_play_time ON formatted_items(play_time);
+CREATE INDEX IF NOT EXISTS idx_formatted_game_type ON formatted_items(game_type, gm_required);
+
+CREATE TABLE IF NOT EXISTS item_history (
+    item_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    field TEXT NOT NULL,
+    old_value TEXT,
+    new_value TEXT,
+    changed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_item ON item_history(item_id, source, changed_at);
+"""
+
+# SQLiteの変数の上限（古いバージョンの999）を超えないよう、既存値の取得を分割する件数
+_LOOKUP_CHUNK = 500
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (ValueError, TypeError):
+        return None
+
+
+def _item_row(item: Dict[str, Any], keyword: Optional[str]) -> Dict[str, Any]:
+    """スクレイピングした商品をitemsテーブルの行にする"""
+    return {
+        "url": item.get("url"),
+        "title": item.get("title"),
+        "price": _to_int(item.get("price")),
+        "likes": _to_int(item.get("likes")),
+        "author": item.get("author"),
+        "description": item.get("description"),
+        "thumbnail_url": item.get("thumbnail_url"),
+        "keyword": keyword,
+    }
+
+
+def _formatted_row(item: Dict[str, Any]) -> Dict[str, Any]:
+    """整形済みのアイテムをformatted_itemsテーブルの行にする（元のアイテムはdataにJSONで保持する）"""
+    play_time = item.get("play_time")
+    if isinstance(play_time, dict):
+        play_time = play_time.get("avg")
+    return {
+        "url": item.get("url"),
+        "title": item.get("title"),
+        "price": _to_int(item.get("price")),
+        "likes": item.get("likes"),
+        "author": item.get("author"),
+        "game_type": item.get("game_type"),
+        "gm_required": item.get("gm_required"),
+        "min_players": _to_int(item.get("min_players")),
+        "max_players": _to_int(item.get("max_players")),
+        "play_time": _to_int(play_time),
+        "thumbnail_url": item.get("thumbnail_url"),
+        "data": json.dumps(item, ensure_ascii=False),
+    }
+
+
+class ItemStore:
+    """商品と整形済みアイテムを保存するSQLiteデータベース（複数スレッドから共有できる）"""
+
+    def __init__(self, db_path: str) -> None:
+        """
+        初期化（テーブル・インデックスがなければ作成する）
+
+        Args:
+            db_path: データベースファイルのパス
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        # WALモードでは書き込み中も別プロセスから読み込める
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        has_index = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'search_index'").fetchone() is not None
+        self._conn.executescript(SCHEMA + search_index.SCHEMA)
+        if not has_index:
+            # 検索インデックスのない古いデータベースは既存の商品で作成する
+            with self._conn:
+                search_index.rebuild_index(self._conn)
+        self._conn.commit()
+
+    def __enter__(self) -> "ItemStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """データベースを閉じる"""
+        with self._lock:
+            self._conn.close()
+
+    def upsert_items(self, items: Iterable[Dict[str, Any]], keyword: Optional[str] = None) -> int:
+        """
+        スクレイピングした商品をまとめて保存する（1つのトランザクションで書き込む）
+
+        全文検索インデックスも同じトランザクションで更新する
+
+        Args:
+            items: 商品のリスト
+            keyword: 検索キーワード
+
+        Returns:
+            保存した件数
+        """
+        rows = {get_item_id(item): _item_row(item, keyword) for item in items}
+        return self._upsert(TABLE_ITEMS, ITEM_COLUMNS, rows)
+
+    def upsert_formatted(self, items: Iterable[Dict[str, Any]]) -> int:
+        """
+        整形済みのアイテムをまとめて保存する（1つのトランザクションで書き込む）
+
+        Returns:
+            保存した件数
+        """
+        rows = {get_item_id(item): _formatted_row(item) for item in items}
+        return self._upsert(TABLE_FORMATTED, FORMATTED_COLUMNS, rows)
+
+    def _upsert(self, table: str, columns: List[str], rows: Dict[str, Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        now = datetime.now().isoformat(timespec="seconds")
+        volatile = VOLATILE_FIELDS[table]
+        # 既存の値がない列（スキ数の取得失敗など）で上書きしない
+        updates = ", ".join(f"{column} = COALESCE(excluded.{column}, {table}.{column})" for column in columns)
+        sql = (
+            f"INSERT INTO {table} (id, {', '.join(columns)}, first_seen_at, updated_at) "
+            f"VALUES (?, {', '.join('?' for _ in columns)}, ?, ?) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}, updated_at = excluded.updated_at")
+
+        with self._lock:
+            with self._conn:
+                ids = list(rows)
+                history = []
+                for start in range(0, len(ids), _LOOKUP_CHUNK):
+                    chunk = ids[start:start + _LOOKUP_CHUNK]
+                    cursor = self._conn.execute(
+                        f"SELECT id, {', '.join(volatile)} FROM {table} WHERE id IN ({', '.join('?' for _ in chunk)})", chunk)
+                    for existing in cursor:
+                        row = rows[existing[0]]
+                        for field, old_value in zip(volatile, existing[1:]):
+                            new_value = row[field]
+                            if new_value is not None and new_value != old_value:
+                                history.append((existing[0], table, field, _history_value(old_value), _history_value(new_value), now))
+                self._conn.executemany(
+                    sql, [(item_id, *(row[column] for column in columns), now, now) for item_id, row in rows.items()])
+                self._conn.executemany("INSERT INTO item_history VALUES (?, ?, ?, ?, ?, ?)", history)
+                if table == TABLE_ITEMS:
+                    search_index.update_index(self._conn, ids)
+        return len(rows)
+
+    def count(self, table: str = TABLE_ITEMS) -> int:
+        """テーブルの件数を取得する"""
+        _check_table(table)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def get_history(self, item_id: str, table: str = TABLE_ITEMS) -> List[Dict[str, Any]]:
+        """商品の変わりやすいフィールドの変化の履歴を古い順に取得する"""
+        _check_table(table)
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT field, old_value, new_value, changed_at FROM item_history "
+                "WHERE item_id = ? AND source = ? ORDER BY rowid", (item_id, table))
+            return [dict(zip(("field", "old_value", "new_value", "changed_at"), row)) for row in cursor]
+
+    def get_likes_counts(self) -> Dict[str, int]:
+        """スクレイピング時のスキ数を商品IDごとに取得する（整形済みのアイテムのスキ数は区分のため）"""
+        with self._lock:
+            cursor = self._conn.execute("SELECT id, likes FROM items WHERE likes IS NOT NULL")
+            return {row[0]: row[1] for row in cursor}
+
+    def search(self, query: str = "", limit: int = 20, **filters: Any) -> List[Dict[str, Any]]:
+        """
+        商品をタイトル・作者・説明文の全文検索と価格・人数・スキ数などの条件で検索する
+
+        Args:
+            query: 検索語（空白区切りですべてを含む商品）
+            limit: 最大件数
+            filters: 検索条件（utils.search_index.FILTERSの引数名）
+
+        Returns:
+            一致した商品（関連度の高い順）
+        """
+        with self._lock:
+            return search_index.search(self._conn, query, limit, **filters)
+
+    def rebuild_search_index(self) -> int:
+        """
+        全文検索インデックスを作り直す
+
+        Returns:
+            登録した件数
+        """
+        with self._lock:
+            with self._conn:
+                return search_index.rebuild_index(self._conn)
+
+    def iter_items(self, table: str = TABLE_ITEMS, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        保存したアイテムを商品ID順に1件ずつ取得する（全件をメモリに読み込まない）
+
+        Args:
+            table: TABLE_ITEMSまたはTABLE_FORMATTED
+            batch_size: 1回のクエリで取得する件数
+        """
+        _check_table(table)
+        last_id = ""
+        while True:
+            with self._lock:
+                if table == TABLE_FORMATTED:
+                    cursor = self._conn.execute(
+                        "SELECT id, data FROM formatted_items WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+                    rows = [(row[0], json.loads(row[1])) for row in cursor]
+                else:
+                    # スクレイピングの出力（format_item_data）と同じフィールド順にする
+                    keys = ("url", "id", "title", "price", "likes", "author", "description", "thumbnail_url")
+                    cursor = self._conn.execute(
+                        f"SELECT {', '.join(keys)} FROM items WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+                    rows = [(row[1], dict(zip(keys, row))) for row in cursor]
+            if not rows:
+                return
+            for _, item in rows:
+                yield item
+            last_id = rows[-1][0]
+
+    def export(self, output_file: str, table: str = TABLE_ITEMS) -> int:
+        """
+        保存したアイテムをJSON（配列）またはJSONLに書き出す（拡張子が.jsonlの場合はJSONL）
+
+        Returns:
+            書き出した件数
+        """
+        os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+        count = 0
+        jsonl = output_file.endswith(".jsonl")
+        with open(output_file, "w", encoding="utf-8") as f:
+            if not jsonl:
+                f.write("[")
+            for item in self.iter_items(table):
+                if jsonl:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+                else:
+                    # json.dumpでindent=2の配列を書いた場合と同じ形にする
+                    text = json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+                    f.write(("," if count else "") + "\n  " + text)
+                count += 1
+            if not jsonl:
+                f.write("\n]" if count else "]")
+        return count
+
+
+def _history_value(value: Any) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def _check_table(table: str) -> None:
+    if table not in VOLATILE_FIELDS:
+        raise ValueError(f"不明なテーブルです: {table}（{TABLE_ITEMS} または {TABLE_FORMATTED}）")
+
+
+class BatchWriter:
+    """
+    アイテムをためてまとめてデータベースに書き込むクラス（複数スレッドから呼び出せる）
+
+    batch_size件たまるごとに1つのトランザクションで書き込み、flushで残りを書き込む
+    """
+
+    def __init__(self, store: ItemStore, table: str, batch_size: Optional[int] = None, keyword: Optional[str] = None) -> None:
+        """
+        初期化
+
+        Args:
+            store: 書き込み先のデータベース
+            table: TABLE_ITEMSまたはTABLE_FORMATTED
+            batch_size: まとめて書き込む件数（省略時はconfig.STORAGE_BATCH_SIZE）
+            keyword: 検索キーワード（TABLE_ITEMSの場合）
+        """
+        _check_table(table)
+        self.store = store
+        self.table = table
+        self.batch_size = batch_size or config.STORAGE_BATCH_SIZE
+        self.keyword = keyword
+        self.written = 0
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, item: Dict[str, Any]) -> None:
+        """アイテムを追加する（batch_size件たまったら書き込む）"""
+        with self._lock:
+            self._pending.append(item)
+            if len(self._pending) < self.batch_size:
+                return
+            batch, self._pending = self._pending, []
+        self._write(batch)
+
+    def flush(self) -> None:
+        """たまっているアイテムを書き込む"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        if self.table == TABLE_FORMATTED:
+            written = self.store.upsert_formatted(batch)
+        else:
+            written = self.store.upsert_items(batch, self.keyword)
+        with self._lock:
+            self.written += written